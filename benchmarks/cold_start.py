@@ -0,0 +1,170 @@
+"""
+Cold Start Benchmark
+====================
+Measures the time it takes to import :py:mod:`tornado_dynamodb`, with its
+optional modules imported lazily as they are now and up front as they used to
+be, and the latency of the first request made by a new client with and
+without calling :py:meth:`~tornado_dynamodb.DynamoDB.prepare` first.
+
+Every sample runs in a new interpreter, so nothing is cached between samples.
+Requests are made to a local stub server that also serves the EC2 Instance
+Metadata API, so the first request of a client without local credentials has
+to fetch them, as it would on an instance.
+
+Usage: ``PYTHONPATH=. python benchmarks/cold_start.py [iterations]``
+
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from tornado import httpserver
+from tornado import ioloop
+from tornado import testing
+from tornado import web
+
+OPTIONAL_MODULES = ['tornado.locks', 'tornado_dynamodb.capacity',
+                    'tornado_dynamodb.compression',
+                    'tornado_dynamodb.expressions', 'uuid']
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.time()
+import tornado_dynamodb
+for name in sys.argv[1:]:
+    __import__(name)
+duration = time.time() - start
+print(duration, ','.join(name for name in {!r} if name in sys.modules))
+""".format(OPTIONAL_MODULES + ['arrow'])
+
+REQUEST_SCRIPT = """
+import sys, time
+from tornado import gen, ioloop
+from tornado_aws import config
+import tornado_dynamodb
+
+config.INSTANCE_ENDPOINT = sys.argv[1] + '/latest{}'
+
+
+@gen.coroutine
+def first_request():
+    client = tornado_dynamodb.DynamoDB(endpoint=sys.argv[1])
+    if sys.argv[2] == 'prepared':
+        yield client.prepare()
+    start = time.time()
+    yield client.list_tables()
+    print(time.time() - start)
+
+ioloop.IOLoop.current().run_sync(first_request)
+"""
+
+
+class StubHandler(web.RequestHandler):
+
+    def post(self):
+        self.set_header('Content-Type', 'application/x-amz-json-1.0')
+        self.write(json.dumps({'TableNames': []}))
+
+
+class RoleHandler(web.RequestHandler):
+
+    def get(self):
+        self.write('benchmark')
+
+
+class CredentialsHandler(web.RequestHandler):
+
+    def get(self, role):
+        self.write(json.dumps({'AccessKeyId': 'BENCHMARK',
+                               'SecretAccessKey': 'BENCHMARK',
+                               'Token': 'BENCHMARK',
+                               'Expiration': '2099-01-01T00:00:00Z'}))
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def environment():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.pop('AWS_ACCESS_KEY_ID', None)
+    env.pop('AWS_SECRET_ACCESS_KEY', None)
+    env['AWS_SHARED_CREDENTIALS_FILE'] = os.devnull + '.missing'
+    return env
+
+
+def run(script, args):
+    output = subprocess.check_output([sys.executable, '-c', script] + args,
+                                     env=environment())
+    return output.decode('utf-8').split()
+
+
+def import_times(iterations):
+    """Alternate between the lazy and the eager imports so that both are
+    sampled under the same system load.
+
+    """
+    lazy, eager, loaded = [], [], set()
+    for _ in range(iterations):
+        values = run(IMPORT_SCRIPT, [])
+        lazy.append(float(values[0]))
+        loaded.update(values[1].split(',') if len(values) > 1 else [])
+        eager.append(float(run(IMPORT_SCRIPT, OPTIONAL_MODULES)[0]))
+    return lazy, eager, sorted(loaded)
+
+
+def first_request_times(endpoint, iterations, prepare):
+    return [float(run(REQUEST_SCRIPT,
+                      [endpoint, 'prepared' if prepare else 'cold'])[0])
+            for _ in range(iterations)]
+
+
+def start_server():
+    sock, port = testing.bind_unused_port()
+    loop = ioloop.IOLoop()
+    application = web.Application([
+        (r'/', StubHandler),
+        (r'/latest/meta-data/iam/security-credentials/', RoleHandler),
+        (r'/latest/meta-data/iam/security-credentials/(.+)',
+         CredentialsHandler)])
+
+    def serve():
+        loop.make_current()
+        server = httpserver.HTTPServer(application)
+        server.add_sockets([sock])
+        loop.start()
+        server.stop()
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:{}'.format(port), loop
+
+
+def main(iterations):
+    lazy, eager, loaded = import_times(iterations)
+    print('import tornado_dynamodb: median {:.2f}ms (optional modules: '
+          '{})'.format(median(lazy) * 1000, ', '.join(loaded) or 'none'))
+    print('import with the optional modules: median {:.2f}ms '
+          '(lazy saves {:.2f}ms)'.format(
+              median(eager) * 1000, (median(eager) - median(lazy)) * 1000))
+
+    endpoint, loop = start_server()
+    cold = first_request_times(endpoint, iterations, False)
+    prepared = first_request_times(endpoint, iterations, True)
+    loop.add_callback(loop.stop)
+    print('first request (cold): median {:.3f}ms'.format(
+        median(cold) * 1000))
+    print('first request (prepared): median {:.3f}ms (prepare saves '
+          '{:.3f}ms)'.format(median(prepared) * 1000,
+                             (median(cold) - median(prepared)) * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 25)
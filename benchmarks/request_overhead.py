@@ -0,0 +1,99 @@
+"""
+Request Overhead Benchmark
+==========================
+Measures the client-side overhead of a request along the full request path:
+payload encoding, signing, the transport and processing the response. Only
+the HTTP client below the transport is replaced, with one that resolves each
+request on the next IOLoop iteration with a canned response.
+
+The request path that passes signed requests to the transport directly is
+compared with the previous path through
+:py:meth:`tornado_aws.client.AsyncAWSClient.fetch`, which allocates a future
+and a closure per call and chains them with
+:py:meth:`~tornado.ioloop.IOLoop.add_future`.
+
+Usage: ``PYTHONPATH=. python benchmarks/request_overhead.py [requests]``
+
+"""
+import io
+import json
+import os
+import sys
+import time
+
+from tornado import concurrent
+from tornado import gen
+from tornado import httpclient
+from tornado import ioloop
+
+import tornado_dynamodb
+from tornado_dynamodb import transport
+from tornado_dynamodb import utils
+
+BODY = json.dumps({'TableNames': ['benchmark']}).encode('utf-8')
+CONCURRENCY = 100
+
+
+class StubHTTPClient(object):
+    """Resolve every request with a canned *ListTables* response."""
+
+    def __init__(self):
+        self.io_loop = ioloop.IOLoop.current()
+
+    def fetch(self, request, **kwargs):
+        future = concurrent.Future()
+        response = httpclient.HTTPResponse(request, 200,
+                                           buffer=io.BytesIO(BODY))
+        self.io_loop.add_callback(future.set_result, response)
+        return future
+
+    def close(self):
+        pass
+
+
+class StubTransport(transport.Transport):
+
+    @staticmethod
+    def _create_client(max_clients, defaults):
+        return StubHTTPClient()
+
+
+class AWSClientFetch(tornado_dynamodb.DynamoDB):
+    """The previous request path, for comparison."""
+
+    def _request(self, command, body):
+        return self.fetch('POST', '/', headers=self._headers(command),
+                          body=json.dumps(body, default=utils.json_default))
+
+
+@gen.coroutine
+def run(method, requests):
+    start = time.time()
+    for _ in range(requests // CONCURRENCY):
+        yield [method() for _ in range(CONCURRENCY)]
+    raise gen.Return((time.time() - start) / requests)
+
+
+@gen.coroutine
+def main(requests):
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'BENCHMARK')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'BENCHMARK')
+    clients = (('aws client', AWSClientFetch(transport=StubTransport())),
+               ('transport', tornado_dynamodb.DynamoDB(
+                   transport=StubTransport())))
+    results = {}
+    for _ in range(3):
+        for name, client in clients:
+            duration = yield run(client.list_tables, requests)
+            results[name] = min(results.get(name, duration), duration)
+    for name, _client in clients:
+        print('{:>10}: {:.2f}us per request, {:,.0f} requests/s'.format(
+            name, results[name] * 1000000, 1 / results[name]))
+    print('{:>10}: {:.2f}us per request'.format(
+        'saved', (results['aws client'] - results['transport']) * 1000000))
+
+
+if __name__ == '__main__':
+    ioloop.IOLoop.current().run_sync(
+        lambda: main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -18,7 +18,7 @@ CLASSIFIERS = ['Development Status :: 3 - Alpha',
 
 DESC = 'An Asynchronous DynamoDB client Tornado'
 
-TESTS_REQUIRE = ['nose', 'mock', 'coverage']
+TESTS_REQUIRE = ['arrow', 'nose', 'mock', 'coverage']
 
 setuptools.setup(name='tornado-dynamodb',
                  version='0.1.0',
@@ -30,8 +30,15 @@ setuptools.setup(name='tornado-dynamodb',
                  packages=['tornado_dynamodb'],
                  package_data={'': ['LICENSE', 'README.rst', 'requirements.txt']},
                  include_package_data=True,
-                 install_requires=['arrow', 'tornado-aws'],
+                 install_requires=['tornado-aws'],
+                 extras_require={'arrow': ['arrow'], 'curl': ['pycurl']},
                  tests_require=TESTS_REQUIRE,
+                 entry_points={'console_scripts': [
+                     'tornado-dynamodb-bulk = tornado_dynamodb.bulk:main',
+                     'tornado-dynamodb-emulator = '
+                     'tornado_dynamodb.emulator:main',
+                     'tornado-dynamodb-loadgen = '
+                     'tornado_dynamodb.loadgen:main']},
                  license='BSD',
                  classifiers=CLASSIFIERS,
                  zip_safe=True)
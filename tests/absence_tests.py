@@ -0,0 +1,202 @@
+import decimal
+import unittest
+import uuid
+
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import absence
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+
+
+class BloomFilterTests(unittest.TestCase):
+
+    def test_sizing(self):
+        bloom = absence.BloomFilter(1000, 0.01)
+        self.assertEqual(bloom.size, 9586)
+        self.assertEqual(bloom.hashes, 7)
+
+    def test_added_values_are_found(self):
+        bloom = absence.BloomFilter(1000, 0.01)
+        for value in range(1000):
+            bloom.add(str(value).encode('utf-8'))
+        self.assertEqual(len(bloom), 1000)
+        for value in range(1000):
+            self.assertIn(str(value).encode('utf-8'), bloom)
+
+    def test_false_positive_rate(self):
+        bloom = absence.BloomFilter(1000, 0.01)
+        for value in range(1000):
+            bloom.add(str(value).encode('utf-8'))
+        false_positives = sum(1 for value in range(1000, 11000)
+                              if str(value).encode('utf-8') in bloom)
+        self.assertLess(false_positives, 200)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            absence.BloomFilter(0)
+        with self.assertRaises(ValueError):
+            absence.BloomFilter(10, 1.5)
+
+
+class AbsenceCacheTests(unittest.TestCase):
+
+    KEY = {'id': {'S': 'a'}}
+
+    def setUp(self):
+        self.cache = absence.AbsenceCache(ttl=60, max_size=3,
+                                          key_schemas={'table': ['id']})
+
+    def test_missing(self):
+        self.assertFalse(self.cache.absent('table', self.KEY))
+        self.cache.missing('table', self.KEY)
+        self.assertTrue(self.cache.absent('table', self.KEY))
+        self.assertFalse(self.cache.absent('table', self.KEY, True))
+        self.assertFalse(self.cache.absent('other', self.KEY))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_numbers_are_normalized(self):
+        self.cache.missing('table', {'id': {'N': '2.50'}})
+        self.assertTrue(self.cache.absent('table', {'id': {'N': '2.5'}}))
+        self.assertTrue(self.cache.absent('table', {'id': {'N': '25E-1'}}))
+
+    def test_missing_expires(self):
+        self.cache.ttl = -1
+        self.cache.missing('table', self.KEY)
+        self.assertFalse(self.cache.absent('table', self.KEY))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_max_size(self):
+        for value in 'abcd':
+            self.cache.missing('table', {'id': {'S': value}})
+        self.assertEqual(len(self.cache), 3)
+        self.assertFalse(self.cache.absent('table', {'id': {'S': 'a'}}))
+        self.assertTrue(self.cache.absent('table', {'id': {'S': 'd'}}))
+
+    def test_writes_remove_missing_keys(self):
+        for command, body in [
+                ('PutItem', {'TableName': 'table',
+                             'Item': {'id': {'S': 'a'}, 'v': {'N': '1'}}}),
+                ('UpdateItem', {'TableName': 'table', 'Key': self.KEY}),
+                ('BatchWriteItem', {'RequestItems': {'table': [
+                    {'PutRequest': {'Item': {'id': {'S': 'a'}}}}]}}),
+                ('TransactWriteItems', {'TransactItems': [
+                    {'Update': {'TableName': 'table', 'Key': self.KEY}}]})]:
+            self.cache.missing('table', self.KEY)
+            self.cache.observe(command, body)
+            self.assertFalse(self.cache.absent('table', self.KEY), command)
+
+    def test_put_with_unknown_schema_clears_table(self):
+        self.cache.missing('unknown', self.KEY)
+        self.cache.missing('table', self.KEY)
+        self.cache.observe('PutItem', {'TableName': 'unknown',
+                                       'Item': {'other': {'S': 'b'}}})
+        self.assertFalse(self.cache.absent('unknown', self.KEY))
+        self.assertTrue(self.cache.absent('table', self.KEY))
+
+    def test_learn_from_create_table(self):
+        self.cache.observe('CreateTable', {
+            'TableName': 'created',
+            'KeySchema': [{'AttributeName': 'pk', 'KeyType': 'HASH'},
+                          {'AttributeName': 'sk', 'KeyType': 'RANGE'}]})
+        self.assertEqual(self.cache.key_schemas['created'], ['pk', 'sk'])
+
+    def test_clear(self):
+        self.cache.missing('table', self.KEY)
+        self.cache.missing('other', self.KEY)
+        self.cache.clear('table')
+        self.assertFalse(self.cache.absent('table', self.KEY))
+        self.assertTrue(self.cache.absent('other', self.KEY))
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+
+class ClientTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.cache = absence.AbsenceCache()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), absence_cache=self.cache)
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable', {
+            'TableName': self.table,
+            'AttributeDefinitions': [{'AttributeName': 'id',
+                                      'AttributeType': 'S'},
+                                     {'AttributeName': 'sort',
+                                      'AttributeType': 'N'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'sort', 'KeyType': 'RANGE'}]})
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ClientTests, self).tearDown()
+
+    @testing.gen_test
+    def test_negative_cache(self):
+        key = {'id': 'a', 'sort': 1}
+        result = yield self.client.get_item(self.table, key)
+        self.assertEqual(result, {})
+        result = yield self.client.get_item(self.table, key)
+        self.assertEqual(result, {})
+        self.assertEqual(self.emulator.requests['GetItem'], 1)
+        yield self.client.get_item(self.table, key, consistent_read=True)
+        self.assertEqual(self.emulator.requests['GetItem'], 2)
+        yield self.client.update_item(
+            self.table, key, update_expression='SET #v = :v',
+            expression_attribute_names={'#v': 'value'},
+            expression_attribute_values={':v': 1})
+        result = yield self.client.get_item(self.table, key)
+        self.assertEqual(result['Item']['value'], 1)
+        self.assertEqual(self.emulator.requests['GetItem'], 3)
+
+    @testing.gen_test
+    def test_bloom_filter(self):
+        for value in range(20):
+            yield self.client.put_item(self.table, {'id': str(value),
+                                                    'sort': value})
+        result = yield self.cache.build(self.client, self.table)
+        self.assertEqual(result, 20)
+        self.assertEqual(self.cache.key_schemas[self.table], ['id', 'sort'])
+        requests = self.emulator.requests['GetItem']
+        for value in range(20, 120):
+            result = yield self.client.get_item(
+                self.table, {'id': str(value), 'sort': value},
+                consistent_read=True)
+            self.assertNotIn('Item', result)
+        self.assertLess(self.emulator.requests['GetItem'] - requests, 5)
+        for value in range(20):
+            result = yield self.client.get_item(
+                self.table, {'id': str(value), 'sort': value})
+            self.assertEqual(result['Item']['sort'], value)
+        yield self.client.put_item(self.table, {'id': 'new', 'sort': 0})
+        result = yield self.client.get_item(self.table,
+                                            {'id': 'new', 'sort': 0})
+        self.assertEqual(result['Item']['id'], 'new')
+
+    @testing.gen_test
+    def test_bloom_filter_keys_are_not_converted(self):
+        key = str(uuid.uuid4()).upper()
+        for sort in ('2.50', '1E+2'):
+            self.emulator.execute('PutItem', {
+                'TableName': self.table,
+                'Item': {'id': {'S': key}, 'sort': {'N': sort}}})
+        result = yield self.cache.build(self.client, self.table)
+        self.assertEqual(result, 2)
+        for sort in (decimal.Decimal('2.50'), decimal.Decimal('2.5'),
+                     decimal.Decimal('1E+2'), 100):
+            result = yield self.client.get_item(self.table,
+                                                {'id': key, 'sort': sort})
+            self.assertIn('Item', result)
+        self.assertEqual(self.cache.hits, 0)
+        result = yield self.client.get_item(
+            self.table, {'id': key.lower(), 'sort': 100})
+        self.assertEqual(result, {})
+
+    @testing.gen_test
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(exceptions.ResourceNotFound):
+            yield self.client.get_item('missing', {'id': 'a', 'sort': 1})
+        self.assertEqual(len(self.cache), 0)
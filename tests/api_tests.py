@@ -1,15 +1,20 @@
+from concurrent import futures
 import datetime
 import os
+import unittest
 import uuid
 
 import mock
 
 from tornado import concurrent
+from tornado import gen
 from tornado import httpclient
 from tornado import testing
+from tornado_aws import config
 from tornado_aws import exceptions as aws_exceptions
 
 import tornado_dynamodb
+from tornado_dynamodb import emulator
 from tornado_dynamodb import exceptions
 
 
@@ -17,11 +22,20 @@ class AsyncTestCase(testing.AsyncTestCase):
 
     def setUp(self):
         super(AsyncTestCase, self).setUp()
+        self.emulator = None
+        if not os.getenv('DYNAMODB_ENDPOINT'):
+            self.emulator = emulator.Emulator()
+            self.emulator.start()
         self.client = self.get_client()
 
+    def tearDown(self):
+        if self.emulator:
+            self.emulator.stop()
+        super(AsyncTestCase, self).tearDown()
+
     @property
     def endpoint(self):
-        return os.getenv('DYNAMODB_ENDPOINT')
+        return os.getenv('DYNAMODB_ENDPOINT') or self.emulator.endpoint
 
     def get_client(self):
         return tornado_dynamodb.DynamoDB(endpoint=self.endpoint)
@@ -31,28 +45,28 @@ class AWSClientTests(AsyncTestCase):
 
     @testing.gen_test
     def test_raises_config_not_found_exception(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = aws_exceptions.ConfigNotFound(path='/test')
             with self.assertRaises(exceptions.ConfigNotFound):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
     @testing.gen_test
     def test_raises_config_parser_error(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = aws_exceptions.ConfigParserError(path='/test')
             with self.assertRaises(exceptions.ConfigParserError):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
     @testing.gen_test
     def test_raises_no_credentials_error(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = aws_exceptions.NoCredentialsError()
             with self.assertRaises(exceptions.NoCredentialsError):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
     @testing.gen_test
     def test_raises_no_profile_error(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = aws_exceptions.NoProfileError(profile='test-1',
                                                               path='/test')
             with self.assertRaises(exceptions.NoProfileError):
@@ -60,36 +74,72 @@ class AWSClientTests(AsyncTestCase):
 
     @testing.gen_test
     def test_raises_request_exception(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = httpclient.HTTPError(500, 'uh-oh')
             with self.assertRaises(exceptions.RequestException):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
     @testing.gen_test
     def test_raises_timeout_exception(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             fetch.side_effect = httpclient.HTTPError(599)
             with self.assertRaises(exceptions.TimeoutException):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
     @testing.gen_test
     def test_fetch_future_exception(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             future = concurrent.Future()
             fetch.return_value = future
             future.set_exception(exceptions.DynamoDBException())
             with self.assertRaises(exceptions.DynamoDBException):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
+    @testing.gen_test
+    def test_other_fetch_future_exceptions(self):
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
+            for method, args in [
+                    (self.client.list_tables, ()),
+                    (self.client.count_scan, ('table',)),
+                    (self.client.transact_write_items,
+                     ([{'Put': {'TableName': 'table',
+                                'Item': {'id': 1}}}],))]:
+                fetch.return_value = concurrent.Future()
+                result = method(*args)
+                fetch.return_value.set_exception(RuntimeError('failed'))
+                with self.assertRaises(RuntimeError):
+                    yield result
+
     @testing.gen_test
     def test_empty_fetch_response_raises_dynamodb_exception(self):
-        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
             future = concurrent.Future()
             fetch.return_value = future
             future.set_result(None)
             with self.assertRaises(exceptions.DynamoDBException):
                 yield self.client.create_table(str(uuid.uuid4()), [], [])
 
+    @testing.gen_test
+    def test_local_credentials_send_to_transport(self):
+        with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as fetch:
+            response = yield self.client.list_tables()
+            fetch.assert_not_called()
+        self.assertIn('TableNames', response)
+
+    @testing.gen_test
+    def test_remote_credentials_use_aws_client_fetch(self):
+        future = concurrent.Future()
+        future.set_result(None)
+        with mock.patch.object(config.Authorization, 'local_credentials',
+                               new_callable=mock.PropertyMock,
+                               return_value=False):
+            with mock.patch('tornado_aws.client.AsyncAWSClient.fetch') as f:
+                f.return_value = future
+                with self.assertRaises(exceptions.DynamoDBException):
+                    yield self.client.list_tables()
+                f.assert_called_once_with('POST', '/', headers=mock.ANY,
+                                          body='{}')
+
 
 class CreateTableTests(AsyncTestCase):
 
@@ -224,6 +274,71 @@ class DescribeTableTests(AsyncTestCase):
             yield self.client.describe_table(table)
 
 
+class UpdateTableTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                 {'AttributeName': 'type', 'AttributeType': 'S'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'}]
+        gsi = [{'IndexName': 'by-type',
+                'KeySchema': [{'AttributeName': 'type', 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'KEYS_ONLY'},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                          'WriteCapacityUnits': 5}}]
+        yield self.client.create_table(table, attrs, schema, 5, 5, gsi)
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_update_throughput(self):
+        table = yield self.create_table()
+        response = yield self.client.update_table(
+            table, read_capacity_units=10, write_capacity_units=2,
+            global_secondary_index_updates=[
+                {'Update': {'IndexName': 'by-type',
+                            'ProvisionedThroughput': {
+                                'ReadCapacityUnits': 20,
+                                'WriteCapacityUnits': 20}}}])
+        self.assertEqual(response['TableName'], table)
+        response = yield self.client.describe_table(table)
+        throughput = response['ProvisionedThroughput']
+        self.assertEqual(throughput['ReadCapacityUnits'], 10)
+        self.assertEqual(throughput['WriteCapacityUnits'], 2)
+        self.assertEqual(throughput['NumberOfDecreasesToday'], 1)
+        index = response['GlobalSecondaryIndexes'][0]
+        self.assertEqual(index['ProvisionedThroughput']['ReadCapacityUnits'],
+                         20)
+
+    @testing.gen_test
+    def test_update_stream(self):
+        table = yield self.create_table()
+        yield self.client.update_table(table, stream_enabled=True,
+                                       stream_view_type='KEYS_ONLY')
+        response = yield self.client.describe_table(table)
+        self.assertEqual(response['StreamSpecification'],
+                         {'StreamEnabled': True,
+                          'StreamViewType': 'KEYS_ONLY'})
+        self.assertEqual(response['ProvisionedThroughput'][
+            'ReadCapacityUnits'], 5)
+
+    def test_partial_throughput_raises(self):
+        with self.assertRaises(ValueError):
+            self.client.update_table('table', read_capacity_units=5)
+
+    def test_invalid_stream_view_type_raises(self):
+        with self.assertRaises(ValueError):
+            self.client.update_table('table', stream_enabled=True,
+                                     stream_view_type='invalid')
+
+    @testing.gen_test
+    def test_table_not_found(self):
+        with self.assertRaises(exceptions.ResourceNotFound):
+            yield self.client.update_table(str(uuid.uuid4()),
+                                           read_capacity_units=1,
+                                           write_capacity_units=1)
+
+
 class ListTableTests(AsyncTestCase):
 
     @testing.gen_test
@@ -259,3 +374,502 @@ class PutGetDeleteTests(AsyncTestCase):
 
         response = yield self.client.get_item(table, {'id': row_id})
         self.assertEqual(response['Item']['id'], row_id)
+
+    @testing.gen_test
+    def test_get_missing_item(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'}]
+        yield self.client.create_table(table, attrs, schema)
+        response = yield self.client.get_item(table, {'id': 'missing'})
+        self.assertNotIn('Item', response)
+
+    @testing.gen_test
+    def test_delete_item(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'}]
+        yield self.client.create_table(table, attrs, schema)
+        row_id = uuid.uuid4()
+        yield self.client.put_item(table, {'id': row_id, 'count': 2})
+
+        with self.assertRaises(exceptions.ConditionalCheckFailedException):
+            yield self.client.delete_item(
+                table, {'id': row_id}, condition_expression='#c > :c',
+                expression_attribute_names={'#c': 'count'},
+                expression_attribute_values={':c': 2})
+
+        response = yield self.client.delete_item(table, {'id': row_id},
+                                                 return_values=True)
+        self.assertEqual(response['Attributes'], {'id': row_id, 'count': 2})
+        response = yield self.client.scan(table)
+        self.assertEqual(response['Count'], 0)
+
+
+class PrepareTests(AsyncTestCase):
+
+    @testing.gen_test
+    def test_prepare_refreshes_credentials(self):
+        future = concurrent.Future()
+        future.set_result(True)
+        with mock.patch.object(self.client._auth_config, 'needs_credentials',
+                               return_value=True):
+            with mock.patch.object(self.client._auth_config, 'refresh',
+                                   return_value=future) as refresh:
+                yield self.client.prepare()
+                refresh.assert_called_once_with()
+
+    @testing.gen_test
+    def test_prepare_raises_no_credentials_error(self):
+        with mock.patch.object(self.client._auth_config, 'needs_credentials',
+                               return_value=True):
+            with mock.patch.object(self.client._auth_config, 'refresh') as rf:
+                rf.side_effect = aws_exceptions.NoCredentialsError()
+                with self.assertRaises(exceptions.NoCredentialsError):
+                    yield self.client.prepare()
+
+    @testing.gen_test
+    def test_prepare_primes_signing_key(self):
+        yield self.client.prepare()
+        date_stamp = datetime.datetime.utcnow().strftime('%Y%m%d')
+        self.assertEqual(self.client._signing_key_cache[0][0], date_stamp)
+
+    def test_signing_key_is_cached(self):
+        key = self.client._signing_key('20160101')
+        with mock.patch('tornado_aws.client.AWSClient._signing_key') as sk:
+            self.assertEqual(self.client._signing_key('20160101'), key)
+            sk.assert_not_called()
+        self.assertNotEqual(self.client._signing_key('20160102'), key)
+
+    def test_credential_loader_uses_async_http_client(self):
+        self.assertIsInstance(self.client._auth_config._client,
+                              httpclient.AsyncHTTPClient)
+
+
+class BatchWriteScanTests(AsyncTestCase):
+
+    @testing.gen_test
+    def test_batch_write_and_scan(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'}]
+        yield self.client.create_table(table, attrs, schema)
+
+        response = yield self.client.batch_write_item(
+            {table: [{'PutRequest': {'Item': {'id': i, 'value': str(i)}}}
+                     for i in range(10)]})
+        self.assertEqual(response['UnprocessedItems'], {})
+        yield self.client.batch_write_item(
+            {table: [{'DeleteRequest': {'Key': {'id': 9}}}]})
+
+        items, start_key = [], None
+        while True:
+            response = yield self.client.scan(table, limit=4,
+                                              exclusive_start_key=start_key)
+            items += response['Items']
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                break
+        self.assertEqual(sorted(item['id'] for item in items), list(range(9)))
+
+    @testing.gen_test
+    def test_parallel_scan_with_filter(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'}]
+        yield self.client.create_table(table, attrs, schema)
+        yield self.client.batch_write_item(
+            {table: [{'PutRequest': {'Item': {'id': i, 'even': i % 2 == 0}}}
+                     for i in range(20)]})
+        items = []
+        for segment in range(2):
+            response = yield self.client.scan(
+                table, filter_expression='even = :even',
+                expression_attribute_values={':even': True},
+                segment=segment, total_segments=2)
+            items += response['Items']
+        self.assertEqual(sorted(item['id'] for item in items),
+                         list(range(0, 20, 2)))
+
+
+class QueryBatchGetTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                 {'AttributeName': 'seq', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                  {'AttributeName': 'seq', 'KeyType': 'RANGE'}]
+        yield self.client.create_table(table, attrs, schema)
+        yield self.client.batch_write_item(
+            {table: [{'PutRequest': {'Item': {'id': 'a', 'seq': i}}}
+                     for i in range(10)]})
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_query(self):
+        table = yield self.create_table()
+        response = yield self.client.query(
+            table, key_condition_expression='id = :id AND seq > :seq',
+            expression_attribute_values={':id': 'a', ':seq': 5},
+            scan_index_forward=False, limit=3)
+        self.assertEqual([item['seq'] for item in response['Items']],
+                         [9, 8, 7])
+        self.assertEqual(response['LastEvaluatedKey'], {'id': 'a', 'seq': 7})
+        response = yield self.client.query(
+            table, key_condition_expression='id = :id AND seq > :seq',
+            expression_attribute_values={':id': 'a', ':seq': 5},
+            exclusive_start_key=response['LastEvaluatedKey'],
+            scan_index_forward=False)
+        self.assertEqual([item['seq'] for item in response['Items']], [6])
+
+    @testing.gen_test
+    def test_query_count(self):
+        table = yield self.create_table()
+        response = yield self.client.query(
+            table, key_condition_expression='id = :id',
+            expression_attribute_values={':id': 'a'}, select='COUNT')
+        self.assertEqual(response['Count'], 10)
+        self.assertNotIn('Items', response)
+
+    @testing.gen_test
+    def test_batch_get_item(self):
+        table = yield self.create_table()
+        response = yield self.client.batch_get_item(
+            {table: {'Keys': [{'id': 'a', 'seq': 1}, {'id': 'b', 'seq': 1}],
+                     'ConsistentRead': True}})
+        self.assertEqual(response['Responses'], {table: [{'id': 'a',
+                                                          'seq': 1}]})
+        self.assertEqual(response['UnprocessedKeys'], {})
+
+    @testing.gen_test
+    def test_batch_get_item_unprocessed_keys(self):
+        if not self.emulator:
+            raise unittest.SkipTest('Requires the emulator')
+        table = yield self.create_table()
+        self.emulator.unprocessed_rate = 1.0
+        response = yield self.client.batch_get_item(
+            {table: {'Keys': [{'id': 'a', 'seq': 1}]}})
+        self.assertEqual(response['UnprocessedKeys'],
+                         {table: {'Keys': [{'id': 'a', 'seq': 1}]}})
+
+
+class TransactionTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        yield self.client.create_table(
+            table, [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+        yield self.client.put_item(table, {'id': 'stock', 'quantity': 1})
+        raise gen.Return(table)
+
+    def order(self, table, order_id):
+        return [{'Put': {'TableName': table,
+                         'Item': {'id': order_id, 'sku': 'abc'},
+                         'ConditionExpression': 'attribute_not_exists(id)'}},
+                {'Update': {'TableName': table, 'Key': {'id': 'stock'},
+                            'UpdateExpression': 'SET quantity = quantity - :n',
+                            'ConditionExpression': 'quantity >= :n',
+                            'ExpressionAttributeValues': {':n': 1}}}]
+
+    @testing.gen_test
+    def test_transact_write_and_get_items(self):
+        table = yield self.create_table()
+        yield self.client.transact_write_items(self.order(table, 'order-1'))
+        response = yield self.client.transact_get_items(
+            [{'Get': {'TableName': table, 'Key': {'id': 'order-1'}}},
+             {'Get': {'TableName': table, 'Key': {'id': 'stock'},
+                      'ProjectionExpression': 'quantity'}},
+             {'Get': {'TableName': table, 'Key': {'id': 'missing'}}}])
+        self.assertEqual(response['Responses'],
+                         [{'Item': {'id': 'order-1', 'sku': 'abc'}},
+                          {'Item': {'quantity': 0}}, {}])
+
+    @testing.gen_test
+    def test_transaction_canceled(self):
+        table = yield self.create_table()
+        yield self.client.transact_write_items(self.order(table, 'order-1'))
+        with self.assertRaises(exceptions.TransactionCanceled) as context:
+            yield self.client.transact_write_items(
+                self.order(table, 'order-2'))
+        self.assertIsNone(context.exception.reasons[0])
+        self.assertIsInstance(context.exception.reasons[1],
+                              exceptions.ConditionalCheckFailedException)
+        response = yield self.client.get_item(table, {'id': 'stock'})
+        self.assertEqual(response['Item']['quantity'], 0)
+
+    @testing.gen_test
+    def test_client_request_token_makes_retries_safe(self):
+        table = yield self.create_table()
+        token = str(uuid.uuid4())
+        yield self.client.transact_write_items(
+            [{'Update': {'TableName': table, 'Key': {'id': 'stock'},
+                         'UpdateExpression': 'SET quantity = quantity + :n',
+                         'ExpressionAttributeValues': {':n': 1}}}],
+            client_request_token=token)
+        yield self.client.transact_write_items(
+            [{'Update': {'TableName': table, 'Key': {'id': 'stock'},
+                         'UpdateExpression': 'SET quantity = quantity + :n',
+                         'ExpressionAttributeValues': {':n': 1}}}],
+            client_request_token=token)
+        response = yield self.client.get_item(table, {'id': 'stock'})
+        self.assertEqual(response['Item']['quantity'], 2)
+        with self.assertRaises(exceptions.IdempotentParameterMismatch):
+            yield self.client.transact_write_items(
+                self.order(table, 'order-1'), client_request_token=token)
+
+    @testing.gen_test
+    def test_transient_failures_are_retried(self):
+        if not self.emulator:
+            raise unittest.SkipTest('Requires the emulator')
+        table = yield self.create_table()
+        self.emulator.inject_error(exceptions.TransactionInProgress, 2,
+                                   ['TransactWriteItems'])
+        yield self.client.transact_write_items(self.order(table, 'order-1'))
+        self.assertEqual(self.emulator.requests['TransactWriteItems'], 3)
+        self.emulator.inject_error(exceptions.TransactionInProgress, 2,
+                                   ['TransactWriteItems'])
+        with self.assertRaises(exceptions.TransactionInProgress):
+            yield self.client.transact_write_items(
+                self.order(table, 'order-2'), max_retries=1)
+
+
+class CancellationReasonTests(unittest.TestCase):
+
+    def test_reasons_are_decoded_from_message(self):
+        error = exceptions.TransactionCanceled(
+            'Transaction cancelled, please refer cancellation reasons for '
+            'specific reasons [None, ConditionalCheckFailed, '
+            'TransactionConflict, Unknown]')
+        self.assertIsNone(error.reasons[0])
+        self.assertIsInstance(error.reasons[1],
+                              exceptions.ConditionalCheckFailedException)
+        self.assertIsInstance(error.reasons[2],
+                              exceptions.TransactionConflict)
+        self.assertIs(type(error.reasons[3]), exceptions.DynamoDBException)
+
+    def test_no_reasons(self):
+        self.assertEqual(exceptions.TransactionCanceled().reasons, [])
+
+
+class CountTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                 {'AttributeName': 'seq', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                  {'AttributeName': 'seq', 'KeyType': 'RANGE'}]
+        yield self.client.create_table(table, attrs, schema)
+        for id_value in ('a', 'b', 'c'):
+            yield self.client.batch_write_item(
+                {table: [{'PutRequest': {'Item': {'id': id_value, 'seq': i}}}
+                         for i in range(10)]})
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_count_query(self):
+        table = yield self.create_table()
+        response = yield self.client.count_query(
+            table, 'id = :id', filter_expression='seq >= :seq',
+            expression_attribute_values={':id': 'b', ':seq': 4},
+            page_size=3, return_consumed_capacity='TOTAL')
+        self.assertEqual(response['Count'], 6)
+        self.assertEqual(response['ScannedCount'], 10)
+        self.assertEqual(response['ConsumedCapacity'],
+                         {'TableName': table, 'CapacityUnits': 2.0})
+        if self.emulator:
+            self.assertEqual(self.emulator.requests['Query'], 4)
+
+    @testing.gen_test
+    def test_count_scan(self):
+        table = yield self.create_table()
+        response = yield self.client.count_scan(table, page_size=7)
+        self.assertEqual(response, {'Count': 30, 'ScannedCount': 30})
+
+    @testing.gen_test
+    def test_parallel_count_scan(self):
+        table = yield self.create_table()
+        response = yield self.client.count_scan(
+            table, total_segments=4, filter_expression='seq < :seq',
+            expression_attribute_values={':seq': 5}, page_size=4,
+            return_consumed_capacity='TOTAL')
+        self.assertEqual(response['Count'], 15)
+        self.assertEqual(response['ScannedCount'], 30)
+        self.assertGreater(response['ConsumedCapacity']['CapacityUnits'], 0)
+
+    @testing.gen_test
+    def test_count_table_not_found(self):
+        with self.assertRaises(exceptions.ResourceNotFound):
+            yield self.client.count_scan(str(uuid.uuid4()), total_segments=2)
+
+
+class MultiQueryTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        attrs = [{'AttributeName': 'shard', 'AttributeType': 'S'},
+                 {'AttributeName': 'ts', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'shard', 'KeyType': 'HASH'},
+                  {'AttributeName': 'ts', 'KeyType': 'RANGE'}]
+        yield self.client.create_table(table, attrs, schema)
+        yield self.client.batch_write_item(
+            {table: [{'PutRequest': {'Item': {
+                'shard': 'user#{}'.format(ts % 4), 'ts': ts,
+                'even': ts % 2 == 0}}} for ts in range(20)]})
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_merges_partitions_in_sort_key_order(self):
+        table = yield self.create_table()
+        shards = ['user#{}'.format(shard) for shard in range(5)]
+        response = yield self.client.multi_query(
+            table, 'shard', shards, 'ts', page_size=2, concurrency=2)
+        self.assertEqual([item['ts'] for item in response['Items']],
+                         list(range(20)))
+        self.assertEqual(response['Count'], 20)
+        self.assertEqual(response['ScannedCount'], 20)
+
+    @testing.gen_test
+    def test_reverse_with_limit(self):
+        table = yield self.create_table()
+        shards = ['user#{}'.format(shard) for shard in range(4)]
+        response = yield self.client.multi_query(
+            table, 'shard', shards, 'ts', scan_index_forward=False, limit=7)
+        self.assertEqual([item['ts'] for item in response['Items']],
+                         list(range(19, 12, -1)))
+
+    @testing.gen_test
+    def test_key_condition_and_filter(self):
+        table = yield self.create_table()
+        response = yield self.client.multi_query(
+            table, 'shard', ['user#0', 'user#1', 'user#2'], 'ts',
+            key_condition_expression='ts BETWEEN :low AND :high',
+            filter_expression='even = :even',
+            expression_attribute_values={':low': 3, ':high': 14,
+                                         ':even': True},
+            page_size=1)
+        self.assertEqual([item['ts'] for item in response['Items']],
+                         [4, 6, 8, 10, 12, 14])
+
+
+class PreflightTests(AsyncTestCase):
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        yield self.client.create_table(
+            table, [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_put_item_too_large(self):
+        table = yield self.create_table()
+        with self.assertRaises(exceptions.ValidationException):
+            yield self.client.put_item(table, {'id': 'x' * 409599})
+        if self.emulator:
+            self.assertEqual(self.emulator.requests['PutItem'], 0)
+        yield self.client.put_item(table, {'id': 'x' * 409598})
+
+    @testing.gen_test
+    def test_update_item(self):
+        table = yield self.create_table()
+        yield self.client.put_item(table, {'id': 'foo', 'count': 1})
+        response = yield self.client.update_item(
+            table, {'id': 'foo'}, 'UPDATED_NEW',
+            condition_expression='#c = :one',
+            update_expression='SET #c = #c + :one, #n = :name',
+            expression_attribute_names={'#c': 'count', '#n': 'name'},
+            expression_attribute_values={':one': 1, ':name': 'bar'})
+        self.assertEqual(response['Attributes'], {'count': 2, 'name': 'bar'})
+        with self.assertRaises(exceptions.ConditionalCheckFailedException):
+            yield self.client.update_item(
+                table, {'id': 'foo'}, condition_expression='#c = :one',
+                update_expression='SET #c = :one',
+                expression_attribute_names={'#c': 'count'},
+                expression_attribute_values={':one': 1})
+        with self.assertRaises(exceptions.ValidationException):
+            yield self.client.update_item(
+                table, {'id': 'foo'}, update_expression='SET #v = :v',
+                expression_attribute_names={'#v': 'value'},
+                expression_attribute_values={':v': 'x' * 409600})
+
+    @testing.gen_test
+    def test_batch_write_item_limits(self):
+        table = yield self.create_table()
+        with self.assertRaises(exceptions.ValidationException):
+            yield self.client.batch_write_item(
+                {table: [{'PutRequest': {'Item': {'id': str(index)}}}
+                         for index in range(26)]})
+        with self.assertRaises(exceptions.ValidationException):
+            yield self.client.batch_write_item(
+                {table: [{'PutRequest': {'Item': {'id': 'x' * 409600}}}]})
+        if self.emulator:
+            self.assertEqual(self.emulator.requests['BatchWriteItem'], 0)
+
+
+class OffloadTests(AsyncTestCase):
+
+    def get_client(self):
+        self.executor = futures.ThreadPoolExecutor(2)
+        return tornado_dynamodb.DynamoDB(endpoint=self.endpoint,
+                                         executor=self.executor,
+                                         offload_threshold=4096)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        super(OffloadTests, self).tearDown()
+
+    @gen.coroutine
+    def create_table(self):
+        table = str(uuid.uuid4())
+        yield self.client.create_table(
+            table, [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+        yield self.client.batch_write_item({table: [
+            {'PutRequest': {'Item': {'id': str(index),
+                                     'nested': {'values': [index] * 20}}}}
+            for index in range(25)]})
+        raise gen.Return(table)
+
+    @testing.gen_test
+    def test_large_responses_are_offloaded(self):
+        table = yield self.create_table()
+        with mock.patch.object(self.executor, 'submit',
+                               wraps=self.executor.submit) as submit:
+            result = yield self.client.scan(table)
+            self.assertEqual(submit.call_count, 1)
+            self.assertEqual(len(result['Items']), 25)
+            self.assertEqual(sorted(item['nested']['values'][0]
+                                    for item in result['Items']),
+                             list(range(25)))
+            result = yield self.client.get_item(table, {'id': '3'})
+            self.assertEqual(result['Item']['nested']['values'], [3] * 20)
+            yield self.client.describe_table(table)
+            self.assertEqual(submit.call_count, 1)
+
+    @testing.gen_test
+    def test_errors_are_not_offloaded(self):
+        with mock.patch.object(self.executor, 'submit') as submit:
+            with self.assertRaises(exceptions.ResourceNotFound):
+                yield self.client.scan(str(uuid.uuid4()))
+            self.assertFalse(submit.called)
+
+    @testing.gen_test
+    def test_process_pool(self):
+        table = yield self.create_table()
+        self.client.executor = futures.ProcessPoolExecutor(1)
+        self.client.offload_threshold = 0
+        try:
+            result = yield self.client.query(
+                table, key_condition_expression='id = :id',
+                expression_attribute_values={':id': '7'})
+        finally:
+            self.client.executor.shutdown()
+        self.assertEqual(result['Items'][0]['nested']['values'], [7] * 20)
@@ -0,0 +1,228 @@
+import time
+import unittest
+import uuid
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import autoscaling
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+
+
+def description(read=5, write=5, indexes=None, **throughput):
+    value = {'TableName': 'table',
+             'TableStatus': 'ACTIVE',
+             'ProvisionedThroughput': dict(throughput,
+                                           ReadCapacityUnits=read,
+                                           WriteCapacityUnits=write)}
+    if indexes:
+        value['GlobalSecondaryIndexes'] = [
+            {'IndexName': name, 'IndexStatus': 'ACTIVE',
+             'ProvisionedThroughput': {'ReadCapacityUnits': units[0],
+                                       'WriteCapacityUnits': units[1]}}
+            for name, units in sorted(indexes.items())]
+    return value
+
+
+class PlanTests(unittest.TestCase):
+
+    def setUp(self):
+        self.scaler = autoscaling.AutoScaler()
+
+    def test_no_usage_is_not_changed(self):
+        self.assertIsNone(self.scaler.plan(description()))
+
+    def test_increase_for_consumed_rate(self):
+        self.scaler.record('table', 'read', 600)
+        self.assertAlmostEqual(self.scaler.rate('table', 'read'), 10.0)
+        self.assertEqual(self.scaler.plan(description()),
+                         {'read_capacity_units': 15,
+                          'write_capacity_units': 5})
+
+    def test_usage_outside_window_is_ignored(self):
+        self.scaler.record('table', 'read', 600, timestamp=time.time() - 120)
+        self.assertEqual(self.scaler.rate('table', 'read'), 0.0)
+
+    def test_increase_for_throttles(self):
+        self.scaler.record_throttle('table', 'write')
+        self.assertEqual(self.scaler.throttles('table', 'write'), 1)
+        self.assertEqual(self.scaler.plan(description()),
+                         {'read_capacity_units': 5,
+                          'write_capacity_units': 10})
+
+    def test_increase_is_bounded(self):
+        scaler = autoscaling.AutoScaler(bounds={'table': (1, 8)})
+        scaler.record('table', 'read', 6000)
+        scaler.record_throttle('table', 'write')
+        self.assertEqual(scaler.plan(description()),
+                         {'read_capacity_units': 8,
+                          'write_capacity_units': 8})
+
+    def test_below_minimum_is_increased(self):
+        scaler = autoscaling.AutoScaler(min_capacity=10)
+        self.assertEqual(scaler.plan(description()),
+                         {'read_capacity_units': 10,
+                          'write_capacity_units': 10})
+
+    def test_scale_in_cooldown(self):
+        self.assertIsNone(self.scaler.plan(description(100, 100)))
+
+    def test_decrease(self):
+        scaler = autoscaling.AutoScaler(scale_in_cooldown=0)
+        scaler.record('table', 'write', 420)
+        self.assertEqual(scaler.plan(description(100, 100)),
+                         {'read_capacity_units': 1,
+                          'write_capacity_units': 10})
+
+    def test_decrease_margin(self):
+        scaler = autoscaling.AutoScaler(scale_in_cooldown=0)
+        scaler.record('table', 'read', 360)
+        scaler.record('table', 'write', 360)
+        self.assertIsNone(scaler.plan(description(10, 10)))
+
+    def test_decrease_limits(self):
+        scaler = autoscaling.AutoScaler(scale_in_cooldown=0)
+        now = time.time()
+        self.assertIsNone(scaler.plan(description(
+            100, 100, NumberOfDecreasesToday=4, LastDecreaseDateTime=now)))
+        if now % 86400 > 7200:
+            self.assertEqual(scaler.plan(description(
+                100, 100, NumberOfDecreasesToday=4,
+                LastDecreaseDateTime=now - 7200)),
+                {'read_capacity_units': 1, 'write_capacity_units': 1})
+            self.assertIsNone(scaler.plan(description(
+                100, 100, NumberOfDecreasesToday=27,
+                LastDecreaseDateTime=now - 7200)))
+        self.assertEqual(scaler.plan(description(
+            100, 100, NumberOfDecreasesToday=27,
+            LastDecreaseDateTime=now - 86400)),
+            {'read_capacity_units': 1, 'write_capacity_units': 1})
+
+    def test_increase_without_decreases_left(self):
+        scaler = autoscaling.AutoScaler(scale_in_cooldown=0)
+        scaler.record('table', 'read', 6000)
+        self.assertEqual(scaler.plan(description(
+            100, 100, NumberOfDecreasesToday=27,
+            LastDecreaseDateTime=time.time())),
+            {'read_capacity_units': 143, 'write_capacity_units': 100})
+
+    def test_scale_out_cooldown(self):
+        self.scaler.record_throttle('table', 'read')
+        self.scaler._updated('table', {'read_capacity_units': 10})
+        self.assertEqual(self.scaler.throttles('table', 'read'), 0)
+        self.scaler.record('table', 'read', 6000)
+        self.assertIsNone(self.scaler.plan(description()))
+
+    def test_global_secondary_indexes(self):
+        self.scaler.record('table/index', 'write', 1200)
+        self.scaler.record_throttle('table/other', 'read')
+        self.assertEqual(
+            self.scaler.plan(description(indexes={'index': (5, 5),
+                                                  'other': (5, 5)})),
+            {'global_secondary_index_updates': [
+                {'Update': {'IndexName': 'index',
+                            'ProvisionedThroughput': {
+                                'ReadCapacityUnits': 5,
+                                'WriteCapacityUnits': 29}}},
+                {'Update': {'IndexName': 'other',
+                            'ProvisionedThroughput': {
+                                'ReadCapacityUnits': 10,
+                                'WriteCapacityUnits': 5}}}]})
+
+    def test_inactive_and_on_demand_tables_are_not_changed(self):
+        self.scaler.record_throttle('table', 'read')
+        value = description()
+        value['TableStatus'] = 'UPDATING'
+        self.assertIsNone(self.scaler.plan(value))
+        value = description()
+        value['BillingModeSummary'] = {'BillingMode': 'PAY_PER_REQUEST'}
+        self.assertIsNone(self.scaler.plan(value))
+
+    def test_reset(self):
+        self.scaler.record('table', 'read', 600)
+        self.scaler.record_throttle('table', 'read')
+        self.scaler.reset()
+        self.assertEqual(self.scaler.rate('table', 'read'), 0.0)
+        self.assertEqual(self.scaler.throttles('table', 'read'), 0)
+
+
+class AutoScalerTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(AutoScalerTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.scaler = autoscaling.AutoScaler(interval=3600)
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), capacity_planner=self.scaler)
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable', {
+            'TableName': self.table,
+            'AttributeDefinitions': [{'AttributeName': 'id',
+                                      'AttributeType': 'S'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'ProvisionedThroughput': {'ReadCapacityUnits': 2,
+                                      'WriteCapacityUnits': 2}})
+
+    def tearDown(self):
+        self.scaler.stop()
+        self.emulator.stop()
+        super(AutoScalerTests, self).tearDown()
+
+    @gen.coroutine
+    def throughput(self):
+        result = yield self.client.describe_table(self.table)
+        raise gen.Return(result['ProvisionedThroughput'])
+
+    @testing.gen_test
+    def test_scale_without_start(self):
+        result = yield self.scaler.scale()
+        self.assertEqual(result, {})
+
+    @testing.gen_test
+    def test_throttle_is_scaled_out(self):
+        self.scaler.start(self.client)
+        self.emulator.throttle(operations=['PutItem'])
+        with self.assertRaises(exceptions.ProvisionedThroughputExceeded):
+            yield self.client.put_item(self.table, {'id': 'a'})
+        for _attempt in range(100):
+            throughput = yield self.throughput()
+            if throughput['WriteCapacityUnits'] != 2:
+                break
+            yield gen.sleep(0.01)
+        self.assertEqual(throughput['WriteCapacityUnits'], 4)
+        self.assertEqual(throughput['ReadCapacityUnits'], 2)
+        self.assertIn('LastIncreaseDateTime', throughput)
+
+    @testing.gen_test
+    def test_unprocessed_items_are_throttles(self):
+        self.emulator.unprocessed_rate = 1.0
+        yield self.client.batch_write_item(
+            {self.table: [{'PutRequest': {'Item': {'id': 'a'}}}]})
+        self.assertEqual(self.scaler.throttles(self.table, 'write'), 1)
+
+    @testing.gen_test
+    def test_scale_in(self):
+        self.scaler.scale_in_cooldown = 0
+        self.scaler.start(self.client)
+        yield self.client.put_item(self.table, {'id': 'a'})
+        yield self.client.update_table(self.table, read_capacity_units=50,
+                                       write_capacity_units=50)
+        result = yield self.scaler.scale()
+        self.assertEqual(result, {self.table: {'read_capacity_units': 1,
+                                               'write_capacity_units': 1}})
+        throughput = yield self.throughput()
+        self.assertEqual(throughput['ReadCapacityUnits'], 1)
+        self.assertEqual(throughput['WriteCapacityUnits'], 1)
+        self.assertEqual(throughput['NumberOfDecreasesToday'], 1)
+        result = yield self.scaler.scale()
+        self.assertEqual(result, {})
+
+    @testing.gen_test
+    def test_errors_are_logged(self):
+        self.scaler.tables = ['missing', self.table]
+        self.scaler.start(self.client)
+        self.scaler.record_throttle(self.table, 'read')
+        result = yield self.scaler.scale()
+        self.assertEqual(list(result), [self.table])
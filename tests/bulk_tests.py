@@ -0,0 +1,259 @@
+import decimal
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+import mock
+
+from tornado import concurrent
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import bulk
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import utils
+
+
+def future_result(value):
+    future = concurrent.Future()
+    future.set_result(value)
+    return future
+
+
+class FakeClient(object):
+
+    def __init__(self, unprocessed=0, items=None):
+        self.written = []
+        self.requests = 0
+        self.unprocessed = unprocessed
+        self.items = items or []
+
+    def batch_write_item(self, request_items):
+        self.requests += 1
+        requests = request_items['table']
+        if self.unprocessed:
+            self.unprocessed -= 1
+            pending, requests = requests[:1], requests[1:]
+        else:
+            pending = []
+        self.written += [r['PutRequest']['Item'] for r in requests]
+        return future_result({'UnprocessedItems':
+                              {'table': pending} if pending else {}})
+
+    def scan(self, table_name, exclusive_start_key=None, limit=None,
+             segment=None, total_segments=None, raw=False):
+        items = [utils.marshall(item) if raw else item for item in self.items
+                 if item['id'] % total_segments == segment]
+        offset = exclusive_start_key['offset'] if exclusive_start_key else 0
+        result = {'Items': items[offset:offset + limit]}
+        if offset + limit < len(items):
+            result['LastEvaluatedKey'] = {'offset': offset + limit}
+        return future_result(result)
+
+
+class ImportTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ImportTests, self).setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(ImportTests, self).tearDown()
+
+    @testing.gen_test
+    def test_import_items(self):
+        client = FakeClient()
+        items = [{'id': i} for i in range(103)]
+        result = yield bulk.import_items(client, 'table', iter(items),
+                                         concurrency=3)
+        self.assertEqual(result['items'], 103)
+        self.assertEqual(result['requests'], 5)
+        self.assertEqual(sorted(i['id'] for i in client.written),
+                         list(range(103)))
+
+    @testing.gen_test
+    def test_unprocessed_items_are_retried(self):
+        client = FakeClient(unprocessed=2)
+        with mock.patch.object(bulk, 'MAX_BACKOFF', 0):
+            result = yield bulk.import_items(client, 'table',
+                                             [{'id': i} for i in range(10)])
+        self.assertEqual(result['items'], 10)
+        self.assertEqual(result['retries'], 2)
+        self.assertEqual(len(client.written), 10)
+
+    @testing.gen_test
+    def test_transient_errors_are_retried(self):
+        client = mock.Mock()
+        error = concurrent.Future()
+        error.set_exception(exceptions.ThrottlingException())
+        client.batch_write_item.side_effect = [error, future_result({})]
+        with mock.patch.object(bulk, 'MAX_BACKOFF', 0):
+            result = yield bulk.import_items(client, 'table', [{'id': 1}])
+        self.assertEqual(result['items'], 1)
+        self.assertEqual(result['retries'], 1)
+
+    @testing.gen_test
+    def test_errors_are_raised(self):
+        client = mock.Mock()
+        error = concurrent.Future()
+        error.set_exception(exceptions.ValidationException())
+        client.batch_write_item.return_value = error
+        with self.assertRaises(exceptions.ValidationException):
+            yield bulk.import_items(client, 'table',
+                                    [{'id': i} for i in range(100)])
+
+    @testing.gen_test
+    def test_resume(self):
+        resume_path = os.path.join(self.path, 'resume.json')
+        with open(resume_path, 'w') as handle:
+            json.dump({'completed': 50}, handle)
+        client = FakeClient()
+        result = yield bulk.import_items(client, 'table',
+                                         [{'id': i} for i in range(60)],
+                                         resume_path=resume_path)
+        self.assertEqual(result['skipped'], 50)
+        self.assertEqual(sorted(i['id'] for i in client.written),
+                         list(range(50, 60)))
+        with open(resume_path) as handle:
+            self.assertEqual(json.load(handle), {'completed': 60})
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            self.io_loop.run_sync(lambda: bulk.import_items(
+                FakeClient(), 'table', [], batch_size=26))
+
+    def test_read_jsonl(self):
+        path = os.path.join(self.path, 'items.jsonl')
+        with open(path, 'w') as handle:
+            handle.write('{"id": 1}\n\n{"id": 2, "tags": ["a"]}\n')
+        self.assertEqual(list(bulk.read_jsonl(path)),
+                         [{'id': 1}, {'id': 2, 'tags': ['a']}])
+
+    def test_read_jsonl_numbers(self):
+        path = os.path.join(self.path, 'items.jsonl')
+        with open(path, 'w') as handle:
+            handle.write('{"id": 1, "price": 0.1}\n')
+        item = list(bulk.read_jsonl(path))[0]
+        self.assertEqual(item['price'], decimal.Decimal('0.1'))
+        self.assertIsInstance(item['price'], decimal.Decimal)
+
+    def test_read_csv(self):
+        path = os.path.join(self.path, 'items.csv')
+        with open(path, 'w') as handle:
+            handle.write('id,name,age\n1,one,\n2,two,20\n')
+        self.assertEqual(list(bulk.read_csv(path, {'id': int, 'age': int})),
+                         [{'id': 1, 'name': 'one'},
+                          {'id': 2, 'name': 'two', 'age': 20}])
+
+
+class ExportTests(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_export_table(self):
+        client = FakeClient(items=[{'id': i} for i in range(20)])
+        output = io.StringIO() if str is not bytes else io.BytesIO()
+        result = yield bulk.export_table(client, 'table', output,
+                                         segments=3, page_size=2)
+        self.assertEqual(result['items'], 20)
+        self.assertEqual(result['requests'], 11)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(sorted(int(json.loads(l)['Item']['id']['N'])
+                                for l in lines), list(range(20)))
+
+
+class RoundTripTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(RoundTripTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+        self.path = tempfile.mkdtemp()
+        for table in ('source', 'target'):
+            self.emulator.execute('CreateTable', {
+                'TableName': table,
+                'AttributeDefinitions': [{'AttributeName': 'id',
+                                          'AttributeType': 'S'}],
+                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}]})
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        self.emulator.stop()
+        super(RoundTripTests, self).tearDown()
+
+    @testing.gen_test
+    def test_export_and_import(self):
+        item = {'id': 'a', 'price': decimal.Decimal('12.34'),
+                'blob': b'\x00\x01', 'tags': {'x', 'y'}, 'sizes': {1, 2}}
+        yield self.client.put_item('source', item)
+        path = os.path.join(self.path, 'export.jsonl')
+        with open(path, 'w') as handle:
+            yield bulk.export_table(self.client, 'source', handle)
+        yield bulk.import_items(self.client, 'target', bulk.read_jsonl(path))
+        source = yield self.client.get_item('source', {'id': 'a'})
+        target = yield self.client.get_item('target', {'id': 'a'})
+        self.assertEqual(target, source)
+        self.assertEqual(target['Item']['price'], 12.34)
+        self.assertEqual(target['Item']['blob'], b'\x00\x01')
+        self.assertEqual(target['Item']['tags'], {'x', 'y'})
+        self.assertEqual(target['Item']['sizes'], {1, 2})
+
+    @testing.gen_test
+    def test_values_are_exported_as_stored(self):
+        key = str(uuid.uuid4()).upper()
+        yield self.client.put_item('source', {
+            'id': key, 'pi': decimal.Decimal('3.14159265358979323846'),
+            'large': decimal.Decimal('1E+30')})
+        path = os.path.join(self.path, 'export.jsonl')
+        with open(path, 'w') as handle:
+            yield bulk.export_table(self.client, 'source', handle)
+        with open(path) as handle:
+            exported = [json.loads(line)['Item'] for line in handle]
+        self.assertEqual(exported, [{
+            'id': {'S': key}, 'pi': {'N': '3.14159265358979323846'},
+            'large': {'N': '1000000000000000000000000000000'}}])
+        result = yield self.client.scan('source', raw=True)
+        self.assertEqual(exported, result['Items'])
+
+
+class RateLimiterTests(testing.AsyncTestCase):
+
+    @testing.gen_test
+    def test_rate_limiter_waits(self):
+        limiter = bulk.RateLimiter(100)
+        start = self.io_loop.time()
+        yield limiter.acquire(100)
+        yield limiter.acquire(10)
+        self.assertGreaterEqual(self.io_loop.time() - start, 0.09)
+
+
+class MainTests(testing.AsyncTestCase):
+
+    def test_import_command(self):
+        with mock.patch.object(bulk, 'import_items') as import_items:
+            import_items.return_value = future_result(
+                {'items': 1, 'elapsed': 1.0, 'throughput': 1.0})
+            with mock.patch.object(bulk, 'read_csv') as read_csv:
+                self.assertEqual(bulk.main(['--endpoint', 'http://localhost',
+                                            'import', 'table', 'items.csv',
+                                            '--concurrency', '4']), 0)
+                read_csv.assert_called_once_with('items.csv')
+            args = import_items.call_args[0]
+            self.assertEqual(args[1:], ('table', read_csv.return_value, 4,
+                                        None, None))
+
+    def test_error_exit_code(self):
+        with mock.patch.object(bulk, 'export_table') as export_table:
+            error = concurrent.Future()
+            error.set_exception(exceptions.ResourceNotFound())
+            export_table.return_value = error
+            with mock.patch.object(bulk, 'open', mock.mock_open(),
+                                   create=True), \
+                    mock.patch('sys.stderr'):
+                self.assertEqual(bulk.main(['export', 'table', 'out.jsonl']),
+                                 1)
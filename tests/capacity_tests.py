@@ -0,0 +1,175 @@
+from concurrent import futures
+import unittest
+
+import mock
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import capacity
+from tornado_dynamodb import emulator
+
+
+class CapacityPlannerTests(unittest.TestCase):
+
+    def test_rates(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 6000
+            planner = capacity.CapacityPlanner(resolution=60)
+            for minute in range(100):
+                units = 6000 if minute == 50 else 60
+                planner.record('table', 'read', units, 'Query',
+                               timestamp=6000 + minute * 60)
+            now.return_value = 6000 + 99 * 60
+            report = planner.report()['table']
+        self.assertEqual(report['operations'], {'Query': 100})
+        self.assertAlmostEqual(report['read']['mean'], 1.99)
+        self.assertEqual(report['read']['peak'], 100)
+        self.assertEqual(report['read']['p99'], 1)
+        self.assertEqual(report['read']['total'], 11940)
+        self.assertEqual(report['write']['total'], 0)
+        self.assertEqual(report['cost']['provisioned'],
+                         round((2 * 0.00013 + 0.00065) * 730, 2))
+        self.assertEqual(report['cost']['on_demand'],
+                         round(1.99 * 730 * 3600 * 0.25 / 1000000, 2))
+
+    def test_retention(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 0
+            planner = capacity.CapacityPlanner(resolution=1, retention=10)
+            planner.record('table', 'write', 100, timestamp=0)
+            now.return_value = 20
+            planner.record('table', 'write', 10, timestamp=20)
+            report = planner.report()['table']
+        self.assertEqual(report['write']['total'], 10)
+        self.assertEqual(report['write']['mean'], 1)
+
+    def test_suggest(self):
+        planner = capacity.CapacityPlanner(resolution=1)
+        planner.record('table', 'read', 70)
+        planner.record('table', 'write', 7)
+        planner.record('table/index', 'read', 14)
+        planner.record('other/index', 'write', 1)
+        self.assertEqual(planner.suggest(), {
+            'table': {'read_capacity_units': 100,
+                      'write_capacity_units': 10,
+                      'global_secondary_index_updates': [{'Update': {
+                          'IndexName': 'index',
+                          'ProvisionedThroughput': {
+                              'ReadCapacityUnits': 20,
+                              'WriteCapacityUnits': 1}}}]},
+            'other': {'read_capacity_units': 1,
+                      'write_capacity_units': 1,
+                      'global_secondary_index_updates': [{'Update': {
+                          'IndexName': 'index',
+                          'ProvisionedThroughput': {
+                              'ReadCapacityUnits': 1,
+                              'WriteCapacityUnits': 2}}}]}})
+
+    def test_index_breakdown(self):
+        planner = capacity.CapacityPlanner()
+        planner.learn({'TableName': 'table', 'LocalSecondaryIndexes': [
+            {'IndexName': 'local'}]})
+        planner.observe('Query', {'TableName': 'table',
+                                  'IndexName': 'local'},
+                        {'ConsumedCapacity': {'TableName': 'table',
+                                              'CapacityUnits': 1}})
+        planner.observe('PutItem', {'TableName': 'table',
+                                    'Item': {'id': {'S': 'abc'}}},
+                        {'ConsumedCapacity': {
+                            'TableName': 'table', 'CapacityUnits': 4,
+                            'Table': {'CapacityUnits': 1},
+                            'LocalSecondaryIndexes': {
+                                'local': {'CapacityUnits': 1}},
+                            'GlobalSecondaryIndexes': {
+                                'global': {'CapacityUnits': 2}}}})
+        report = planner.report()
+        self.assertEqual(sorted(report), ['table', 'table/global'])
+        self.assertEqual(report['table']['read']['total'], 1)
+        self.assertEqual(report['table']['write']['total'], 2)
+        self.assertEqual(report['table']['item_size']['written'], 5)
+        self.assertEqual(report['table/global']['write']['total'], 2)
+        self.assertEqual(report['table/global']['operations'],
+                         {'PutItem': 1})
+
+    def test_prepare(self):
+        planner = capacity.CapacityPlanner(sample_rate=0.5, seed=1)
+        prepared = [planner.prepare('GetItem', {}) for _ in range(1000)]
+        self.assertAlmostEqual(prepared.count(True), 500, delta=50)
+        body = {'ReturnConsumedCapacity': 'TOTAL'}
+        planner.sample_rate = 1.0
+        self.assertTrue(planner.prepare('Query', body))
+        self.assertEqual(body['ReturnConsumedCapacity'], 'TOTAL')
+        body = {}
+        self.assertFalse(planner.prepare('DescribeTable', body))
+        self.assertEqual(body, {})
+
+
+class ClientCapacityTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientCapacityTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.planner = capacity.CapacityPlanner(resolution=1)
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), capacity_planner=self.planner)
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ClientCapacityTests, self).tearDown()
+
+    @gen.coroutine
+    def create_table(self):
+        yield self.client.create_table(
+            'table', [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+
+    @testing.gen_test
+    def test_records_client_requests(self):
+        yield self.create_table()
+        yield self.client.put_item('table', {'id': 'a', 'data': 'x' * 2000})
+        yield self.client.batch_write_item({'table': [
+            {'PutRequest': {'Item': {'id': 'b'}}}]})
+        yield self.client.get_item('table', {'id': 'a'},
+                                   consistent_read=True)
+        yield self.client.scan('table')
+        yield self.client.describe_table('table')
+        yield gen.moment
+        report = self.planner.report()['table']
+        self.assertEqual(report['operations'], {
+            'BatchWriteItem': 1, 'GetItem': 1, 'PutItem': 1, 'Scan': 1})
+        self.assertEqual(report['write']['total'], 3)
+        self.assertEqual(report['read']['total'], 1.5)
+        self.assertEqual(report['item_size']['written'], (3 + 2007) / 2)
+        self.assertEqual(
+            self.planner.suggest()['table']['write_capacity_units'],
+            int(-(-report['write']['p99'] // 0.7)))
+
+    @testing.gen_test
+    def test_decoded_bodies_are_observed(self):
+        yield self.create_table()
+        yield self.client.put_item('table', {'id': 'a', 'data': 'x' * 2000})
+        with mock.patch.object(self.planner, 'observe',
+                               wraps=self.planner.observe) as observe:
+            yield self.client.get_item('table', {'id': 'a'})
+        observe.assert_called_once_with('GetItem', mock.ANY, mock.ANY)
+        self.assertIn('Item', observe.call_args[0][2])
+        self.assertEqual(self.planner.report()['table']['item_size']['read'],
+                         2007)
+
+    @testing.gen_test
+    def test_offloaded_responses_are_observed(self):
+        yield self.create_table()
+        yield self.client.put_item('table', {'id': 'a', 'data': 'x' * 2000})
+        with futures.ThreadPoolExecutor(1) as executor:
+            client = tornado_dynamodb.DynamoDB(
+                endpoint=self.emulator.start(), capacity_planner=self.planner,
+                executor=executor, offload_threshold=1)
+            with mock.patch.object(self.planner, 'observe') as observe:
+                result = yield client.scan('table')
+        self.assertEqual(result['Items'][0]['id'], 'a')
+        observe.assert_not_called()
+        report = self.planner.report()['table']
+        self.assertEqual(report['operations']['Scan'], 1)
+        self.assertEqual(report['item_size']['read'], 2007)
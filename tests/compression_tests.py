@@ -0,0 +1,136 @@
+import unittest
+import zlib
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import compression
+from tornado_dynamodb import emulator
+from tornado_dynamodb import utils
+
+
+class CompressorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.compressor = compression.Compressor(
+            threshold=100, attributes={'small'}, exclude={'id'})
+
+    def test_round_trip(self):
+        for value in ('é' * 500, b'\x00\x01' * 500):
+            compressed = self.compressor.compress(value)
+            self.assertTrue(compression.is_compressed(compressed))
+            self.assertLess(len(compressed), 100)
+            self.assertEqual(compression.decompress(compressed), value)
+        self.assertGreater(self.compressor.ratio, 10)
+
+    def test_incompressible_values_are_unchanged(self):
+        self.assertEqual(self.compressor.compress('abc'), 'abc')
+        self.assertFalse(compression.is_compressed(b'\xdcZ\x00\x00'))
+        self.assertEqual(compression.decompress(b'plain'), b'plain')
+
+    def test_compress_item(self):
+        item = {'id': 'x' * 200, 'body': 'y' * 200, 'small': 'z' * 50,
+                'other': 'short', 'count': 1000}
+        compressed = self.compressor.compress_item(item)
+        self.assertEqual(compressed['id'], item['id'])
+        self.assertTrue(compression.is_compressed(compressed['body']))
+        self.assertTrue(compression.is_compressed(compressed['small']))
+        self.assertEqual(compressed['other'], 'short')
+        self.assertEqual(compressed['count'], 1000)
+        self.assertLess(utils.item_size(compressed), utils.item_size(item))
+        self.assertEqual(compression.decompress_item(
+            utils.unmarshall(utils.marshall(compressed))), item)
+
+    def test_unmarshall_does_not_decompress(self):
+        compressed = self.compressor.compress(b'\x00' * 200)
+        self.assertEqual(utils.unmarshall({'value': {'B': compressed}}),
+                         {'value': compressed})
+
+    def test_undecodable_values_are_unchanged(self):
+        for value in (b'\xdcZ\x01\x00not zlib', b'\xdcZ\xfa\x00unknown',
+                      b'\xdcZ\x01\x01' + zlib.compress(b'\xff\xfe')):
+            self.assertEqual(compression.decompress(value), value)
+
+    def test_register_codec(self):
+        compression.register_codec(200, 'test', zlib.compress,
+                                   zlib.decompress)
+        self.assertIn('test', compression.codecs())
+        compressor = compression.Compressor(codec='test')
+        self.assertEqual(bytearray(compressor.compress('a' * 100))[2], 200)
+        with self.assertRaises(ValueError):
+            compression.register_codec(200, 'other', zlib.compress,
+                                       zlib.decompress)
+        with self.assertRaises(ValueError):
+            compression.register_codec(256, 'other', zlib.compress,
+                                       zlib.decompress)
+        with self.assertRaises(ValueError):
+            compression.Compressor(codec='unknown')
+
+
+class ClientCompressionTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientCompressionTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.compressor = compression.Compressor(exclude={'id'})
+        self.endpoint = self.emulator.start()
+        self.client = tornado_dynamodb.DynamoDB(endpoint=self.endpoint,
+                                                compressor=self.compressor)
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ClientCompressionTests, self).tearDown()
+
+    @gen.coroutine
+    def create_table(self):
+        yield self.client.create_table(
+            'documents', [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+
+    @testing.gen_test
+    def test_put_item_consumes_fewer_units(self):
+        yield self.create_table()
+        document = '{"key": "value"}' * 2000
+        response = yield self.client.put_item(
+            'documents', {'id': 'a', 'document': document},
+            return_consumed_capacity='TOTAL')
+        self.assertEqual(response['ConsumedCapacity']['CapacityUnits'], 1)
+        response = yield self.client.get_item('documents', {'id': 'a'})
+        self.assertEqual(response['Item'], {'id': 'a', 'document': document})
+
+    @testing.gen_test
+    def test_user_binary_values(self):
+        yield self.create_table()
+        value = b'\xdcZ\x01\x00' + b'\x00' * 10
+        yield self.client.put_item('documents', {'id': 'a', 'data': value})
+        response = yield self.client.get_item('documents', {'id': 'a'})
+        self.assertEqual(response['Item']['data'], value)
+
+    @testing.gen_test
+    def test_clients_without_compressor(self):
+        yield self.create_table()
+        yield self.client.put_item('documents',
+                                   {'id': 'a', 'document': 'a' * 2048})
+        client = tornado_dynamodb.DynamoDB(endpoint=self.endpoint)
+        response = yield client.get_item('documents', {'id': 'a'})
+        self.assertTrue(compression.is_compressed(
+            response['Item']['document']))
+        self.assertEqual(compression.decompress_item(response['Item']),
+                         {'id': 'a', 'document': 'a' * 2048})
+
+    @testing.gen_test
+    def test_batch_and_transact_writes(self):
+        yield self.create_table()
+        yield self.client.batch_write_item({'documents': [
+            {'PutRequest': {'Item': {'id': 'b', 'data': b'\x01' * 2048}}},
+            {'DeleteRequest': {'Key': {'id': 'c'}}}]})
+        yield self.client.transact_write_items([
+            {'Put': {'TableName': 'documents',
+                     'Item': {'id': 'c', 'data': 'c' * 2048}}}])
+        result = yield self.client.scan('documents',
+                                        return_consumed_capacity='TOTAL')
+        self.assertEqual(sorted((item['id'], item['data'])
+                                for item in result['Items']),
+                         [('b', b'\x01' * 2048), ('c', 'c' * 2048)])
+        self.assertEqual(result['ConsumedCapacity']['CapacityUnits'], 0.5)
@@ -0,0 +1,161 @@
+import decimal
+import uuid
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import counters
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+
+
+class CounterAggregatorTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(CounterAggregatorTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable', {
+            'TableName': self.table,
+            'AttributeDefinitions': [{'AttributeName': 'id',
+                                      'AttributeType': 'S'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}]})
+        self.counters = counters.CounterAggregator(self.client, interval=60)
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(CounterAggregatorTests, self).tearDown()
+
+    @gen.coroutine
+    def get(self, key):
+        result = yield self.client.get_item(self.table, {'id': key})
+        raise gen.Return(result['Item'])
+
+    @testing.gen_test
+    def test_increments_are_aggregated(self):
+        for _offset in range(100):
+            self.counters.increment(self.table, {'id': 'a'}, 'views')
+        self.counters.increment(self.table, {'id': 'a'}, 'likes', 3)
+        self.counters.increment(self.table, {'id': 'b'}, 'views', 2)
+        self.assertEqual(self.counters.pending, 2)
+        result = yield self.counters.flush()
+        self.assertEqual(result, 2)
+        self.assertEqual(self.emulator.requests['UpdateItem'], 2)
+        self.assertEqual(self.counters.pending, 0)
+        self.assertEqual(self.counters.increments, 102)
+        self.assertEqual(self.counters.updates, 2)
+        item = yield self.get('a')
+        self.assertEqual(item, {'id': 'a', 'views': 100, 'likes': 3})
+        self.counters.increment(self.table, {'id': 'a'}, 'views', -10)
+        yield self.counters.flush()
+        item = yield self.get('a')
+        self.assertEqual(item['views'], 90)
+
+    @testing.gen_test
+    def test_zero_sum_is_not_written(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'views', 1)
+        self.counters.increment(self.table, {'id': 'a'}, 'views', -1)
+        result = yield self.counters.flush()
+        self.assertEqual(result, 0)
+        self.assertEqual(self.emulator.requests['UpdateItem'], 0)
+
+    @testing.gen_test
+    def test_decimal_increments(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'score',
+                                decimal.Decimal('0.1'))
+        self.counters.increment(self.table, {'id': 'a'}, 'score',
+                                decimal.Decimal('0.2'))
+        yield self.counters.flush()
+        item = yield self.get('a')
+        self.assertEqual(item['score'], 0.3)
+
+    def test_invalid_increments(self):
+        for value in [0.5, True, '1', None]:
+            with self.assertRaises(ValueError):
+                self.counters.increment(self.table, {'id': 'a'}, 'views',
+                                        value)
+        self.assertEqual(self.counters.pending, 0)
+        self.assertEqual(self.counters.increments, 0)
+
+    @testing.gen_test
+    def test_flush_after_interval(self):
+        aggregator = counters.CounterAggregator(self.client, interval=0.05)
+        aggregator.increment(self.table, {'id': 'a'}, 'views')
+        yield gen.sleep(0.01)
+        self.assertEqual(aggregator.pending, 1)
+        for _attempt in range(50):
+            yield gen.sleep(0.01)
+            if not aggregator.pending:
+                break
+        self.assertEqual(aggregator.pending, 0)
+        item = yield self.get('a')
+        self.assertEqual(item['views'], 1)
+
+    @testing.gen_test
+    def test_flush_at_max_keys(self):
+        aggregator = counters.CounterAggregator(self.client, interval=60,
+                                                max_keys=3)
+        for key in 'abc':
+            aggregator.increment(self.table, {'id': key}, 'views')
+        for _attempt in range(50):
+            yield gen.sleep(0.01)
+            if aggregator.updates == 3:
+                break
+        self.assertEqual(aggregator.updates, 3)
+
+    @testing.gen_test
+    def test_throttled_increments_are_kept(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'views', 5)
+        self.emulator.throttle(operations=['UpdateItem'])
+        result = yield self.counters.flush()
+        self.assertEqual(result, 0)
+        self.assertEqual(self.counters.pending, 1)
+        self.counters.increment(self.table, {'id': 'a'}, 'views', 2)
+        result = yield self.counters.flush()
+        self.assertEqual(result, 1)
+        item = yield self.get('a')
+        self.assertEqual(item['views'], 7)
+
+    @testing.gen_test
+    def test_other_errors_are_dropped(self):
+        self.counters.increment('missing', {'id': 'a'}, 'views')
+        result = yield self.counters.flush()
+        self.assertEqual(result, 0)
+        self.assertEqual(self.counters.pending, 0)
+
+    @testing.gen_test
+    def test_ambiguous_errors_are_not_retried(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'views')
+        self.counters.increment(self.table, {'id': 'b'}, 'views')
+        self.emulator.inject_error(exceptions.InternalFailure, 1,
+                                   ['UpdateItem'])
+        result = yield self.counters.flush()
+        self.assertEqual(result, 1)
+        self.assertEqual(self.counters.pending, 0)
+        self.assertEqual(self.emulator.requests['UpdateItem'], 2)
+
+    @testing.gen_test
+    def test_unexpected_errors_only_drop_their_item(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'views')
+        self.counters.increment(self.table, {'id': object()}, 'views')
+        self.counters.increment(self.table, {'id': 'b'}, 'views')
+        result = yield self.counters.flush()
+        self.assertEqual(result, 2)
+        self.assertEqual(self.counters.pending, 0)
+        for key in 'ab':
+            item = yield self.get(key)
+            self.assertEqual(item['views'], 1)
+
+    @testing.gen_test
+    def test_close(self):
+        self.counters.increment(self.table, {'id': 'a'}, 'views')
+        self.emulator.throttle(2, ['UpdateItem'])
+        yield self.counters.close()
+        self.assertEqual(self.counters.pending, 0)
+        item = yield self.get('a')
+        self.assertEqual(item['views'], 1)
+        with self.assertRaises(RuntimeError):
+            self.counters.increment(self.table, {'id': 'a'}, 'views')
@@ -0,0 +1,292 @@
+import time
+import unittest
+import uuid
+
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+
+
+def create_table(instance, name='table', indexes=False):
+    attributes = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                  {'AttributeName': 'seq', 'AttributeType': 'N'}]
+    payload = {'TableName': name,
+               'AttributeDefinitions': attributes,
+               'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                             {'AttributeName': 'seq', 'KeyType': 'RANGE'}],
+               'ProvisionedThroughput': {'ReadCapacityUnits': 1,
+                                         'WriteCapacityUnits': 1}}
+    if indexes:
+        attributes.append({'AttributeName': 'group', 'AttributeType': 'S'})
+        payload['GlobalSecondaryIndexes'] = [{
+            'IndexName': 'group',
+            'KeySchema': [{'AttributeName': 'group', 'KeyType': 'HASH'},
+                          {'AttributeName': 'seq', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'KEYS_ONLY'}}]
+    return instance.execute('CreateTable', payload)
+
+
+def item(id_value, seq, **attributes):
+    value = {'id': {'S': id_value}, 'seq': {'N': str(seq)}}
+    for name, attribute in attributes.items():
+        value[name] = {'S': attribute}
+    return value
+
+
+class EmulatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = emulator.Emulator(seed=1)
+        create_table(self.emulator, indexes=True)
+        for id_value in ('a', 'b'):
+            for seq in range(10):
+                self.put(item(id_value, seq,
+                              group='even' if seq % 2 == 0 else 'odd'))
+
+    def put(self, value, **kwargs):
+        kwargs.update({'TableName': 'table', 'Item': value})
+        return self.emulator.execute('PutItem', kwargs)
+
+    def query(self, **kwargs):
+        kwargs.setdefault('TableName', 'table')
+        return self.emulator.execute('Query', kwargs)
+
+    def test_create_table_validation(self):
+        with self.assertRaises(exceptions.ResourceInUse):
+            create_table(self.emulator)
+        with self.assertRaises(exceptions.ValidationException):
+            self.emulator.execute('CreateTable', {
+                'TableName': 'other',
+                'AttributeDefinitions': [
+                    {'AttributeName': 'id', 'AttributeType': 'S'},
+                    {'AttributeName': 'unused', 'AttributeType': 'S'}],
+                'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}]})
+
+    def test_describe_and_list_tables(self):
+        create_table(self.emulator, 'other')
+        table = self.emulator.execute('DescribeTable',
+                                      {'TableName': 'table'})['Table']
+        self.assertEqual(table['ItemCount'], 20)
+        self.assertEqual(table['TableStatus'], tornado_dynamodb.TABLE_ACTIVE)
+        self.assertEqual(table['GlobalSecondaryIndexes'][0]['ItemCount'], 20)
+        response = self.emulator.execute('ListTables', {'Limit': 1})
+        self.assertEqual(response, {'TableNames': ['other'],
+                                    'LastEvaluatedTableName': 'other'})
+        response = self.emulator.execute(
+            'ListTables', {'ExclusiveStartTableName': 'other'})
+        self.assertEqual(response, {'TableNames': ['table']})
+
+    def test_put_validation(self):
+        with self.assertRaises(exceptions.ValidationException):
+            self.put({'id': {'S': 'a'}})
+        with self.assertRaises(exceptions.ValidationException):
+            self.put({'id': {'S': 'a'}, 'seq': {'S': '1'}})
+
+    def test_conditional_put(self):
+        condition = {'ConditionExpression': 'attribute_not_exists(id)'}
+        with self.assertRaises(exceptions.ConditionalCheckFailedException):
+            self.put(item('a', 1), **condition)
+        self.put(item('c', 1), **condition)
+        response = self.put(item('c', 1, name='new'), ReturnValues='ALL_OLD')
+        self.assertEqual(response['Attributes'], item('c', 1))
+
+    def test_update_item(self):
+        response = self.emulator.execute('UpdateItem', {
+            'TableName': 'table',
+            'Key': {'id': {'S': 'new'}, 'seq': {'N': '1'}},
+            'UpdateExpression': 'ADD #c :one SET #n = :name',
+            'ExpressionAttributeNames': {'#c': 'count', '#n': 'name'},
+            'ExpressionAttributeValues': {':one': {'N': '1'},
+                                          ':name': {'S': 'foo'}},
+            'ReturnValues': 'UPDATED_NEW'})
+        self.assertEqual(response['Attributes'],
+                         {'count': {'N': '1'}, 'name': {'S': 'foo'}})
+        with self.assertRaises(exceptions.ValidationException):
+            self.emulator.execute('UpdateItem', {
+                'TableName': 'table',
+                'Key': {'id': {'S': 'new'}, 'seq': {'N': '1'}},
+                'UpdateExpression': 'SET id = :v',
+                'ExpressionAttributeValues': {':v': {'S': 'other'}}})
+
+    def test_query_pagination(self):
+        kwargs = {'KeyConditionExpression': 'id = :id AND seq >= :seq',
+                  'ExpressionAttributeValues': {':id': {'S': 'a'},
+                                                ':seq': {'N': '3'}},
+                  'Limit': 4}
+        sequences, start_key = [], None
+        while True:
+            if start_key:
+                kwargs['ExclusiveStartKey'] = start_key
+            response = self.query(**kwargs)
+            sequences += [int(i['seq']['N']) for i in response['Items']]
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                break
+        self.assertEqual(sequences, list(range(3, 10)))
+
+    def test_query_reverse_with_filter(self):
+        response = self.query(
+            KeyConditionExpression='id = :id',
+            FilterExpression='#g = :g',
+            ExpressionAttributeNames={'#g': 'group'},
+            ExpressionAttributeValues={':id': {'S': 'b'},
+                                       ':g': {'S': 'odd'}},
+            ScanIndexForward=False, Limit=4)
+        self.assertEqual([i['seq']['N'] for i in response['Items']],
+                         ['9', '7'])
+        self.assertEqual(response['ScannedCount'], 4)
+        response = self.query(
+            KeyConditionExpression='id = :id',
+            ExpressionAttributeValues={':id': {'S': 'b'}},
+            ScanIndexForward=False, ExclusiveStartKey=response[
+                'LastEvaluatedKey'], Limit=1)
+        self.assertEqual(response['Items'][0]['seq']['N'], '5')
+
+    def test_query_index(self):
+        response = self.query(
+            IndexName='group', KeyConditionExpression='#g = :g',
+            ExpressionAttributeNames={'#g': 'group'},
+            ExpressionAttributeValues={':g': {'S': 'even'}}, Limit=3)
+        self.assertEqual(response['Count'], 3)
+        self.assertEqual(set(response['Items'][0]), {'id', 'seq', 'group'})
+        self.assertEqual(set(response['LastEvaluatedKey']),
+                         {'id', 'seq', 'group'})
+
+    def test_query_requires_partition_key(self):
+        with self.assertRaises(exceptions.ValidationException):
+            self.query(KeyConditionExpression='seq = :seq',
+                       ExpressionAttributeValues={':seq': {'N': '1'}})
+
+    def test_parallel_scan(self):
+        seen = []
+        for segment in range(3):
+            response = self.emulator.execute('Scan', {
+                'TableName': 'table', 'Segment': segment,
+                'TotalSegments': 3, 'ProjectionExpression': 'id, seq'})
+            seen += [(i['id']['S'], i['seq']['N']) for i in response['Items']]
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(len(set(seen)), 20)
+
+    def test_scan_count(self):
+        response = self.emulator.execute('Scan', {
+            'TableName': 'table', 'Select': 'COUNT',
+            'ReturnConsumedCapacity': 'TOTAL'})
+        self.assertEqual(response['Count'], 20)
+        self.assertNotIn('Items', response)
+        self.assertEqual(response['ConsumedCapacity']['CapacityUnits'], 0.5)
+
+    def test_batch_operations(self):
+        response = self.emulator.execute('BatchWriteItem', {'RequestItems': {
+            'table': [{'PutRequest': {'Item': item('c', 1)}},
+                      {'DeleteRequest': {'Key': item('a', 1)}}]}})
+        self.assertEqual(response['UnprocessedItems'], {})
+        response = self.emulator.execute('BatchGetItem', {'RequestItems': {
+            'table': {'Keys': [item('c', 1), item('a', 1)]}}})
+        self.assertEqual(response['Responses'], {'table': [item('c', 1)]})
+        with self.assertRaises(exceptions.ValidationException):
+            self.emulator.execute('BatchWriteItem', {'RequestItems': {
+                'table': [{'PutRequest': {'Item': item('c', 1)}}] * 2}})
+
+    def test_unprocessed_batch_items(self):
+        self.emulator.unprocessed_rate = 1.0
+        response = self.emulator.execute('BatchWriteItem', {'RequestItems': {
+            'table': [{'PutRequest': {'Item': item('c', 1)}}]}})
+        self.assertEqual(len(response['UnprocessedItems']['table']), 1)
+        response = self.emulator.execute('BatchGetItem', {'RequestItems': {
+            'table': {'Keys': [item('a', 1)], 'ConsistentRead': True}}})
+        self.assertEqual(response['UnprocessedKeys'], {
+            'table': {'Keys': [item('a', 1)], 'ConsistentRead': True}})
+
+    def test_transact_write_items(self):
+        request = {'TransactItems': [
+            {'Put': {'TableName': 'table', 'Item': item('c', 1)}},
+            {'ConditionCheck': {
+                'TableName': 'table', 'Key': item('a', 1),
+                'ConditionExpression': 'attribute_not_exists(id)'}}]}
+        with self.assertRaises(exceptions.TransactionCanceled) as context:
+            self.emulator.execute('TransactWriteItems', request)
+        self.assertEqual(
+            emulator.Emulator.error_response(context.exception)[1][
+                'CancellationReasons'],
+            [{'Code': 'None'},
+             {'Code': 'ConditionalCheckFailed',
+              'Message': 'ConditionalCheckFailed'}])
+        self.assertIsNone(self.emulator._tables['table'].get(item('c', 1)))
+        request['TransactItems'][1] = {'Delete': {'TableName': 'table',
+                                                  'Key': item('c', 1)}}
+        with self.assertRaises(exceptions.ValidationException):
+            self.emulator.execute('TransactWriteItems', request)
+
+    def test_injected_errors(self):
+        self.emulator.throttle(2, operations=['GetItem'])
+        key = {'TableName': 'table', 'Key': item('a', 1)}
+        self.emulator.execute('DescribeTable', {'TableName': 'table'})
+        for _ in range(2):
+            with self.assertRaises(exceptions.ProvisionedThroughputExceeded):
+                self.emulator.execute('GetItem', key)
+        self.assertIn('Item', self.emulator.execute('GetItem', key))
+        self.assertEqual(self.emulator.requests['GetItem'], 3)
+
+    def test_enforce_throughput(self):
+        self.emulator.enforce_throughput = True
+        self.emulator.burst_seconds = 1
+        key = {'TableName': 'table', 'Key': item('a', 1),
+               'ConsistentRead': True}
+        self.emulator.execute('GetItem', key)
+        with self.assertRaises(exceptions.ProvisionedThroughputExceeded):
+            self.emulator.execute('GetItem', key)
+        table = self.emulator._tables['table']
+        tokens, updated = table.buckets['Read']
+        table.buckets['Read'] = tokens, updated - 1
+        self.emulator.execute('GetItem', key)
+
+    def test_unknown_operation(self):
+        with self.assertRaises(exceptions.InvalidAction):
+            self.emulator.execute('Unknown', {})
+
+    def test_error_response(self):
+        self.assertEqual(
+            emulator.Emulator.error_response(
+                exceptions.ConditionalCheckFailedException('failed')),
+            (400, {'__type': 'com.amazonaws.dynamodb.v20120810#'
+                             'ConditionalCheckFailedException',
+                   'message': 'failed'}))
+        self.assertEqual(emulator.Emulator.error_response(
+            exceptions.ServiceUnavailable())[0], 503)
+
+
+class EmulatorServerTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(EmulatorServerTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+        self.table = str(uuid.uuid4())
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(EmulatorServerTests, self).tearDown()
+
+    @testing.gen_test
+    def test_injected_error_is_raised_by_client(self):
+        yield self.client.create_table(
+            self.table, [{'AttributeName': 'id', 'AttributeType': 'S'}],
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}])
+        self.emulator.throttle()
+        with self.assertRaises(exceptions.ProvisionedThroughputExceeded):
+            yield self.client.put_item(self.table, {'id': 'foo'})
+        self.emulator.inject_error(exceptions.InternalFailure)
+        with self.assertRaises(exceptions.RequestException):
+            yield self.client.put_item(self.table, {'id': 'foo'})
+        yield self.client.put_item(self.table, {'id': 'foo'})
+
+    @testing.gen_test
+    def test_latency(self):
+        self.emulator.latency = 0.05
+        start = time.time()
+        response = yield self.client.list_tables()
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertEqual(response['TableNames'], [])
@@ -0,0 +1,147 @@
+import decimal
+import unittest
+
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import expressions
+
+ITEM = {'id': {'S': 'foo'},
+        'count': {'N': '5'},
+        'tags': {'SS': ['a', 'b']},
+        'info': {'M': {'name': {'S': 'Foo Bar'},
+                       'scores': {'L': [{'N': '1'}, {'N': '2'}]}}},
+        'enabled': {'BOOL': True}}
+
+
+class EvaluateTests(unittest.TestCase):
+
+    def evaluate(self, expression, values=None, names=None):
+        return expressions.evaluate(expression, ITEM, names, values)
+
+    def test_comparisons(self):
+        self.assertTrue(self.evaluate('#c = :v', {':v': {'N': '5.0'}},
+                                      {'#c': 'count'}))
+        self.assertTrue(self.evaluate('id <> :v', {':v': {'S': 'bar'}}))
+        self.assertTrue(self.evaluate('id > :v', {':v': {'S': 'bar'}}))
+        self.assertFalse(self.evaluate('id < :v', {':v': {'N': '1'}}))
+        self.assertFalse(self.evaluate('missing = :v', {':v': {'N': '1'}}))
+
+    def test_between_and_in(self):
+        values = {':a': {'N': '1'}, ':b': {'N': '5'}, ':c': {'N': '6'}}
+        self.assertTrue(self.evaluate('#c BETWEEN :a AND :b', values,
+                                      {'#c': 'count'}))
+        self.assertTrue(self.evaluate('#c IN (:c, :b)', values,
+                                      {'#c': 'count'}))
+        self.assertFalse(self.evaluate('#c in (:a, :c)', values,
+                                       {'#c': 'count'}))
+
+    def test_boolean_operators(self):
+        values = {':t': {'BOOL': True}, ':s': {'S': 'foo'}}
+        self.assertTrue(self.evaluate(
+            'NOT (enabled <> :t) AND (id = :t OR id = :s)', values))
+        self.assertFalse(self.evaluate('enabled = :t AND NOT id = :s',
+                                       values))
+
+    def test_functions(self):
+        values = {':a': {'S': 'a'}, ':foo': {'S': 'Foo'}, ':ss': {'S': 'SS'},
+                  ':two': {'N': '2'}}
+        self.assertTrue(self.evaluate('attribute_exists(info.scores[1])'))
+        self.assertTrue(self.evaluate('attribute_not_exists(info.scores[2])'))
+        self.assertTrue(self.evaluate('attribute_type(tags, :ss)', values))
+        self.assertTrue(self.evaluate('begins_with(info.#n, :foo)', values,
+                                      {'#n': 'name'}))
+        self.assertTrue(self.evaluate('contains(tags, :a)', values))
+        self.assertTrue(self.evaluate('contains(info.scores, :two)', values))
+        self.assertTrue(self.evaluate('size(tags) = :two', values))
+
+    def test_invalid_expressions(self):
+        for expression in ('id = ', 'id = :missing', '#missing = :v',
+                           'id ~ :v', '(id = :v', ''):
+            with self.assertRaises(exceptions.ValidationException):
+                self.evaluate(expression, {':v': {'S': 'foo'}})
+
+
+class KeyConditionTests(unittest.TestCase):
+
+    def test_key_conditions(self):
+        values = {':id': {'S': 'foo'}, ':a': {'N': '1'}, ':b': {'N': '3'}}
+        conditions = expressions.key_conditions(
+            'id = :id AND #r BETWEEN :a AND :b', {'#r': 'range'}, values)
+        self.assertEqual(conditions, {'id': ('=', {'S': 'foo'}),
+                                      'range': ('BETWEEN', {'N': '1'},
+                                                {'N': '3'})})
+        self.assertTrue(expressions.matches({'N': '2'}, conditions['range']))
+        self.assertFalse(expressions.matches({'N': '4'}, conditions['range']))
+
+    def test_invalid_key_conditions(self):
+        values = {':id': {'S': 'foo'}}
+        for expression in ('id = :id OR id = :id', 'id <> :id',
+                           'id = :id AND id = :id', 'contains(id, :id)'):
+            with self.assertRaises(exceptions.ValidationException):
+                expressions.key_conditions(expression, None, values)
+
+
+class ProjectTests(unittest.TestCase):
+
+    def test_project(self):
+        self.assertEqual(
+            expressions.project('id, info.#n, info.scores[1], missing', ITEM,
+                                {'#n': 'name'}),
+            {'id': {'S': 'foo'},
+             'info': {'M': {'name': {'S': 'Foo Bar'},
+                            'scores': {'L': [{'N': '2'}]}}}})
+
+
+class UpdateTests(unittest.TestCase):
+
+    def update(self, expression, values=None, names=None):
+        return expressions.update(expression, ITEM, names, values)
+
+    def test_set(self):
+        values = {':one': {'N': '1'}, ':l': {'L': [{'N': '3'}]},
+                  ':v': {'S': 'new'}}
+        item, updated = self.update(
+            'SET #c = #c + :one, info.scores = list_append(info.scores, :l), '
+            'created = if_not_exists(created, :v), id = if_not_exists(id, :v)',
+            values, {'#c': 'count'})
+        self.assertEqual(item['count'], {'N': '6'})
+        self.assertEqual(item['info']['M']['scores']['L'][-1], {'N': '3'})
+        self.assertEqual(item['created'], {'S': 'new'})
+        self.assertEqual(item['id'], {'S': 'foo'})
+        self.assertEqual(updated, {'count', 'info', 'created', 'id'})
+        self.assertEqual(ITEM['count'], {'N': '5'})
+
+    def test_operands_use_original_item(self):
+        item, _updated = self.update('SET #c = :v, copy = #c',
+                                     {':v': {'N': '1'}}, {'#c': 'count'})
+        self.assertEqual(item['copy'], {'N': '5'})
+
+    def test_remove(self):
+        item, updated = self.update('REMOVE enabled, info.scores[0]')
+        self.assertNotIn('enabled', item)
+        self.assertEqual(item['info']['M']['scores']['L'], [{'N': '2'}])
+        self.assertEqual(updated, {'enabled', 'info'})
+
+    def test_add_and_delete(self):
+        values = {':n': {'N': '-2.5'}, ':add': {'SS': ['b', 'c']},
+                  ':del': {'SS': ['a']}}
+        item, _updated = self.update('ADD #c :n, tags :add, new :n',
+                                     values, {'#c': 'count'})
+        self.assertEqual(item['count'], {'N': '2.5'})
+        self.assertEqual(sorted(item['tags']['SS']), ['a', 'b', 'c'])
+        self.assertEqual(item['new'], {'N': '-2.5'})
+        item, _updated = self.update('DELETE tags :del', values)
+        self.assertEqual(item['tags'], {'SS': ['b']})
+
+    def test_invalid_updates(self):
+        values = {':s': {'S': 'foo'}, ':n': {'N': '1'}}
+        for expression in ('SET id = id + :n', 'SET missing.child = :n',
+                           'ADD id :n', 'SET a = :n SET b = :n',
+                           'UPSERT id = :s', 'DELETE tags :n'):
+            with self.assertRaises(exceptions.ValidationException):
+                self.update(expression, values)
+
+    def test_format_number(self):
+        self.assertEqual(
+            expressions.format_number(decimal.Decimal('1E+2')), '100')
+        self.assertEqual(
+            expressions.format_number(decimal.Decimal('-0.000')), '0')
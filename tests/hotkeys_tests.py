@@ -0,0 +1,142 @@
+import unittest
+
+import mock
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import hotkeys
+
+
+class HotKeyTrackerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = hotkeys.HotKeyTracker(capacity=4)
+
+    def test_heavy_hitters(self):
+        for index in range(1000):
+            value = 'hot' if index % 2 == 0 else 'key-{}'.format(index)
+            self.tracker.record('table', {'S': value})
+        top = self.tracker.top('table', 1)
+        self.assertEqual(top[0][0], 'hot')
+        self.assertGreaterEqual(top[0][1], 500)
+        self.assertLessEqual(top[0][1] - top[0][2], 500)
+
+    def test_observe_requests(self):
+        self.tracker.observe('CreateTable', {
+            'TableName': 'table',
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'seq', 'KeyType': 'RANGE'}],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': 'group',
+                'KeySchema': [{'AttributeName': 'group',
+                               'KeyType': 'HASH'}]}]})
+        key = {'id': {'S': 'a'}, 'seq': {'N': '1'}}
+        self.tracker.observe('GetItem', {'TableName': 'table', 'Key': key})
+        self.tracker.observe('PutItem', {'TableName': 'table', 'Item': key})
+        self.tracker.observe('BatchWriteItem', {'RequestItems': {'table': [
+            {'PutRequest': {'Item': key}},
+            {'DeleteRequest': {'Key': {'id': {'S': 'b'},
+                                       'seq': {'N': '1'}}}}]}})
+        self.tracker.observe('Query', {
+            'TableName': 'table', 'IndexName': 'group',
+            'KeyConditionExpression': '#g = :g',
+            'ExpressionAttributeNames': {'#g': 'group'},
+            'ExpressionAttributeValues': {':g': {'S': 'x'}}})
+        self.assertEqual(self.tracker.top('table'), [('a', 3, 0),
+                                                     ('b', 1, 0)])
+        self.assertEqual(self.tracker.report()['table/group'],
+                         [('x', 1, 0)])
+
+    def test_unknown_schema(self):
+        self.tracker.observe('GetItem', {'TableName': 'table',
+                                         'Key': {'id': {'N': '1'}}})
+        self.tracker.observe('GetItem', {
+            'TableName': 'table', 'Key': {'id': {'N': '1'},
+                                          'seq': {'N': '1'}}})
+        self.assertEqual(self.tracker.top('table'), [(1, 1, 0)])
+
+    def test_sampling_scales_counts(self):
+        tracker = hotkeys.HotKeyTracker(sample_rate=0.5, seed=1)
+        for _ in range(1000):
+            tracker.observe('GetItem', {'TableName': 'table',
+                                        'Key': {'id': {'S': 'a'}}})
+        self.assertAlmostEqual(tracker.top('table')[0][1], 1000, delta=100)
+
+    def test_windows(self):
+        with mock.patch('time.time') as now:
+            now.return_value = 1000
+            tracker = hotkeys.HotKeyTracker(window=60)
+            tracker.record('table', {'S': 'a'})
+            now.return_value = 1070
+            tracker.record('table', {'S': 'b'})
+            self.assertEqual([key for key, _count, _error
+                              in tracker.top('table')], ['a', 'b'])
+            now.return_value = 1140
+            self.assertEqual(tracker.top('table'), [('b', 1, 0)])
+            now.return_value = 1400
+            self.assertEqual(tracker.report(), {})
+
+
+class ShardedTableTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ShardedTableTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.tracker = hotkeys.HotKeyTracker()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), hot_key_tracker=self.tracker)
+        self.table = hotkeys.ShardedTable(self.client, 'events', 'user',
+                                          'ts', {'busy': 4})
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ShardedTableTests, self).tearDown()
+
+    @gen.coroutine
+    def create_table(self):
+        yield self.client.create_table(
+            'events', [{'AttributeName': 'user', 'AttributeType': 'S'},
+                       {'AttributeName': 'ts', 'AttributeType': 'N'}],
+            [{'AttributeName': 'user', 'KeyType': 'HASH'},
+             {'AttributeName': 'ts', 'KeyType': 'RANGE'}])
+        for ts in range(20):
+            yield self.table.put_item({'user': 'busy', 'ts': ts})
+        yield self.table.put_item({'user': 'quiet', 'ts': 1})
+
+    def test_shard_key(self):
+        self.assertEqual(self.table.shard_key({'user': 'quiet', 'ts': 1}),
+                         {'user': 'quiet', 'ts': 1})
+        key = self.table.shard_key({'user': 'busy', 'ts': 1})
+        self.assertIn(key['user'], self.table.shard_values('busy'))
+        self.assertEqual(self.table.strip(key), {'user': 'busy', 'ts': 1})
+        with self.assertRaises(ValueError):
+            self.table.add_hot_key(1, 2)
+
+    @testing.gen_test
+    def test_writes_are_spread_across_shards(self):
+        yield self.create_table()
+        top = self.tracker.top('events')
+        self.assertGreater(len(top), 2)
+        self.assertLess(top[0][1], 20)
+        result = yield self.client.scan('events')
+        self.assertEqual(len(set(item['user'] for item in result['Items'])),
+                         5)
+
+    @testing.gen_test
+    def test_reads_strip_and_fan_out(self):
+        yield self.create_table()
+        result = yield self.table.get_item({'user': 'busy', 'ts': 7})
+        self.assertEqual(result['Item'], {'user': 'busy', 'ts': 7})
+        result = yield self.table.query('busy', scan_index_forward=False,
+                                        limit=5)
+        self.assertEqual(result['Items'],
+                         [{'user': 'busy', 'ts': ts}
+                          for ts in range(19, 14, -1)])
+        result = yield self.table.query('quiet')
+        self.assertEqual(result['Items'], [{'user': 'quiet', 'ts': 1}])
+        result = yield self.table.delete_item({'user': 'busy', 'ts': 7},
+                                              return_values=True)
+        self.assertEqual(result['Attributes'], {'user': 'busy', 'ts': 7})
@@ -0,0 +1,148 @@
+import json
+import unittest
+
+import mock
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import bulk
+from tornado_dynamodb import emulator
+from tornado_dynamodb import loadgen
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = loadgen.Histogram()
+        for value in range(1, 1001):
+            histogram.record(value / 1000.0)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, delta=0.005)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, delta=0.01)
+        self.assertEqual(histogram.percentile(100), 1.0)
+        summary = histogram.summary()
+        self.assertAlmostEqual(summary['mean'], 0.5005)
+        self.assertEqual(set(summary),
+                         {'p50', 'p90', 'p99', 'p99.9', 'mean', 'max'})
+
+    def test_merge(self):
+        first, second = loadgen.Histogram(), loadgen.Histogram()
+        first.record(0.001)
+        second.record(0.1)
+        first.merge(second)
+        self.assertEqual(first.count, 2)
+        self.assertEqual((first.min, first.max), (0.001, 0.1))
+
+    def test_empty(self):
+        self.assertEqual(loadgen.Histogram().percentile(99), 0.0)
+
+
+class ParseMixTests(unittest.TestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(loadgen.parse_mix('get_item=80, put_item=20,scan'),
+                         {'get_item': 80, 'put_item': 20, 'scan': 1})
+
+    def test_invalid_operation(self):
+        with self.assertRaises(ValueError):
+            loadgen.parse_mix('delete_table=1')
+
+
+class ItemGeneratorTests(unittest.TestCase):
+
+    def test_items(self):
+        generator = loadgen.ItemGenerator(key_space=3, range_keys=2,
+                                          attributes=2, value_size=5, seed=1)
+        items = list(generator.items())
+        self.assertEqual(len(items), 6)
+        self.assertEqual(set(items[0]), {'id', 'seq', 'attr0', 'attr1'})
+        self.assertEqual(len(items[0]['attr1']), 5)
+        self.assertIn(generator.key()['seq'], (0, 1))
+
+
+class LoadGeneratorTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(LoadGeneratorTests, self).setUp()
+        self.emulator = emulator.Emulator(seed=1)
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+        self.generator = loadgen.ItemGenerator(key_space=50, range_keys=2,
+                                               seed=1)
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(LoadGeneratorTests, self).tearDown()
+
+    @gen.coroutine
+    def prepare(self):
+        yield loadgen.create_table(self.client, 'loadgen', self.generator)
+        yield bulk.import_items(self.client, 'loadgen',
+                                self.generator.items())
+
+    def test_invalid_mix(self):
+        with self.assertRaises(ValueError):
+            loadgen.LoadGenerator(self.client, 'loadgen', {'get_item': 0})
+        with self.assertRaises(ValueError):
+            loadgen.LoadGenerator(self.client, 'loadgen', {'unknown': 1})
+
+    @testing.gen_test
+    def test_closed_loop(self):
+        yield self.prepare()
+        load = loadgen.LoadGenerator(self.client, 'loadgen',
+                                     concurrency=4, generator=self.generator,
+                                     seed=1)
+        report = yield load.run(requests=200)
+        self.assertEqual(report['requests'], 200)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(sum(op['requests'] for op in
+                             report['operations'].values()), 200)
+        self.assertGreater(report['operations']['get_item']['requests'],
+                           report['operations']['scan']['requests'])
+        self.assertGreater(report['latency']['p99'], 0)
+
+    @testing.gen_test
+    def test_open_loop_counts_throttles(self):
+        yield self.prepare()
+        self.emulator.throttle(5, operations=['PutItem'])
+        load = loadgen.LoadGenerator(self.client, 'loadgen',
+                                     {'put_item': 1}, concurrency=4,
+                                     rate=500, generator=self.generator)
+        start = self.io_loop.time()
+        report = yield load.run(requests=50)
+        self.assertGreaterEqual(self.io_loop.time() - start, 0.09)
+        self.assertEqual(report['requests'], 50)
+        self.assertEqual(report['throttles'], 5)
+        self.assertEqual(report['throttle_rate'], 0.1)
+
+    @testing.gen_test
+    def test_duration(self):
+        yield self.prepare()
+        load = loadgen.LoadGenerator(self.client, 'loadgen', {'query': 1},
+                                     concurrency=2, generator=self.generator)
+        report = yield load.run(duration=0.1)
+        self.assertGreater(report['requests'], 0)
+        self.assertGreaterEqual(report['elapsed'], 0.1)
+        self.assertIn('query', loadgen.format_report(report))
+
+
+class MainTests(unittest.TestCase):
+
+    def test_emulator_json_report(self):
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(loadgen.main([
+                '--emulator', '--requests', '50', '--key-space', '10',
+                '--json', '--seed', '1', '--mix', 'get_item=1,put_item=1']),
+                0)
+        report = json.loads(stdout.write.call_args[0][0])
+        self.assertEqual(report['requests'], 50)
+        self.assertEqual(set(report['operations']), {'get_item', 'put_item'})
+
+    def test_text_report(self):
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(loadgen.main(['--emulator', '--requests', '10',
+                                           '--key-space', '10']), 0)
+        output = stdout.write.call_args[0][0]
+        self.assertIn('p99.9', output)
+        self.assertIn('10 requests in', output)
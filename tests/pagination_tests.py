@@ -0,0 +1,117 @@
+import unittest
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import pagination
+
+
+class PageSizerTests(unittest.TestCase):
+
+    def test_converges_on_target_latency(self):
+        sizer = pagination.PageSizer(initial=10, maximum=10000,
+                                     target_latency=0.1)
+        for _ in range(20):
+            sizer.observe(sizer.limit, 0, 0.01 + 0.0001 * sizer.limit)
+        self.assertAlmostEqual(sizer.limit, 900, delta=10)
+
+    def test_growth_is_bounded(self):
+        sizer = pagination.PageSizer(initial=10, maximum=10000)
+        sizer.observe(10, 0, 0.0001)
+        self.assertEqual(sizer.limit, 20)
+        sizer = pagination.PageSizer(initial=100)
+        sizer.observe(100, 0, 10.0)
+        self.assertEqual(sizer.limit, 50)
+
+    def test_memory_budget(self):
+        sizer = pagination.PageSizer(initial=100, target_latency=None,
+                                     memory_budget=64 * 1024)
+        for _ in range(5):
+            sizer.observe(sizer.limit, sizer.limit * 1024, 0.01)
+        self.assertEqual(sizer.limit, 64)
+
+    def test_slow_consumer(self):
+        sizer = pagination.PageSizer(initial=400, target_latency=0.1)
+        for _ in range(5):
+            sizer.observe(sizer.limit, 0, sizer.limit * 0.0001)
+            sizer.consumed(sizer.limit, sizer.limit * 0.01)
+        self.assertEqual(sizer.limit, 10)
+
+    def test_fast_consumer_does_not_limit(self):
+        sizer = pagination.PageSizer(initial=100, target_latency=0.1)
+        sizer.observe(100, 0, 0.1)
+        sizer.consumed(100, 0.001)
+        self.assertEqual(sizer.limit, 100)
+
+    def test_limits(self):
+        with self.assertRaises(ValueError):
+            pagination.PageSizer(minimum=10, maximum=5)
+        self.assertEqual(pagination.PageSizer(initial=5000).limit,
+                         pagination.DEFAULT_MAXIMUM)
+
+
+class PaginatorTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(PaginatorTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(PaginatorTests, self).tearDown()
+
+    @gen.coroutine
+    def create_table(self):
+        attrs = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                 {'AttributeName': 'seq', 'AttributeType': 'N'}]
+        schema = [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                  {'AttributeName': 'seq', 'KeyType': 'RANGE'}]
+        yield self.client.create_table('table', attrs, schema)
+        for offset in range(0, 200, 25):
+            yield self.client.batch_write_item(
+                {'table': [{'PutRequest': {'Item': {
+                    'id': 'a', 'seq': seq, 'value': 'x' * 100}}}
+                    for seq in range(offset, offset + 25)]})
+
+    @testing.gen_test
+    def test_query_pages_grow(self):
+        yield self.create_table()
+        paginator = pagination.Paginator(
+            self.client.query, table_name='table',
+            key_condition_expression='id = :id',
+            expression_attribute_values={':id': 'a'},
+            page_sizer=pagination.PageSizer(initial=5, minimum=5))
+        sequences = []
+        while not paginator.exhausted:
+            items = yield paginator.next()
+            sequences += [item['seq'] for item in items]
+        self.assertEqual(sequences, list(range(200)))
+        self.assertLess(paginator.pages, 8)
+        self.assertEqual(paginator.items, 200)
+        self.assertGreater(paginator.page_sizer.item_size, 100)
+        result = yield paginator.next()
+        self.assertEqual(result, [])
+
+    @testing.gen_test
+    def test_scan_with_memory_budget(self):
+        yield self.create_table()
+        paginator = pagination.Paginator(
+            self.client.scan, table_name='table', consistent_read=True,
+            prefetch=False, page_sizer=pagination.PageSizer(
+                initial=50, minimum=1, target_latency=None,
+                memory_budget=2048))
+        count = 0
+        while not paginator.exhausted:
+            items = yield paginator.next()
+            count += len(items)
+        self.assertEqual(count, 200)
+        self.assertLessEqual(paginator.page_sizer.limit, 16)
+
+    def test_managed_arguments(self):
+        with self.assertRaises(ValueError):
+            pagination.Paginator(self.client.scan, table_name='table',
+                                 limit=10)
@@ -0,0 +1,168 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from tornado import gen
+from tornado import ioloop
+
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import parallel
+from tornado_dynamodb import utils
+
+TABLE = 'parallel'
+ITEMS = 50
+
+
+def ignore(items):
+    pass
+
+
+@gen.coroutine
+def ignore_async(items):
+    yield gen.moment
+
+
+def fail(items):
+    raise ValueError('callback failed')
+
+
+class ParallelScanTests(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = emulator.Emulator()
+        self.loop = ioloop.IOLoop()
+        started = threading.Event()
+        result = {}
+
+        def run():
+            self.loop.make_current()
+            result['endpoint'] = self.emulator.start()
+            self.loop.add_callback(started.set)
+            self.loop.start()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run)
+        self.thread.daemon = True
+        self.thread.start()
+        started.wait(5)
+        self.client_kwargs = {'endpoint': result['endpoint']}
+        self.emulator.execute('CreateTable', {
+            'TableName': TABLE,
+            'AttributeDefinitions': [{'AttributeName': 'id',
+                                      'AttributeType': 'N'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
+            'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                      'WriteCapacityUnits': 5}})
+        for value in range(ITEMS):
+            self.emulator.execute('PutItem', {
+                'TableName': TABLE,
+                'Item': utils.marshall({'id': value, 'value': str(value)})})
+        self.tempdir = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.tempdir, 'checkpoint.json')
+
+    def tearDown(self):
+        self.loop.add_callback(self.emulator.stop)
+        self.loop.add_callback(self.loop.stop)
+        self.thread.join(5)
+        shutil.rmtree(self.tempdir)
+
+    def scan(self, **kwargs):
+        kwargs.setdefault('processes', 2)
+        kwargs.setdefault('segments', 4)
+        return parallel.ParallelScan(TABLE, client_kwargs=self.client_kwargs,
+                                     **kwargs)
+
+    def test_default_segments(self):
+        scan = parallel.ParallelScan(TABLE, processes=3)
+        self.assertEqual(scan.segments, 12)
+
+    def test_managed_scan_kwargs_raise(self):
+        with self.assertRaises(ValueError):
+            parallel.ParallelScan(TABLE, segment=1)
+
+    def test_pages(self):
+        segments, values = set(), []
+        for segment, items in self.scan(limit=7).pages():
+            segments.add(segment)
+            values += [item['id'] for item in items]
+        self.assertEqual(sorted(values), list(range(ITEMS)))
+        self.assertEqual(segments, {0, 1, 2, 3})
+
+    def test_run_with_callback(self):
+        stats = self.scan(callback=ignore, limit=7).run()
+        self.assertEqual(stats['items'], ITEMS)
+        self.assertGreater(stats['requests'], 4)
+
+    def test_run_with_coroutine_callback(self):
+        stats = self.scan(callback=ignore_async).run()
+        self.assertEqual(stats['items'], ITEMS)
+
+    def test_callback_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            self.scan(callback=fail).run()
+
+    def test_missing_table_is_raised(self):
+        scan = parallel.ParallelScan('missing', processes=1, segments=1,
+                                     client_kwargs=self.client_kwargs)
+        with self.assertRaises(exceptions.ResourceNotFound):
+            scan.run()
+
+    def test_resume_from_checkpoint(self):
+        values = []
+        pages = self.scan(limit=5, checkpoint_path=self.checkpoint_path,
+                          processes=1, segments=2).pages()
+        for _page in range(3):
+            values += [item['id'] for item in next(pages)[1]]
+        pages.close()
+        with open(self.checkpoint_path) as handle:
+            state = json.load(handle)
+        self.assertEqual(state['table'], TABLE)
+        self.assertEqual(state['total_segments'], 2)
+        self.assertTrue(state['segments'])
+        for segment, items in self.scan(
+                limit=5, checkpoint_path=self.checkpoint_path,
+                processes=1, segments=2).pages():
+            values += [item['id'] for item in items]
+        self.assertEqual(sorted(set(values)), list(range(ITEMS)))
+        self.assertLess(len(values), ITEMS + 10)
+
+    def test_completed_checkpoint_is_not_rescanned(self):
+        self.scan(checkpoint_path=self.checkpoint_path).run()
+        stats = self.scan(checkpoint_path=self.checkpoint_path).run()
+        self.assertEqual(stats['items'], 0)
+        self.assertEqual(stats['requests'], 0)
+
+    def test_checkpoint_for_other_scan_raises(self):
+        self.scan(checkpoint_path=self.checkpoint_path).run()
+        with self.assertRaises(ValueError):
+            self.scan(checkpoint_path=self.checkpoint_path, segments=8)
+
+
+class SendTests(unittest.TestCase):
+
+    def test_full_queue_does_not_block_the_ioloop(self):
+        queue = multiprocessing.Queue(1)
+        queue.put('first')
+        ticks = []
+
+        @gen.coroutine
+        def tick():
+            for _offset in range(5):
+                yield gen.sleep(0.001)
+                ticks.append(_offset)
+            self.assertEqual(queue.get(timeout=1), 'first')
+
+        @gen.coroutine
+        def run():
+            yield [parallel._send(queue, 'second'), tick()]
+
+        loop = ioloop.IOLoop()
+        loop.run_sync(run)
+        loop.close()
+        self.assertEqual(len(ticks), 5)
+        self.assertEqual(queue.get(timeout=1), 'second')
@@ -0,0 +1,189 @@
+import unittest
+import uuid
+
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import planner
+
+TABLE = {
+    'TableName': 'orders',
+    'AttributeDefinitions': [
+        {'AttributeName': 'customer', 'AttributeType': 'S'},
+        {'AttributeName': 'id', 'AttributeType': 'S'},
+        {'AttributeName': 'created', 'AttributeType': 'N'},
+        {'AttributeName': 'status', 'AttributeType': 'S'}],
+    'KeySchema': [{'AttributeName': 'customer', 'KeyType': 'HASH'},
+                  {'AttributeName': 'id', 'KeyType': 'RANGE'}],
+    'LocalSecondaryIndexes': [{
+        'IndexName': 'by-created',
+        'KeySchema': [{'AttributeName': 'customer', 'KeyType': 'HASH'},
+                      {'AttributeName': 'created', 'KeyType': 'RANGE'}],
+        'Projection': {'ProjectionType': 'INCLUDE',
+                       'NonKeyAttributes': ['total']}}],
+    'GlobalSecondaryIndexes': [{
+        'IndexName': 'by-status',
+        'KeySchema': [{'AttributeName': 'status', 'KeyType': 'HASH'},
+                      {'AttributeName': 'created', 'KeyType': 'RANGE'}],
+        'Projection': {'ProjectionType': 'ALL'},
+        'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                  'WriteCapacityUnits': 5}}],
+    'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                              'WriteCapacityUnits': 5}}
+
+
+class QueryPlannerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.planner = planner.QueryPlanner([TABLE])
+
+    def test_table(self):
+        plan = self.planner.plan('orders', {'customer': 'c1', 'id': 'o1'})
+        self.assertFalse(plan.scan)
+        self.assertIsNone(plan.index_name)
+        self.assertEqual(plan.key_conditions, {'customer': ('=', 'c1'),
+                                               'id': ('=', 'o1')})
+        self.assertEqual(plan.filter_conditions, {})
+
+    def test_local_index_for_sort_condition(self):
+        plan = self.planner.plan('orders', {'customer': 'c1',
+                                            'created': ('>=', 10)},
+                                 attributes=['id', 'total'])
+        self.assertEqual(plan.index_name, 'by-created')
+        self.assertEqual(plan.parameters(), {
+            'table_name': 'orders',
+            'consistent_read': False,
+            'index_name': 'by-created',
+            'key_condition_expression': '#c0 >= :c0_0 AND #c1 = :c1_0',
+            'projection_expression': '#a0, #a1',
+            'expression_attribute_names': {
+                '#c0': 'created', '#c1': 'customer', '#a0': 'id',
+                '#a1': 'total'},
+            'expression_attribute_values': {':c0_0': 10, ':c1_0': 'c1'}})
+
+    def test_projection_is_required(self):
+        plan = self.planner.plan('orders', {'customer': 'c1',
+                                            'created': ('>=', 10)})
+        self.assertIsNone(plan.index_name)
+        self.assertEqual(plan.key_conditions, {'customer': ('=', 'c1')})
+        self.assertEqual(plan.filter_conditions, {'created': ('>=', 10)})
+
+    def test_global_index(self):
+        plan = self.planner.plan('orders', {
+            'status': 'open', 'created': ('BETWEEN', 1, 5),
+            'total': ('>', 100)})
+        self.assertEqual(plan.index_name, 'by-status')
+        self.assertEqual(plan.filter_conditions, {'total': ('>', 100)})
+        self.assertEqual(
+            plan.parameters()['key_condition_expression'],
+            '#c0 BETWEEN :c0_0 AND :c0_1 AND #c1 = :c1_0')
+        self.assertEqual(plan.parameters()['filter_expression'],
+                         '#c2 > :c2_0')
+
+    def test_sparse_index_is_not_used(self):
+        plan = self.planner.plan('orders', {'status': 'open'})
+        self.assertTrue(plan.scan)
+        self.assertIn('by-status only has the items with created, add a '
+                      'condition on it or pass allow_sparse', plan.reason)
+        plan = self.planner.plan('orders', {'status': 'open'},
+                                 allow_sparse=True)
+        self.assertEqual(plan.index_name, 'by-status')
+
+    def test_consistent_read_skips_global_index(self):
+        plan = self.planner.plan('orders', {'status': 'open'},
+                                 consistent_read=True)
+        self.assertTrue(plan.scan)
+        self.assertIn('by-status does not support consistent reads',
+                      plan.reason)
+
+    def test_scan(self):
+        plan = self.planner.plan('orders', {
+            'total': ('>', 100), 'id': ('begins_with', 'o')})
+        self.assertTrue(plan.scan)
+        self.assertEqual(plan.reason,
+                         'table needs an equality condition on customer; '
+                         'by-created needs an equality condition on '
+                         'customer; by-status needs an equality condition '
+                         'on status')
+        parameters = plan.parameters()
+        self.assertNotIn('key_condition_expression', parameters)
+        self.assertEqual(parameters['filter_expression'],
+                         'begins_with(#c0, :c0_0) AND #c1 > :c1_0')
+
+    def test_inactive_index(self):
+        table = dict(TABLE, GlobalSecondaryIndexes=[
+            dict(TABLE['GlobalSecondaryIndexes'][0],
+                 IndexStatus='CREATING')])
+        self.planner.learn(table)
+        self.assertTrue(self.planner.plan('orders', {'status': 'open'}).scan)
+
+    def test_unknown_table(self):
+        with self.assertRaises(ValueError):
+            self.planner.plan('missing', {'id': 'a'})
+
+    def test_invalid_condition(self):
+        with self.assertRaises(ValueError):
+            self.planner.plan('orders', {'customer': ('~', 'c1')})
+        with self.assertRaises(ValueError):
+            self.planner.plan('orders', {'created': ('BETWEEN', 1)})
+
+    def test_observe(self):
+        self.planner.observe('UpdateTable', {
+            'TableName': 'orders', 'GlobalSecondaryIndexUpdates': []})
+        self.assertNotIn('orders', self.planner.tables)
+        self.planner.observe('CreateTable', TABLE)
+        self.assertIn('orders', self.planner.tables)
+        self.planner.observe('DeleteTable', {'TableName': 'orders'})
+        self.assertNotIn('orders', self.planner.tables)
+
+
+class ClientTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.planner = planner.QueryPlanner()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), query_planner=self.planner)
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable',
+                              dict(TABLE, TableName=self.table))
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ClientTests, self).tearDown()
+
+    @testing.gen_test
+    def test_execute(self):
+        for offset in range(10):
+            yield self.client.put_item(self.table, {
+                'customer': 'c{}'.format(offset % 2), 'id': str(offset),
+                'created': offset, 'total': offset * 10,
+                'status': 'open' if offset < 6 else 'closed'})
+        yield self.planner.load(self.client, self.table)
+        self.assertEqual(self.emulator.requests['DescribeTable'], 1)
+        yield self.planner.load(self.client, self.table)
+        self.assertEqual(self.emulator.requests['DescribeTable'], 1)
+
+        plan = self.planner.plan(self.table, {'status': 'open',
+                                              'created': ('>', 1),
+                                              'customer': 'c0'})
+        result = yield plan.execute(self.client)
+        self.assertEqual(sorted(item['id'] for item in result['Items']),
+                         ['2', '4'])
+        self.assertEqual(self.emulator.requests['Query'], 1)
+
+        plan = self.planner.plan(self.table, {'customer': 'c1',
+                                              'created': ('<', 5)},
+                                 attributes=['id', 'total'])
+        result = yield plan.execute(self.client)
+        self.assertEqual(result['Items'], [{'id': '1', 'total': 10},
+                                           {'id': '3', 'total': 30}])
+
+        plan = self.planner.plan(self.table, {'total': ('>=', 80)})
+        self.assertTrue(plan.scan)
+        result = yield plan.execute(self.client)
+        self.assertEqual(sorted(item['id'] for item in result['Items']),
+                         ['8', '9'])
+        self.assertEqual(self.emulator.requests['Scan'], 1)
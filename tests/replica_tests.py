@@ -0,0 +1,244 @@
+import time
+import unittest
+import uuid
+
+from tornado import gen
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import expressions
+from tornado_dynamodb import replica
+from tornado_dynamodb import utils
+
+
+class StoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.store = replica._Store({
+            'KeySchema': [{'AttributeName': 'name', 'KeyType': 'RANGE'},
+                          {'AttributeName': 'kind', 'KeyType': 'HASH'}]})
+        for name in ['apple', 'apricot', 'banana', 'avocado']:
+            self.put({'kind': 'fruit', 'name': name}, False)
+        self.store.sort()
+
+    def put(self, item, ordered=True):
+        self.store.put(utils.marshall(item), item, ordered)
+
+    def query(self, expression, values):
+        return [item['name'] for item in self.store.query(
+            None, expressions.key_conditions(
+                expression, {'#k': 'kind', '#n': 'name'},
+                utils.marshall(values)))]
+
+    def test_begins_with(self):
+        self.assertEqual(self.query('#k = :k AND begins_with(#n, :n)',
+                                    {':k': 'fruit', ':n': 'ap'}),
+                         ['apple', 'apricot'])
+        self.assertEqual(self.query('#k = :k AND begins_with(#n, :n)',
+                                    {':k': 'fruit', ':n': 'c'}), [])
+
+    def test_put_keeps_order(self):
+        self.put({'kind': 'fruit', 'name': 'apple', 'ripe': True})
+        self.put({'kind': 'fruit', 'name': 'cherry'})
+        self.store.delete(utils.marshall({'kind': 'fruit',
+                                          'name': 'banana'}))
+        self.assertEqual(self.query('#k = :k AND #n >= :n',
+                                    {':k': 'fruit', ':n': 'apricot'}),
+                         ['apricot', 'avocado', 'cherry'])
+        self.assertTrue(self.store.get({'kind': 'fruit',
+                                        'name': 'apple'})['ripe'])
+
+
+class TableReplicaTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TableReplicaTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start())
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable', {
+            'TableName': self.table,
+            'AttributeDefinitions': [
+                {'AttributeName': 'id', 'AttributeType': 'S'},
+                {'AttributeName': 'sort', 'AttributeType': 'N'},
+                {'AttributeName': 'group', 'AttributeType': 'S'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'sort', 'KeyType': 'RANGE'}],
+            'GlobalSecondaryIndexes': [{
+                'IndexName': 'by-group',
+                'KeySchema': [{'AttributeName': 'group', 'KeyType': 'HASH'},
+                              {'AttributeName': 'sort', 'KeyType': 'RANGE'}],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                          'WriteCapacityUnits': 5}}],
+            'ProvisionedThroughput': {'ReadCapacityUnits': 5,
+                                      'WriteCapacityUnits': 5}})
+        self.replica = replica.TableReplica(self.client, self.table,
+                                            refresh_interval=None)
+
+    def tearDown(self):
+        self.replica.stop()
+        self.emulator.stop()
+        super(TableReplicaTests, self).tearDown()
+
+    @gen.coroutine
+    def populate(self):
+        for key in 'ab':
+            for sort in range(10):
+                item = {'id': key, 'sort': sort, 'value': sort * 2}
+                if sort % 2:
+                    item['group'] = 'odd'
+                yield self.client.put_item(self.table, item)
+
+    @testing.gen_test
+    def test_load(self):
+        yield self.populate()
+        result = yield self.replica.load()
+        self.assertEqual(result, 20)
+        self.assertEqual(len(self.replica), 20)
+        self.assertEqual(self.emulator.requests['Scan'],
+                         replica.DEFAULT_SEGMENTS)
+        requests = sum(self.emulator.requests.values())
+        self.assertEqual(self.replica.get_item({'id': 'a', 'sort': 3}),
+                         {'id': 'a', 'sort': 3, 'value': 6, 'group': 'odd'})
+        self.assertIsNone(self.replica.get_item({'id': 'c', 'sort': 3}))
+        self.assertEqual(sum(self.emulator.requests.values()), requests)
+
+    @testing.gen_test
+    def test_query(self):
+        yield self.populate()
+        yield self.replica.load()
+        result = self.replica.query(
+            '#id = :id AND #sort BETWEEN :low AND :high',
+            {'#id': 'id', '#sort': 'sort'},
+            {':id': 'b', ':low': 2, ':high': 5})
+        self.assertEqual([item['sort'] for item in result['Items']],
+                         [2, 3, 4, 5])
+        self.assertEqual(result['Count'], 4)
+        result = self.replica.query(
+            '#id = :id AND #sort > :sort', {'#id': 'id', '#sort': 'sort'},
+            {':id': 'a', ':sort': 6}, scan_index_forward=False, limit=2)
+        self.assertEqual([item['sort'] for item in result['Items']], [9, 8])
+        result = self.replica.query('#id = :id', {'#id': 'id'},
+                                    {':id': 'c'})
+        self.assertEqual(result['Items'], [])
+
+    @testing.gen_test
+    def test_query_index(self):
+        yield self.populate()
+        yield self.replica.load()
+        result = self.replica.query(
+            '#g = :g AND #sort <= :sort', {'#g': 'group', '#sort': 'sort'},
+            {':g': 'odd', ':sort': 5}, index_name='by-group')
+        self.assertEqual(sorted((item['id'], item['sort'])
+                                for item in result['Items']),
+                         [('a', 1), ('a', 3), ('a', 5),
+                          ('b', 1), ('b', 3), ('b', 5)])
+        self.assertEqual([item['sort'] for item in result['Items']],
+                         [1, 1, 3, 3, 5, 5])
+
+    @testing.gen_test
+    def test_query_validation(self):
+        yield self.populate()
+        yield self.replica.load()
+        with self.assertRaises(exceptions.ValidationException):
+            self.replica.query('#id > :id', {'#id': 'id'}, {':id': 'a'})
+        with self.assertRaises(exceptions.ValidationException):
+            self.replica.query('#id = :id', {'#id': 'id'}, {':id': 'a'},
+                               index_name='missing')
+        with self.assertRaises(exceptions.ValidationException):
+            self.replica.get_item({'id': 'a'})
+
+    @testing.gen_test
+    def test_not_loaded(self):
+        with self.assertRaises(exceptions.StaleReplica):
+            self.replica.get_item({'id': 'a', 'sort': 1})
+
+    @testing.gen_test
+    def test_max_staleness(self):
+        yield self.populate()
+        stale = replica.TableReplica(self.client, self.table,
+                                     refresh_interval=None, max_staleness=60)
+        yield stale.load()
+        self.assertIsNotNone(stale.get_item({'id': 'a', 'sort': 1}))
+        stale.synchronized = time.time() - 120
+        with self.assertRaises(exceptions.StaleReplica):
+            stale.get_item({'id': 'a', 'sort': 1})
+        stale.on_records('shard', [])
+        self.assertIsNotNone(stale.get_item({'id': 'a', 'sort': 1}))
+
+    @testing.gen_test
+    def test_stream_records(self):
+        yield self.populate()
+        yield self.replica.load()
+        self.replica.on_records('shard', [
+            {'eventName': 'INSERT',
+             'dynamodb': {'Keys': {'id': {'S': 'c'}, 'sort': {'N': '0'}},
+                          'NewImage': {'id': {'S': 'c'}, 'sort': {'N': '0'},
+                                       'group': {'S': 'odd'}}}},
+            {'eventName': 'MODIFY',
+             'dynamodb': {'Keys': {'id': {'S': 'a'}, 'sort': {'N': '1'}},
+                          'NewImage': {'id': {'S': 'a'}, 'sort': {'N': '1'},
+                                       'value': {'N': '9'}}}},
+            {'eventName': 'REMOVE',
+             'dynamodb': {'Keys': {'id': {'S': 'a'}, 'sort': {'N': '3'}}}},
+            {'eventName': 'MODIFY',
+             'dynamodb': {'Keys': {'id': {'S': 'b'}, 'sort': {'N': '1'}}}}])
+        self.assertEqual(len(self.replica), 20)
+        self.assertEqual(self.replica.get_item({'id': 'a', 'sort': 1}),
+                         {'id': 'a', 'sort': 1, 'value': 9})
+        self.assertIsNone(self.replica.get_item({'id': 'a', 'sort': 3}))
+        result = self.replica.query('#g = :g', {'#g': 'group'},
+                                    {':g': 'odd'}, index_name='by-group')
+        self.assertEqual(sorted((item['id'], item['sort'])
+                                for item in result['Items']),
+                         [('a', 5), ('a', 7), ('a', 9), ('b', 1), ('b', 3),
+                          ('b', 5), ('b', 7), ('b', 9), ('c', 0)])
+        self.assertEqual(result['Items'][0]['id'], 'c')
+
+    @testing.gen_test
+    def test_keys_are_not_converted(self):
+        key = str(uuid.uuid4()).upper()
+        self.emulator.execute('PutItem', {
+            'TableName': self.table,
+            'Item': {'id': {'S': key}, 'sort': {'N': '2.50'},
+                     'group': {'S': key}}})
+        yield self.replica.load()
+        item = self.replica.get_item({'id': key, 'sort': 2.5})
+        self.assertEqual(item['sort'], 2.5)
+        self.assertIsNone(self.replica.get_item({'id': key.lower(),
+                                                 'sort': 2.5}))
+        result = self.replica.query('#g = :g', {'#g': 'group'}, {':g': key},
+                                    index_name='by-group')
+        self.assertEqual(result['Items'], [item])
+        self.replica.on_records('shard', [
+            {'eventName': 'REMOVE',
+             'dynamodb': {'Keys': {'id': {'S': key}, 'sort': {'N': '2.5'}}}}])
+        self.assertEqual(len(self.replica), 0)
+        self.assertIsNone(self.replica.get_item({'id': key, 'sort': 2.5}))
+
+    @testing.gen_test
+    def test_load_retries_throttling(self):
+        yield self.populate()
+        self.emulator.throttle(2, ['Scan'])
+        result = yield self.replica.load()
+        self.assertEqual(result, 20)
+
+    @testing.gen_test
+    def test_start_refreshes(self):
+        yield self.populate()
+        refreshing = replica.TableReplica(self.client, self.table,
+                                          refresh_interval=0.05)
+        yield refreshing.start()
+        try:
+            yield self.client.put_item(self.table, {'id': 'c', 'sort': 0})
+            for _attempt in range(50):
+                yield gen.sleep(0.01)
+                if refreshing.get_item({'id': 'c', 'sort': 0}):
+                    break
+            self.assertEqual(len(refreshing), 21)
+        finally:
+            refreshing.stop()
@@ -0,0 +1,195 @@
+import errno
+import socket
+
+import mock
+
+from tornado import concurrent
+from tornado import testing
+
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import routing
+
+
+def future_result(value):
+    future = concurrent.Future()
+    future.set_result(value)
+    return future
+
+
+def future_exception(error):
+    future = concurrent.Future()
+    future.set_exception(error)
+    return future
+
+
+class RoutingClientTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(RoutingClientTests, self).setUp()
+        self.east = mock.Mock()
+        self.west = mock.Mock()
+        self.client = routing.RoutingClient([('east', self.east),
+                                             ('west', self.west)],
+                                            write_endpoint='east',
+                                            failure_threshold=2)
+
+    def test_no_endpoints_raises(self):
+        with self.assertRaises(ValueError):
+            routing.RoutingClient([])
+
+    def test_duplicate_endpoints_raises(self):
+        with self.assertRaises(ValueError):
+            routing.RoutingClient([('a', self.east), ('a', self.west)])
+
+    def test_unknown_write_endpoint_raises(self):
+        with self.assertRaises(ValueError):
+            routing.RoutingClient([('a', self.east)], write_endpoint='b')
+
+    @testing.gen_test
+    def test_reads_go_to_lowest_latency(self):
+        self.client.endpoints[0].latency = 0.080
+        self.client.endpoints[1].latency = 0.010
+        self.west.get_item.return_value = future_result({'Item': {'id': 1}})
+        result = yield self.client.get_item('table', {'id': 1})
+        self.assertEqual(result, {'Item': {'id': 1}})
+        self.west.get_item.assert_called_once_with('table', {'id': 1})
+        self.east.get_item.assert_not_called()
+
+    @testing.gen_test
+    def test_error_rate_penalizes_endpoint(self):
+        self.client.endpoints[0].latency = 0.010
+        self.client.endpoints[0].error_rate = 0.5
+        self.client.endpoints[1].latency = 0.030
+        self.west.query.return_value = future_result({})
+        yield self.client.query('table')
+        self.west.query.assert_called_once_with('table')
+
+    @testing.gen_test
+    def test_writes_are_pinned(self):
+        self.client.endpoints[0].latency = 0.080
+        self.client.endpoints[1].latency = 0.010
+        self.east.put_item.return_value = future_result({})
+        yield self.client.put_item('table', {'id': 1})
+        self.east.put_item.assert_called_once_with('table', {'id': 1})
+        self.west.put_item.assert_not_called()
+
+    @testing.gen_test
+    def test_writes_are_not_failed_over_by_default(self):
+        self.east.put_item.return_value = future_exception(
+            exceptions.ProvisionedThroughputExceeded())
+        with self.assertRaises(exceptions.ProvisionedThroughputExceeded):
+            yield self.client.put_item('table', {'id': 1})
+        self.west.put_item.assert_not_called()
+        self.assertEqual(self.client.stats()['east']['failures'], 1)
+
+    @testing.gen_test
+    def test_unpinned_writes_are_not_failed_over_by_default(self):
+        client = routing.RoutingClient([('east', self.east),
+                                        ('west', self.west)])
+        client.endpoints[1].latency = 0.100
+        self.east.update_item.return_value = future_exception(
+            exceptions.TimeoutException())
+        with self.assertRaises(exceptions.TimeoutException):
+            yield client.update_item('table', {'id': 1})
+        self.west.update_item.assert_not_called()
+
+    @testing.gen_test
+    def test_write_failover(self):
+        client = routing.RoutingClient([('east', self.east),
+                                        ('west', self.west)],
+                                       write_endpoint='east',
+                                       write_failover=True)
+        self.east.put_item.return_value = future_exception(
+            exceptions.ThrottlingException())
+        self.west.put_item.return_value = future_result({})
+        yield client.put_item('table', {'id': 1})
+        self.west.put_item.assert_called_once_with('table', {'id': 1})
+        self.assertEqual(client.stats()['east']['failures'], 1)
+
+    @testing.gen_test
+    def test_write_failover_on_connection_refused(self):
+        client = routing.RoutingClient([('east', self.east),
+                                        ('west', self.west)],
+                                       write_endpoint='east',
+                                       write_failover=True)
+        self.east.put_item.return_value = future_exception(
+            socket.error(errno.ECONNREFUSED, 'Connection refused'))
+        self.west.put_item.return_value = future_result({})
+        yield client.put_item('table', {'id': 1})
+        self.west.put_item.assert_called_once_with('table', {'id': 1})
+
+    @testing.gen_test
+    def test_writes_that_may_be_applied_are_not_failed_over(self):
+        for error in (exceptions.TimeoutException(),
+                      exceptions.RequestException(),
+                      exceptions.InternalFailure(),
+                      socket.error(errno.ECONNRESET, 'Connection reset')):
+            client = routing.RoutingClient([('east', self.east),
+                                            ('west', self.west)],
+                                           write_failover=True)
+            client.endpoints[1].latency = 0.100
+            self.east.update_item.return_value = future_exception(error)
+            with self.assertRaises(type(error)):
+                yield client.update_item('table', {'id': 1})
+            self.west.update_item.assert_not_called()
+            self.assertEqual(client.stats()['east']['failures'], 1)
+
+    @testing.gen_test
+    def test_read_failover_marks_endpoint_down(self):
+        self.east.get_item.side_effect = lambda *a, **k: future_exception(
+            exceptions.ServiceUnavailable())
+        self.west.get_item.side_effect = lambda *a, **k: future_result({})
+        for _ in range(2):
+            self.client.endpoints[0].latency = 0.001
+            self.client.endpoints[1].latency = 0.100
+            yield self.client.get_item('table', {'id': 1})
+        self.assertFalse(self.client.endpoints[0].healthy(self.io_loop.time()))
+        self.east.get_item.reset_mock()
+        yield self.client.get_item('table', {'id': 1})
+        self.east.get_item.assert_not_called()
+
+    @testing.gen_test
+    def test_non_failover_error_is_raised(self):
+        self.client.endpoints[1].latency = 0.100
+        self.east.get_item.return_value = future_exception(
+            exceptions.ValidationException())
+        with self.assertRaises(exceptions.ValidationException):
+            yield self.client.get_item('table', {'id': 1})
+        self.west.get_item.assert_not_called()
+        self.assertEqual(self.client.stats()['east']['failures'], 0)
+        self.assertEqual(self.client.stats()['east']['requests'], 0)
+
+    @testing.gen_test
+    def test_all_endpoints_fail(self):
+        self.east.scan.return_value = future_exception(
+            exceptions.TimeoutException())
+        self.west.scan.return_value = future_exception(
+            exceptions.InternalFailure())
+        with self.assertRaises(exceptions.DynamoDBException):
+            yield self.client.scan('table')
+
+
+class EndpointTests(testing.AsyncTestCase):
+
+    def test_ewma_latency(self):
+        endpoint = routing.Endpoint('test', None, alpha=0.5)
+        endpoint.record_success(1.0)
+        endpoint.record_success(0.0)
+        self.assertAlmostEqual(endpoint.latency, 0.5)
+
+    def test_ewma_error_rate(self):
+        endpoint = routing.Endpoint('test', None, alpha=0.5)
+        endpoint.record_failure(1.0, 0)
+        self.assertAlmostEqual(endpoint.error_rate, 0.5)
+        endpoint.record_success(1.0)
+        self.assertAlmostEqual(endpoint.error_rate, 0.25)
+
+    def test_success_clears_down_state(self):
+        endpoint = routing.Endpoint('test', None, failure_threshold=1,
+                                    cooldown=10)
+        endpoint.record_failure(1.0, 100)
+        self.assertFalse(endpoint.healthy(105))
+        self.assertTrue(endpoint.healthy(111))
+        endpoint.record_failure(1.0, 100)
+        endpoint.record_success(1.0)
+        self.assertTrue(endpoint.healthy(100))
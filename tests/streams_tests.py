@@ -0,0 +1,271 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+import mock
+
+from tornado import concurrent
+from tornado import gen
+from tornado import httpclient
+from tornado import ioloop
+from tornado import testing
+
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import streams
+
+STREAM_ARN = 'arn:aws:dynamodb:us-east-1:000000000000:table/test/stream/1'
+
+
+def future_result(value):
+    future = concurrent.Future()
+    future.set_result(value)
+    return future
+
+
+def record(sequence, value):
+    return {'eventName': 'INSERT',
+            'dynamodb': {'SequenceNumber': sequence,
+                         'Keys': {'id': {'S': str(value)}},
+                         'NewImage': {'id': {'S': str(value)},
+                                      'count': {'N': '1'}}}}
+
+
+class FakeStream(object):
+    """Serves shards and their records for the consumer"""
+
+    def __init__(self, shards, records, open_shards=()):
+        self.shards = shards
+        self.records = records
+        self.open_shards = open_shards
+        self.reads = []
+
+    def describe_stream(self, stream_arn, exclusive_start_shard_id=None):
+        if exclusive_start_shard_id is None:
+            return future_result({'Shards': self.shards[:1],
+                                  'LastEvaluatedShardId': 'page'})
+        return future_result({'Shards': self.shards[1:]})
+
+    def get_shard_iterator(self, stream_arn, shard_id, iterator_type,
+                           sequence_number=None):
+        offset = 0
+        if sequence_number:
+            sequences = [r['dynamodb']['SequenceNumber']
+                         for r in self.records[shard_id]]
+            offset = sequences.index(sequence_number) + 1
+        return future_result('{}:{}'.format(shard_id, offset))
+
+    def get_records(self, iterator, limit=None):
+        shard_id, offset = iterator.split(':')
+        offset = int(offset)
+        self.reads.append(shard_id)
+        records = self.records[shard_id][offset:offset + limit]
+        result = {'Records': records}
+        if offset + limit < len(self.records[shard_id]) or \
+                shard_id in self.open_shards:
+            result['NextShardIterator'] = '{}:{}'.format(shard_id,
+                                                         offset + limit)
+        return future_result(result)
+
+
+class DynamoDBStreamsTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(DynamoDBStreamsTests, self).setUp()
+        self.client = streams.DynamoDBStreams(region='us-west-2')
+
+    def test_endpoint(self):
+        self.assertEqual(self.client._endpoint_url,
+                         'https://streams.dynamodb.us-west-2.amazonaws.com')
+
+    def test_headers(self):
+        self.assertEqual(self.client._headers('GetRecords')['x-amz-target'],
+                         'DynamoDBStreams_20120810.GetRecords')
+
+    def test_ioloop_is_resolved_per_call(self):
+        self.assertIs(self.client.ioloop, self.io_loop)
+        other = ioloop.IOLoop()
+        other.make_current()
+        try:
+            self.assertIs(self.client.ioloop, other)
+        finally:
+            self.io_loop.make_current()
+            other.close()
+
+    def test_invalid_iterator_type(self):
+        with self.assertRaises(ValueError):
+            self.client.get_shard_iterator(STREAM_ARN, 'shard', 'INVALID')
+
+    @testing.gen_test
+    def test_get_shard_iterator(self):
+        with mock.patch.object(self.client, '_fetch') as fetch:
+            fetch.return_value = future_result(None)
+            with mock.patch.object(self.client, '_process_response') as pr:
+                pr.return_value = {'ShardIterator': 'iterator'}
+                result = yield self.client.get_shard_iterator(
+                    STREAM_ARN, 'shard', streams.ITERATOR_AFTER_SEQUENCE_NUMBER,
+                    '100')
+        self.assertEqual(result, 'iterator')
+        fetch.assert_called_once_with(
+            'GetShardIterator',
+            {'StreamArn': STREAM_ARN, 'ShardId': 'shard',
+             'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER',
+             'SequenceNumber': '100'}, None)
+
+    @testing.gen_test
+    def test_expired_iterator_is_mapped(self):
+        body = json.dumps({
+            '__type':
+                'com.amazonaws.dynamodb.v20120810#ExpiredIteratorException',
+            'message': 'expired'}).encode('utf-8')
+        request = httpclient.HTTPRequest('http://localhost/')
+        future = concurrent.Future()
+        future.set_exception(httpclient.HTTPError(
+            400, response=httpclient.HTTPResponse(
+                request, 400, buffer=io.BytesIO(body))))
+        with mock.patch('tornado_dynamodb.transport.Transport.fetch') as fetch:
+            fetch.return_value = future
+            with self.assertRaises(exceptions.ExpiredIteratorException):
+                yield self.client.get_records('iterator')
+
+
+class UnmarshallRecordTests(testing.AsyncTestCase):
+
+    def test_unmarshall_record(self):
+        value = uuid.uuid4()
+        result = streams.unmarshall_record(record('1', value))
+        self.assertEqual(result['dynamodb']['Keys'], {'id': value})
+        self.assertEqual(result['dynamodb']['NewImage'],
+                         {'id': value, 'count': 1})
+
+
+class FileCheckpointStoreTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(FileCheckpointStoreTests, self).setUp()
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'checkpoints.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super(FileCheckpointStoreTests, self).tearDown()
+
+    def test_round_trip(self):
+        store = streams.FileCheckpointStore(self.filename)
+        self.assertIsNone(store.get(STREAM_ARN, 'shard-1'))
+        store.set(STREAM_ARN, 'shard-1', '100')
+        store = streams.FileCheckpointStore(self.filename)
+        self.assertEqual(store.get(STREAM_ARN, 'shard-1'), '100')
+        with open(self.filename) as handle:
+            self.assertEqual(json.load(handle),
+                             {STREAM_ARN: {'shard-1': '100'}})
+
+
+class StreamConsumerTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(StreamConsumerTests, self).setUp()
+        self.batches = []
+        self.shards = [{'ShardId': 'parent'},
+                       {'ShardId': 'child', 'ParentShardId': 'parent'},
+                       {'ShardId': 'other', 'ParentShardId': 'trimmed'}]
+        self.records = {
+            'parent': [record(str(i), i) for i in range(5)],
+            'child': [record(str(i), i) for i in range(5, 8)],
+            'other': [record(str(i), i) for i in range(100, 102)]}
+
+    @gen.coroutine
+    def on_records(self, shard_id, records):
+        yield gen.moment
+        self.batches.append((shard_id, [r['dynamodb']['SequenceNumber']
+                                        for r in records]))
+
+    def consumer(self, stream, store=None, **kwargs):
+        return streams.StreamConsumer(stream, STREAM_ARN, self.on_records,
+                                      store, batch_size=2, poll_interval=0,
+                                      describe_interval=0.01, **kwargs)
+
+    def test_invalid_iterator_type(self):
+        with self.assertRaises(ValueError):
+            streams.StreamConsumer(None, STREAM_ARN, None,
+                                   iterator_type='AT_SEQUENCE_NUMBER')
+
+    @testing.gen_test
+    def test_consumes_all_shards(self):
+        store = streams.CheckpointStore()
+        consumer = self.consumer(FakeStream(self.shards, self.records), store)
+        yield consumer.run()
+        self.assertEqual(consumer.finished_shards,
+                         {'parent', 'child', 'other'})
+        for shard_id, records in self.records.items():
+            sequences = []
+            for batch_shard_id, batch in self.batches:
+                if batch_shard_id == shard_id:
+                    sequences += batch
+            self.assertEqual(sequences,
+                             [r['dynamodb']['SequenceNumber']
+                              for r in records])
+            self.assertEqual(store.get(STREAM_ARN, shard_id),
+                             streams.SHARD_END)
+        self.assertIn(('parent', ['0', '1']), self.batches)
+
+    @testing.gen_test
+    def test_child_waits_for_parent(self):
+        stream = FakeStream(self.shards, self.records)
+        yield self.consumer(stream).run()
+        last_parent = max(i for i, s in enumerate(stream.reads)
+                          if s == 'parent')
+        first_child = stream.reads.index('child')
+        self.assertGreater(first_child, last_parent)
+
+    @testing.gen_test
+    def test_resumes_from_checkpoint(self):
+        store = streams.CheckpointStore()
+        store.set(STREAM_ARN, 'parent', streams.SHARD_END)
+        store.set(STREAM_ARN, 'child', '5')
+        store.set(STREAM_ARN, 'other', '100')
+        yield self.consumer(FakeStream(self.shards, self.records),
+                            store).run()
+        self.assertEqual(sorted(self.batches),
+                         [('child', ['6', '7']), ('other', ['101'])])
+
+    @testing.gen_test
+    def test_stop(self):
+        stream = FakeStream(self.shards[:1], self.records,
+                            open_shards=('parent',))
+        consumer = self.consumer(stream)
+        future = consumer.run()
+        while len(self.batches) < 3:
+            yield gen.sleep(0.001)
+        consumer.stop()
+        yield future
+        self.assertEqual(consumer.finished_shards, set())
+
+    @testing.gen_test
+    def test_records_are_unmarshalled(self):
+        images = []
+
+        def on_records(shard_id, records):
+            images.extend(r['dynamodb']['NewImage'] for r in records)
+
+        for raw, image in ((False, {'id': '0', 'count': 1}),
+                           (True, {'id': {'S': '0'}, 'count': {'N': '1'}})):
+            del images[:]
+            records = {'parent': [record('0', 0)]}
+            yield streams.StreamConsumer(
+                FakeStream(self.shards[:1], records), STREAM_ARN,
+                on_records, poll_interval=0, raw=raw).run()
+            self.assertEqual(images, [image])
+
+    @testing.gen_test
+    def test_callback_error_is_raised(self):
+        def on_records(shard_id, records):
+            raise ValueError('bad record')
+
+        consumer = streams.StreamConsumer(
+            FakeStream(self.shards, self.records), STREAM_ARN, on_records,
+            poll_interval=0, describe_interval=0.01)
+        with self.assertRaises(ValueError):
+            yield consumer.run()
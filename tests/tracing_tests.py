@@ -0,0 +1,247 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+
+from tornado import gen
+from tornado import testing
+from tornado import web
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import tracing
+
+
+class RecordingTracer(tracing.Tracer):
+
+    def __init__(self):
+        self.spans = []
+        self.parent = None
+
+    def current_span(self):
+        return self.parent
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def named(self, name):
+        return [span for span in self.spans if span.name == name]
+
+
+class SpanTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = RecordingTracer()
+
+    def test_child(self):
+        parent = self.tracer.start_span('parent', attributes={'a': 1})
+        child = parent.child('child')
+        self.assertEqual(child.trace_id, parent.trace_id)
+        self.assertEqual(child.parent_id, parent.span_id)
+        self.assertNotEqual(child.span_id, parent.span_id)
+        self.assertEqual(len(parent.trace_id), 32)
+        self.assertEqual(len(parent.span_id), 16)
+        self.assertEqual(parent.children, 1)
+        child.finish()
+        parent.finish()
+        parent.finish()
+        self.assertEqual(self.tracer.spans, [child, parent])
+        self.assertGreaterEqual(parent.duration, child.duration)
+
+    def test_current_span_is_parent(self):
+        self.tracer.parent = self.tracer.start_span('request')
+        span = self.tracer.start_span('operation')
+        self.assertEqual(span.parent_id, self.tracer.parent.span_id)
+
+    def test_context_manager_records_error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.start_span('failing') as span:
+                span.add('count', 2)
+                span.add('count', 3)
+                raise ValueError('failed')
+        self.assertEqual(span.attributes, {'count': 5,
+                                           'error.type': 'ValueError'})
+        self.assertEqual(self.tracer.spans, [span])
+
+    def test_base_tracer_discards_spans(self):
+        tracer = tracing.Tracer()
+        span = tracer.start_span('span')
+        span.finish()
+        self.assertIsNone(span.parent_id)
+        tracer.close()
+
+
+class FileTracerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'spans.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_spans_are_appended(self):
+        tracer = tracing.FileTracer(self.path)
+        with tracer.start_span('parent', attributes={'table': 'a'}) as span:
+            span.child('child').finish()
+        tracer.close()
+        span.child('closed').finish()
+        with open(self.path) as handle:
+            spans = [json.loads(line) for line in handle]
+        self.assertEqual([value['name'] for value in spans],
+                         ['child', 'parent'])
+        self.assertEqual(spans[0]['parent_id'], spans[1]['span_id'])
+        self.assertEqual(spans[1]['attributes'], {'table': 'a'})
+        self.assertIsNone(spans[1]['parent_id'])
+
+
+class ZipkinTracerTests(testing.AsyncHTTPTestCase):
+
+    def get_app(self):
+        self.received = []
+        received = self.received
+
+        class Collector(web.RequestHandler):
+
+            def post(self):
+                received.extend(json.loads(self.request.body.decode('utf-8')))
+                self.set_status(202)
+
+        return web.Application([('/api/v2/spans', Collector)])
+
+    @testing.gen_test
+    def test_spans_are_sent(self):
+        tracer = tracing.ZipkinTracer(self.get_url('/api/v2/spans'),
+                                      'orders', batch_size=3, interval=60)
+        parent = tracer.start_span('parent', attributes={'count': 2})
+        parent.child('child').finish()
+        parent.finish()
+        self.assertEqual(self.received, [])
+        result = yield tracer.close()
+        self.assertEqual(result, 2)
+        self.assertEqual(len(self.received), 2)
+        child, parent = self.received
+        self.assertEqual(child['parentId'], parent['id'])
+        self.assertEqual(child['traceId'], parent['traceId'])
+        self.assertNotIn('parentId', parent)
+        self.assertEqual(parent['tags'], {'count': '2'})
+        self.assertEqual(parent['localEndpoint'], {'serviceName': 'orders'})
+        self.assertEqual(parent['kind'], 'CLIENT')
+
+    @testing.gen_test
+    def test_full_batches_are_sent(self):
+        tracer = tracing.ZipkinTracer(self.get_url('/api/v2/spans'),
+                                      batch_size=2, interval=60)
+        for _offset in range(4):
+            tracer.start_span('span').finish()
+        for _attempt in range(50):
+            yield gen.sleep(0.01)
+            if tracer.sent == 4:
+                break
+        self.assertEqual(len(self.received), 4)
+
+    @testing.gen_test
+    def test_errors_drop_spans(self):
+        tracer = tracing.ZipkinTracer(self.get_url('/missing'),
+                                      interval=60, max_pending=2)
+        for _offset in range(3):
+            tracer.start_span('span').finish()
+        self.assertEqual(tracer.dropped, 1)
+        result = yield tracer.flush()
+        self.assertEqual(result, 0)
+        self.assertEqual(tracer.dropped, 3)
+
+
+class ClientTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(ClientTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.tracer = RecordingTracer()
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), tracer=self.tracer)
+        self.table = str(uuid.uuid4())
+        self.emulator.execute('CreateTable', {
+            'TableName': self.table,
+            'AttributeDefinitions': [{'AttributeName': 'id',
+                                      'AttributeType': 'S'},
+                                     {'AttributeName': 'sort',
+                                      'AttributeType': 'N'}],
+            'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'sort', 'KeyType': 'RANGE'}]})
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(ClientTests, self).tearDown()
+
+    @testing.gen_test
+    def test_operation_spans(self):
+        for sort in range(3):
+            yield self.client.put_item(self.table, {'id': 'a', 'sort': sort})
+        self.tracer.parent = self.tracer.start_span('handler')
+        result = yield self.client.query(
+            self.table, key_condition_expression='#id = :id',
+            expression_attribute_names={'#id': 'id'},
+            expression_attribute_values={':id': 'a'},
+            return_consumed_capacity='TOTAL')
+        self.assertEqual(result['Count'], 3)
+        span = self.tracer.named('DynamoDB.Query')[0]
+        self.assertEqual(span.parent_id, self.tracer.parent.span_id)
+        self.assertEqual(span.attributes['aws.dynamodb.table_name'],
+                         self.table)
+        self.assertEqual(span.attributes['aws.dynamodb.item_count'], 3)
+        self.assertIn('aws.dynamodb.consumed_capacity', span.attributes)
+        self.assertGreater(span.attributes['http.response_bytes'], 0)
+        attempt = self.tracer.named('attempt')[-1]
+        self.assertEqual(attempt.parent_id, span.span_id)
+        self.assertEqual(attempt.attributes['http.status_code'], 200)
+        self.assertEqual(attempt.attributes['http.response_bytes'],
+                         span.attributes['http.response_bytes'])
+        self.assertEqual(len(self.tracer.named('DynamoDB.PutItem')), 3)
+
+    @testing.gen_test
+    def test_error_type(self):
+        with self.assertRaises(exceptions.ResourceNotFound):
+            yield self.client.get_item('missing', {'id': 'a', 'sort': 1})
+        span = self.tracer.named('DynamoDB.GetItem')[0]
+        self.assertEqual(span.attributes['error.type'], 'ResourceNotFound')
+        self.assertEqual(self.tracer.named('attempt')[0].attributes[
+            'error.type'], 'ResourceNotFound')
+
+    @testing.gen_test
+    def test_pages(self):
+        for sort in range(5):
+            yield self.client.put_item(self.table, {'id': 'a', 'sort': sort})
+        result = yield self.client.count_scan(self.table, page_size=2)
+        self.assertEqual(result['Count'], 5)
+        span = self.tracer.named('DynamoDB.Scan')[0]
+        self.assertEqual(span.attributes['aws.dynamodb.item_count'], 5)
+        children = [child for child in self.tracer.spans
+                    if child.parent_id == span.span_id]
+        self.assertEqual([child.name for child in children],
+                         ['attempt', 'page', 'page'])
+        self.assertEqual([child.attributes['attempt'] for child in children],
+                         [1, 2, 3])
+
+    @testing.gen_test
+    def test_retries(self):
+        self.emulator.inject_error(exceptions.InternalFailure, 1,
+                                   ['TransactWriteItems'])
+        yield self.client.transact_write_items([
+            {'Put': {'TableName': self.table,
+                     'Item': {'id': 'a', 'sort': 1}}}])
+        span = self.tracer.named('DynamoDB.TransactWriteItems')[0]
+        self.assertEqual(span.attributes['aws.dynamodb.table_name'],
+                         self.table)
+        self.assertNotIn('error.type', span.attributes)
+        children = [child for child in self.tracer.spans
+                    if child.parent_id == span.span_id]
+        self.assertEqual([child.name for child in children],
+                         ['attempt', 'retry'])
+        self.assertEqual(children[0].attributes['error.type'],
+                         'RequestException')
+        self.assertEqual(children[0].attributes['http.status_code'], 500)
+        self.assertEqual(children[1].attributes['http.status_code'], 200)
@@ -0,0 +1,190 @@
+import os
+import threading
+import unittest
+
+import mock
+
+from tornado import concurrent
+from tornado import gen
+from tornado import httpclient
+from tornado import ioloop
+from tornado import testing
+
+import tornado_dynamodb
+from tornado_dynamodb import emulator
+from tornado_dynamodb import transport
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.pending = []
+        self.requests = []
+
+    def fetch(self, request, **kwargs):
+        self.requests.append((request, kwargs))
+        future = concurrent.Future()
+        self.pending.append(future)
+        return future
+
+    def complete(self, code=200):
+        request = httpclient.HTTPRequest('http://localhost/')
+        self.pending.pop(0).set_result(
+            httpclient.HTTPResponse(request, code))
+
+    def close(self):
+        pass
+
+
+class TransportTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(TransportTests, self).setUp()
+        self.client = FakeClient()
+        with mock.patch.object(transport.Transport, '_create_client',
+                               return_value=self.client):
+            self.transport = transport.Transport(max_clients=10,
+                                                 max_host_connections=2)
+
+    @testing.gen_test
+    def test_fetch_counts_requests(self):
+        future = self.transport.fetch('http://localhost/', raise_error=False)
+        yield gen.moment
+        self.assertEqual(self.transport.stats()['in_flight'], 1)
+        self.client.complete()
+        response = yield future
+        self.assertEqual(response.code, 200)
+        self.assertDictEqual(self.transport.stats(),
+                             {'requests': 1, 'opened': 1, 'reused': 0,
+                              'in_flight': 0, 'idle': 0})
+        self.assertEqual(self.client.requests[0][1], {'raise_error': False})
+
+    @testing.gen_test
+    def test_max_host_connections(self):
+        futures = [self.transport.fetch('http://localhost/')
+                   for _ in range(3)]
+        futures.append(self.transport.fetch('http://otherhost/'))
+        yield gen.moment
+        self.assertEqual(len(self.client.requests), 3)
+        self.client.complete()
+        yield futures[0]
+        yield gen.moment
+        self.assertEqual(len(self.client.requests), 4)
+        for _ in range(3):
+            self.client.complete()
+        yield futures
+
+    @testing.gen_test
+    def test_warm_up(self):
+        future = self.transport.warm_up('http://localhost/', 2)
+        yield gen.moment
+        self.client.complete()
+        self.client.complete(599)
+        self.assertEqual((yield future), 1)
+
+    def test_keep_alive_counters(self):
+        self.transport._on_connections(1)
+        self.transport._on_connections(0)
+        self.transport._on_connections(0)
+        stats = self.transport.stats()
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['reused'], 2)
+
+    @unittest.skipIf(transport.pycurl is not None, 'pycurl is installed')
+    def test_curl_transport_requires_pycurl(self):
+        with self.assertRaises(ImportError):
+            transport.CurlTransport()
+
+
+class DynamoDBTransportTests(testing.AsyncTestCase):
+
+    def test_default_transport(self):
+        client = tornado_dynamodb.DynamoDB(max_clients=5)
+        self.assertIsInstance(client.transport, transport.Transport)
+        self.assertIs(client._client, client.transport)
+        self.assertEqual(client.transport.max_clients, 5)
+
+    def test_custom_transport(self):
+        value = transport.Transport(max_clients=2)
+        client = tornado_dynamodb.DynamoDB(transport=value)
+        self.assertIs(client._client, value)
+
+    def test_warm_up(self):
+        client = tornado_dynamodb.DynamoDB(endpoint='http://localhost:7777')
+        with mock.patch.object(client.transport, 'warm_up') as warm_up:
+            client.warm_up(3)
+            warm_up.assert_called_once_with('http://localhost:7777', 3)
+
+    def test_copy(self):
+        value = transport.Transport(max_clients=3, max_host_connections=2,
+                                    defaults={'request_timeout': 5})
+        copy = value.copy()
+        self.assertIsNot(copy, value)
+        self.assertEqual(copy.max_clients, 3)
+        self.assertEqual(copy.max_host_connections, 2)
+        self.assertEqual(copy.client.defaults['request_timeout'], 5)
+        self.assertIs(copy.io_loop, self.io_loop)
+
+
+class MultipleIOLoopTests(testing.AsyncTestCase):
+
+    def setUp(self):
+        super(MultipleIOLoopTests, self).setUp()
+        self.emulator = emulator.Emulator()
+        self.transport = transport.Transport(max_clients=4)
+        self.client = tornado_dynamodb.DynamoDB(
+            endpoint=self.emulator.start(), transport=self.transport)
+
+    def tearDown(self):
+        self.emulator.stop()
+        super(MultipleIOLoopTests, self).tearDown()
+
+    @testing.gen_test
+    def test_client_used_from_another_thread(self):
+        result = {}
+
+        def run():
+            loop = ioloop.IOLoop()
+            loop.make_current()
+            try:
+                result['tables'] = loop.run_sync(self.client.list_tables)
+                result['transport'] = self.client.transport
+                result['ioloop'] = self.client.ioloop
+                self.client.close()
+            except Exception as error:
+                result['error'] = error
+            finally:
+                loop.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        while thread.is_alive():
+            yield gen.sleep(0.01)
+        self.assertNotIn('error', result)
+        self.assertEqual(result['tables'], {'TableNames': []})
+        self.assertIsNot(result['transport'], self.transport)
+        self.assertEqual(result['transport'].max_clients, 4)
+        self.assertIsNot(result['ioloop'], self.io_loop)
+        self.assertIs(self.client.transport, self.transport)
+        self.assertIs(self.client.ioloop, self.io_loop)
+        result = yield self.client.list_tables()
+        self.assertEqual(result, {'TableNames': []})
+
+    @testing.gen_test
+    def test_transports_are_discarded_after_fork(self):
+        yield self.client.list_tables()
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            with mock.patch.object(self.transport, 'close') as close:
+                self.assertIsNot(self.client.transport, self.transport)
+                self.assertFalse(close.called)
+                result = yield self.client.list_tables()
+        self.assertEqual(result, {'TableNames': []})
+
+    @testing.gen_test
+    def test_close(self):
+        with mock.patch.object(self.transport, 'close') as close:
+            self.client.close()
+            close.assert_called_once_with()
+        self.assertIsNot(self.client.transport, self.transport)
+        result = yield self.client.list_tables()
+        self.assertEqual(result, {'TableNames': []})
@@ -1,8 +1,10 @@
 import datetime
+import decimal
 import unittest
 import uuid
 
 import arrow
+import mock
 
 from tornado_dynamodb import utils
 
@@ -69,9 +71,44 @@ class MarshallTests(unittest.TestCase):
     def test_value_error_raised_on_unsupported_type(self):
         self.assertRaises(ValueError, utils.marshall, {'key': self})
 
+    def test_arrow_is_not_imported(self):
+        self.assertFalse(hasattr(utils, 'arrow'))
+        with mock.patch.dict('sys.modules', {'arrow': None}):
+            self.assertRaises(ValueError, utils.marshall, {'key': self})
+
+    def test_uuid_is_not_imported(self):
+        self.assertFalse(hasattr(utils, 'uuid'))
+        with mock.patch.dict('sys.modules', {'uuid': None}):
+            self.assertEqual(utils.unmarshall({'key': {'S': 'value'}}),
+                             {'key': 'value'})
+            self.assertRaises(ValueError, utils.marshall, {'key': self})
+
     def test_value_error_raised_on_mixed_set(self):
         self.assertRaises(ValueError, utils.marshall, {'key': {1, 'two', 3}})
 
+    def test_numbers(self):
+        self.assertEqual(utils.marshall({'float': 0.1,
+                                         'decimal': decimal.Decimal('1.10'),
+                                         'set': {1, 2.5,
+                                                 decimal.Decimal('3.25')}}),
+                         {'float': {'N': '0.1'},
+                          'decimal': {'N': '1.1'},
+                          'set': {'NS': ['1', '2.5', '3.25']}})
+
+    def test_numbers_without_exponent(self):
+        self.assertEqual(utils.marshall({'large': 1e20, 'small': 1e-07,
+                                         'decimal': decimal.Decimal('1E+2'),
+                                         'set': {1e20}}),
+                         {'large': {'N': '100000000000000000000'},
+                          'small': {'N': '0.0000001'},
+                          'decimal': {'N': '100'},
+                          'set': {'NS': ['100000000000000000000']}})
+
+    def test_value_error_raised_on_non_finite_number(self):
+        self.assertRaises(ValueError, utils.marshall, {'key': float('nan')})
+        self.assertRaises(ValueError, utils.marshall,
+                          {'key': decimal.Decimal('Infinity')})
+
 
 class UnmarshallTests(unittest.TestCase):
     maxDiff = None
@@ -118,5 +155,73 @@ class UnmarshallTests(unittest.TestCase):
         }
         self.assertDictEqual(expectation, utils.unmarshall(value))
 
+    def test_exponent_numbers(self):
+        self.assertEqual(utils.unmarshall({'large': {'N': '1e+20'},
+                                           'small': {'N': '1E-7'},
+                                           'set': {'NS': ['1E+2', '3']}}),
+                         {'large': decimal.Decimal('1e+20'),
+                          'small': decimal.Decimal('1E-7'),
+                          'set': {decimal.Decimal(100), 3}})
+
     def test_value_error_raised_on_unsupported_type(self):
         self.assertRaises(ValueError, utils.unmarshall, {'key': {'T': 1}})
+
+
+class ItemSizeTests(unittest.TestCase):
+
+    def test_item_size(self):
+        item = {'id': 'foo', 'count': 12345, 'price': 100,
+                'enabled': True, 'empty': None, 'data': b'\x00\x01',
+                'tags': {'a', 'bc'}, 'info': {'name': 'é'},
+                'list': [1, 'ab']}
+        expected = ((2 + 3) + (5 + 4) + (5 + 2) + (7 + 1) + (5 + 1) +
+                    (4 + 2) + (4 + 3) + (4 + 3 + 1 + 4 + 2) +
+                    (4 + 3 + 1 + 2 + 1 + 2))
+        self.assertEqual(utils.item_size(item), expected)
+        marshalled, size = utils.marshall_with_size(item)
+        self.assertEqual(marshalled, utils.marshall(item))
+        self.assertEqual(size, expected)
+
+    def test_marshalled_item_size(self):
+        item = {'id': {'S': 'foo'}, 'data': {'B': 'AAE='},
+                'numbers': {'NS': ['1', '1.50']},
+                'nested': {'L': [{'M': {'a': {'NULL': True}}}]}}
+        self.assertEqual(utils.item_size(item, marshalled=True),
+                         (2 + 3) + (4 + 2) + (7 + 2 + 2) +
+                         (6 + 3 + 1 + 3 + 1 + 1 + 1))
+
+    def test_capacity_units(self):
+        self.assertEqual(utils.read_capacity_units(100), 0.5)
+        self.assertEqual(utils.read_capacity_units(4097, True), 2.0)
+        self.assertEqual(utils.read_capacity_units(100, True, True), 2.0)
+        self.assertEqual(utils.write_capacity_units(1025), 2.0)
+        self.assertEqual(utils.write_capacity_units(10, True), 2.0)
+
+    def test_estimate_capacity(self):
+        items = [{'id': 'x' * 3000}, {'id': 'y' * 3000}]
+        self.assertEqual(utils.estimate_capacity('Query', items), 1.0)
+        self.assertEqual(utils.estimate_capacity('BatchGetItem', items,
+                                                 True), 2.0)
+        self.assertEqual(utils.estimate_capacity('PutItem', items[:1]), 3.0)
+        self.assertEqual(
+            utils.estimate_capacity('TransactWriteItems', items), 12.0)
+        with self.assertRaises(ValueError):
+            utils.estimate_capacity('CreateTable', items)
+
+    def test_batches(self):
+        items = [{'id': str(index)} for index in range(60)]
+        self.assertEqual([len(batch) for batch in utils.batches(items)],
+                         [25, 25, 10])
+        items = [{'id': 'x' * 98} for _ in range(5)]
+        self.assertEqual([len(batch) for batch in
+                          utils.batches(items, max_size=250)], [2, 2, 1])
+
+
+class KeyNamesTests(unittest.TestCase):
+
+    def test_partition_key_first(self):
+        self.assertEqual(utils.key_names(
+            [{'AttributeName': 'sort', 'KeyType': 'RANGE'},
+             {'AttributeName': 'id', 'KeyType': 'HASH'}]), ['id', 'sort'])
+        self.assertEqual(utils.key_names(
+            [{'AttributeName': 'id', 'KeyType': 'HASH'}]), ['id'])
@@ -7,17 +7,28 @@ fairly closely, it does try and make some of the more mundane tasks like
 data marshalling and demarshalling for you.
 
 """
+import collections
+import datetime
+import functools
+import heapq
 import json
 import logging
+import os
+import sys
+import threading
+import weakref
 
 from tornado_aws import client
+from tornado_aws import config
 from tornado_aws import exceptions as aws_exceptions
 
 from tornado import concurrent
+from tornado import gen
 from tornado import httpclient
 from tornado import ioloop
 
 from tornado_dynamodb import exceptions
+from tornado_dynamodb import transport as _transport
 from tornado_dynamodb import utils
 
 __version__ = '0.1.0'
@@ -39,8 +50,491 @@ STREAM_VIEW_KEYS_ONLY = 'KEYS_ONLY'
 _STREAM_VIEW_TYPES = (STREAM_VIEW_NEW_IMAGE, STREAM_VIEW_OLD_IMAGE,
                       STREAM_VIEW_NEW_AND_OLD_IMAGES, STREAM_VIEW_KEYS_ONLY)
 
+# Transient TransactWriteItems failures that are retried with the same token
+_TRANSACT_RETRY_BACKOFF = 0.05
+_TRANSACT_RETRY_EXCEPTIONS = (exceptions.InternalFailure,
+                              exceptions.RequestException,
+                              exceptions.ServiceUnavailable,
+                              exceptions.TimeoutException,
+                              exceptions.TransactionInProgress)
 
-class DynamoDB(client.AsyncAWSClient):
+
+class _AsyncClient(client.AsyncAWSClient):
+    """The request path shared by :py:class:`~tornado_dynamodb.DynamoDB` and
+    :py:class:`~tornado_dynamodb.streams.DynamoDBStreams`: the IOLoop is
+    resolved for each call, each IOLoop gets its own transport and
+    credentials, and the responses of :py:meth:`_execute` are processed in a
+    done callback of the request future.
+
+    :param str profile: Specify the configuration profile name
+    :param str region: The AWS region to make requests to
+    :param str access_key: The access key
+    :param str secret_key: The secret access key
+    :param str endpoint: Override the base endpoint URL
+    :param int max_clients: Max simultaneous requests
+    :param transport: The HTTP transport to use
+    :type transport: :py:class:`~tornado_dynamodb.transport.Transport`
+    :param executor: Decode and unmarshall large responses in this executor
+    :type executor: :py:class:`concurrent.futures.Executor`
+    :param int offload_threshold: The response body size in bytes from
+        which responses are decoded in the ``executor``
+    :param tracer: Record a span for each operation and HTTP request
+    :type tracer: :py:class:`~tornado_dynamodb.tracing.Tracer`
+
+    """
+    def __init__(self, profile, region, access_key, secret_key, endpoint,
+                 max_clients, transport=None, executor=None,
+                 offload_threshold=65536, tracer=None):
+        self.executor = executor
+        self.offload_threshold = offload_threshold
+        self.tracer = tracer
+        self._credentials = access_key, secret_key
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._states = weakref.WeakKeyDictionary()
+        self._transport = transport or _transport.Transport(max_clients)
+        self._transport_pid = self._pid
+        super(_AsyncClient, self).__init__('dynamodb', profile, region,
+                                           access_key, secret_key, endpoint,
+                                           max_clients)
+        self._signing_key_cache = None, None
+
+    @property
+    def ioloop(self):
+        """The IOLoop of the current thread.
+
+        :rtype: tornado.ioloop.IOLoop
+
+        """
+        return ioloop.IOLoop.current()
+
+    @property
+    def transport(self):
+        """The transport used for requests made on the current IOLoop.
+
+        :rtype: :py:class:`~tornado_dynamodb.transport.Transport`
+
+        """
+        return self._state().transport
+
+    def close(self):
+        """Close the transport used on the current IOLoop. A new transport
+        is created if the client is used on the IOLoop again.
+
+        """
+        with self._lock:
+            state = self._states.pop(ioloop.IOLoop.current(), None)
+        if state:
+            state.transport.close()
+
+    @property
+    def _auth_config(self):
+        """The credentials used on the current IOLoop, which load remote
+        credentials with the transport's HTTP client.
+
+        :rtype: :py:class:`tornado_aws.config.Authorization`
+
+        """
+        state = self._state()
+        if state.auth_config is None:
+            access_key, secret_key = self._credentials
+            state.auth_config = config.Authorization(
+                self._profile, access_key, secret_key,
+                state.transport.client)
+        return state.auth_config
+
+    @_auth_config.setter
+    def _auth_config(self, value):
+        """The base class creates credentials that would load remote
+        credentials with the transport instead of its HTTP client, so they
+        are created per IOLoop by the getter instead."""
+
+    @property
+    def _client(self):
+        """The transport that the
+        :py:class:`~tornado_aws.client.AsyncAWSClient` base class makes
+        requests with on the current IOLoop.
+
+        :rtype: :py:class:`~tornado_dynamodb.transport.Transport`
+
+        """
+        return self._state().transport
+
+    @_client.setter
+    def _client(self, value):
+        """The base class assigns the HTTP client adapter, which is managed
+        per IOLoop instead."""
+
+    @property
+    def _ioloop(self):
+        return ioloop.IOLoop.current()
+
+    @_ioloop.setter
+    def _ioloop(self, value):
+        """The base class assigns the IOLoop the client is created on,
+        which is resolved for each call instead."""
+
+    def _get_client_adapter(self):
+        """Return the transport's HTTP client for the
+        :py:class:`~tornado_aws.client.AsyncAWSClient` base class to use when
+        loading credentials.
+
+        :rtype: tornado.httpclient.AsyncHTTPClient
+
+        """
+        return self._state().transport.client
+
+    def _state(self):
+        """Return the transport and credentials for the current IOLoop,
+        creating them the first time the client is used on it, and
+        discarding the ones inherited from the parent process after a fork.
+
+        :rtype: :py:class:`~tornado_dynamodb._LoopState`
+
+        """
+        if os.getpid() != self._pid:
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+            self._states = weakref.WeakKeyDictionary()
+        loop = ioloop.IOLoop.current()
+        state = self._states.get(loop)
+        if state is None:
+            with self._lock:
+                state = self._states.get(loop)
+                if state is None:
+                    state = self._states[loop] = _LoopState(
+                        self._loop_transport(loop))
+        return state
+
+    def _loop_transport(self, loop):
+        """Return the transport to use on the IOLoop: the transport the
+        client was created with if it belongs to the IOLoop and the current
+        process, or a copy of it.
+
+        :param tornado.ioloop.IOLoop loop: The IOLoop
+        :rtype: :py:class:`~tornado_dynamodb.transport.Transport`
+
+        """
+        if self._transport_pid == self._pid and \
+                self._transport.io_loop is loop:
+            self._transport_pid = None
+            return self._transport
+        return self._transport.copy()
+
+    def _execute(self, command, payload, transform=None):
+        """Make the API request and return a future that is resolved with
+        the processed response body, passed through ``transform`` if it is
+        specified.
+
+        The result future is resolved in a done callback of the request
+        future rather than a callback scheduled with
+        :py:meth:`~tornado.ioloop.IOLoop.add_future`, so the result is
+        available in the same IOLoop iteration as the response.
+
+        :param str command: The DynamoDB API operation
+        :param dict payload: The request payload, in the wire format
+        :param callable transform: Transform the response body
+        :rtype: :class:`tornado.concurrent.Future`
+
+        """
+        future = concurrent.TracebackFuture()
+        span = self._trace(command, payload, future)
+        try:
+            request = self._fetch(command, payload, span)
+        except exceptions.DynamoDBException as error:
+            if span is not None:
+                span.finish(error)
+            raise
+        request.add_done_callback(
+            functools.partial(self._on_response, future, transform))
+        return future
+
+    def _on_response(self, future, transform, response):
+        """Resolve the result future of
+        :py:meth:`_execute` with the processed
+        response.
+
+        :param future: The result future
+        :type future: :class:`tornado.concurrent.Future`
+        :param callable transform: Transform the response body
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+
+        """
+        if self.executor and self._offload(future, transform, response):
+            return
+        try:
+            body = self._process_response(response)
+            future.set_result(transform(body) if transform else body)
+        except Exception:
+            future.set_exc_info(sys.exc_info())
+
+    def _offload(self, future, transform, response):
+        """Decode a successful response in the executor if its body is at
+        least :py:attr:`offload_threshold` bytes long, returning ``True`` if
+        it was submitted. Transforms that are bound to the client are run on
+        the IOLoop, since they use its state.
+
+        :param future: The result future
+        :type future: :class:`tornado.concurrent.Future`
+        :param callable transform: Transform the response body
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+        :rtype: bool
+
+        """
+        if response.exception() or \
+                getattr(transform, '__self__', None) is self:
+            return False
+        http_response = response.result()
+        if not http_response or http_response.code != 200 or \
+                len(http_response.body or b'') < self.offload_threshold:
+            return False
+
+        observer = self._observer(response)
+
+        def on_decoded(decoded):
+            try:
+                result, summary = decoded.result()
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+                return
+            if observer:
+                observer[1](summary)
+            future.set_result(result)
+
+        self.ioloop.add_future(
+            self.executor.submit(_decode_response, http_response.body,
+                                 transform, observer and observer[0]),
+            on_decoded)
+        return True
+
+    def _observer(self, response):
+        """Return the functions that observe the decoded body of a response:
+        one that summarizes the body, which is picklable so it can run in
+        the executor, and one that records the summary on the IOLoop. Return
+        :data:`None` when the response is not observed, which is the case
+        for every response here.
+
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+        :rtype: tuple
+
+        """
+        return None
+
+    def _fetch(self, command, body, span=None, name='attempt'):
+        """Make the HTTP request for an API operation, recording it as a
+        child span named ``name`` of the operation ``span``.
+
+        :param str command: The API operation
+        :param dict body: The request payload, in the wire format
+        :param span: The span of the operation
+        :type span: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param str name: The child span name
+        :rtype: :class:`tornado.concurrent.Future`
+
+        """
+        attempt = None
+        if span is not None:
+            attempt = span.child(name, {'attempt': span.children + 1})
+        try:
+            future = self._request(command, body)
+        except exceptions.DynamoDBException as error:
+            if attempt is not None:
+                attempt.finish(error)
+            raise
+        if attempt is not None:
+            future.add_done_callback(functools.partial(
+                self._traced_attempt, span, attempt))
+        return future
+
+    def _request(self, command, body):
+        """Sign and send the HTTP request for an API operation.
+
+        Requests made with local credentials are signed and passed to the
+        transport directly, and the transport future is returned as it is.
+        :py:meth:`tornado_aws.client.AsyncAWSClient.fetch` allocates a
+        future and a closure per call and resolves its future on the next
+        IOLoop iteration, which is only needed to refresh remote credentials
+        and to retry requests that fail because they expired. Error
+        responses of the direct path are converted by
+        :py:func:`_request_error` instead.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :rtype: :class:`tornado.concurrent.Future`
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        try:
+            body = json.dumps(body, default=utils.json_default)
+            if not self._auth_config.local_credentials:
+                return self.fetch('POST', '/', headers=self._headers(command),
+                                  body=body)
+            return self._state().transport.fetch(
+                self._create_request('POST', '/',
+                                     headers=self._headers(command),
+                                     body=body),
+                raise_error=True)
+        except aws_exceptions.ConfigNotFound as error:
+            raise exceptions.ConfigNotFound(str(error))
+        except aws_exceptions.ConfigParserError as error:
+            raise exceptions.ConfigParserError(str(error))
+        except aws_exceptions.NoCredentialsError as error:
+            raise exceptions.NoCredentialsError(str(error))
+        except aws_exceptions.NoProfileError as error:
+            raise exceptions.NoProfileError(str(error))
+        except httpclient.HTTPError as error:
+            if error.code == 599:
+                raise exceptions.TimeoutException()
+            else:
+                raise exceptions.RequestException(error.message)
+
+    def _trace(self, command, payload, future):
+        """Start the span of an operation, which is finished when its result
+        future is resolved, or return :data:`None` if the client does not
+        have a tracer.
+
+        :param str command: The DynamoDB API operation
+        :param dict payload: The request payload, in the wire format
+        :param future: The result future of the operation
+        :type future: :class:`tornado.concurrent.Future`
+        :rtype: :py:class:`~tornado_dynamodb.tracing.Span`
+
+        """
+        if not self.tracer:
+            return None
+        attributes = {'db.system': 'dynamodb', 'db.operation': command}
+        tables = _table_names(payload)
+        if tables:
+            attributes['aws.dynamodb.table_name'] = ','.join(tables)
+        if payload.get('IndexName'):
+            attributes['aws.dynamodb.index_name'] = payload['IndexName']
+        span = self.tracer.start_span('DynamoDB.{}'.format(command),
+                                      attributes=attributes)
+        future.add_done_callback(functools.partial(self._traced_operation,
+                                                   span))
+        return span
+
+    @staticmethod
+    def _traced_attempt(span, attempt, response):
+        """Finish the span of a HTTP request, adding its response size to
+        the operation span.
+
+        :param span: The span of the operation
+        :type span: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param attempt: The span of the request
+        :type attempt: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+
+        """
+        error = _request_error(response)
+        if isinstance(error, aws_exceptions.AWSError):
+            error_type = error.args[1].get('type')
+            if error_type in exceptions.MAP:
+                error_type = exceptions.MAP[error_type].__name__
+            attempt.set_attribute('error.type', error_type)
+        elif error is None and response.result():
+            http_response = response.result()
+            size = len(http_response.body or b'')
+            attempt.set_attribute('http.status_code', http_response.code)
+            attempt.set_attribute('http.response_bytes', size)
+            span.add('http.response_bytes', size)
+        elif isinstance(error, httpclient.HTTPError):
+            attempt.set_attribute('http.status_code', error.code)
+            attempt.set_attribute('error.type', 'TimeoutException'
+                                  if error.code == 599 else
+                                  'RequestException')
+        attempt.finish(error)
+
+    @staticmethod
+    def _traced_operation(span, future):
+        """Finish the span of an operation with the item count and consumed
+        capacity of its result.
+
+        :param span: The span of the operation
+        :type span: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param future: The result future of the operation
+        :type future: :class:`tornado.concurrent.Future`
+
+        """
+        error = future.exception()
+        result = None if error else future.result()
+        if isinstance(result, dict):
+            if 'Count' in result:
+                span.set_attribute('aws.dynamodb.item_count', result['Count'])
+            elif 'Items' in result:
+                span.set_attribute('aws.dynamodb.item_count',
+                                   len(result['Items']))
+            elif isinstance(result.get('Responses'), dict):
+                span.set_attribute('aws.dynamodb.item_count', sum(
+                    len(items) for items in result['Responses'].values()))
+            elif 'Responses' in result:
+                span.set_attribute('aws.dynamodb.item_count', sum(
+                    1 for value in result['Responses'] if 'Item' in value))
+            elif 'Item' in result:
+                span.set_attribute('aws.dynamodb.item_count', 1)
+            capacity = result.get('ConsumedCapacity')
+            if capacity:
+                if isinstance(capacity, dict):
+                    capacity = [capacity]
+                span.set_attribute(
+                    'aws.dynamodb.consumed_capacity',
+                    sum(value.get('CapacityUnits', 0) for value in capacity))
+        span.finish(error)
+
+    def _signing_key(self, date_stamp):
+        """Return the signature key for the request, caching it for the
+        date stamp and secret key it was created with.
+
+        :param str date_stamp: Date in %Y%m%d format for signing
+        :rtype: bytes
+
+        """
+        cache_key = date_stamp, self._auth_config.secret_key
+        if self._signing_key_cache[0] != cache_key:
+            self._signing_key_cache = (
+                cache_key, super(_AsyncClient, self)._signing_key(date_stamp))
+        return self._signing_key_cache[1]
+
+    @staticmethod
+    def _process_response(response):
+        error = _request_error(response)
+        if isinstance(error, aws_exceptions.AWSError):
+            error_type = error.args[1].get('type')
+            if error_type in exceptions.MAP:
+                raise exceptions.MAP[error_type](error.args[1].get('message'))
+        elif isinstance(error, httpclient.HTTPError):
+            if error.code == 599:
+                raise exceptions.TimeoutException()
+            raise exceptions.RequestException(error.message)
+        if error:
+            raise error
+        http_response = response.result()
+        if not http_response or not http_response.body:
+            raise exceptions.DynamoDBException('empty response')
+        body = json.loads(http_response.body.decode('utf-8'))
+        if http_response.code != 200:
+            if body['__type'] in exceptions.MAP:
+                raise exceptions.MAP[body['__type']](body['message'])
+            raise ValueError('Unhandled exception!', body)
+        return body
+
+    @staticmethod
+    def _headers(method):
+        """Return request headers for the specified API method
+
+        :param api method: The API method
+        :type: dict
+
+        """
+        return {'Content-Type': 'application/x-amz-json-1.0',
+                'x-amz-target': 'DynamoDB_20120810.{}'.format(method)}
+
+
+class DynamoDB(_AsyncClient):
     """An opinionated asynchronous DynamoDB client for Tornado
 
     :param str profile: Specify the configuration profile name
@@ -49,26 +543,347 @@ class DynamoDB(client.AsyncAWSClient):
     :param str secret_key: The secret access key
     :param str endpoint: Override the base endpoint URL
     :param int max_clients: Max simultaneous requests (Default: ``100``)
+    :param transport: The HTTP transport to use. If not specified, a
+        :py:class:`~tornado_dynamodb.transport.Transport` is created using
+        ``max_clients``. Other IOLoops use a copy of it.
+    :type transport: :py:class:`~tornado_dynamodb.transport.Transport`
+    :param hot_key_tracker: Track the partition keys of the requests made
+    :type hot_key_tracker:
+        :py:class:`~tornado_dynamodb.hotkeys.HotKeyTracker`
+    :param compressor: Compress large attributes of the items written
+    :type compressor: :py:class:`~tornado_dynamodb.compression.Compressor`
+    :param capacity_planner: Record the capacity consumed by requests
+    :type capacity_planner:
+        :py:class:`~tornado_dynamodb.capacity.CapacityPlanner`
+    :param executor: Decode and unmarshall large responses in this executor
+        instead of on the IOLoop
+    :type executor: :py:class:`concurrent.futures.Executor`
+    :param int offload_threshold: The response body size in bytes from
+        which responses are decoded in the ``executor``
+    :param absence_cache: Answer :py:meth:`get_item` requests for keys that
+        are known not to exist without making a request
+    :type absence_cache: :py:class:`~tornado_dynamodb.absence.AbsenceCache`
+    :param query_planner: Learn the key schemas of the tables described
+    :type query_planner: :py:class:`~tornado_dynamodb.planner.QueryPlanner`
+    :param tracer: Record a span for each operation and HTTP request
+    :type tracer: :py:class:`~tornado_dynamodb.tracing.Tracer`
 
     :raises: :py:exc:`~tornado_dynamodb.exceptions.ConfigNotFound`
              :py:exc:`~tornado_dynamodb.exceptions.ConfigParserError`
              :py:exc:`~tornado_dynamodb.exceptions.NoCredentialsError`
              :py:exc:`~tornado_dynamodb.exceptions.NoProfileError`
 
+    A client can be shared by code running on different IOLoops, in
+    different threads, and by the worker processes forked after it was
+    created. The IOLoop is resolved for each call, and each IOLoop gets its
+    own transport and credentials, created the first time the client is used
+    on it. A forked process discards the transports it inherited without
+    closing them, so the connections of the parent are not disturbed.
+
+    When an ``executor`` is specified, the JSON decoding and unmarshalling of
+    responses that are at least ``offload_threshold`` bytes long, such as
+    large *Query* and *Scan* pages, run in it so that they do not block the
+    IOLoop. Smaller responses are decoded inline. Both thread and process
+    pool executors can be used.
+
     """
     def __init__(self, profile=None, region=None, access_key=None,
-                 secret_key=None, endpoint=None, max_clients=100):
+                 secret_key=None, endpoint=None, max_clients=100,
+                 transport=None, hot_key_tracker=None, compressor=None,
+                 capacity_planner=None, executor=None,
+                 offload_threshold=65536, absence_cache=None,
+                 query_planner=None, tracer=None):
         """Create a new DynamoDB instance"""
-        super(DynamoDB, self).__init__('dynamodb', profile, region,
-                                       access_key, secret_key, endpoint,
-                                       max_clients)
-        self.ioloop = ioloop.IOLoop.current()
+        self.absence_cache = absence_cache
+        self.capacity_planner = capacity_planner
+        self.compressor = compressor
+        self.hot_key_tracker = hot_key_tracker
+        self.query_planner = query_planner
+        self._planned = weakref.WeakKeyDictionary()
+        super(DynamoDB, self).__init__(profile, region, access_key,
+                                       secret_key, endpoint, max_clients,
+                                       transport, executor,
+                                       offload_threshold, tracer)
+
+    def batch_get_item(self, request_items, return_consumed_capacity=None):
+        """The *BatchGetItem* operation returns the attributes of one or more
+        items from one or more tables. You identify requested items by primary
+        key. A single operation can retrieve up to 16 MB of data, which can
+        contain as many as 100 items.
+
+        If the requested items exceed the response size limit, or the table's
+        provisioned throughput is exceeded, the keys that were not read are
+        returned in the ``UnprocessedKeys`` response parameter. The unprocessed
+        keys are returned unmarshalled, in the same format as
+        ``request_items``, so they can be passed directly to a subsequent
+        *BatchGetItem* call, ideally with an exponential backoff.
+
+        :param dict request_items: A map of one or more table names and, for
+            each table, a dict with a ``Keys`` list of primary keys to
+            retrieve and optionally the ``ConsistentRead``,
+            ``ExpressionAttributeNames`` and ``ProjectionExpression`` to use
+            for the table. Keys are specified as native values and are
+            marshalled for you:
+
+            .. code:: python
+
+                {'my-table': {'Keys': [{'id': 1}, {'id': 2}],
+                              'ProjectionExpression': 'id, #n',
+                              'ExpressionAttributeNames': {'#n': 'name'}}}
+
+        :param str return_consumed_capacity: Determines the level of detail
+            about provisioned throughput consumption that is returned in the
+            response. Should be ``None`` or one of ``INDEXES`` or ``TOTAL``
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": [{
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  }],
+                  "Responses": {
+                    "string": [{"string": "value"}]
+                  },
+                  "UnprocessedKeys": {
+                    "string": {
+                      "Keys": [{"string": "value"}]
+                    }
+                  }
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.MissingParameter`
+                 :py:exc:`~tornado_dynamodb.exceptions.OptInRequired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        payload = {'RequestItems': self._get_requests(request_items,
+                                                      utils.marshall)}
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+
+        return self._execute('BatchGetItem', payload,
+                             self._decompressing(self._batch_get_response))
+
+    def batch_write_item(self, request_items, return_consumed_capacity=None,
+                         return_item_collection_metrics=False):
+        """The *BatchWriteItem* operation puts or deletes multiple items in one
+        or more tables. A single call to *BatchWriteItem* can write up to 16 MB
+        of data, which can comprise as many as 25 put or delete requests.
+        Individual items to be written can be as large as 400 KB.
+
+        The individual *PutItem* and *DeleteItem* operations specified in
+        *BatchWriteItem* are atomic; however *BatchWriteItem* as a whole is
+        not. If any requested operations fail because the table's provisioned
+        throughput is exceeded or an internal processing failure occurs, the
+        failed operations are returned in the ``UnprocessedItems`` response
+        parameter. The unprocessed items are returned unmarshalled, in the
+        same format as ``request_items``, so they can be passed directly to a
+        subsequent *BatchWriteItem* call, ideally with an exponential backoff.
+
+        :param dict request_items: A map of one or more table names and, for
+            each table, a list of operations to be performed. Each operation
+            is a dict with either a ``PutRequest`` key with an ``Item`` value,
+            or a ``DeleteRequest`` key with a ``Key`` value. Items and keys
+            are specified as native values and are marshalled for you:
+
+            .. code:: python
+
+                {'my-table': [
+                    {'PutRequest': {'Item': {'id': 1, 'name': 'one'}}},
+                    {'DeleteRequest': {'Key': {'id': 2}}}]}
+
+        :param str return_consumed_capacity: Determines the level of detail
+            about provisioned throughput consumption that is returned in the
+            response. Should be ``None`` or one of ``INDEXES`` or ``TOTAL``
+        :param bool return_item_collection_metrics: Determines whether item
+            collection metrics are returned.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": [{
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  }],
+                  "ItemCollectionMetrics": {
+                    "string": [{
+                      "ItemCollectionKey": {"string": AttributeValue},
+                      "SizeEstimateRangeGB": [number]
+                    }]
+                  },
+                  "UnprocessedItems": {
+                    "string": [{
+                      "DeleteRequest": {"Key": {"string": "value"}},
+                      "PutRequest": {"Item": {"string": "value"}}
+                    }]
+                  }
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ItemCollectionSizeLimitExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.MissingParameter`
+                 :py:exc:`~tornado_dynamodb.exceptions.OptInRequired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        sizes = []
+
+        def marshall(value):
+            value, size = utils.marshall_with_size(value)
+            sizes.append(size)
+            return value
+
+        def marshall_item(value):
+            return marshall(self._compress(value))
+
+        payload = {'RequestItems': self._write_requests(
+            request_items, marshall, marshall_item)}
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if return_item_collection_metrics:
+            payload['ReturnItemCollectionMetrics'] = 'SIZE'
+
+        if len(sizes) > utils.MAX_BATCH_WRITE_ITEMS:
+            return self._failed(exceptions.ValidationException(
+                'Too many items requested for the BatchWriteItem call'))
+        elif sizes and max(sizes) > utils.MAX_ITEM_SIZE:
+            return self._failed(self._item_too_large(max(sizes)))
+        elif sum(sizes) > utils.MAX_BATCH_WRITE_SIZE:
+            return self._failed(exceptions.ValidationException(
+                'Request size of {} bytes has exceeded the maximum allowed '
+                'size of {} bytes'.format(sum(sizes),
+                                          utils.MAX_BATCH_WRITE_SIZE)))
+        return self._execute('BatchWriteItem', payload,
+                             self._batch_write_response)
+
+    def count_query(self, table_name, key_condition_expression,
+                    consistent_read=False, expression_attribute_names=None,
+                    expression_attribute_values=None, filter_expression=None,
+                    index_name=None, page_size=None,
+                    return_consumed_capacity=None):
+        """Count the items matching a *Query* without transferring or
+        unmarshalling them. *Query* requests are made with ``Select`` set to
+        ``COUNT``, and ``LastEvaluatedKey`` is followed until the result set
+        is exhausted, with the request for the next page being sent as soon
+        as the previous page's response arrives.
+
+        :param str table_name: The name of the table containing the requested
+            items.
+        :param str key_condition_expression: The condition that specifies the
+            key value(s) for items to be counted.
+        :param bool consistent_read: Use strongly consistent reads
+        :param dict expression_attribute_names: One or more substitution tokens
+            for attribute names in an expression.
+        :param dict expression_attribute_values: One or more values that can be
+            substituted in an expression.
+        :param str filter_expression: Only count the items that match this
+            condition. Items that do not match are still included in
+            ``ScannedCount`` and consume read capacity.
+        :param str index_name: The name of an index to query.
+        :param int page_size: The maximum number of items to evaluate per
+            request
+        :param str return_consumed_capacity: Set to ``INDEXES`` or ``TOTAL`` to
+            include the capacity consumed by all of the requests
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": {
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  },
+                  "Count": number,
+                  "ScannedCount": number
+                }
+
+        :rtype: tornado.concurrent.Future
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
-    def batch_get_item(self):
-        pass
+        """
+        payload = self._count_payload(
+            table_name, consistent_read, expression_attribute_names,
+            expression_attribute_values, filter_expression, index_name,
+            page_size, return_consumed_capacity)
+        payload['KeyConditionExpression'] = key_condition_expression
+        return self._count('Query', payload)
+
+    @gen.coroutine
+    def count_scan(self, table_name, total_segments=1, consistent_read=False,
+                   expression_attribute_names=None,
+                   expression_attribute_values=None, filter_expression=None,
+                   index_name=None, page_size=None,
+                   return_consumed_capacity=None):
+        """Count the items in a table or index without transferring or
+        unmarshalling them. *Scan* requests are made with ``Select`` set to
+        ``COUNT``, following ``LastEvaluatedKey`` until the table is
+        exhausted. If ``total_segments`` is greater than ``1``, the segments
+        of a parallel scan are counted concurrently and their counts summed.
+
+        :param str table_name: The name of the table to count
+        :param int total_segments: The number of parallel scan segments
+        :param bool consistent_read: Use strongly consistent reads
+        :param dict expression_attribute_names: One or more substitution tokens
+            for attribute names in an expression.
+        :param dict expression_attribute_values: One or more values that can be
+            substituted in an expression.
+        :param str filter_expression: Only count the items that match this
+            condition. Items that do not match are still included in
+            ``ScannedCount`` and consume read capacity.
+        :param str index_name: The name of an index to scan.
+        :param int page_size: The maximum number of items to evaluate per
+            request
+        :param str return_consumed_capacity: Set to ``INDEXES`` or ``TOTAL`` to
+            include the capacity consumed by all of the requests
+        :returns: The same response format as
+            :py:meth:`~tornado_dynamodb.DynamoDB.count_query`
+        :rtype: tornado.concurrent.Future
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
-    def batch_write_item(self):
-        pass
+        """
+        payload = self._count_payload(
+            table_name, consistent_read, expression_attribute_names,
+            expression_attribute_values, filter_expression, index_name,
+            page_size, return_consumed_capacity)
+        if total_segments <= 1:
+            result = yield self._count('Scan', payload)
+            raise gen.Return(result)
+        results = yield [
+            self._count('Scan', dict(payload, Segment=segment,
+                                     TotalSegments=total_segments))
+            for segment in range(total_segments)]
+        result = results[0]
+        for value in results[1:]:
+            result['Count'] += value['Count']
+            result['ScannedCount'] += value['ScannedCount']
+            if 'ConsumedCapacity' in value:
+                result['ConsumedCapacity']['CapacityUnits'] += \
+                    value['ConsumedCapacity']['CapacityUnits']
+        raise gen.Return(result)
 
     def create_table(self, name, attributes, key_schema, read_capacity_units=1,
                      write_capacity_units=1, global_secondary_indexes=None,
@@ -237,18 +1052,8 @@ class DynamoDB(client.AsyncAWSClient):
         if local_secondary_indexes:
             payload['LocalSecondaryIndexes'] = local_secondary_indexes
 
-        future = concurrent.TracebackFuture()
-
-        def on_response(response):
-            try:
-                future.set_result(
-                    self._process_response(response)['TableDescription'])
-            except exceptions.DynamoDBException as error:
-                return future.set_exception(error)
-
-        request = self._fetch('CreateTable', payload)
-        self.ioloop.add_future(request, on_response)
-        return future
+        return self._execute('CreateTable', payload,
+                             self._table_description)
 
     def delete_item(self, table_name, key, condition_expression=None,
                     expression_attribute_names=None,
@@ -394,7 +1199,22 @@ class DynamoDB(client.AsyncAWSClient):
                  :py:exc:`~tornado_dynamodb.exceptions.ItemCollectionSizeLimitExceeded`
 
         """
-        pass
+        payload = {'TableName': table_name, 'Key': utils.marshall(key)}
+        if condition_expression:
+            payload['ConditionExpression'] = condition_expression
+        if expression_attribute_names:
+            payload['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            payload['ExpressionAttributeValues'] = expression_attribute_values
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if return_item_collection_metrics:
+            payload['ReturnItemCollectionMetrics'] = 'SIZE'
+        if return_values:
+            payload['ReturnValues'] = 'ALL_OLD'
+
+        return self._execute('DeleteItem', self._marshall_items(payload),
+                             self._decompressing(self._unmarshall_items))
 
     def delete_table(self, name):
         """The DeleteTable operation deletes a table and all of its items.
@@ -495,18 +1315,8 @@ class DynamoDB(client.AsyncAWSClient):
                  :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
 
         """
-        future = concurrent.TracebackFuture()
-
-        def on_response(response):
-            try:
-                future.set_result(
-                    self._process_response(response).get('TableDescription'))
-            except exceptions.DynamoDBException as error:
-                future.set_exception(error)
-
-        request = self._fetch('DeleteTable', {'TableName': name})
-        self.ioloop.add_future(request, on_response)
-        return future
+        return self._execute('DeleteTable', {'TableName': name},
+                             self._table_description)
 
     def describe_table(self, name):
         """Returns information about the table, including the current status of
@@ -599,17 +1409,8 @@ class DynamoDB(client.AsyncAWSClient):
                  :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
 
         """
-        future = concurrent.TracebackFuture()
-
-        def on_response(response):
-            try:
-                future.set_result(self._process_response(response).get('Table'))
-            except exceptions.DynamoDBException as error:
-                future.set_exception(error)
-
-        request = self._fetch('DescribeTable', {'TableName': name})
-        self.ioloop.add_future(request, on_response)
-        return future
+        return self._execute('DescribeTable', {'TableName': name},
+                             self._describe_table_response)
 
     def get_item(self, table_name, key, consistent_read=False,
                  expression_attribute_names=None,
@@ -658,7 +1459,10 @@ class DynamoDB(client.AsyncAWSClient):
                 capacity for the operation.
               - ``NONE``: No consumed capacity details are included in the
                 response.
-        :returns: Response Format:
+        :returns: Response Format, without ``Item`` if the item does not
+            exist. When the client has an ``absence_cache`` and the key is
+            known not to exist, an empty response is returned without making a
+            request.
 
             .. code:: json
 
@@ -727,17 +1531,17 @@ class DynamoDB(client.AsyncAWSClient):
         if return_consumed_capacity:
             payload['ReturnConsumedCapacity'] = return_consumed_capacity
 
-        future = concurrent.TracebackFuture()
-
-        def on_response(response):
-            try:
-                body = self._process_response(response)
-                body['Item'] = utils.unmarshall(body['Item'])
-                future.set_result(body)
-            except exceptions.DynamoDBException as error:
-                future.set_exception(error)
-
-        self.ioloop.add_future(self._fetch('GetItem', payload), on_response)
+        transform = self._decompressing(self._get_item_response)
+        if self.absence_cache is None:
+            return self._execute('GetItem', payload, transform)
+        elif self.absence_cache.absent(table_name, payload['Key'],
+                                       consistent_read):
+            future = concurrent.TracebackFuture()
+            future.set_result({})
+            return future
+        future = self._execute('GetItem', payload, transform)
+        future.add_done_callback(functools.partial(
+            self.absence_cache.observe_get, table_name, payload['Key']))
         return future
 
     def list_tables(self, exclusive_start_table_name=None, limit=None):
@@ -771,21 +1575,169 @@ class DynamoDB(client.AsyncAWSClient):
                  :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
         """
-        future = concurrent.TracebackFuture()
         payload = {}
         if exclusive_start_table_name:
             payload['ExclusiveStartTableName'] = exclusive_start_table_name
         if limit:
             payload['Limit'] = limit
+        return self._execute('ListTables', payload)
 
-        def on_response(response):
+    @gen.coroutine
+    def multi_query(self, table_name, partition_key, partition_values,
+                    sort_key, key_condition_expression=None,
+                    expression_attribute_names=None,
+                    expression_attribute_values=None, filter_expression=None,
+                    projection_expression=None, index_name=None,
+                    consistent_read=False, limit=None, page_size=None,
+                    scan_index_forward=True, concurrency=10):
+        """Query a table or index for several partition key values at once,
+        returning a single list of items ordered by the sort key.
+
+        The per-partition queries run concurrently, with at most
+        ``concurrency`` requests in flight. Their pages are merged with a
+        heap as they arrive: while a page is being merged, the next page of
+        that partition is already being requested. The merge stops as soon
+        as ``limit`` items have been collected, and no partition is asked for
+        more than ``limit`` items per page.
+
+        This is also the way to read a write-sharded key, by passing each of
+        the shard suffixed partition key values in ``partition_values``.
+
+        .. code:: python
+
+            result = yield client.multi_query(
+                'events', 'user_id', ['user-1', 'user-2', 'user-3'],
+                'created_at', '#created_at > :since',
+                expression_attribute_names={'#created_at': 'created_at'},
+                expression_attribute_values={':since': yesterday},
+                index_name='user_id-created_at-index',
+                scan_index_forward=False, limit=50)
+
+        :param str table_name: The name of the table to query
+        :param str partition_key: The name of the partition key attribute
+        :param list partition_values: The partition key values to query
+        :param str sort_key: The name of the sort key attribute to order the
+            items by. It must be included in the projected attributes.
+        :param str key_condition_expression: An optional condition on the
+            sort key, applied to every partition
+        :param dict expression_attribute_names: One or more substitution tokens
+            for attribute names in an expression.
+        :param dict expression_attribute_values: One or more values that can be
+            substituted in an expression.
+        :param str filter_expression: A condition that items must match to be
+            returned
+        :param str projection_expression: The attributes to retrieve
+        :param str index_name: The name of an index to query
+        :param bool consistent_read: Use strongly consistent reads
+        :param int limit: The maximum number of items to return in total
+        :param int page_size: The ``limit`` for each *Query* request
+        :param bool scan_index_forward: Return the items in ascending sort key
+            order if ``True``, descending if ``False``
+        :param int concurrency: The maximum number of concurrent requests
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "Count": number,
+                  "Items": [{"string": "value"}],
+                  "ScannedCount": number
+                }
+
+        :rtype: tornado.concurrent.Future
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        names = dict(expression_attribute_names or {})
+        names['#multi_query_partition'] = partition_key
+        condition = '#multi_query_partition = :multi_query_partition'
+        if key_condition_expression:
+            condition += ' AND ({})'.format(key_condition_expression)
+        if limit:
+            page_size = min(page_size or limit, limit)
+        from tornado import locks
+        semaphore = locks.Semaphore(concurrency)
+        scanned = [0]
+
+        @gen.coroutine
+        def fetch(value, start_key):
+            values = dict(expression_attribute_values or {})
+            values[':multi_query_partition'] = value
+            with (yield semaphore.acquire()):
+                result = yield self.query(
+                    table_name, consistent_read=consistent_read,
+                    exclusive_start_key=start_key,
+                    expression_attribute_names=names,
+                    expression_attribute_values=values,
+                    filter_expression=filter_expression,
+                    projection_expression=projection_expression,
+                    index_name=index_name,
+                    key_condition_expression=condition, limit=page_size,
+                    scan_index_forward=scan_index_forward)
+            scanned[0] += result.get('ScannedCount', 0)
+            raise gen.Return(result)
+
+        @gen.coroutine
+        def refill(stream):
+            while not stream['items'] and stream['pending']:
+                result = yield stream['pending']
+                stream['items'] = collections.deque(result.get('Items', []))
+                stream['pending'] = None
+                if result.get('LastEvaluatedKey'):
+                    stream['pending'] = fetch(stream['value'],
+                                              result['LastEvaluatedKey'])
+
+        streams = [{'value': value, 'items': None,
+                    'pending': fetch(value, None)}
+                   for value in partition_values]
+        heap, items = [], []
+        try:
+            yield [refill(stream) for stream in streams]
+            for index, stream in enumerate(streams):
+                if stream['items']:
+                    heapq.heappush(heap, _MergeEntry(
+                        stream['items'][0][sort_key], index,
+                        scan_index_forward))
+            while heap and (not limit or len(items) < limit):
+                index = heapq.heappop(heap).index
+                stream = streams[index]
+                items.append(stream['items'].popleft())
+                yield refill(stream)
+                if stream['items']:
+                    heapq.heappush(heap, _MergeEntry(
+                        stream['items'][0][sort_key], index,
+                        scan_index_forward))
+        finally:
+            for stream in streams:
+                if stream['pending']:
+                    self.ioloop.add_future(stream['pending'],
+                                           lambda future: future.exception())
+        raise gen.Return({'Count': len(items), 'Items': items,
+                          'ScannedCount': scanned[0]})
+
+    @gen.coroutine
+    def prepare(self):
+        """Resolve the credentials and prime the request signing key ahead
+        of the first request, so that the cost is paid at startup instead of
+        by the first request the client makes. If the credentials are not
+        configured locally, they are fetched from the EC2 Instance Metadata
+        API.
+
+        :rtype: tornado.concurrent.Future
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.NoCredentialsError`
+
+        """
+        if self._auth_config.needs_credentials():
             try:
-                future.set_result(self._process_response(response))
-            except exceptions.DynamoDBException as error:
-                future.set_exception(error)
-        request = self._fetch('ListTables', payload)
-        self.ioloop.add_future(request, on_response)
-        return future
+                yield self._auth_config.refresh()
+            except aws_exceptions.NoCredentialsError as error:
+                raise exceptions.NoCredentialsError(str(error))
+        self._signing_key(datetime.datetime.utcnow().strftime('%Y%m%d'))
 
     def put_item(self, table_name, item, return_values=False,
                  condition_expression=None,
@@ -863,7 +1815,8 @@ class DynamoDB(client.AsyncAWSClient):
         :rtype: dict
 
         """
-        payload = {'TableName': table_name, 'Item': utils.marshall(item)}
+        item, size = utils.marshall_with_size(self._compress(item))
+        payload = {'TableName': table_name, 'Item': item}
         if condition_expression:
             payload['ConditionExpression'] = condition_expression
         if expression_attribute_names:
@@ -877,21 +1830,15 @@ class DynamoDB(client.AsyncAWSClient):
         if return_values:
             payload['ReturnValues'] = 'ALL_OLD'
 
-        future = concurrent.TracebackFuture()
-
-        def on_response(response):
-            try:
-                future.set_result(self._process_response(response))
-            except exceptions.DynamoDBException as error:
-                future.set_exception(error)
-
-        self.ioloop.add_future(self._fetch('PutItem', payload), on_response)
-        return future
+        if size > utils.MAX_ITEM_SIZE:
+            return self._failed(self._item_too_large(size))
+        return self._execute('PutItem', payload)
 
     def query(self, table_name, consistent_read=False,
               exclusive_start_key=None, expression_attribute_names=None,
               expression_attribute_values=None, filter_expression=None,
-              projection_expression=None, index_name=None,limit=None,
+              projection_expression=None, index_name=None,
+              key_condition_expression=None, limit=None,
               return_consumed_capacity=None, scan_index_forward=True,
               select=None):
         """A *Query* operation uses the primary key of a table or a secondary
@@ -952,6 +1899,11 @@ class DynamoDB(client.AsyncAWSClient):
             index can be any local secondary index or global secondary index.
             Note that if you use this parameter, you must also provide
             ``table_name``.
+        :param str key_condition_expression: The condition that specifies the
+            key value(s) for items to be retrieved by the *Query* action. The
+            condition must perform an equality test on a single partition key
+            value, and can optionally test the sort key with one of ``=``,
+            ``<``, ``<=``, ``>``, ``>=``, ``BETWEEN`` or ``begins_with``.
         :param int limit: The maximum number of items to evaluate (not
             necessarily the number of matching items). If DynamoDB processes
             the number of items up to the limit while processing the results,
@@ -1012,16 +1964,68 @@ class DynamoDB(client.AsyncAWSClient):
                 ``ALL_ATTRIBUTES``.
               - ``COUNT``: Returns the number of matching items, rather than
                 the matching items themselves.
-        :rtype: dict
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": {
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  },
+                  "Count": number,
+                  "Items": [{"string": "value"}],
+                  "LastEvaluatedKey": {"string": "value"},
+                  "ScannedCount": number
+                }
+
+            ``Items`` and ``LastEvaluatedKey`` are unmarshalled to native
+            values.
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.MissingParameter`
+                 :py:exc:`~tornado_dynamodb.exceptions.OptInRequired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
         """
-        pass
+        payload = {'TableName': table_name}
+        if consistent_read:
+            payload['ConsistentRead'] = True
+        if exclusive_start_key:
+            payload['ExclusiveStartKey'] = exclusive_start_key
+        if expression_attribute_names:
+            payload['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            payload['ExpressionAttributeValues'] = expression_attribute_values
+        if filter_expression:
+            payload['FilterExpression'] = filter_expression
+        if projection_expression:
+            payload['ProjectionExpression'] = projection_expression
+        if index_name:
+            payload['IndexName'] = index_name
+        if key_condition_expression:
+            payload['KeyConditionExpression'] = key_condition_expression
+        if limit:
+            payload['Limit'] = limit
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if not scan_index_forward:
+            payload['ScanIndexForward'] = False
+        if select:
+            payload['Select'] = select
+
+        return self._execute('Query', self._marshall_items(payload),
+                             self._decompressing(self._unmarshall_items))
 
     def scan(self, table_name, consistent_read=False, exclusive_start_key=None,
              expression_attribute_names=None, expression_attribute_values=None,
              filter_expression=None, projection_expression=None,
              index_name=None, limit=None, return_consumed_capacity=None,
-             segment=None, total_segments=None):
+             segment=None, total_segments=None, select=None, raw=False):
         """The *Scan* operation returns one or more items and item attributes
         by accessing every item in a table or a secondary index.
 
@@ -1155,10 +2159,254 @@ class DynamoDB(client.AsyncAWSClient):
 
             If you specify ``total_segments``, you must also specify
             ``segments``.
-        :rtype: dict
+        :param str select: The attributes to be returned in the result. Set
+            to ``COUNT`` to return the number of matching items instead of
+            the items themselves, or use
+            :py:meth:`~tornado_dynamodb.DynamoDB.count_scan` to count every
+            item in a table.
+        :param bool raw: Return ``Items`` and ``LastEvaluatedKey`` in the
+            wire format, exactly as they are stored, and pass
+            ``exclusive_start_key`` in the wire format. Values are not
+            converted to native types, so they are not changed by a round
+            trip through them, and compressed values are not decompressed.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": {
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  },
+                  "Count": number,
+                  "Items": [{"string": "value"}],
+                  "LastEvaluatedKey": {"string": "value"},
+                  "ScannedCount": number
+                }
+
+            ``Items`` and ``LastEvaluatedKey`` are unmarshalled to native
+            values, unless ``raw`` is set.
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.MissingParameter`
+                 :py:exc:`~tornado_dynamodb.exceptions.OptInRequired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        payload = {'TableName': table_name}
+        if consistent_read:
+            payload['ConsistentRead'] = True
+        if exclusive_start_key:
+            payload['ExclusiveStartKey'] = exclusive_start_key
+        if expression_attribute_names:
+            payload['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            payload['ExpressionAttributeValues'] = expression_attribute_values
+        if filter_expression:
+            payload['FilterExpression'] = filter_expression
+        if projection_expression:
+            payload['ProjectionExpression'] = projection_expression
+        if index_name:
+            payload['IndexName'] = index_name
+        if limit:
+            payload['Limit'] = limit
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if segment is not None or total_segments is not None:
+            payload['Segment'] = segment
+            payload['TotalSegments'] = total_segments
+        if select:
+            payload['Select'] = select
+
+        if raw:
+            if expression_attribute_values:
+                payload['ExpressionAttributeValues'] = utils.marshall(
+                    expression_attribute_values)
+            return self._execute('Scan', payload)
+        return self._execute('Scan', self._marshall_items(payload),
+                             self._decompressing(self._unmarshall_items))
+
+    def transact_get_items(self, transact_items,
+                           return_consumed_capacity=None):
+        """The *TransactGetItems* operation atomically retrieves up to 100
+        items from one or more tables in the same account and region, in a
+        single round trip. The items are read as a consistent snapshot: no
+        transaction that modifies them can be applied part way through the
+        read.
+
+        :param list transact_items: The items to retrieve, each a dict with a
+            ``Get`` key whose value has the ``TableName`` and ``Key`` of the
+            item and optionally the ``ProjectionExpression`` and
+            ``ExpressionAttributeNames`` to use. Keys are specified as native
+            values and are marshalled for you:
+
+            .. code:: python
+
+                [{'Get': {'TableName': 'orders', 'Key': {'id': 1}}},
+                 {'Get': {'TableName': 'stock', 'Key': {'sku': 'abc'},
+                          'ProjectionExpression': 'quantity'}}]
+
+        :param str return_consumed_capacity: Determines the level of detail
+            about provisioned throughput consumption that is returned in the
+            response. Should be ``None`` or one of ``INDEXES`` or ``TOTAL``
+        :returns: Response format, with one entry in ``Responses`` for each
+            requested item, in request order. The entry is empty if the item
+            does not exist:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": [{
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  }],
+                  "Responses": [{
+                    "Item": {"string": "value"}
+                  }]
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.TransactionCanceled`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        payload = {'TransactItems': self._transact_items(transact_items)}
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+
+        return self._execute(
+            'TransactGetItems', payload,
+            self._decompressing(self._transact_get_response))
+
+    def transact_write_items(self, transact_items, client_request_token=None,
+                             return_consumed_capacity=None,
+                             return_item_collection_metrics=False,
+                             max_retries=3):
+        """The *TransactWriteItems* operation groups up to 100 ``Put``,
+        ``Update``, ``Delete`` and ``ConditionCheck`` actions into a single
+        all-or-nothing request. Either every action succeeds, or none of them
+        are applied and
+        :py:exc:`~tornado_dynamodb.exceptions.TransactionCanceled` is raised
+        with the reason each action caused the cancellation in its
+        ``reasons`` attribute.
+
+        Every request carries a client request token, which makes it
+        idempotent for 10 minutes: if a request is retried after a timeout or
+        a transient failure, DynamoDB does not apply the actions a second
+        time. Transient failures are retried with the same token up to
+        ``max_retries`` times with an exponential backoff. To safely retry a
+        failed call yourself, pass the same ``client_request_token`` again.
+
+        :param list transact_items: The actions to perform, each a dict with a
+            single ``Put``, ``Update``, ``Delete`` or ``ConditionCheck`` key.
+            The value is the same as the parameters of the corresponding
+            single item operation in the DynamoDB API, with the ``Item``,
+            ``Key`` and ``ExpressionAttributeValues`` specified as native
+            values that are marshalled for you:
+
+            .. code:: python
+
+                [{'Put': {'TableName': 'orders',
+                          'Item': {'id': 1, 'sku': 'abc'},
+                          'ConditionExpression': 'attribute_not_exists(id)'}},
+                 {'Update': {'TableName': 'stock', 'Key': {'sku': 'abc'},
+                             'UpdateExpression': 'SET stock = stock - :n',
+                             'ConditionExpression': 'stock >= :n',
+                             'ExpressionAttributeValues': {':n': 1}}}]
+
+        :param str client_request_token: A unique identifier of up to 36
+            characters for the request. If not specified, a UUID is generated.
+        :param str return_consumed_capacity: Determines the level of detail
+            about provisioned throughput consumption that is returned in the
+            response. Should be ``None`` or one of ``INDEXES`` or ``TOTAL``
+        :param bool return_item_collection_metrics: Determines whether item
+            collection metrics are returned.
+        :param int max_retries: The number of times to retry the request after
+            a timeout, transient failure or
+            :py:exc:`~tornado_dynamodb.exceptions.TransactionInProgress`
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "ConsumedCapacity": [{
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  }],
+                  "ItemCollectionMetrics": {
+                    "string": [{
+                      "ItemCollectionKey": {"string": "value"},
+                      "SizeEstimateRangeGB": [number]
+                    }]
+                  }
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.IdempotentParameterMismatch`
+                 :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.TimeoutException`
+                 :py:exc:`~tornado_dynamodb.exceptions.TransactionCanceled`
+                 :py:exc:`~tornado_dynamodb.exceptions.TransactionInProgress`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
         """
-        pass
+        import uuid
+        payload = {'TransactItems': self._transact_items(transact_items,
+                                                         self._compress),
+                   'ClientRequestToken':
+                       client_request_token or str(uuid.uuid4())}
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if return_item_collection_metrics:
+            payload['ReturnItemCollectionMetrics'] = 'SIZE'
+
+        future = concurrent.TracebackFuture()
+        span = self._trace('TransactWriteItems', payload, future)
+        attempts = [0]
+
+        def on_response(response):
+            try:
+                body = self._process_response(response)
+                for metrics in body.get('ItemCollectionMetrics', {}).values():
+                    for value in metrics:
+                        value['ItemCollectionKey'] = utils.unmarshall(
+                            value['ItemCollectionKey'])
+                future.set_result(body)
+            except _TRANSACT_RETRY_EXCEPTIONS as error:
+                if attempts[0] >= max_retries:
+                    return future.set_exception(error)
+                attempts[0] += 1
+                LOGGER.debug('Retrying TransactWriteItems %s (%i/%i): %s',
+                             payload['ClientRequestToken'], attempts[0],
+                             max_retries, error)
+                self.ioloop.call_later(
+                    _TRANSACT_RETRY_BACKOFF * 2 ** (attempts[0] - 1), retry)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+
+        def retry():
+            try:
+                self._fetch('TransactWriteItems', payload, span,
+                            'retry').add_done_callback(on_response)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+
+        self._fetch('TransactWriteItems', payload,
+                    span).add_done_callback(on_response)
+        return future
 
     def update_item(self, table_name, key, return_values=False,
                     condition_expression=None, update_expression=None,
@@ -1181,9 +2429,10 @@ class DynamoDB(client.AsyncAWSClient):
             primary key, you only need to provide a value for the partition
             key. For a composite primary key, you must provide values for both
             the partition key and the sort key.
-        :param bool return_values: Set to ``True`` if you want to get the item
-            attributes as they appeared before they were updated with the
-            *UpdateItem* request.
+        :param bool|str return_values: Set to ``True`` if you want to get the
+            item attributes as they appeared before they were updated with the
+            *UpdateItem* request, or to one of ``ALL_OLD``, ``UPDATED_OLD``,
+            ``ALL_NEW`` or ``UPDATED_NEW``.
         :param str condition_expression: A condition that must be satisfied in
             order for a conditional *UpdateItem* operation to succeed. One of:
             ``attribute_exists``, ``attribute_not_exists``, ``attribute_type``,
@@ -1202,14 +2451,65 @@ class DynamoDB(client.AsyncAWSClient):
             response. Should be ``None`` or one of ``INDEXES`` or ``TOTAL``
         :param bool return_item_collection_metrics: Determines whether item
             collection metrics are returned.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "Attributes": {"string": "value"},
+                  "ConsumedCapacity": {
+                    "CapacityUnits": number,
+                    "TableName": "string"
+                  },
+                  "ItemCollectionMetrics": {
+                    "ItemCollectionKey": {"string": "value"},
+                    "SizeEstimateRangeGB": [number]
+                  }
+                }
+
+            ``Attributes`` are unmarshalled to native values. An item is
+            rejected without making a request if the size of its key and
+            ``expression_attribute_values`` exceeds the maximum item size.
         :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.ConditionalCheckFailedException`
+                 :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ItemCollectionSizeLimitExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
 
         """
-        pass
+        key, size = utils.marshall_with_size(key)
+        payload = {'TableName': table_name, 'Key': key}
+        if condition_expression:
+            payload['ConditionExpression'] = condition_expression
+        if update_expression:
+            payload['UpdateExpression'] = update_expression
+        if expression_attribute_names:
+            payload['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            values, values_size = utils.marshall_with_size(
+                expression_attribute_values)
+            payload['ExpressionAttributeValues'] = values
+            size += values_size
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        if return_item_collection_metrics:
+            payload['ReturnItemCollectionMetrics'] = 'SIZE'
+        if return_values:
+            payload['ReturnValues'] = 'ALL_OLD' \
+                if return_values is True else return_values
 
-    def update_table(self, name, attributes, read_capacity_units=1,
-                     write_capacity_units=1,
-                     global_secondary_index_updates=None, stream_enabled=False,
+        if size > utils.MAX_ITEM_SIZE:
+            return self._failed(self._item_too_large(size))
+        return self._execute('UpdateItem', payload,
+                             self._decompressing(self._unmarshall_items))
+
+    def update_table(self, name, attributes=None, read_capacity_units=None,
+                     write_capacity_units=None,
+                     global_secondary_index_updates=None, stream_enabled=None,
                      stream_view_type=None):
         """Modifies the provisioned throughput settings, global secondary
         indexes, or DynamoDB Streams settings for a given table.
@@ -1229,6 +2529,8 @@ class DynamoDB(client.AsyncAWSClient):
         table returns to the ``ACTIVE`` state, the *UpdateTable* operation is
         complete.
 
+        Only the settings that are specified are changed.
+
         :param str name: The table name to be updated
         :param list attributes: A list of attribute definition key/value pairs
             where the key is the name of the attribute and the value is one of
@@ -1237,10 +2539,12 @@ class DynamoDB(client.AsyncAWSClient):
             attributes must include the key element(s) of the new index.
         :param int read_capacity_units: The maximum number of strongly
             consistent reads consumed per second before DynamoDB returns a
-            :exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+            :exc:`~tornado_dynamodb.exceptions.ThrottlingException`. Must be
+            specified with ``write_capacity_units``.
         :param int write_capacity_units: The maximum number of writes consumed
             per second before DynamoDB returns a
-            :exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+            :exc:`~tornado_dynamodb.exceptions.ThrottlingException`. Must be
+            specified with ``read_capacity_units``.
         :param dict global_secondary_index_updates: An array of one or more
             global secondary indexes for the table. For each index in the
             array, you can request one action:
@@ -1257,62 +2561,332 @@ class DynamoDB(client.AsyncAWSClient):
         :param str stream_view_type: When an item in the table is modified,
             StreamViewType determines what information is written to the stream
             for this table.
+        :returns: The table description, in the same format as
+            :py:meth:`~tornado_dynamodb.DynamoDB.create_table`
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.LimitExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceInUse`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.RequestExpired`
+                 :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable`
+                 :py:exc:`~tornado_dynamodb.exceptions.ThrottlingException`
+                 :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        payload = {'TableName': name}
+        if attributes:
+            payload['AttributeDefinitions'] = attributes
+        if (read_capacity_units is None) != (write_capacity_units is None):
+            raise ValueError('read_capacity_units and write_capacity_units '
+                             'must be specified together')
+        elif read_capacity_units is not None:
+            payload['ProvisionedThroughput'] = {
+                'ReadCapacityUnits': read_capacity_units,
+                'WriteCapacityUnits': write_capacity_units
+            }
+        if stream_enabled:
+            if stream_view_type not in _STREAM_VIEW_TYPES:
+                raise ValueError('Invalid stream_view_type value: {}'.format(
+                    stream_view_type))
+            payload['StreamSpecification'] = {
+                'StreamEnabled': True,
+                'StreamViewType': stream_view_type
+            }
+        elif stream_enabled is not None:
+            payload['StreamSpecification'] = {'StreamEnabled': False}
+        if global_secondary_index_updates:
+            payload['GlobalSecondaryIndexUpdates'] = \
+                global_secondary_index_updates
+        return self._execute('UpdateTable', payload,
+                             self._table_description)
+
+    def warm_up(self, connections):
+        """Pre-open connections to the DynamoDB endpoint so that the first
+        requests made do not pay for connection setup and TLS handshakes.
+        This only has a lasting effect when the client is using a transport
+        that keeps connections alive, such as
+        :py:class:`~tornado_dynamodb.transport.CurlTransport`.
+
+        :param int connections: The number of connections to open
+        :returns: The number of connections established
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self.transport.warm_up(self._endpoint_url, connections)
+
+    def _count(self, operation, payload):
+        """Follow ``LastEvaluatedKey`` through the pages of a *Query* or
+        *Scan* made with ``Select`` set to ``COUNT``, summing the counts.
+        ``LastEvaluatedKey`` is passed back in its wire format, so nothing in
+        the responses is unmarshalled.
+
+        :param str operation: ``Query`` or ``Scan``
+        :param dict payload: The marshalled request payload
+        :rtype: tornado.concurrent.Future
+
+        """
+        future = concurrent.TracebackFuture()
+        span = self._trace(operation, payload, future)
+        result = {'Count': 0, 'ScannedCount': 0}
+        if payload.get('ReturnConsumedCapacity'):
+            result['ConsumedCapacity'] = {'TableName': payload['TableName'],
+                                          'CapacityUnits': 0.0}
+
+        def on_response(response):
+            try:
+                body = self._process_response(response)
+            except Exception:
+                return future.set_exc_info(sys.exc_info())
+            if 'LastEvaluatedKey' in body:
+                fetch(dict(payload,
+                           ExclusiveStartKey=body['LastEvaluatedKey']))
+            result['Count'] += body.get('Count', 0)
+            result['ScannedCount'] += body.get('ScannedCount', 0)
+            if 'ConsumedCapacity' in result:
+                result['ConsumedCapacity']['CapacityUnits'] += \
+                    body.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+            if 'LastEvaluatedKey' not in body:
+                future.set_result(result)
+
+        def fetch(page):
+            try:
+                self._fetch(operation, page, span,
+                            'page' if page is not payload else 'attempt'
+                            ).add_done_callback(on_response)
+            except Exception:
+                future.set_exc_info(sys.exc_info())
+
+        fetch(payload)
+        return future
+
+    def _count_payload(self, table_name, consistent_read,
+                       expression_attribute_names, expression_attribute_values,
+                       filter_expression, index_name, page_size,
+                       return_consumed_capacity):
+        """Build the common request payload for
+        :py:meth:`~tornado_dynamodb.DynamoDB.count_query` and
+        :py:meth:`~tornado_dynamodb.DynamoDB.count_scan`.
+
         :rtype: dict
 
         """
-        pass
+        payload = {'TableName': table_name, 'Select': 'COUNT'}
+        if consistent_read:
+            payload['ConsistentRead'] = True
+        if expression_attribute_names:
+            payload['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            payload['ExpressionAttributeValues'] = expression_attribute_values
+        if filter_expression:
+            payload['FilterExpression'] = filter_expression
+        if index_name:
+            payload['IndexName'] = index_name
+        if page_size:
+            payload['Limit'] = page_size
+        if return_consumed_capacity:
+            payload['ReturnConsumedCapacity'] = return_consumed_capacity
+        return self._marshall_items(payload)
+
+    def _compress(self, item):
+        """Compress the attributes of an item that is written if the client
+        has a compressor.
+
+        :param dict item: The native item
+        :rtype: dict
+
+        """
+        if self.compressor:
+            return self.compressor.compress_item(item)
+        return item
+
+    def _decompressing(self, transform):
+        """Return the transform of a response with items, decompressing the
+        values of the items it returns if the client has a compressor.
+        Clients without a compressor return binary values as they are
+        stored.
+
+        :param callable transform: Transform the response body
+        :rtype: callable
+
+        """
+        if self.compressor:
+            return functools.partial(_decompress_items, transform)
+        return transform
+
+    def _describe_table_response(self, body):
+        """Return the table description from a *DescribeTable* response,
+        passing it to the hot key tracker, absence cache, capacity planner
+        and query planner.
+
+        :param dict body: The response body
+        :rtype: dict
 
-    def _fetch(self, command, body):
         """
+        table = body.get('Table')
+        if self.hot_key_tracker:
+            self.hot_key_tracker.learn(table)
+        if self.absence_cache is not None:
+            self.absence_cache.learn(table)
+        if self.capacity_planner:
+            self.capacity_planner.learn(table)
+        if self.query_planner:
+            self.query_planner.learn(table)
+        return table
 
-        :param str command:
-        :param dict body:
+    @staticmethod
+    def _failed(error):
+        """Return a future that has failed with the exception, for errors
+        that are detected before a request is made.
+
+        :param Exception error: The exception
         :rtype: :class:`tornado.concurrent.Future`
 
         """
-        try:
-            future = self.fetch('POST', '/', headers=self._headers(command),
-                                body=json.dumps(body))
-        except aws_exceptions.ConfigNotFound as error:
-            raise exceptions.ConfigNotFound(str(error))
-        except aws_exceptions.ConfigParserError as error:
-            raise exceptions.ConfigParserError(str(error))
-        except aws_exceptions.NoCredentialsError as error:
-            raise exceptions.NoCredentialsError(str(error))
-        except aws_exceptions.NoProfileError as error:
-            raise exceptions.NoProfileError(str(error))
-        except httpclient.HTTPError as error:
-            if error.code == 599:
-                raise exceptions.TimeoutException()
-            else:
-                raise exceptions.RequestException(error.message)
+        future = concurrent.TracebackFuture()
+        future.set_exception(error)
+        return future
+
+    def _fetch(self, command, body, span=None, name='attempt'):
+        """Make the HTTP request for an API operation, passing it to the hot
+        key tracker, absence cache, query planner and capacity planner.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param span: The span of the operation
+        :type span: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param str name: The child span name
+        :rtype: :class:`tornado.concurrent.Future`
+
+        """
+        if self.hot_key_tracker:
+            self.hot_key_tracker.observe(command, body)
+        if self.absence_cache is not None:
+            self.absence_cache.observe(command, body)
+        if self.query_planner:
+            self.query_planner.observe(command, body)
+        planned = self.capacity_planner and self.capacity_planner.prepare(
+            command, body)
+        future = super(DynamoDB, self)._fetch(command, body, span, name)
+        if planned:
+            self._planned[future] = command, body
         return future
 
+    def _observer(self, response):
+        """Return the functions that pass the decoded body of a response to
+        the capacity planner, if it selected the request.
+
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+        :rtype: tuple
+
+        """
+        planned = self._planned.pop(response, None)
+        if not planned:
+            return None
+        from tornado_dynamodb import capacity
+        command, body = planned
+        return (functools.partial(capacity.usage, command, body),
+                functools.partial(self.capacity_planner.record_usage,
+                                  command, body))
+
+    def _process_response(self, response):
+        """Return the decoded body of a response, passing it or the error
+        to the capacity planner if it selected the request.
+
+        :param response: The request future
+        :type response: :class:`tornado.concurrent.Future`
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        planned = self._planned.pop(response, None)
+        try:
+            body = super(DynamoDB, self)._process_response(response)
+        except exceptions.DynamoDBException as error:
+            if planned:
+                self.capacity_planner.observe_error(planned[0], planned[1],
+                                                    error)
+            raise
+        if planned:
+            self.capacity_planner.observe(planned[0], planned[1], body)
+        return body
+
     @staticmethod
-    def _process_response(response):
-        error = response.exception()
-        if error:
-            raise error
-        http_response = response.result()
-        if not http_response or not http_response.body:
-            raise exceptions.DynamoDBException('empty response')
-        body = json.loads(http_response.body.decode('utf-8'))
-        if http_response.code != 200:
-            if body['__type'] in exceptions.MAP:
-                raise exceptions.MAP[body['__type']](body['message'])
-            raise ValueError('Unhandled exception!', body)
+    def _item_too_large(size):
+        """Return the exception raised before sending a request for an item
+        that DynamoDB would reject for exceeding the maximum item size.
+
+        :param int size: The item size in bytes
+        :rtype: tornado_dynamodb.exceptions.ValidationException
+
+        """
+        return exceptions.ValidationException(
+            'Item size of {} bytes has exceeded the maximum allowed size of '
+            '{} bytes'.format(size, utils.MAX_ITEM_SIZE))
+
+    @classmethod
+    def _batch_get_response(cls, body):
+        """Unmarshall the items and unprocessed keys of a *BatchGetItem*
+        response.
+
+        :param dict body: The response body
+        :rtype: dict
+
+        """
+        body = cls._unmarshall_items(body)
+        body['UnprocessedKeys'] = cls._get_requests(
+            body.get('UnprocessedKeys', {}), utils.unmarshall)
+        return body
+
+    @classmethod
+    def _batch_write_response(cls, body):
+        """Unmarshall the unprocessed items of a *BatchWriteItem* response.
+
+        :param dict body: The response body
+        :rtype: dict
+
+        """
+        body['UnprocessedItems'] = cls._write_requests(
+            body.get('UnprocessedItems', {}), utils.unmarshall)
         return body
 
     @staticmethod
-    def _headers(method):
-        """Return request headers for the specified API method
+    def _get_item_response(body):
+        """Unmarshall the item of a *GetItem* response, which does not
+        have an ``Item`` if the item does not exist.
 
-        :param api method: The API method
-        :type: dict
+        :param dict body: The response body
+        :rtype: dict
 
         """
-        return {'Content-Type': 'application/x-amz-json-1.0',
-                'x-amz-target': 'DynamoDB_20120810.{}'.format(method)}
+        if 'Item' in body:
+            body['Item'] = utils.unmarshall(body['Item'])
+        return body
+
+    @staticmethod
+    def _table_description(body):
+        """Return the table description of a *CreateTable*, *DeleteTable*
+        or *UpdateTable* response.
+
+        :param dict body: The response body
+        :rtype: dict
+
+        """
+        return body.get('TableDescription')
+
+    @staticmethod
+    def _transact_get_response(body):
+        """Unmarshall the items of a *TransactGetItems* response.
+
+        :param dict body: The response body
+        :rtype: dict
+
+        """
+        for value in body.get('Responses', []):
+            if 'Item' in value:
+                value['Item'] = utils.unmarshall(value['Item'])
+        return body
 
     @staticmethod
     def _marshall_items(kwargs):
@@ -1335,10 +2909,195 @@ class DynamoDB(client.AsyncAWSClient):
         :rtype: dict
 
         """
-        for key in ['Attributes', 'ItemCollectionKey', 'LastEvaluatedKey',
-                    'Responses', 'UnprocessedKeys']:
-            for item in results.get(key, {}):
-                results[key][item] = utils.unmarshall(results[key][item])
+        for key in ['Attributes', 'ItemCollectionKey', 'LastEvaluatedKey']:
+            if key in results:
+                results[key] = utils.unmarshall(results[key])
+        for table in results.get('Responses', {}):
+            results['Responses'][table] = [
+                utils.unmarshall(item) for item in results['Responses'][table]]
         for index, value in enumerate(results.get('Items', [])):
             results['Items'][index] = utils.unmarshall(value)
         return results
+
+    @staticmethod
+    def _get_requests(request_items, transform):
+        """Apply the marshalling transform to the keys in a *BatchGetItem*
+        request or ``UnprocessedKeys`` response.
+
+        :param dict request_items: The key requests by table name
+        :param callable transform: The marshalling function to apply
+        :rtype: dict
+
+        """
+        result = {}
+        for table, request in request_items.items():
+            result[table] = dict(request)
+            result[table]['Keys'] = [transform(key)
+                                     for key in request.get('Keys', [])]
+        return result
+
+    @staticmethod
+    def _write_requests(request_items, transform, item_transform=None):
+        """Apply the marshalling transform to the items and keys in a
+        *BatchWriteItem* request or ``UnprocessedItems`` response.
+
+        :param dict request_items: The write requests by table name
+        :param callable transform: The marshalling function to apply
+        :param callable item_transform: The function to apply to items
+            instead of ``transform``
+        :rtype: dict
+
+        """
+        item_transform = item_transform or transform
+        result = {}
+        for table, requests in request_items.items():
+            result[table] = []
+            for request in requests:
+                if 'PutRequest' in request:
+                    result[table].append({'PutRequest': {
+                        'Item': item_transform(
+                            request['PutRequest']['Item'])}})
+                else:
+                    result[table].append({'DeleteRequest': {
+                        'Key': transform(request['DeleteRequest']['Key'])}})
+        return result
+
+    @staticmethod
+    def _transact_items(transact_items, compress=None):
+        """Marshall the items, keys and expression attribute values in the
+        actions of a *TransactGetItems* or *TransactWriteItems* request.
+
+        :param list transact_items: The transaction actions
+        :param callable compress: The function to apply to items before
+            they are marshalled
+        :rtype: list
+
+        """
+        result = []
+        for action in transact_items:
+            marshalled = {}
+            for name, request in action.items():
+                marshalled[name] = dict(request)
+                for key in ['Item', 'Key', 'ExpressionAttributeValues']:
+                    if key in request:
+                        value = request[key]
+                        if key == 'Item' and compress:
+                            value = compress(value)
+                        marshalled[name][key] = utils.marshall(value)
+            result.append(marshalled)
+        return result
+
+
+def _decode_response(body, transform, summarize=None):
+    """Decode a response body and apply the transform to it, returning the
+    result and the summary of the decoded body made by ``summarize`` before
+    it is transformed. This runs in the executor of a
+    :py:class:`~tornado_dynamodb.DynamoDB` client.
+
+    :param bytes body: The response body
+    :param callable transform: Transform the decoded body
+    :param callable summarize: Summarize the decoded body
+    :rtype: tuple
+
+    """
+    body = json.loads(body.decode('utf-8'))
+    summary = summarize(body) if summarize else None
+    return transform(body) if transform else body, summary
+
+
+def _decompress_items(transform, body):
+    """Apply the transform to a response body and decompress the values of
+    the items in the result.
+
+    :param callable transform: Transform the response body
+    :param dict body: The response body
+    :rtype: dict
+
+    """
+    from tornado_dynamodb import compression
+    result = transform(body)
+    for key in ('Attributes', 'Item'):
+        if key in result:
+            result[key] = compression.decompress_item(result[key])
+    for index, item in enumerate(result.get('Items', [])):
+        result['Items'][index] = compression.decompress_item(item)
+    responses = result.get('Responses', {})
+    if isinstance(responses, dict):
+        for table, items in responses.items():
+            responses[table] = [compression.decompress_item(item)
+                                for item in items]
+    else:
+        for value in responses:
+            if 'Item' in value:
+                value['Item'] = compression.decompress_item(value['Item'])
+    return result
+
+
+def _request_error(response):
+    """Return the exception of a request future. HTTP errors with an AWS
+    error response body are returned as the
+    :py:exc:`~tornado_aws.exceptions.AWSError` that
+    :py:meth:`tornado_aws.client.AsyncAWSClient.fetch` raises for them, so
+    requests sent to the transport directly fail in the same way.
+
+    :param response: The request future
+    :type response: :class:`tornado.concurrent.Future`
+    :rtype: Exception
+
+    """
+    error = response.exception()
+    if not isinstance(error, httpclient.HTTPError) or error.code != 400 or \
+            error.response is None or not error.response.body:
+        return error
+    try:
+        payload = json.loads(error.response.body.decode('utf-8'))
+    except ValueError:
+        return error
+    if not isinstance(payload, dict) or '__type' not in payload:
+        return error
+    return aws_exceptions.AWSError(
+        type=payload['__type'],
+        message=payload.get('message', payload.get('Message')))
+
+
+def _table_names(payload):
+    """Return the sorted names of the tables a request payload is for.
+
+    :param dict payload: The request payload, in the wire format
+    :rtype: list
+
+    """
+    if 'TableName' in payload:
+        return [payload['TableName']]
+    names = set(payload.get('RequestItems', {}))
+    for action in payload.get('TransactItems', []):
+        for request in action.values():
+            names.add(request.get('TableName'))
+    return sorted(name for name in names if name)
+
+
+class _LoopState(object):
+    """The transport and credentials a client uses on one IOLoop."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.auth_config = None
+
+
+class _MergeEntry(object):
+    """Heap entry for the head item of a partition in
+    :py:meth:`~tornado_dynamodb.DynamoDB.multi_query`, ordered by sort key
+    value in the query direction and then by partition.
+
+    """
+    __slots__ = ('value', 'index', 'forward')
+
+    def __init__(self, value, index, forward):
+        self.value = value
+        self.index = index
+        self.forward = forward
+
+    def __lt__(self, other):
+        if self.value == other.value:
+            return self.index < other.index
+        return (self.value < other.value) == self.forward
@@ -0,0 +1,355 @@
+"""
+Absent Keys
+===========
+:py:class:`~tornado_dynamodb.absence.AbsenceCache` answers
+:py:meth:`~tornado_dynamodb.DynamoDB.get_item` requests for keys that are
+known not to exist without making a request, which makes lookups that
+mostly miss, such as abuse and deduplication checks, cheap:
+
+.. code:: python
+
+    cache = absence.AbsenceCache(ttl=30)
+    client = tornado_dynamodb.DynamoDB(absence_cache=cache)
+    yield cache.build(client, 'seen-messages')
+    ...
+    result = yield client.get_item('seen-messages', {'id': message_id})
+    if 'Item' not in result:
+        ...
+
+Keys are known to be absent in two ways:
+
+- **Negative cache**: a key that a *GetItem* request did not find is
+  remembered for ``ttl`` seconds. Eventually consistent reads are answered
+  from it, strongly consistent reads always make a request.
+- **Bloom filter**: :py:meth:`~tornado_dynamodb.absence.AbsenceCache.build`
+  scans the keys of a table into a
+  :py:class:`~tornado_dynamodb.absence.BloomFilter`, and any key that is not
+  in it definitely does not exist.
+
+Both are updated by the writes made through the client: a *PutItem*,
+*UpdateItem*, *BatchWriteItem* or *TransactWriteItems* request for a key
+removes it from the negative cache and adds it to the Bloom filter. Writes
+made by other clients are not seen, so the negative cache can be stale for
+up to ``ttl`` seconds and a Bloom filter should only be built for a table
+that is only written to through the client, or rebuilt periodically.
+Deleted keys stay in the Bloom filter until it is rebuilt.
+
+"""
+import collections
+import hashlib
+import json
+import logging
+import math
+import struct
+import time
+
+from tornado import gen
+
+from tornado_dynamodb import expressions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 1024
+DEFAULT_ERROR_RATE = 0.01
+DEFAULT_MAX_SIZE = 100000
+DEFAULT_TTL = 60.0
+
+
+class BloomFilter(object):
+    """A Bloom filter sized for ``capacity`` values with a false positive
+    rate of ``error_rate``. Values that were added are always found, and a
+    value that was not added is found with about ``error_rate``
+    probability, which increases once more than ``capacity`` values have
+    been added.
+
+    :param int capacity: The number of values to size the filter for
+    :param float error_rate: The false positive rate at ``capacity``
+    :raises: ValueError
+
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY,
+                 error_rate=DEFAULT_ERROR_RATE):
+        if capacity < 1 or not 0 < error_rate < 1:
+            raise ValueError('capacity must be positive and error_rate '
+                             'between 0 and 1')
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) /
+                                  math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) *
+                                       math.log(2))))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, value):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(value))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        """Add a value to the filter.
+
+        :param bytes value: The value to add
+
+        """
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def _positions(self, value):
+        """Return the bit positions of a value, using double hashing of the
+        two halves of its MD5 digest.
+
+        """
+        first, second = struct.unpack('<QQ', hashlib.md5(value).digest())
+        return [(first + offset * second) % self.size
+                for offset in range(self.hashes)]
+
+
+class AbsenceCache(object):
+    """Remember the keys that are known not to exist, with a negative cache
+    of the keys that were not found and optional Bloom filters of the keys
+    that do exist.
+
+    The key schema of a table is learned from the *CreateTable* requests and
+    :py:meth:`~tornado_dynamodb.DynamoDB.describe_table` responses that pass
+    through the client, or can be configured with ``key_schemas``. It is
+    needed to find the key of the items written with *PutItem*. When it is
+    not known, a put removes every negative cache entry of the table.
+
+    :param float ttl: The number of seconds to remember a key that was not
+        found for
+    :param int max_size: The most keys to remember, the least recently
+        added are discarded first
+    :param dict key_schemas: A mapping of table names to the list of their
+        key attribute names
+
+    """
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE,
+                 key_schemas=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.key_schemas = dict(key_schemas or {})
+        self.hits = 0
+        self._building = collections.defaultdict(list)
+        self._entries = collections.OrderedDict()
+        self._filters = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def absent(self, table_name, key, consistent_read=False):
+        """Return ``True`` if the key is known not to exist.
+
+        :param str table_name: The table name
+        :param dict key: The key, in the wire format
+        :param bool consistent_read: Ignore the negative cache
+        :rtype: bool
+
+        """
+        value = _canonical(key)
+        if not consistent_read:
+            expires = self._entries.get((table_name, value))
+            if expires is not None:
+                if expires > time.time():
+                    self.hits += 1
+                    return True
+                del self._entries[table_name, value]
+        bloom = self._filters.get(table_name)
+        if bloom is not None and value not in bloom:
+            self.hits += 1
+            return True
+        return False
+
+    @gen.coroutine
+    def build(self, client, table_name, capacity=None,
+              error_rate=DEFAULT_ERROR_RATE):
+        """Scan the keys of a table into a new Bloom filter and use it for
+        the table once the scan is complete. Keys written through the client
+        while the table is scanned are added to the new filter.
+
+        :param client: The client to scan the table with
+        :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+        :param str table_name: The table name
+        :param int capacity: The number of keys to size the filter for,
+            defaults to twice the item count of the table
+        :param float error_rate: The false positive rate at ``capacity``
+        :returns: The number of keys added to the filter
+        :rtype: int
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        table = yield client.describe_table(table_name)
+        self.learn(table)
+        bloom = BloomFilter(
+            capacity or max(DEFAULT_CAPACITY, 2 * table.get('ItemCount', 0)),
+            error_rate)
+        names = dict(('#k{}'.format(offset), name) for offset, name
+                     in enumerate(self.key_schemas[table_name]))
+        self._building[table_name].append(bloom)
+        try:
+            start_key = None
+            while True:
+                result = yield client.scan(
+                    table_name, exclusive_start_key=start_key,
+                    expression_attribute_names=names,
+                    projection_expression=', '.join(sorted(names)),
+                    raw=True)
+                for item in result.get('Items', []):
+                    bloom.add(_canonical(item))
+                start_key = result.get('LastEvaluatedKey')
+                if not start_key:
+                    break
+        finally:
+            self._building[table_name].remove(bloom)
+        self._filters[table_name] = bloom
+        LOGGER.debug('Built a Bloom filter of %i keys for %s',
+                     len(bloom), table_name)
+        raise gen.Return(len(bloom))
+
+    def clear(self, table_name=None):
+        """Discard the negative cache entries and Bloom filter of a table, or
+        of every table.
+
+        :param str table_name: The table name
+
+        """
+        if table_name is None:
+            self._entries.clear()
+            self._filters.clear()
+            return
+        self._filters.pop(table_name, None)
+        self.clear_missing(table_name)
+
+    def exists(self, table_name, key):
+        """Record that a key exists, removing it from the negative cache and
+        adding it to the Bloom filter of the table.
+
+        :param str table_name: The table name
+        :param dict key: The key, in the wire format
+
+        """
+        value = _canonical(key)
+        self._entries.pop((table_name, value), None)
+        for bloom in [self._filters.get(table_name)] + \
+                self._building.get(table_name, []):
+            if bloom is not None:
+                bloom.add(value)
+
+    def learn(self, table):
+        """Learn the key schema of a table from a table description or
+        *CreateTable* request.
+
+        :param dict table: The table description
+
+        """
+        self.key_schemas[table['TableName']] = [
+            key['AttributeName'] for key in table.get('KeySchema', [])]
+
+    def missing(self, table_name, key):
+        """Record that a key does not exist.
+
+        :param str table_name: The table name
+        :param dict key: The key, in the wire format
+
+        """
+        entry = table_name, _canonical(key)
+        self._entries.pop(entry, None)
+        self._entries[entry] = time.time() + self.ttl
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def observe(self, command, body):
+        """Record the keys written by a request. This is called by the
+        client for each request it makes.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+
+        """
+        if command == 'CreateTable':
+            return self.learn(body)
+        try:
+            for table_name, key, item in _written(command, body):
+                if key is None:
+                    key = self._key(table_name, item)
+                if key is None:
+                    self.clear_missing(table_name)
+                else:
+                    self.exists(table_name, key)
+        except (KeyError, TypeError) as error:
+            LOGGER.debug('Could not record the keys of a %s request: %s',
+                         command, error)
+
+    def observe_get(self, table_name, key, response):
+        """Record the key as missing if a *GetItem* request did not find it.
+
+        :param str table_name: The table name
+        :param dict key: The key, in the wire format
+        :param response: The future of the request
+        :type response: :class:`tornado.concurrent.Future`
+
+        """
+        if not response.exception() and 'Item' not in response.result():
+            self.missing(table_name, key)
+
+    def clear_missing(self, table_name):
+        """Discard the negative cache entries of a table.
+
+        :param str table_name: The table name
+
+        """
+        for entry in [entry for entry in self._entries
+                      if entry[0] == table_name]:
+            del self._entries[entry]
+
+    def _key(self, table_name, item):
+        """Return the key of an item, or :data:`None` if the key schema of
+        the table is not known.
+
+        """
+        names = self.key_schemas.get(table_name)
+        if not names:
+            return None
+        return dict((name, item[name]) for name in names)
+
+
+def _canonical(key):
+    """Return the bytes that identify a key in the wire format. Numbers are
+    normalized, since ``2.50`` and ``2.5`` are the same key.
+
+    """
+    key = dict((name, {'N': expressions.format_number(
+        expressions.normalize_key(value))} if 'N' in value else value)
+        for name, value in key.items())
+    return json.dumps(key, sort_keys=True, separators=(',', ':'),
+                      default=utils.json_default).encode('utf-8')
+
+
+def _written(command, body):
+    """Return the ``(table, key, item)`` of each item a request writes,
+    with either the key or the item set.
+
+    """
+    if command == 'PutItem':
+        return [(body['TableName'], None, body['Item'])]
+    elif command == 'UpdateItem':
+        return [(body['TableName'], body['Key'], None)]
+    elif command == 'BatchWriteItem':
+        return [(table_name, None, request['PutRequest']['Item'])
+                for table_name, requests in body['RequestItems'].items()
+                for request in requests if 'PutRequest' in request]
+    elif command == 'TransactWriteItems':
+        written = []
+        for action in body['TransactItems']:
+            if 'Put' in action:
+                written.append((action['Put']['TableName'], None,
+                                action['Put']['Item']))
+            elif 'Update' in action:
+                written.append((action['Update']['TableName'],
+                                action['Update']['Key'], None))
+        return written
+    return []
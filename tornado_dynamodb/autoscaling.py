@@ -0,0 +1,405 @@
+"""
+Provisioned Capacity Autoscaling
+================================
+:py:class:`~tornado_dynamodb.autoscaling.AutoScaler` adjusts the provisioned
+throughput of tables and global secondary indexes from the consumed capacity
+and throttled requests observed by a :py:class:`~tornado_dynamodb.DynamoDB`
+client, using :py:meth:`~tornado_dynamodb.DynamoDB.update_table`. Because it
+reacts to the client's own requests instead of CloudWatch metrics, it can
+raise throughput seconds after a traffic ramp starts being throttled.
+
+.. code:: python
+
+    scaler = autoscaling.AutoScaler(
+        min_capacity=5, max_capacity=500,
+        bounds={'events/by-user': (10, 1000)})
+    client = tornado_dynamodb.DynamoDB(capacity_planner=scaler)
+    scaler.start(client)
+
+The scaler is a :py:class:`~tornado_dynamodb.capacity.CapacityPlanner` that
+keeps one second buckets for ``window`` seconds, and every ``interval``
+seconds it provisions each table and index it has seen requests for so that
+the consumed rate over the window uses ``target_utilization`` of it. When a
+request is throttled, the table is evaluated straight away and its
+throughput multiplied by at least ``scale_out_factor``, since the consumed
+capacity of throttled traffic understates the demand.
+
+Throughput is only decreased when it is at least ``scale_in_margin`` above
+what is needed, ``scale_in_cooldown`` seconds after the last change and
+within the DynamoDB decrease limits: four decreases at any time in a UTC
+day, and after that one more for each hour without a decrease, up to
+:py:data:`~tornado_dynamodb.autoscaling.DECREASES_PER_DAY`. Tables in
+on-demand mode and tables that are not ``ACTIVE`` are not changed.
+
+"""
+import collections
+import logging
+import math
+import time
+
+from tornado import gen
+from tornado import ioloop
+
+from tornado_dynamodb import capacity
+from tornado_dynamodb import exceptions
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 10
+DEFAULT_MAX_CAPACITY = 40000
+DEFAULT_WINDOW = 60
+
+#: The maximum number of throughput decreases per table or index in a UTC day
+DECREASES_PER_DAY = 27
+
+#: The number of decreases that can be made at any time in a UTC day
+FREE_DECREASES = 4
+
+#: The number of seconds without a decrease before another is allowed, once
+#: the free decreases are used
+DECREASE_INTERVAL = 3600
+
+_KINDS = ('read', 'write')
+_UNITS = {'read': 'ReadCapacityUnits', 'write': 'WriteCapacityUnits'}
+
+
+class AutoScaler(capacity.CapacityPlanner):
+    """Scale the provisioned throughput of the tables and global secondary
+    indexes used through a client. Pass the scaler as the
+    ``capacity_planner`` of the client and then :py:meth:`start` it with the
+    client.
+
+    Tables and indexes are named as in
+    :py:class:`~tornado_dynamodb.capacity.CapacityPlanner`, with global
+    secondary indexes as ``table/index``.
+
+    :param int min_capacity: The fewest capacity units to provision
+    :param int max_capacity: The most capacity units to provision
+    :param dict bounds: ``(min_capacity, max_capacity)`` for specific
+        tables and indexes
+    :param float target_utilization: The fraction of the provisioned
+        throughput that the consumed rate should use
+    :param int window: The number of seconds to measure the consumed rate
+        over
+    :param int interval: The number of seconds between evaluations
+    :param float scale_out_factor: The smallest multiple of the current
+        throughput to provision when requests are throttled
+    :param float scale_in_margin: The fraction of the current throughput
+        that must be unused before it is decreased
+    :param int scale_out_cooldown: The number of seconds after a change
+        before throughput is increased again
+    :param int scale_in_cooldown: The number of seconds after a change, or
+        after the scaler is created, before throughput is decreased
+    :param list tables: The tables to scale, defaults to every table the
+        client makes requests to
+
+    """
+    def __init__(self, min_capacity=1, max_capacity=DEFAULT_MAX_CAPACITY,
+                 bounds=None,
+                 target_utilization=capacity.DEFAULT_TARGET_UTILIZATION,
+                 window=DEFAULT_WINDOW, interval=DEFAULT_INTERVAL,
+                 scale_out_factor=2.0, scale_in_margin=0.2,
+                 scale_out_cooldown=30, scale_in_cooldown=300, tables=None):
+        super(AutoScaler, self).__init__(resolution=1, retention=window)
+        self.min_capacity = min_capacity
+        self.max_capacity = max_capacity
+        self.bounds = dict(bounds or {})
+        self.target_utilization = target_utilization
+        self.window = window
+        self.interval = interval
+        self.scale_out_factor = scale_out_factor
+        self.scale_in_margin = scale_in_margin
+        self.scale_out_cooldown = scale_out_cooldown
+        self.scale_in_cooldown = scale_in_cooldown
+        self.tables = tables
+        self._changed = {}
+        self._client = None
+        self._evaluating = set()
+        self._pending = set()
+        self._periodic = None
+        self._throttles = {}
+
+    def start(self, client):
+        """Start evaluating the tables every ``interval`` seconds on the
+        current :py:class:`~tornado.ioloop.IOLoop`.
+
+        :param client: The client to update the tables with
+        :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+
+        """
+        self.stop()
+        self._client = client
+        self._periodic = ioloop.PeriodicCallback(self.scale,
+                                                 self.interval * 1000)
+        self._periodic.start()
+
+    def stop(self):
+        """Stop evaluating the tables."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+        self._client = None
+
+    @gen.coroutine
+    def scale(self, table=None):
+        """Evaluate a table, or every table, and update the throughput of
+        the ones that need it. Errors are logged and do not stop the other
+        tables from being evaluated.
+
+        :param str table: The table to evaluate
+        :returns: The :py:meth:`~tornado_dynamodb.DynamoDB.update_table`
+            keyword arguments used for each table that was updated
+        :rtype: dict
+
+        """
+        client, updated = self._client, {}
+        if client is None:
+            raise gen.Return(updated)
+        for name in [table] if table else self._scaled_tables():
+            if name in self._evaluating:
+                continue
+            self._evaluating.add(name)
+            try:
+                description = yield client.describe_table(name)
+                update = self.plan(description)
+                if update:
+                    LOGGER.info('Updating the throughput of %s: %r',
+                                name, update)
+                    yield client.update_table(name, **update)
+                    self._updated(name, update)
+                    updated[name] = update
+            except exceptions.DynamoDBException as error:
+                LOGGER.warning('Could not scale %s: %s', name, error)
+            finally:
+                self._evaluating.discard(name)
+        raise gen.Return(updated)
+
+    def plan(self, description):
+        """Return the :py:meth:`~tornado_dynamodb.DynamoDB.update_table`
+        keyword arguments that change the throughput of a table and its
+        global secondary indexes, or :data:`None` if no change is needed.
+
+        :param dict description: The table description
+        :rtype: dict
+
+        """
+        if description.get('TableStatus', 'ACTIVE') != 'ACTIVE' or \
+                description.get('BillingModeSummary', {}).get(
+                    'BillingMode') == 'PAY_PER_REQUEST':
+            return None
+        table, result = description['TableName'], {}
+        units = self._target(table, description['ProvisionedThroughput'])
+        if units:
+            result['read_capacity_units'] = units['read']
+            result['write_capacity_units'] = units['write']
+        for index in description.get('GlobalSecondaryIndexes', []):
+            if index.get('IndexStatus', 'ACTIVE') != 'ACTIVE' or \
+                    'ProvisionedThroughput' not in index:
+                continue
+            units = self._target('{}/{}'.format(table, index['IndexName']),
+                                 index['ProvisionedThroughput'])
+            if units:
+                result.setdefault('global_secondary_index_updates', []).append(
+                    {'Update': {'IndexName': index['IndexName'],
+                                'ProvisionedThroughput': {
+                                    'ReadCapacityUnits': units['read'],
+                                    'WriteCapacityUnits': units['write']}}})
+        return result or None
+
+    def rate(self, resource, kind):
+        """Return the capacity units consumed per second by a table or
+        index over the last ``window`` seconds.
+
+        :param str resource: The table name, or ``table/index``
+        :param str kind: ``read`` or ``write``
+        :rtype: float
+
+        """
+        usage = self._usage.get(resource)
+        if usage is None:
+            return 0.0
+        current = self._bucket()
+        return sum(usage.units[kind].get(bucket, 0)
+                   for bucket in range(current - self.window + 1,
+                                       current + 1)) / float(self.window)
+
+    def record_throttle(self, resource, kind, count=1, timestamp=None):
+        """Record throttled requests for a table or index.
+
+        :param str resource: The table name, or ``table/index``
+        :param str kind: ``read`` or ``write``
+        :param int count: The number of throttled requests
+        :param float timestamp: When the requests were throttled, defaults
+            to now
+
+        """
+        throttles = self._throttles.setdefault(
+            resource, {'read': collections.Counter(),
+                       'write': collections.Counter()})
+        throttles[kind][self._bucket(timestamp)] += count
+        current = self._bucket()
+        for buckets in throttles.values():
+            for bucket in [bucket for bucket in buckets
+                           if bucket <= current - self.window]:
+                del buckets[bucket]
+
+    def throttles(self, resource, kind):
+        """Return the number of throttled requests for a table or index
+        since the later of its last throughput change and the start of the
+        window.
+
+        :param str resource: The table name, or ``table/index``
+        :param str kind: ``read`` or ``write``
+        :rtype: int
+
+        """
+        buckets = self._throttles.get(resource, {}).get(kind, {})
+        first = max(self._bucket() - self.window,
+                    self._bucket(self._changed.get(resource, 0)))
+        return sum(count for bucket, count in buckets.items()
+                   if bucket > first)
+
+    def observe_error(self, command, body, error):
+        """Record the table or index that a request was throttled by, and
+        evaluate the table straight away.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param error: The exception the request failed with
+        :type error: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        if isinstance(error, exceptions.ProvisionedThroughputExceeded):
+            self._throttled(command, body, _request_tables(body))
+
+    def record_usage(self, command, body, summary):
+        """Record the consumed capacity of a completed request, and the
+        unprocessed requests of a batch operation as throttles.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param tuple summary: The values returned by
+            :py:func:`~tornado_dynamodb.capacity.usage`
+
+        """
+        super(AutoScaler, self).record_usage(command, body, summary)
+        if summary and summary[2]:
+            self._throttled(command, body, summary[2])
+
+    def reset(self):
+        """Discard all of the recorded usage and throttles."""
+        super(AutoScaler, self).reset()
+        self._changed = {}
+        self._throttles = {}
+
+    def _bounds(self, resource):
+        return self.bounds.get(resource,
+                               (self.min_capacity, self.max_capacity))
+
+    def _can_decrease(self, throughput):
+        """Return ``True`` if the DynamoDB limits allow the throughput to be
+        decreased.
+
+        """
+        now = time.time()
+        decreases = throughput.get('NumberOfDecreasesToday', 0)
+        last = throughput.get('LastDecreaseDateTime') or 0
+        if last // 86400 != now // 86400:
+            decreases = 0
+        if decreases >= DECREASES_PER_DAY:
+            return False
+        return decreases < FREE_DECREASES or \
+            now - last >= DECREASE_INTERVAL
+
+    def _scaled_tables(self):
+        if self.tables is not None:
+            return list(self.tables)
+        return sorted(set(resource.partition('/')[0] for resource in
+                          list(self._usage) + list(self._throttles)))
+
+    def _target(self, resource, throughput):
+        """Return the read and write units to provision for a table or
+        index, or :data:`None` if the throughput should not change.
+
+        """
+        minimum, maximum = self._bounds(resource)
+        now, changed = time.time(), self._changed.get(resource)
+        current = dict((kind, throughput[_UNITS[kind]]) for kind in _KINDS)
+        target = {}
+        for kind in _KINDS:
+            units = capacity._provision(self.rate(resource, kind),
+                                        self.target_utilization, minimum)
+            throttled = self.throttles(resource, kind)
+            if throttled:
+                units = max(units, int(math.ceil(
+                    current[kind] * self.scale_out_factor)))
+            units = min(maximum, units)
+            if units > current[kind] and changed and \
+                    now - changed < self.scale_out_cooldown and \
+                    minimum <= current[kind]:
+                units = current[kind]
+            elif units < current[kind] and current[kind] <= maximum and (
+                    throttled or
+                    now - (changed or self._start) < self.scale_in_cooldown or
+                    units > current[kind] * (1 - self.scale_in_margin)):
+                units = current[kind]
+            target[kind] = units
+        if any(target[kind] < current[kind] for kind in _KINDS) and \
+                not self._can_decrease(throughput):
+            target = dict((kind, max(target[kind], current[kind]))
+                          for kind in _KINDS)
+        return None if target == current else target
+
+    def _schedule(self, table):
+        """Evaluate a throttled table on the next IOLoop iteration, unless it
+        is already waiting to be evaluated or was changed within
+        ``scale_out_cooldown`` seconds.
+
+        """
+        if self._client is None or table in self._pending or \
+                table in self._evaluating or \
+                time.time() - self._changed.get(table, 0) < \
+                self.scale_out_cooldown:
+            return
+        self._pending.add(table)
+
+        def evaluate():
+            self._pending.discard(table)
+            return self.scale(table)
+
+        self._client.ioloop.add_callback(evaluate)
+
+    def _throttled(self, command, body, tables):
+        """Record a throttle for each table, or for the index of a *Query*
+        or *Scan*, and evaluate the tables.
+
+        """
+        kind = 'read' if command in capacity.READS else 'write'
+        for table in tables:
+            resource = table
+            if body.get('IndexName') and \
+                    '{}/{}'.format(table, body['IndexName']) not in \
+                    self.local_indexes:
+                resource = '{}/{}'.format(table, body['IndexName'])
+            self.record_throttle(resource, kind)
+            self._schedule(table)
+
+    def _updated(self, table, update):
+        """Record when the throughput of a table and its indexes changed."""
+        now = time.time()
+        if 'read_capacity_units' in update:
+            self._changed[table] = now
+        for index in update.get('global_secondary_index_updates', []):
+            self._changed['{}/{}'.format(
+                table, index['Update']['IndexName'])] = now
+
+
+def _request_tables(body):
+    """Return the names of the tables a request is made to."""
+    if 'TableName' in body:
+        return [body['TableName']]
+    elif 'RequestItems' in body:
+        return sorted(body['RequestItems'])
+    return sorted(set(
+        action[key]['TableName'] for action in body.get('TransactItems', [])
+        for key in action if 'TableName' in action[key]))
@@ -0,0 +1,483 @@
+"""
+Bulk Import and Export
+======================
+Load items into a table from JSONL or CSV files with concurrent, chunked
+*BatchWriteItem* requests, and export a table to a JSONL file with a
+segmented parallel *Scan*.
+
+Imports are rate limited, retry unprocessed items with an exponential
+backoff, and can be resumed: when a ``resume_path`` is provided, the number
+of input items that have been written is saved to it as the import
+progresses, and a restarted import skips those items.
+
+Exports keep memory bounded to one page per scan segment; each page is
+written to the output before the next page for that segment is requested.
+Items are exported in the DynamoDB JSON format that DynamoDB's own export
+to S3 uses, one ``{"Item": {...}}`` object per line, so number, binary and
+set values keep their types when the file is imported again.
+
+.. code:: python
+
+    client = tornado_dynamodb.DynamoDB()
+    stats = yield bulk.import_items(client, 'my-table',
+                                    bulk.read_jsonl('items.jsonl'),
+                                    concurrency=16, rate_limit=5000)
+    with open('export.jsonl', 'w') as handle:
+        stats = yield bulk.export_table(client, 'my-table', handle,
+                                        segments=8)
+
+The same functionality is available from the command line with the
+``tornado-dynamodb-bulk`` console script.
+
+"""
+import argparse
+import csv
+import decimal
+import json
+import logging
+import os
+import sys
+
+from tornado import gen
+from tornado import ioloop
+from tornado import queues
+
+import tornado_dynamodb
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+BATCH_SIZE = 25
+MAX_BACKOFF = 20.0
+
+_ATTRIBUTE_TYPES = {'B', 'BOOL', 'BS', 'L', 'M', 'N', 'NS', 'NULL', 'S',
+                    'SS'}
+_RETRY_EXCEPTIONS = (exceptions.InternalFailure,
+                     exceptions.ProvisionedThroughputExceeded,
+                     exceptions.RequestException,
+                     exceptions.ServiceUnavailable,
+                     exceptions.ThrottlingException,
+                     exceptions.TimeoutException)
+
+
+class Stats(object):
+    """Tracks the progress and throughput of a bulk operation."""
+
+    def __init__(self):
+        self.items = 0
+        self.requests = 0
+        self.retries = 0
+        self.skipped = 0
+        self.start = ioloop.IOLoop.current().time()
+        self.finish = None
+
+    @property
+    def elapsed(self):
+        """Return the number of seconds the operation has been running.
+
+        :rtype: float
+
+        """
+        return (self.finish or ioloop.IOLoop.current().time()) - self.start
+
+    @property
+    def throughput(self):
+        """Return the number of items processed per second.
+
+        :rtype: float
+
+        """
+        elapsed = self.elapsed
+        return self.items / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        """Return the stats as a dict.
+
+        :rtype: dict
+
+        """
+        return {'items': self.items,
+                'requests': self.requests,
+                'retries': self.retries,
+                'skipped': self.skipped,
+                'elapsed': self.elapsed,
+                'throughput': self.throughput}
+
+
+class RateLimiter(object):
+    """A token bucket that limits operations to ``rate`` per second, allowing
+    bursts of up to one second worth of operations.
+
+    :param float rate: The number of operations permitted per second
+
+    """
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._tokens = self.rate
+        self._updated = ioloop.IOLoop.current().time()
+
+    @gen.coroutine
+    def acquire(self, count=1):
+        """Wait until ``count`` operations are permitted.
+
+        :param int count: The number of operations
+
+        """
+        while True:
+            now = ioloop.IOLoop.current().time()
+            self._tokens = min(self.rate, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= count or self._tokens >= self.rate:
+                self._tokens -= count
+                return
+            yield gen.sleep((count - self._tokens) / self.rate)
+
+
+def read_jsonl(path):
+    """Yield the items in a JSONL file, one JSON object per line. Lines in
+    the DynamoDB JSON format written by
+    :py:func:`~tornado_dynamodb.bulk.export_table` are unmarshalled, and
+    non-integer numbers in plain JSON lines are read as
+    :py:class:`decimal.Decimal` values. Blank lines are skipped.
+
+    :param str path: The path to the file
+    :rtype: generator
+
+    """
+    with open(path, 'r') as handle:
+        for line in handle:
+            if line.strip():
+                item = json.loads(line, parse_float=decimal.Decimal)
+                if _is_marshalled(item):
+                    item = utils.unmarshall(item['Item'])
+                yield item
+
+
+def read_csv(path, types=None):
+    """Yield the items in a CSV file that has a header row. Empty values are
+    omitted from the item, since DynamoDB does not accept empty strings.
+
+    :param str path: The path to the file
+    :param dict types: An optional map of column name to a callable that
+        converts the column's string value, such as :py:class:`int`
+    :rtype: generator
+
+    """
+    types = types or {}
+    with open(path, 'r') as handle:
+        for row in csv.DictReader(handle):
+            item = {}
+            for key, value in row.items():
+                if value == '' or value is None:
+                    continue
+                item[key] = types[key](value) if key in types else value
+            yield item
+
+
+@gen.coroutine
+def import_items(client, table_name, items, concurrency=8, rate_limit=None,
+                 resume_path=None, batch_size=BATCH_SIZE,
+                 report_interval=10.0):
+    """Write the items to the table using concurrent *BatchWriteItem*
+    requests.
+
+    :param client: The client to write with
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table to write to
+    :param iterable items: The items to write, as native values
+    :param int concurrency: The number of concurrent *BatchWriteItem*
+        requests (Default: ``8``)
+    :param float rate_limit: The maximum number of items to write per second
+    :param str resume_path: Where to save the progress of the import. If the
+        file exists, the import resumes from the saved position.
+    :param int batch_size: The number of items per request, up to ``25``.
+        Batches are also kept under the 16 MB request size limit.
+    :param float report_interval: How often to log the throughput in seconds
+    :returns: The :py:meth:`~tornado_dynamodb.bulk.Stats.as_dict` values
+    :rtype: dict
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+    """
+    if not 0 < batch_size <= BATCH_SIZE:
+        raise ValueError('batch_size must be between 1 and {}'.format(
+            BATCH_SIZE))
+    stats = Stats()
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    progress = _Progress(resume_path)
+    queue = queues.Queue(maxsize=concurrency * 2)
+    errors = []
+
+    @gen.coroutine
+    def worker():
+        while True:
+            chunk = yield queue.get()
+            try:
+                if chunk is None:
+                    return
+                index, batch = chunk
+                if not errors:
+                    if limiter:
+                        yield limiter.acquire(len(batch))
+                    yield _write_batch(client, table_name, batch, stats)
+                    progress.complete(index, len(batch))
+            except Exception as error:
+                errors.append(error)
+            finally:
+                queue.task_done()
+
+    workers = [worker() for _ in range(concurrency)]
+    reporter = _Reporter(stats, 'Imported', report_interval)
+    batch, batch_bytes, index, position = [], 0, 0, 0
+    try:
+        for item in items:
+            position += 1
+            if position <= progress.offset:
+                stats.skipped += 1
+                continue
+            if errors:
+                break
+            size = utils.item_size(item)
+            if batch and batch_bytes + size > utils.MAX_BATCH_WRITE_SIZE:
+                yield queue.put((index, batch))
+                batch, batch_bytes, index = [], 0, index + 1
+            batch.append(item)
+            batch_bytes += size
+            if len(batch) == batch_size:
+                yield queue.put((index, batch))
+                batch, batch_bytes, index = [], 0, index + 1
+        if batch and not errors:
+            yield queue.put((index, batch))
+    finally:
+        for _ in workers:
+            yield queue.put(None)
+        yield workers
+        reporter.stop()
+        progress.save()
+    if errors:
+        raise errors[0]
+    stats.finish = ioloop.IOLoop.current().time()
+    LOGGER.info('Imported %i items into %s in %.2f seconds (%.2f items/sec)',
+                stats.items, table_name, stats.elapsed, stats.throughput)
+    raise gen.Return(stats.as_dict())
+
+
+@gen.coroutine
+def export_table(client, table_name, output, segments=4, page_size=None,
+                 report_interval=10.0, **scan_kwargs):
+    """Export all of the items in the table to ``output`` as JSONL using a
+    parallel scan with ``segments`` segments. Each line is an object with
+    the item in the DynamoDB JSON format as its ``Item`` value, which
+    :py:func:`~tornado_dynamodb.bulk.read_jsonl` reads back. Items are
+    written exactly as the scan returns them, without converting their
+    values to native types and back.
+
+    :param client: The client to scan with
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table to export
+    :param output: A file-like object to write the items to
+    :param int segments: The number of parallel scan segments
+        (Default: ``4``)
+    :param int page_size: The ``limit`` for each *Scan* request
+    :param float report_interval: How often to log the throughput in seconds
+    :param scan_kwargs: Additional keyword arguments for
+        :py:meth:`~tornado_dynamodb.DynamoDB.scan`
+    :returns: The :py:meth:`~tornado_dynamodb.bulk.Stats.as_dict` values
+    :rtype: dict
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+    """
+    stats = Stats()
+
+    @gen.coroutine
+    def scan_segment(segment):
+        start_key = None
+        while True:
+            result = yield client.scan(table_name,
+                                       exclusive_start_key=start_key,
+                                       limit=page_size, segment=segment,
+                                       total_segments=segments, raw=True,
+                                       **scan_kwargs)
+            stats.requests += 1
+            for item in result.get('Items', []):
+                output.write(json.dumps({'Item': item}, sort_keys=True))
+                output.write('\n')
+            stats.items += len(result.get('Items', []))
+            start_key = result.get('LastEvaluatedKey')
+            if not start_key:
+                return
+
+    reporter = _Reporter(stats, 'Exported', report_interval)
+    try:
+        yield [scan_segment(segment) for segment in range(segments)]
+    finally:
+        reporter.stop()
+    stats.finish = ioloop.IOLoop.current().time()
+    LOGGER.info('Exported %i items from %s in %.2f seconds (%.2f items/sec)',
+                stats.items, table_name, stats.elapsed, stats.throughput)
+    raise gen.Return(stats.as_dict())
+
+
+def _is_marshalled(value):
+    """Check to see if a line read from a JSONL file is an item in the
+    DynamoDB JSON format.
+
+    :param dict value: The decoded line
+    :rtype: bool
+
+    """
+    item = value.get('Item')
+    return len(value) == 1 and isinstance(item, dict) and all(
+        isinstance(attribute, dict) and len(attribute) == 1 and
+        next(iter(attribute)) in _ATTRIBUTE_TYPES
+        for attribute in item.values())
+
+
+@gen.coroutine
+def _write_batch(client, table_name, batch, stats):
+    """Write the batch of items, retrying unprocessed items and transient
+    errors with an exponential backoff.
+
+    :param tornado_dynamodb.DynamoDB client: The client to write with
+    :param str table_name: The table to write to
+    :param list batch: The items to write
+    :param Stats stats: The stats to update
+
+    """
+    requests = {table_name: [{'PutRequest': {'Item': item}}
+                             for item in batch]}
+    attempt = 0
+    while requests:
+        if attempt:
+            stats.retries += 1
+            yield gen.sleep(min(MAX_BACKOFF, 0.05 * (2 ** attempt)))
+        attempt += 1
+        try:
+            result = yield client.batch_write_item(requests)
+        except _RETRY_EXCEPTIONS as error:
+            LOGGER.debug('Retrying batch write: %s', error)
+            continue
+        stats.requests += 1
+        pending = result.get('UnprocessedItems') or {}
+        stats.items += (len(requests.get(table_name, [])) -
+                        len(pending.get(table_name, [])))
+        if not pending.get(table_name):
+            attempt = 0
+        requests = dict([(k, v) for k, v in pending.items() if v])
+
+
+class _Progress(object):
+    """Tracks which chunks of an import have completed, saving the number of
+    contiguous input items that have been written to ``path``.
+
+    """
+    def __init__(self, path):
+        self._path = path
+        self._completed = {}
+        self._next = 0
+        self.offset = 0
+        if path and os.path.exists(path):
+            with open(path, 'r') as handle:
+                self.offset = json.load(handle)['completed']
+        self._saved = self.offset
+
+    def complete(self, index, count):
+        self._completed[index] = count
+        while self._next in self._completed:
+            self.offset += self._completed.pop(self._next)
+            self._next += 1
+        if self.offset - self._saved >= 1000:
+            self.save()
+
+    def save(self):
+        if not self._path or self._saved == self.offset:
+            return
+        temp_path = '{}.tmp'.format(self._path)
+        with open(temp_path, 'w') as handle:
+            json.dump({'completed': self.offset}, handle)
+        os.rename(temp_path, self._path)
+        self._saved = self.offset
+
+
+class _Reporter(object):
+    """Periodically logs the throughput of a bulk operation."""
+
+    def __init__(self, stats, action, interval):
+        self._stats = stats
+        self._action = action
+        self._callback = ioloop.PeriodicCallback(self._report,
+                                                 interval * 1000)
+        self._callback.start()
+
+    def stop(self):
+        self._callback.stop()
+
+    def _report(self):
+        LOGGER.info('%s %i items (%.2f items/sec)', self._action,
+                    self._stats.items, self._stats.throughput)
+
+
+def main(args=None):
+    """Entry point for the ``tornado-dynamodb-bulk`` console script."""
+    parser = argparse.ArgumentParser(
+        description='Bulk import and export DynamoDB tables')
+    parser.add_argument('--endpoint', help='Override the endpoint URL')
+    parser.add_argument('--profile', help='The AWS configuration profile')
+    parser.add_argument('--region', help='The AWS region')
+    parser.add_argument('--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    importer = commands.add_parser('import', help='Import items from a file')
+    importer.add_argument('table', help='The table to import into')
+    importer.add_argument('path', help='The JSONL or CSV file to import')
+    importer.add_argument('--format', choices=['jsonl', 'csv'],
+                          help='The file format, detected from the file '
+                               'extension when not specified')
+    importer.add_argument('--concurrency', type=int, default=8)
+    importer.add_argument('--rate-limit', type=float,
+                          help='The maximum number of items per second')
+    importer.add_argument('--resume', dest='resume_path',
+                          help='Save progress to this file and resume '
+                               'from it when restarted')
+
+    exporter = commands.add_parser('export', help='Export a table to JSONL')
+    exporter.add_argument('table', help='The table to export')
+    exporter.add_argument('path', help='The JSONL file to write')
+    exporter.add_argument('--segments', type=int, default=4)
+    exporter.add_argument('--page-size', type=int)
+
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    @gen.coroutine
+    def run():
+        client = tornado_dynamodb.DynamoDB(args.profile, args.region,
+                                           endpoint=args.endpoint)
+        if args.command == 'import':
+            file_format = args.format or (
+                'csv' if args.path.lower().endswith('.csv') else 'jsonl')
+            items = (read_csv(args.path) if file_format == 'csv'
+                     else read_jsonl(args.path))
+            result = yield import_items(client, args.table, items,
+                                        args.concurrency, args.rate_limit,
+                                        args.resume_path)
+        else:
+            with open(args.path, 'w') as handle:
+                result = yield export_table(client, args.table, handle,
+                                            args.segments, args.page_size)
+        raise gen.Return(result)
+
+    try:
+        result = ioloop.IOLoop.current().run_sync(run)
+    except exceptions.DynamoDBException as error:
+        sys.stderr.write('Error: {}\n'.format(error))
+        return 1
+    sys.stdout.write('{} items in {:.2f} seconds ({:.2f} items/sec)\n'.format(
+        result['items'], result['elapsed'], result['throughput']))
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
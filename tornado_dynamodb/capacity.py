@@ -0,0 +1,410 @@
+"""
+Capacity Planning
+=================
+:py:class:`~tornado_dynamodb.capacity.CapacityPlanner` records the
+operations, item sizes and consumed capacity of the requests a
+:py:class:`~tornado_dynamodb.DynamoDB` client makes, and reports the read and
+write capacity units used per second by each table and global secondary
+index, what that traffic would cost in on-demand and provisioned mode, and a
+provisioned throughput configuration for
+:py:meth:`~tornado_dynamodb.DynamoDB.update_table`:
+
+.. code:: python
+
+    planner = capacity.CapacityPlanner()
+    client = tornado_dynamodb.DynamoDB(capacity_planner=planner)
+    ...
+    for resource, usage in planner.report().items():
+        LOGGER.info('%s: %.1f RCU/s p99, %.1f WCU/s p99, $%.2f/month',
+                    resource, usage['read']['p99'], usage['write']['p99'],
+                    min(usage['cost'].values()))
+    for table, throughput in planner.suggest().items():
+        yield client.update_table(table, [], **throughput)
+
+Requests that do not ask for the consumed capacity are made with
+``ReturnConsumedCapacity`` set to ``INDEXES``, so their responses include
+it. Consumed capacity is counted in buckets of ``resolution`` seconds, and
+the mean, peak and 99th percentile rates are calculated from the buckets.
+
+"""
+import collections
+import logging
+import math
+import random
+import time
+
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_RESOLUTION = 60
+DEFAULT_RETENTION = 1440
+DEFAULT_TARGET_UTILIZATION = 0.7
+
+#: Prices in USD for the us-east-1 region, per request unit in on-demand
+#: mode and per capacity unit hour in provisioned mode
+PRICING = {'on_demand_read': 0.25 / 1000000,
+           'on_demand_write': 1.25 / 1000000,
+           'provisioned_read': 0.00013,
+           'provisioned_write': 0.00065}
+
+HOURS_PER_MONTH = 730
+
+READS = {'BatchGetItem', 'GetItem', 'Query', 'Scan', 'TransactGetItems'}
+WRITES = {'BatchWriteItem', 'DeleteItem', 'PutItem', 'TransactWriteItems',
+          'UpdateItem'}
+
+
+class CapacityPlanner(object):
+    """Record the capacity consumed by the requests made through a client
+    and plan the throughput of the tables and indexes they use.
+
+    Capacity consumed by a global secondary index is recorded under
+    ``table/index``. Capacity consumed by a local secondary index is
+    recorded for its table, since it shares the table's throughput. When a
+    response does not break the capacity down by index, the capacity of
+    requests for an index is recorded for the index, unless it is known to
+    be a local secondary index from a *CreateTable* request or
+    :py:meth:`~tornado_dynamodb.DynamoDB.describe_table` response.
+
+    When ``sample_rate`` is less than ``1``, only that fraction of requests
+    is recorded and the recorded values are scaled up to estimate the total.
+
+    :param int resolution: The length of a bucket in seconds
+    :param int retention: The number of buckets to keep
+    :param float sample_rate: The fraction of requests to record
+    :param dict pricing: Override the prices in
+        :py:data:`~tornado_dynamodb.capacity.PRICING`
+    :param int seed: Seed for the sampling random number generator
+
+    """
+    def __init__(self, resolution=DEFAULT_RESOLUTION,
+                 retention=DEFAULT_RETENTION, sample_rate=1.0, pricing=None,
+                 seed=None):
+        self.resolution = resolution
+        self.retention = retention
+        self.sample_rate = sample_rate
+        self.pricing = dict(PRICING)
+        self.pricing.update(pricing or {})
+        self.local_indexes = set()
+        self._random = random.Random(seed)
+        self._start = time.time()
+        self._usage = {}
+
+    def learn(self, table):
+        """Learn the local secondary indexes of a table from a table
+        description or *CreateTable* request.
+
+        :param dict table: The table description
+
+        """
+        for index in table.get('LocalSecondaryIndexes', []):
+            self.local_indexes.add('{}/{}'.format(table['TableName'],
+                                                  index['IndexName']))
+
+    def prepare(self, command, body):
+        """Ask for the consumed capacity of a request if it does not already
+        and return ``True`` if its response should be recorded. This is
+        called by the client for each request it makes.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :rtype: bool
+
+        """
+        if command == 'CreateTable':
+            self.learn(body)
+            return False
+        elif command not in READS and command not in WRITES:
+            return False
+        elif self.sample_rate < 1 and \
+                self._random.random() >= self.sample_rate:
+            return False
+        if body.get('ReturnConsumedCapacity', 'NONE') == 'NONE':
+            body['ReturnConsumedCapacity'] = 'INDEXES'
+        return True
+
+    def observe(self, command, body, result):
+        """Record the operation, item sizes and consumed capacity of a
+        completed request. This is called by the client with the decoded
+        body of each response that :py:meth:`prepare` selected.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param dict result: The response body, in the wire format
+
+        """
+        self.record_usage(command, body, usage(command, body, result))
+
+    def observe_error(self, command, body, error):
+        """Record the failure of a request that :py:meth:`prepare` selected.
+        Failed requests do not consume capacity, so they are not recorded.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param error: The exception the request failed with
+        :type error: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+
+    def record_usage(self, command, body, summary):
+        """Record the values returned by
+        :py:func:`~tornado_dynamodb.capacity.usage` for a completed request.
+        The client calls :py:func:`~tornado_dynamodb.capacity.usage` in its
+        executor for the responses it decodes there.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+        :param tuple summary: The consumed capacity, item sizes and tables
+            with unprocessed requests, or :data:`None` if they could not be
+            read from the response
+
+        """
+        if summary is None:
+            return
+        capacity, sizes, _unprocessed = summary
+        kind = 'read' if command in READS else 'write'
+        index = body.get('IndexName')
+        try:
+            for consumed in capacity:
+                table = consumed['TableName']
+                for resource, units in self._split(table, index, consumed):
+                    self.record(resource, kind, units, command,
+                                sizes.pop(table, None))
+        except (AttributeError, KeyError, TypeError) as error:
+            LOGGER.debug('Could not record the capacity of a %s request: %s',
+                         command, error)
+        for table, values in sizes.items():
+            self.record(table, kind, 0, command, values)
+
+    def record(self, resource, kind, units, operation=None, sizes=None,
+               timestamp=None):
+        """Record consumed capacity for a table or index.
+
+        :param str resource: The table name, or ``table/index``
+        :param str kind: ``read`` or ``write``
+        :param float units: The capacity units consumed
+        :param str operation: The DynamoDB API operation to count
+        :param list sizes: The sizes of the items read or written in bytes
+        :param float timestamp: When the capacity was consumed, defaults to
+            now
+
+        """
+        usage = self._usage.get(resource)
+        if usage is None:
+            usage = self._usage[resource] = _Usage()
+        bucket = self._bucket(timestamp)
+        usage.units[kind][bucket] += units / self.sample_rate
+        if operation:
+            usage.operations[operation] += 1.0 / self.sample_rate
+        for size in sizes or []:
+            usage.sizes[kind][0] += size
+            usage.sizes[kind][1] += 1
+        current = self._bucket()
+        if usage.pruned != current:
+            usage.pruned = current
+            for buckets in usage.units.values():
+                for key in [key for key in buckets
+                            if key <= current - self.retention]:
+                    del buckets[key]
+
+    def report(self):
+        """Return the usage of each table and index as a dict of:
+
+        - ``operations``: the estimated number of each operation
+        - ``read`` and ``write``: the ``mean``, ``peak`` and ``p99``
+          capacity units per second, and the ``total`` units consumed
+        - ``item_size``: the mean size of the items ``read`` and ``written``
+        - ``cost``: the projected monthly cost in ``on_demand`` and
+          ``provisioned`` mode, with throughput provisioned as
+          :py:meth:`suggest` recommends
+
+        :rtype: dict
+
+        """
+        report = {}
+        for resource, usage in self._usage.items():
+            read, write = self._rates(usage, 'read'), self._rates(usage,
+                                                                  'write')
+            report[resource] = {
+                'operations': dict((operation, int(round(count)))
+                                   for operation, count
+                                   in usage.operations.items()),
+                'read': read,
+                'write': write,
+                'item_size': {'read': _mean(usage.sizes['read']),
+                              'written': _mean(usage.sizes['write'])},
+                'cost': self._cost(read, write)}
+        return report
+
+    def suggest(self, target_utilization=DEFAULT_TARGET_UTILIZATION,
+                minimum=1):
+        """Return the provisioned throughput for each table as keyword
+        arguments for :py:meth:`~tornado_dynamodb.DynamoDB.update_table`.
+        Throughput is provisioned so that the 99th percentile rate uses
+        ``target_utilization`` of it.
+
+        :param float target_utilization: The fraction of the provisioned
+            throughput to use
+        :param int minimum: The smallest number of units to provision
+        :rtype: dict
+
+        """
+        suggestions = {}
+        for resource in sorted(self._usage):
+            table, _, index = resource.partition('/')
+            read, write = [
+                _provision(self._rates(self._usage[resource], kind)['p99'],
+                           target_utilization, minimum)
+                for kind in ('read', 'write')]
+            suggestion = suggestions.setdefault(table, {
+                'read_capacity_units': minimum,
+                'write_capacity_units': minimum})
+            if not index:
+                suggestion['read_capacity_units'] = read
+                suggestion['write_capacity_units'] = write
+                continue
+            suggestion.setdefault('global_secondary_index_updates', []).append(
+                {'Update': {'IndexName': index,
+                            'ProvisionedThroughput': {
+                                'ReadCapacityUnits': read,
+                                'WriteCapacityUnits': write}}})
+        return suggestions
+
+    def reset(self):
+        """Discard all of the recorded usage."""
+        self._start = time.time()
+        self._usage = {}
+
+    def _bucket(self, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        return int(timestamp // self.resolution)
+
+    def _cost(self, read, write):
+        """Return the projected monthly cost of the rates in each mode."""
+        seconds = HOURS_PER_MONTH * 3600
+        provisioned = (
+            _provision(read['p99'], DEFAULT_TARGET_UTILIZATION, 1) *
+            self.pricing['provisioned_read'] +
+            _provision(write['p99'], DEFAULT_TARGET_UTILIZATION, 1) *
+            self.pricing['provisioned_write'])
+        return {'on_demand': round(
+                    seconds * (read['mean'] * self.pricing['on_demand_read'] +
+                               write['mean'] *
+                               self.pricing['on_demand_write']), 2),
+                'provisioned': round(provisioned * HOURS_PER_MONTH, 2)}
+
+    def _split(self, table, index, consumed):
+        """Return the ``(resource, units)`` pairs of a consumed capacity
+        entry, attributing local secondary index capacity to the table.
+
+        """
+        indexes = consumed.get('GlobalSecondaryIndexes', {})
+        if 'Table' not in consumed and not indexes:
+            resource = '{}/{}'.format(table, index) if index else table
+            if resource in self.local_indexes:
+                resource = table
+            return [(resource, consumed.get('CapacityUnits', 0))]
+        units = consumed.get('Table', {}).get('CapacityUnits', 0)
+        for value in consumed.get('LocalSecondaryIndexes', {}).values():
+            units += value.get('CapacityUnits', 0)
+        return [(table, units)] + [
+            ('{}/{}'.format(table, name), value.get('CapacityUnits', 0))
+            for name, value in sorted(indexes.items())]
+
+    def _rates(self, usage, kind):
+        """Return the mean, peak and 99th percentile capacity units per
+        second, and the total units, from the buckets of one kind.
+
+        """
+        current = self._bucket()
+        first = max(self._bucket(self._start), current - self.retention + 1)
+        rates = sorted(usage.units[kind].get(bucket, 0) /
+                       float(self.resolution)
+                       for bucket in range(first, current + 1)) or [0.0]
+        total = sum(usage.units[kind].values())
+        return {'mean': total / (len(rates) * float(self.resolution)),
+                'peak': rates[-1],
+                'p99': rates[int(math.ceil(0.99 * len(rates))) - 1],
+                'total': total}
+
+
+class _Usage(object):
+    """The recorded usage of a table or index."""
+
+    def __init__(self):
+        self.operations = collections.Counter()
+        self.pruned = None
+        self.sizes = {'read': [0, 0], 'write': [0, 0]}
+        self.units = {'read': collections.Counter(),
+                      'write': collections.Counter()}
+
+
+def usage(command, body, result):
+    """Return the consumed capacity entries of a response, the sizes of the
+    items read or written by table and the names of the tables with
+    unprocessed requests, or :data:`None` if they can not be read from the
+    response.
+
+    :param str command: The DynamoDB API operation
+    :param dict body: The request payload, in the wire format
+    :param dict result: The response body, in the wire format
+    :rtype: tuple
+
+    """
+    try:
+        capacity = result.get('ConsumedCapacity', [])
+        if isinstance(capacity, dict):
+            capacity = [capacity]
+        unprocessed = result.get('UnprocessedItems') or \
+            result.get('UnprocessedKeys') or {}
+        return (capacity, _sizes(command, body, result),
+                sorted(table for table, value in unprocessed.items()
+                       if value))
+    except (AttributeError, KeyError, TypeError, ValueError) as error:
+        LOGGER.debug('Could not record the capacity of a %s request: %s',
+                     command, error)
+
+
+def _mean(values):
+    """Return the mean of a ``[sum, count]`` pair."""
+    return values[0] / float(values[1]) if values[1] else 0.0
+
+
+def _sizes(command, body, result):
+    """Return the sizes of the items read or written by table."""
+    items = collections.defaultdict(list)
+    if command == 'PutItem':
+        items[body['TableName']].append(body['Item'])
+    elif command == 'BatchWriteItem':
+        for table, requests in body['RequestItems'].items():
+            items[table] += [request['PutRequest']['Item']
+                             for request in requests
+                             if 'PutRequest' in request]
+    elif command == 'TransactWriteItems':
+        for action in body['TransactItems']:
+            if 'Put' in action:
+                items[action['Put']['TableName']].append(
+                    action['Put']['Item'])
+    elif command == 'GetItem' and 'Item' in result:
+        items[body['TableName']].append(result['Item'])
+    elif command in ('Query', 'Scan'):
+        items[body['TableName']] += result.get('Items', [])
+    elif command == 'BatchGetItem':
+        for table, values in result.get('Responses', {}).items():
+            items[table] += values
+    elif command == 'TransactGetItems':
+        for action, response in zip(body['TransactItems'],
+                                    result.get('Responses', [])):
+            if 'Item' in response:
+                items[action['Get']['TableName']].append(
+                    response['Item'])
+    return dict((table, [utils.item_size(item, marshalled=True)
+                         for item in values])
+                for table, values in items.items() if values)
+
+
+def _provision(rate, target_utilization, minimum):
+    """Return the capacity units to provision for a rate."""
+    return max(minimum, int(math.ceil(rate / target_utilization)))
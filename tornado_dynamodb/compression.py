@@ -0,0 +1,244 @@
+"""
+Attribute Compression
+=====================
+:py:class:`~tornado_dynamodb.compression.Compressor` compresses large string
+and binary attribute values before an item is written, storing them as
+binary (``B``) values that start with a four byte header identifying the
+codec and the original type. Items are sized after compression, so large
+text attributes consume fewer write capacity units, and fewer read capacity
+units when they are read back.
+
+.. code:: python
+
+    client = tornado_dynamodb.DynamoDB(
+        compressor=compression.Compressor(threshold=1024,
+                                          attributes={'document'},
+                                          exclude={'id'}))
+
+The items read by a client that has a compressor are decompressed, so
+reads return the original values. Clients without a compressor, and
+:py:func:`~tornado_dynamodb.utils.unmarshall`, return binary values as they
+are stored; use :py:func:`~tornado_dynamodb.compression.decompress_item` to
+decompress the items read elsewhere, such as the images of stream records.
+Values are only compressed when the result is smaller than the original.
+
+Compression is applied to the top-level attributes of the items written by
+:py:meth:`~tornado_dynamodb.DynamoDB.put_item`,
+:py:meth:`~tornado_dynamodb.DynamoDB.batch_write_item` and the ``Put``
+actions of :py:meth:`~tornado_dynamodb.DynamoDB.transact_write_items`. Key
+attributes must not be compressed, list them in ``exclude`` if their values
+can be longer than the threshold.
+
+`zlib <https://docs.python.org/3/library/zlib.html>`_ is always available.
+``lz4`` and ``zstd`` are registered when the
+`lz4 <https://pypi.python.org/pypi/lz4>`_ or
+`zstandard <https://pypi.python.org/pypi/zstandard>`_ packages are installed,
+and other codecs can be added with
+:py:func:`~tornado_dynamodb.compression.register_codec`.
+
+"""
+import collections
+import logging
+import zlib
+
+try:
+    from lz4 import frame as lz4_frame
+except ImportError:  # pragma: no cover
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 1024
+
+MAGIC = b'\xdcZ'
+HEADER_SIZE = 4
+
+_TEXT = 0x01
+_TEXT_TYPE = type(u'')
+
+Codec = collections.namedtuple('Codec', ['id', 'name', 'compress',
+                                         'decompress'])
+
+_CODECS = {}
+_NAMES = {}
+
+
+def register_codec(codec_id, name, compress, decompress):
+    """Register a compression codec. The codec id is stored in the header of
+    each compressed value, so it must not be changed or reused once values
+    have been written with it.
+
+    :param int codec_id: The id of the codec, from ``1`` to ``255``
+    :param str name: The name to select the codec with
+    :param callable compress: Compress :py:class:`bytes`
+    :param callable decompress: Decompress :py:class:`bytes`
+    :raises: ValueError
+
+    """
+    if not 0 < codec_id < 256:
+        raise ValueError('codec_id must be between 1 and 255')
+    elif codec_id in _CODECS and _CODECS[codec_id].name != name:
+        raise ValueError('codec_id {} is registered for {}'.format(
+            codec_id, _CODECS[codec_id].name))
+    _CODECS[codec_id] = Codec(codec_id, name, compress, decompress)
+    _NAMES[name] = codec_id
+
+
+def codecs():
+    """Return the names of the registered codecs.
+
+    :rtype: list
+
+    """
+    return sorted(_NAMES)
+
+
+def is_compressed(value):
+    """Return ``True`` if the binary value has a compression header for a
+    registered codec.
+
+    :param bytes value: The value to check
+    :rtype: bool
+
+    """
+    return (isinstance(value, bytes) and len(value) >= HEADER_SIZE and
+            value[:2] == MAGIC and bytearray(value[2:3])[0] in _CODECS)
+
+
+def decompress(value):
+    """Return the original value of a compressed binary value, or the value
+    unchanged if it is not compressed. Values with a header for a codec
+    that is not registered, or that can not be decompressed with their
+    codec, are also returned unchanged.
+
+    :param bytes value: The value to decompress
+    :rtype: bytes|str
+
+    """
+    if not is_compressed(value):
+        if isinstance(value, bytes) and len(value) >= HEADER_SIZE and \
+                value[:2] == MAGIC:
+            LOGGER.warning('Returning a value compressed with unregistered '
+                           'codec %i unchanged', bytearray(value[2:3])[0])
+        return value
+    codec_id, flags = bytearray(value[2:HEADER_SIZE])
+    try:
+        data = _CODECS[codec_id].decompress(value[HEADER_SIZE:])
+        if flags & _TEXT:
+            return data.decode('utf-8')
+    except Exception as error:
+        LOGGER.warning('Returning a value that could not be decompressed '
+                       'with %s unchanged: %s', _CODECS[codec_id].name, error)
+        return value
+    return data
+
+
+def decompress_item(item):
+    """Return a copy of the item with its compressed attribute values
+    decompressed.
+
+    :param dict item: The native item
+    :rtype: dict
+
+    """
+    return dict((name, decompress(value)) for name, value in item.items())
+
+
+class Compressor(object):
+    """Compress the large string and binary attributes of items before they
+    are marshalled.
+
+    An attribute is compressed if its name is in ``attributes``, or if its
+    value is at least ``threshold`` bytes long. Attributes in ``exclude``
+    are never compressed.
+
+    :param int threshold: The length to compress values from, or
+        :data:`None` to only compress ``attributes``
+    :param set attributes: The names of the attributes to always compress
+    :param set exclude: The names of the attributes to never compress
+    :param str codec: The name of the codec to compress with
+    :raises: ValueError
+
+    """
+    def __init__(self, threshold=DEFAULT_THRESHOLD, attributes=None,
+                 exclude=None, codec='zlib'):
+        if codec not in _NAMES:
+            raise ValueError('Unknown codec: {}'.format(codec))
+        self.threshold = threshold
+        self.attributes = set(attributes or [])
+        self.exclude = set(exclude or [])
+        self.codec = _CODECS[_NAMES[codec]]
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def ratio(self):
+        """The ratio of the size of the values passed to
+        :py:meth:`compress` to their size after compression.
+
+        :rtype: float
+
+        """
+        return self.bytes_in / float(self.bytes_out or 1)
+
+    def compress(self, value):
+        """Return the compressed value with its header, or the value
+        unchanged if compressing does not make it smaller.
+
+        :param bytes|str value: The value to compress
+        :rtype: bytes|str
+
+        """
+        flags = 0
+        data = value
+        if isinstance(value, _TEXT_TYPE):
+            data, flags = value.encode('utf-8'), _TEXT
+        compressed = self.codec.compress(data)
+        self.bytes_in += len(data)
+        if len(compressed) + HEADER_SIZE >= len(data):
+            self.bytes_out += len(data)
+            return value
+        self.bytes_out += len(compressed) + HEADER_SIZE
+        return MAGIC + bytes(bytearray([self.codec.id, flags])) + compressed
+
+    def compress_item(self, item):
+        """Return a copy of the item with the qualifying attributes
+        compressed.
+
+        :param dict item: The native item
+        :rtype: dict
+
+        """
+        result = {}
+        for name, value in item.items():
+            if self._qualifies(name, value):
+                value = self.compress(value)
+            result[name] = value
+        return result
+
+    def _qualifies(self, name, value):
+        """Return ``True`` if the attribute should be compressed.
+
+        :param str name: The attribute name
+        :param mixed value: The attribute value
+        :rtype: bool
+
+        """
+        if name in self.exclude or \
+                not isinstance(value, (bytes, _TEXT_TYPE)):
+            return False
+        return name in self.attributes or (
+            self.threshold is not None and len(value) >= self.threshold)
+
+
+register_codec(1, 'zlib', zlib.compress, zlib.decompress)
+if lz4_frame:  # pragma: no cover
+    register_codec(2, 'lz4', lz4_frame.compress, lz4_frame.decompress)
+if zstandard:  # pragma: no cover
+    register_codec(3, 'zstd', zstandard.ZstdCompressor().compress,
+                   zstandard.ZstdDecompressor().decompress)
@@ -0,0 +1,213 @@
+"""
+Counter Aggregation
+===================
+:py:class:`~tornado_dynamodb.counters.CounterAggregator` sums the increments
+made to numeric attributes in memory and writes them with one
+:py:meth:`~tornado_dynamodb.DynamoDB.update_item` ``ADD`` per item, so a
+counter that is incremented thousands of times a second costs a few writes
+instead of one write per event:
+
+.. code:: python
+
+    counters = counters.CounterAggregator(client, interval=1.0)
+    counters.increment('videos', {'id': video_id}, 'views')
+    counters.increment('videos', {'id': video_id}, 'likes', 2)
+    ...
+    yield counters.close()
+
+Increments are written at most ``interval`` seconds after they are made, or
+straight away once ``max_keys`` items have pending increments. All of the
+pending increments of an item are written in a single atomic update. If an
+update is throttled, its increments are merged back into the pending
+increments and written by the next flush, so they are not lost, but are
+applied after newer increments. An ``ADD`` is not idempotent, so updates
+that fail with an error that leaves it unknown whether they were applied,
+such as a timeout or an internal server error, are logged and dropped
+rather than retried, and may under count but never double count.
+
+Increments must be integers or :py:class:`decimal.Decimal` values, as
+summing floats in memory would write rounding errors to the counters.
+
+"""
+import collections
+import decimal
+import logging
+import numbers
+
+from tornado import concurrent
+from tornado import gen
+
+from tornado_dynamodb import bulk
+from tornado_dynamodb import exceptions
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 10
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_KEYS = 1000
+
+_THROTTLE_EXCEPTIONS = (exceptions.ProvisionedThroughputExceeded,
+                        exceptions.ThrottlingException)
+
+
+class CounterAggregator(object):
+    """Aggregate counter increments per item and attribute, and flush them
+    as single ``ADD`` updates.
+
+    :param client: The client to update the items with
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param float interval: The most seconds an increment is kept in memory
+        before it is written
+    :param int max_keys: Flush once this many items have pending increments
+    :param int concurrency: The number of updates to make at once
+
+    """
+    def __init__(self, client, interval=DEFAULT_INTERVAL,
+                 max_keys=DEFAULT_MAX_KEYS, concurrency=DEFAULT_CONCURRENCY):
+        self.client = client
+        self.interval = interval
+        self.max_keys = max_keys
+        self.concurrency = concurrency
+        self.increments = 0
+        self.updates = 0
+        self._closed = False
+        self._pending = collections.OrderedDict()
+        self._timeout = None
+
+    @property
+    def pending(self):
+        """The number of items with increments that have not been written.
+
+        :rtype: int
+
+        """
+        return len(self._pending)
+
+    def increment(self, table_name, key, attribute, value=1):
+        """Add ``value`` to a numeric attribute of an item. The attribute is
+        created if it does not exist.
+
+        :param str table_name: The table of the item
+        :param dict key: The primary key of the item
+        :param str attribute: The name of the attribute to increment
+        :param int|decimal.Decimal value: The amount to add
+        :raises: RuntimeError
+        :raises: ValueError
+
+        """
+        if self._closed:
+            raise RuntimeError('The counter aggregator is closed')
+        if isinstance(value, bool) or not isinstance(
+                value, (numbers.Integral, decimal.Decimal)):
+            raise ValueError('value must be an integer or a Decimal')
+        pending_key = table_name, tuple(sorted(key.items()))
+        counters = self._pending.get(pending_key)
+        if counters is None:
+            counters = self._pending[pending_key] = collections.Counter()
+        counters[attribute] += value
+        self.increments += 1
+        if len(self._pending) >= self.max_keys:
+            self._schedule(0)
+        elif self._timeout is None:
+            self._schedule(self.interval)
+
+    @gen.coroutine
+    def flush(self):
+        """Write the pending increments, returning the number of updates
+        made. Increments that are throttled are kept for the next flush, and
+        other errors are logged and the increments dropped.
+
+        :rtype: int
+
+        """
+        self._cancel()
+        pending, self._pending = self._pending, collections.OrderedDict()
+        updates = [(table_name, dict(key), counters)
+                   for (table_name, key), counters in pending.items()]
+        written = 0
+        for offset in range(0, len(updates), self.concurrency):
+            results = yield [self._update(*update) for update in
+                             updates[offset:offset + self.concurrency]]
+            written += sum(results)
+        self.updates += written
+        if self._pending and not self._closed:
+            self._schedule(self.interval)
+        raise gen.Return(written)
+
+    @gen.coroutine
+    def close(self):
+        """Stop accepting increments and write the pending ones, retrying
+        the updates that are throttled until they are written.
+
+        """
+        self._closed = True
+        attempt = 0
+        while self._pending:
+            if attempt:
+                yield gen.sleep(min(bulk.MAX_BACKOFF, 0.05 * (2 ** attempt)))
+            yield self.flush()
+            attempt += 1
+        self._cancel()
+
+    def _cancel(self):
+        if self._timeout is not None:
+            self.client.ioloop.remove_timeout(self._timeout)
+            self._timeout = None
+
+    def _schedule(self, delay):
+        """Flush the pending increments in ``delay`` seconds, unless a
+        flush is already scheduled to happen sooner.
+
+        """
+        deadline = self.client.ioloop.time() + delay
+        if self._timeout is not None:
+            if self._timeout.deadline <= deadline:
+                return
+            self._cancel()
+        self._timeout = self.client.ioloop.call_at(deadline, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timeout = None
+        future = self.flush()
+        self.client.ioloop.add_future(future, concurrent.Future.result)
+
+    @gen.coroutine
+    def _update(self, table_name, key, counters):
+        """Write the increments of one item, returning ``1`` if it was
+        updated.
+
+        """
+        names, values, actions = {}, {}, []
+        for offset, (attribute, value) in enumerate(sorted(counters.items())):
+            if not value:
+                continue
+            names['#c{}'.format(offset)] = attribute
+            values[':c{}'.format(offset)] = value
+            actions.append('#c{0} :c{0}'.format(offset))
+        if not actions:
+            raise gen.Return(0)
+        try:
+            yield self.client.update_item(
+                table_name, key,
+                update_expression='ADD {}'.format(', '.join(actions)),
+                expression_attribute_names=names,
+                expression_attribute_values=values)
+        except _THROTTLE_EXCEPTIONS as error:
+            LOGGER.debug('Retrying the increments of %s %r: %s',
+                         table_name, key, error)
+            self._merge(table_name, key, counters)
+            raise gen.Return(0)
+        except exceptions.DynamoDBException as error:
+            LOGGER.error('Dropping the increments of %s %r: %s',
+                         table_name, key, error)
+            raise gen.Return(0)
+        except Exception:
+            LOGGER.exception('Dropping the increments of %s %r',
+                             table_name, key)
+            raise gen.Return(0)
+        raise gen.Return(1)
+
+    def _merge(self, table_name, key, counters):
+        pending_key = table_name, tuple(sorted(key.items()))
+        self._pending.setdefault(pending_key,
+                                 collections.Counter()).update(counters)
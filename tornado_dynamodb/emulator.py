@@ -0,0 +1,1172 @@
+"""
+DynamoDB Emulator
+=================
+:py:class:`~tornado_dynamodb.emulator.Emulator` is a pure Python, in-process
+stand-in for DynamoDB that speaks the DynamoDB JSON protocol over HTTP. It is
+intended for fast tests and for benchmarks that need a reproducible target,
+and supports injected latency, throttling and error responses.
+
+.. code:: python
+
+    emulator = emulator.Emulator(latency=0.005, jitter=0.002, seed=1)
+    client = tornado_dynamodb.DynamoDB(endpoint=emulator.start())
+
+    emulator.throttle(2, operations=['PutItem'])
+    emulator.inject_error(exceptions.InternalFailure)
+
+Tables, item CRUD, *Query* and *Scan* with pagination, parallel scans,
+secondary indexes, batch operations, transactions and condition, filter,
+projection and update expressions are supported. Requests are not
+authenticated, tables are ``ACTIVE`` as soon as they are created, and the
+emulator can also be run as a standalone server:
+
+.. code:: bash
+
+    tornado-dynamodb-emulator --port 7777
+
+"""
+import argparse
+import bisect
+import collections
+import copy
+import json
+import logging
+import random
+import re
+import time
+import zlib
+
+from tornado import gen
+from tornado import httpserver
+from tornado import ioloop
+from tornado import netutil
+from tornado import web
+
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import expressions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+MAX_BATCH_GET = 100
+MAX_BATCH_WRITE = 25
+MAX_PAGE_SIZE = 1048576
+MAX_TRANSACT_ITEMS = 100
+
+_TOKEN_TTL = 600
+_DECREASES_PER_DAY = 27
+
+_ACCOUNT = '000000000000'
+_REGION = 'local'
+_TARGET_PREFIX = 'DynamoDB_20120810.'
+_TABLE_NAME = re.compile(r'^[a-zA-Z0-9_.-]{3,255}$')
+
+_ERROR_TYPES = dict((cls, error_type)
+                    for error_type, cls in exceptions.MAP.items())
+_ERROR_STATUS = {exceptions.InternalFailure: 500,
+                 exceptions.ServiceUnavailable: 503}
+_REASON_CODES = dict((cls, code) for code, cls
+                     in exceptions.CANCELLATION_REASONS.items())
+_WRITE_ACTIONS = ('ConditionCheck', 'Delete', 'Put', 'Update')
+
+
+class Emulator(object):
+    """In-process DynamoDB emulator.
+
+    :param float latency: Seconds to delay each response by
+    :param float jitter: Maximum additional random delay in seconds
+    :param int seed: Seed for the random number generator used for jitter
+        and unprocessed batch items, for reproducible runs
+    :param bool enforce_throughput: Throttle requests that exceed the
+        provisioned throughput of a table
+    :param int burst_seconds: Seconds of unused throughput that can be
+        accumulated for bursts when ``enforce_throughput`` is set
+    :param float unprocessed_rate: The fraction of batch request items to
+        return as unprocessed
+
+    """
+    def __init__(self, latency=0.0, jitter=0.0, seed=None,
+                 enforce_throughput=False, burst_seconds=300,
+                 unprocessed_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.enforce_throughput = enforce_throughput
+        self.burst_seconds = burst_seconds
+        self.unprocessed_rate = unprocessed_rate
+        self.requests = collections.Counter()
+        self.port = None
+        self._faults = []
+        self._random = random.Random(seed)
+        self._server = None
+        self._tables = {}
+        self._tokens = {}
+
+    @property
+    def endpoint(self):
+        """Return the URL of the emulator once it has been started.
+
+        :rtype: str
+
+        """
+        if self.port is None:
+            return None
+        return 'http://127.0.0.1:{}'.format(self.port)
+
+    def start(self, port=0, address='127.0.0.1'):
+        """Start listening for requests on the current
+        :py:class:`~tornado.ioloop.IOLoop`, returning the endpoint URL. If
+        ``port`` is ``0``, an unused port is chosen.
+
+        :param int port: The port to listen on
+        :param str address: The address to listen on
+        :rtype: str
+
+        """
+        sockets = netutil.bind_sockets(port, address)
+        self.port = sockets[0].getsockname()[1]
+        application = web.Application([(r'/', _RequestHandler,
+                                        {'emulator': self})])
+        self._server = httpserver.HTTPServer(application)
+        self._server.add_sockets(sockets)
+        return self.endpoint
+
+    def stop(self):
+        """Stop listening for requests"""
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+            self.port = None
+
+    def reset(self):
+        """Remove all tables, pending faults and request counts."""
+        self._tables = {}
+        self._tokens = {}
+        self._faults = []
+        self.requests.clear()
+
+    def inject_error(self, error, count=1, operations=None, message=None):
+        """Respond to the next ``count`` requests with an error. The error is
+        returned with the DynamoDB error type that the client maps to the
+        exception class, :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+        is returned as a HTTP ``500`` and
+        :py:exc:`~tornado_dynamodb.exceptions.ServiceUnavailable` as a HTTP
+        ``503``.
+
+        :param error: The exception class to respond with
+        :type error: :py:class:`~tornado_dynamodb.exceptions.DynamoDBException`
+        :param int count: The number of requests to fail
+        :param list operations: Only fail requests for these operations, for
+            example ``['PutItem']``
+        :param str message: The error message
+
+        """
+        self._faults.append([error, count, set(operations or []),
+                             message or 'Injected {}'.format(error.__name__)])
+
+    def throttle(self, count=1, operations=None):
+        """Respond to the next ``count`` requests with a
+        :py:exc:`~tornado_dynamodb.exceptions.ProvisionedThroughputExceeded`
+        error.
+
+        :param int count: The number of requests to throttle
+        :param list operations: Only throttle requests for these operations
+
+        """
+        self.inject_error(exceptions.ProvisionedThroughputExceeded, count,
+                          operations, 'The level of configured provisioned '
+                                      'throughput for the table was exceeded')
+
+    def delay(self):
+        """Return the number of seconds to delay the next response by.
+
+        :rtype: float
+
+        """
+        if not self.jitter:
+            return self.latency
+        return self.latency + self._random.uniform(0, self.jitter)
+
+    def execute(self, operation, payload):
+        """Execute a DynamoDB API operation, returning the response body.
+
+        :param str operation: The operation name, for example ``GetItem``
+        :param dict payload: The request body
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        self.requests[operation] += 1
+        self._raise_fault(operation)
+        method = _OPERATIONS.get(operation)
+        if method is None:
+            raise exceptions.InvalidAction(
+                'Unknown operation: {}'.format(operation))
+        return method(self, payload)
+
+    @staticmethod
+    def error_response(error):
+        """Return the HTTP status code and response body for an error.
+
+        :param error: The exception to return
+        :type error: :py:class:`~tornado_dynamodb.exceptions.DynamoDBException`
+        :rtype: (int, dict)
+
+        """
+        error_type = _ERROR_TYPES.get(
+            type(error), 'com.amazonaws.dynamodb.v20120810#{}'.format(
+                type(error).__name__))
+        body = {'__type': error_type,
+                'message': str(error.args[0]) if error.args else ''}
+        if isinstance(error, exceptions.TransactionCanceled):
+            body['CancellationReasons'] = [
+                {'Code': 'None'} if reason is None else
+                {'Code': _REASON_CODES.get(type(reason), str(reason)),
+                 'Message': str(reason)} for reason in error.reasons]
+        return _ERROR_STATUS.get(type(error), 400), body
+
+    def _raise_fault(self, operation):
+        for fault in self._faults:
+            error, count, operations, message = fault
+            if not operations or operation in operations:
+                fault[1] -= 1
+                if fault[1] <= 0:
+                    self._faults.remove(fault)
+                raise error(message)
+
+    def _table(self, name):
+        if not name:
+            raise exceptions.ValidationException(
+                'The parameter TableName is required')
+        if name not in self._tables:
+            raise exceptions.ResourceNotFound(
+                'Requested resource not found: Table: {} not found'.format(
+                    name))
+        return self._tables[name]
+
+    def _consume(self, table, kind, units):
+        """Deduct consumed capacity from the table's throughput bucket,
+        throttling the request if there is less than one capacity unit left.
+
+        """
+        if not self.enforce_throughput:
+            return
+        now = time.time()
+        rate = table.throughput['{}CapacityUnits'.format(kind)]
+        tokens, updated = table.buckets.get(kind, (rate * self.burst_seconds,
+                                                   now))
+        tokens = min(rate * max(self.burst_seconds, 1),
+                     tokens + rate * (now - updated))
+        if tokens < 1:
+            table.buckets[kind] = tokens, now
+            raise exceptions.ProvisionedThroughputExceeded(
+                'The level of configured provisioned throughput for the '
+                'table was exceeded')
+        table.buckets[kind] = tokens - units, now
+
+    def _check_throughput(self, table, kind):
+        self._consume(table, kind, 0)
+
+    def _unprocessed(self):
+        return self.unprocessed_rate and \
+            self._random.random() < self.unprocessed_rate
+
+    # Table operations
+
+    def _create_table(self, payload):
+        name = payload.get('TableName')
+        if not name or not _TABLE_NAME.match(name):
+            raise exceptions.ValidationException(
+                'TableName must be at least 3 characters long and at most 255 '
+                'characters long')
+        if name in self._tables:
+            raise exceptions.ResourceInUse(
+                'Table already exists: {}'.format(name))
+        table = _Table(payload, self._random)
+        self._tables[name] = table
+        return {'TableDescription': table.describe(status='CREATING')}
+
+    def _delete_table(self, payload):
+        table = self._table(payload.get('TableName'))
+        del self._tables[table.name]
+        return {'TableDescription': table.describe(status='DELETING')}
+
+    def _describe_table(self, payload):
+        return {'Table': self._table(payload.get('TableName')).describe()}
+
+    def _list_tables(self, payload):
+        names = sorted(self._tables)
+        start = payload.get('ExclusiveStartTableName')
+        if start:
+            names = names[bisect.bisect_right(names, start):]
+        limit = payload.get('Limit') or 100
+        result = {'TableNames': names[:limit]}
+        if len(names) > limit:
+            result['LastEvaluatedTableName'] = names[limit - 1]
+        return result
+
+    def _update_table(self, payload):
+        table = self._table(payload.get('TableName'))
+        table.update(payload)
+        return {'TableDescription': table.describe()}
+
+    # Item operations
+
+    def _get_item(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Read')
+        item = table.get(payload.get('Key'))
+        units = utils.read_capacity_units(_item_size(item) if item else 0,
+                                          payload.get('ConsistentRead'))
+        self._consume(table, 'Read', units)
+        result = _capacity({}, payload, table, units)
+        if item is not None:
+            result['Item'] = _project(item, payload)
+        return result
+
+    def _put_item(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Write')
+        item = payload.get('Item') or {}
+        key = table.validate_item(item)
+        existing = table.items.get(key)
+        _check_condition(payload, existing)
+        table.put(key, item)
+        units = utils.write_capacity_units(max(
+            _item_size(item), _item_size(existing) if existing else 0))
+        self._consume(table, 'Write', units)
+        result = _capacity({}, payload, table, units)
+        if existing and payload.get('ReturnValues') == 'ALL_OLD':
+            result['Attributes'] = existing
+        return _collection_metrics(result, payload, table, item)
+
+    def _delete_item(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Write')
+        key = table.key(payload.get('Key'))
+        existing = table.items.get(key)
+        _check_condition(payload, existing)
+        table.delete(key)
+        units = utils.write_capacity_units(
+            _item_size(existing) if existing else 0)
+        self._consume(table, 'Write', units)
+        result = _capacity({}, payload, table, units)
+        if existing and payload.get('ReturnValues') == 'ALL_OLD':
+            result['Attributes'] = existing
+        return _collection_metrics(result, payload, table,
+                                   existing or payload['Key'])
+
+    def _update_item(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Write')
+        key = table.key(payload.get('Key'))
+        existing = table.items.get(key)
+        _check_condition(payload, existing)
+        item, updated = _updated_item(table, payload, existing)
+        table.put(key, item)
+        units = utils.write_capacity_units(max(
+            _item_size(item), _item_size(existing) if existing else 0))
+        self._consume(table, 'Write', units)
+        result = _capacity({}, payload, table, units)
+        return_values = payload.get('ReturnValues', 'NONE')
+        if return_values == 'ALL_NEW':
+            result['Attributes'] = item
+        elif return_values == 'ALL_OLD' and existing:
+            result['Attributes'] = existing
+        elif return_values == 'UPDATED_NEW':
+            result['Attributes'] = dict((k, v) for k, v in item.items()
+                                        if k in updated)
+        elif return_values == 'UPDATED_OLD' and existing:
+            result['Attributes'] = dict((k, v) for k, v in existing.items()
+                                        if k in updated)
+        return _collection_metrics(result, payload, table, item)
+
+    # Query and scan
+
+    def _query(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Read')
+        view = table.view(payload.get('IndexName'))
+        if not payload.get('KeyConditionExpression'):
+            raise exceptions.ValidationException(
+                'Either the KeyConditions or KeyConditionExpression parameter '
+                'must be specified in the request.')
+        conditions = expressions.key_conditions(
+            payload['KeyConditionExpression'],
+            payload.get('ExpressionAttributeNames'),
+            payload.get('ExpressionAttributeValues'))
+        hash_condition = conditions.pop(view.hash_key, None)
+        if not hash_condition or hash_condition[0] != '=' or \
+                set(conditions) - {view.range_key}:
+            raise exceptions.ValidationException(
+                'Query condition missed key schema element: {}'.format(
+                    view.hash_key))
+        entries = view.partition(hash_condition[1],
+                                 conditions.get(view.range_key))
+        if payload.get('ScanIndexForward') is False:
+            entries.reverse()
+        return self._page(table, view, entries, payload,
+                          payload.get('ScanIndexForward') is not False)
+
+    def _scan(self, payload):
+        table = self._table(payload.get('TableName'))
+        self._check_throughput(table, 'Read')
+        view = table.view(payload.get('IndexName'))
+        segment = payload.get('Segment')
+        total_segments = payload.get('TotalSegments')
+        if (segment is None) != (total_segments is None):
+            raise exceptions.ValidationException(
+                'The TotalSegments parameter is required but was not present '
+                'in the request when Segment parameter is present')
+        entries = view.entries()
+        if total_segments:
+            if not 0 <= segment < total_segments:
+                raise exceptions.ValidationException(
+                    'The Segment parameter is zero-based and must be less '
+                    'than parameter TotalSegments')
+            entries = [entry for entry in entries
+                       if _segment(entry[0][0], total_segments) == segment]
+        return self._page(table, view, entries, payload, True)
+
+    def _page(self, table, view, entries, payload, forward):
+        """Return a page of results for *Query* and *Scan* from the sorted
+        ``(sort_key, item)`` entries.
+
+        """
+        start = 0
+        if payload.get('ExclusiveStartKey'):
+            position = view.sort_key(payload['ExclusiveStartKey'])
+            keys = [entry[0] for entry in entries]
+            if forward:
+                start = bisect.bisect_right(keys, position)
+            else:
+                start = len(keys) - bisect.bisect_left(keys[::-1], position)
+        limit = payload.get('Limit')
+        names = payload.get('ExpressionAttributeNames')
+        values = payload.get('ExpressionAttributeValues')
+        items, scanned, size, last = [], 0, 0, None
+        for index in range(start, len(entries)):
+            if (limit and scanned >= limit) or size >= MAX_PAGE_SIZE:
+                break
+            item = view.project(entries[index][1])
+            scanned += 1
+            size += _item_size(item)
+            last = index
+            if payload.get('FilterExpression') and not expressions.evaluate(
+                    payload['FilterExpression'], item, names, values):
+                continue
+            items.append(item)
+        units = utils.read_capacity_units(size,
+                                          payload.get('ConsistentRead'))
+        self._consume(table, 'Read', units)
+        result = _capacity({'Count': len(items), 'ScannedCount': scanned},
+                           payload, table, units)
+        if payload.get('Select') != 'COUNT':
+            result['Items'] = [_project(item, payload) for item in items]
+        if last is not None and last + 1 < len(entries):
+            result['LastEvaluatedKey'] = view.key_of(entries[last][1])
+        return result
+
+    # Batch operations
+
+    def _batch_get_item(self, payload):
+        request_items = payload.get('RequestItems') or {}
+        if sum(len(r.get('Keys', [])) for r in request_items.values()) > \
+                MAX_BATCH_GET:
+            raise exceptions.ValidationException(
+                'Too many items requested for the BatchGetItem call')
+        responses, unprocessed, capacity = {}, {}, []
+        for name, request in request_items.items():
+            table = self._table(name)
+            self._check_throughput(table, 'Read')
+            responses[name], size = [], 0
+            for key in request.get('Keys', []):
+                if self._unprocessed():
+                    unprocessed.setdefault(name, dict(
+                        (k, v) for k, v in request.items() if k != 'Keys'))
+                    unprocessed[name].setdefault('Keys', []).append(key)
+                    continue
+                item = table.get(key)
+                if item is not None:
+                    size += _item_size(item)
+                    responses[name].append(_project(item, request))
+            units = utils.read_capacity_units(size,
+                                              request.get('ConsistentRead'))
+            self._consume(table, 'Read', units)
+            capacity.append({'TableName': name, 'CapacityUnits': units})
+        result = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+        if payload.get('ReturnConsumedCapacity') in ('INDEXES', 'TOTAL'):
+            result['ConsumedCapacity'] = capacity
+        return result
+
+    def _batch_write_item(self, payload):
+        request_items = payload.get('RequestItems') or {}
+        if sum(len(r) for r in request_items.values()) > MAX_BATCH_WRITE:
+            raise exceptions.ValidationException(
+                'Too many items requested for the BatchWriteItem call')
+        operations, unprocessed, capacity = [], {}, []
+        for name, requests in request_items.items():
+            table, keys = self._table(name), set()
+            self._check_throughput(table, 'Write')
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = request['PutRequest'].get('Item') or {}
+                    key = table.validate_item(item)
+                else:
+                    item = None
+                    key = table.key(
+                        request.get('DeleteRequest', {}).get('Key'))
+                if key in keys:
+                    raise exceptions.ValidationException(
+                        'Provided list of item keys contains duplicates')
+                keys.add(key)
+                operations.append((table, key, item, request))
+        units = collections.Counter()
+        for table, key, item, request in operations:
+            if self._unprocessed():
+                unprocessed.setdefault(table.name, []).append(request)
+                continue
+            existing = table.items.get(key)
+            units[table.name] += utils.write_capacity_units(max(
+                _item_size(item) if item else 0,
+                _item_size(existing) if existing else 0))
+            if item is None:
+                table.delete(key)
+            else:
+                table.put(key, item)
+        for name in request_items:
+            self._consume(self._tables[name], 'Write', units[name])
+            capacity.append({'TableName': name,
+                             'CapacityUnits': float(units[name])})
+        result = {'UnprocessedItems': unprocessed}
+        if payload.get('ReturnConsumedCapacity') in ('INDEXES', 'TOTAL'):
+            result['ConsumedCapacity'] = capacity
+        return result
+
+    # Transactions
+
+    def _transact_get_items(self, payload):
+        actions = self._transact_actions(payload, ('Get',))
+        responses, units = [], collections.Counter()
+        for _action, table, key, request in actions:
+            self._check_throughput(table, 'Read')
+            item = table.items.get(key)
+            units[table.name] += utils.read_capacity_units(
+                _item_size(item) if item else 0, transactional=True)
+            responses.append({'Item': _project(item, request)}
+                             if item is not None else {})
+        return self._transact_capacity({'Responses': responses}, payload,
+                                       'Read', units)
+
+    def _transact_write_items(self, payload):
+        """Apply all of the actions in a *TransactWriteItems* request or
+        none of them, replaying the original response for a retried client
+        request token.
+
+        """
+        now, token = time.time(), payload.get('ClientRequestToken')
+        for value in list(self._tokens):
+            if self._tokens[value][0] < now:
+                del self._tokens[value]
+        digest = json.dumps(payload.get('TransactItems'), sort_keys=True)
+        if token in self._tokens:
+            if self._tokens[token][1] != digest:
+                raise exceptions.IdempotentParameterMismatch(
+                    'The request uses the same client token as a previous, '
+                    'but non-identical request.')
+            return copy.deepcopy(self._tokens[token][2])
+        actions = self._transact_actions(payload, _WRITE_ACTIONS)
+        writes, reasons = [], []
+        for action, table, key, request in actions:
+            self._check_throughput(table, 'Write')
+            existing = table.items.get(key)
+            try:
+                _check_condition(request, existing)
+            except exceptions.ConditionalCheckFailedException as error:
+                reasons.append(error)
+                continue
+            reasons.append(None)
+            if action == 'Put':
+                writes.append((table, key, request['Item'], existing))
+            elif action == 'Update':
+                writes.append((table, key,
+                               _updated_item(table, request, existing)[0],
+                               existing))
+            elif action == 'Delete':
+                writes.append((table, key, None, existing))
+        if any(reasons):
+            raise exceptions.TransactionCanceled(
+                'Transaction cancelled, please refer cancellation reasons for '
+                'specific reasons [{}]'.format(', '.join(
+                    'None' if reason is None else
+                    _REASON_CODES[type(reason)] for reason in reasons)))
+        units = collections.Counter()
+        for table, key, item, existing in writes:
+            units[table.name] += utils.write_capacity_units(max(
+                _item_size(item) if item else 0,
+                _item_size(existing) if existing else 0),
+                transactional=True)
+            if item is None:
+                table.delete(key)
+            else:
+                table.put(key, item)
+        result = self._transact_capacity({}, payload, 'Write', units)
+        if token:
+            self._tokens[token] = now + _TOKEN_TTL, digest, result
+        return copy.deepcopy(result)
+
+    def _transact_actions(self, payload, allowed):
+        """Validate the actions in a transaction request, returning a list
+        of ``(action, table, key, request)`` tuples.
+
+        """
+        transact_items = payload.get('TransactItems') or []
+        if not 0 < len(transact_items) <= MAX_TRANSACT_ITEMS:
+            raise exceptions.ValidationException(
+                'Member must have length less than or equal to {} and '
+                'greater than or equal to 1'.format(MAX_TRANSACT_ITEMS))
+        actions, keys = [], set()
+        for value in transact_items:
+            if len(value) != 1 or next(iter(value)) not in allowed:
+                raise exceptions.ValidationException(
+                    'TransactItems can only contain one of {}'.format(
+                        ', '.join(allowed)))
+            action, request = next(iter(value.items()))
+            table = self._table(request.get('TableName'))
+            if action == 'Put':
+                key = table.validate_item(request.get('Item') or {})
+            else:
+                key = table.key(request.get('Key'))
+            if (table.name, key) in keys:
+                raise exceptions.ValidationException(
+                    'Transaction request cannot include multiple operations '
+                    'on one item')
+            keys.add((table.name, key))
+            actions.append((action, table, key, request))
+        return actions
+
+    def _transact_capacity(self, result, payload, kind, units):
+        capacity = []
+        for name in sorted(units):
+            self._consume(self._tables[name], kind, units[name])
+            capacity.append({'TableName': name,
+                             'CapacityUnits': float(units[name])})
+        if payload.get('ReturnConsumedCapacity') in ('INDEXES', 'TOTAL'):
+            result['ConsumedCapacity'] = capacity
+        return result
+
+
+_OPERATIONS = {
+    'BatchGetItem': Emulator._batch_get_item,
+    'BatchWriteItem': Emulator._batch_write_item,
+    'CreateTable': Emulator._create_table,
+    'DeleteItem': Emulator._delete_item,
+    'DeleteTable': Emulator._delete_table,
+    'DescribeTable': Emulator._describe_table,
+    'GetItem': Emulator._get_item,
+    'ListTables': Emulator._list_tables,
+    'PutItem': Emulator._put_item,
+    'Query': Emulator._query,
+    'Scan': Emulator._scan,
+    'TransactGetItems': Emulator._transact_get_items,
+    'TransactWriteItems': Emulator._transact_write_items,
+    'UpdateItem': Emulator._update_item,
+    'UpdateTable': Emulator._update_table
+}
+
+
+class _Table(object):
+    """Holds the definition and items of an emulated table."""
+
+    def __init__(self, payload, rng):
+        self.name = payload['TableName']
+        self.attributes = _attribute_definitions(
+            payload.get('AttributeDefinitions'))
+        self.key_schema = _key_schema(payload.get('KeySchema'),
+                                      self.attributes)
+        self.key_names = [k['AttributeName'] for k in self.key_schema]
+        self.throughput = _throughput(payload.get('ProvisionedThroughput'))
+        self.stream = payload.get('StreamSpecification') or {}
+        self.created = time.time()
+        self.stream_label = None
+        self.indexes = collections.OrderedDict()
+        self.items = {}
+        self.buckets = {}
+        self._random = rng
+        self._sorted = None
+        for index in payload.get('GlobalSecondaryIndexes') or []:
+            self._add_index(index, True)
+        for index in payload.get('LocalSecondaryIndexes') or []:
+            self._add_index(index, False)
+        used = set(self.key_names)
+        for index in self.indexes.values():
+            used.update(index.key_names)
+        if set(self.attributes) - used:
+            raise exceptions.ValidationException(
+                'One or more parameter values were invalid: Some '
+                'AttributeDefinitions are not used. AttributeDefinitions: '
+                '[{}], keys used: [{}]'.format(
+                    ', '.join(sorted(self.attributes)),
+                    ', '.join(sorted(used))))
+        self._update_stream()
+
+    def _add_index(self, definition, is_global):
+        name = definition.get('IndexName')
+        if not name or name in self.indexes:
+            raise exceptions.ValidationException(
+                'One or more parameter values were invalid: Duplicate or '
+                'missing index name')
+        index = _View(self, definition, is_global)
+        if not is_global and index.hash_key != self.key_names[0]:
+            raise exceptions.ValidationException(
+                'One or more parameter values were invalid: Index KeySchema '
+                'does not have the same leading hash key as table KeySchema '
+                'for index: {}'.format(name))
+        self.indexes[name] = index
+
+    @property
+    def arn(self):
+        return 'arn:aws:dynamodb:{}:{}:table/{}'.format(_REGION, _ACCOUNT,
+                                                         self.name)
+
+    def describe(self, status='ACTIVE'):
+        size = sum(_item_size(item) for item in self.items.values())
+        description = {
+            'AttributeDefinitions': [
+                {'AttributeName': name, 'AttributeType': data_type}
+                for name, data_type in sorted(self.attributes.items())],
+            'CreationDateTime': self.created,
+            'ItemCount': len(self.items),
+            'KeySchema': self.key_schema,
+            'ProvisionedThroughput': _describe_throughput(self.throughput),
+            'TableArn': self.arn,
+            'TableName': self.name,
+            'TableSizeBytes': size,
+            'TableStatus': status}
+        if self.stream:
+            description['StreamSpecification'] = self.stream
+        if self.stream_label:
+            description['LatestStreamLabel'] = self.stream_label
+            description['LatestStreamArn'] = '{}/stream/{}'.format(
+                self.arn, self.stream_label)
+        for is_global, key in ((True, 'GlobalSecondaryIndexes'),
+                               (False, 'LocalSecondaryIndexes')):
+            indexes = [index.describe() for index in self.indexes.values()
+                       if index.is_global == is_global]
+            if indexes:
+                description[key] = indexes
+        return description
+
+    def update(self, payload):
+        if payload.get('AttributeDefinitions'):
+            self.attributes.update(_attribute_definitions(
+                payload['AttributeDefinitions']))
+        if payload.get('ProvisionedThroughput'):
+            self.throughput = _update_throughput(
+                self.throughput, payload['ProvisionedThroughput'])
+            self.buckets = {}
+        if payload.get('StreamSpecification'):
+            self.stream = payload['StreamSpecification']
+            self._update_stream()
+        for update in payload.get('GlobalSecondaryIndexUpdates') or []:
+            if 'Create' in update:
+                self._add_index(update['Create'], True)
+            elif 'Delete' in update:
+                self.view(update['Delete'].get('IndexName'))
+                del self.indexes[update['Delete']['IndexName']]
+            elif 'Update' in update:
+                index = self.view(update['Update'].get('IndexName'))
+                index.throughput = _update_throughput(
+                    index.throughput,
+                    update['Update'].get('ProvisionedThroughput'))
+
+    def _update_stream(self):
+        if self.stream.get('StreamEnabled'):
+            self.stream_label = time.strftime(
+                '%Y-%m-%dT%H:%M:%S.000', time.gmtime())
+        else:
+            self.stream_label = None
+
+    def view(self, index_name=None):
+        if index_name is None:
+            return _View(self, None, False)
+        if index_name not in self.indexes:
+            raise exceptions.ValidationException(
+                'The table does not have the specified index: {}'.format(
+                    index_name))
+        return self.indexes[index_name]
+
+    def key(self, key):
+        """Return the normalized primary key for a key or item, raising a
+        :py:exc:`~tornado_dynamodb.exceptions.ValidationException` if it
+        does not match the key schema.
+
+        """
+        if not key or set(key) != set(self.key_names):
+            raise exceptions.ValidationException(
+                'The provided key element does not match the schema')
+        return self._key(key)
+
+    def _key(self, item):
+        values = []
+        for name in self.key_names:
+            value = item[name]
+            if next(iter(value)) != self.attributes[name]:
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: Type mismatch '
+                    'for key {} expected: {} actual: {}'.format(
+                        name, self.attributes[name], next(iter(value))))
+            values.append(expressions.normalize_key(value))
+        return tuple(values)
+
+    def validate_item(self, item):
+        """Validate the item's key and index key attributes, returning the
+        normalized primary key.
+
+        """
+        for name in self.key_names:
+            if name not in item:
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: Missing the '
+                    'key {} in the item'.format(name))
+        for name, data_type in self.attributes.items():
+            if name in item and next(iter(item[name])) != data_type:
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: Type mismatch '
+                    'for Index Key {} Expected: {} Actual: {}'.format(
+                        name, data_type, next(iter(item[name]))))
+        for name, value in item.items():
+            if not value:
+                raise exceptions.ValidationException(
+                    'Supplied AttributeValue is empty, must contain exactly '
+                    'one of the supported datatypes')
+            data_type = next(iter(value))
+            if data_type in ('SS', 'NS', 'BS') and not value[data_type]:
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: A set may not '
+                    'be empty')
+            if name in self.attributes and data_type in ('S', 'B') and \
+                    not value[data_type]:
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: An '
+                    'AttributeValue may not contain an empty string')
+        return self._key(item)
+
+    def get(self, key):
+        return self.items.get(self.key(key))
+
+    def put(self, key, item):
+        if key not in self.items:
+            self._sorted = None
+        self.items[key] = item
+
+    def delete(self, key):
+        if self.items.pop(key, None) is not None:
+            self._sorted = None
+
+    def sorted_keys(self):
+        if self._sorted is None:
+            self._sorted = sorted(self.items)
+        return self._sorted
+
+
+class _View(object):
+    """A table or secondary index that can be queried and scanned."""
+
+    def __init__(self, table, definition, is_global):
+        self.table = table
+        self.is_global = is_global
+        if definition is None:
+            self.name = None
+            self.key_schema = table.key_schema
+            self.projection = {'ProjectionType': 'ALL'}
+            self.throughput = None
+        else:
+            self.name = definition['IndexName']
+            self.key_schema = _key_schema(definition.get('KeySchema'),
+                                          table.attributes)
+            self.projection = definition.get('Projection') or {}
+            if self.projection.get('ProjectionType') not in \
+                    ('ALL', 'KEYS_ONLY', 'INCLUDE'):
+                raise exceptions.ValidationException(
+                    'One or more parameter values were invalid: Unknown '
+                    'ProjectionType for index: {}'.format(self.name))
+            self.throughput = _throughput(
+                definition.get('ProvisionedThroughput')) if is_global \
+                else None
+        self.key_names = [k['AttributeName'] for k in self.key_schema]
+        self.hash_key = self.key_names[0]
+        self.range_key = self.key_names[1] \
+            if len(self.key_names) > 1 else None
+
+    def describe(self):
+        items = [item for item in self.table.items.values()
+                 if all(name in item for name in self.key_names)]
+        description = {
+            'IndexArn': '{}/index/{}'.format(self.table.arn, self.name),
+            'IndexName': self.name,
+            'IndexSizeBytes': sum(_item_size(self.project(item))
+                                  for item in items),
+            'ItemCount': len(items),
+            'KeySchema': self.key_schema,
+            'Projection': self.projection}
+        if self.is_global:
+            description['IndexStatus'] = 'ACTIVE'
+            description['ProvisionedThroughput'] = _describe_throughput(
+                self.throughput)
+        return description
+
+    def entries(self):
+        """Return the ``(sort_key, item)`` entries for the view in key
+        order.
+
+        """
+        if self.name is None:
+            return [(key, self.table.items[key])
+                    for key in self.table.sorted_keys()]
+        return sorted((self.sort_key(item), item)
+                      for item in self.table.items.values()
+                      if all(name in item for name in self.key_names))
+
+    def partition(self, hash_value, range_condition):
+        """Return the sorted entries for a partition key, optionally
+        filtered by a sort key condition.
+
+        """
+        hash_key = expressions.normalize_key(hash_value)
+        if self.name is None:
+            keys = self.table.sorted_keys()
+            start = bisect.bisect_left(keys, (hash_key,))
+            entries = []
+            for key in keys[start:]:
+                if key[0] != hash_key:
+                    break
+                entries.append((key, self.table.items[key]))
+        else:
+            entries = [entry for entry in self.entries()
+                       if entry[0][0] == hash_key]
+        if range_condition:
+            entries = [entry for entry in entries if expressions.matches(
+                entry[1][self.range_key], range_condition)]
+        return entries
+
+    def sort_key(self, item):
+        """Return the sort position of an item or ``LastEvaluatedKey``."""
+        try:
+            key = tuple(expressions.normalize_key(item[name])
+                        for name in self.key_names)
+            if self.name is not None:
+                key += self.table._key(item)
+        except KeyError:
+            raise exceptions.ValidationException(
+                'The provided starting key is invalid')
+        return key
+
+    def key_of(self, item):
+        """Return the ``LastEvaluatedKey`` for an item."""
+        names = set(self.key_names) | set(self.table.key_names)
+        return dict((name, item[name]) for name in names)
+
+    def project(self, item):
+        projection_type = self.projection.get('ProjectionType', 'ALL')
+        if projection_type == 'ALL':
+            return item
+        names = set(self.key_names) | set(self.table.key_names)
+        if projection_type == 'INCLUDE':
+            names.update(self.projection.get('NonKeyAttributes', []))
+        return dict((name, value) for name, value in item.items()
+                    if name in names)
+
+
+def _attribute_definitions(definitions):
+    attributes = {}
+    for definition in definitions or []:
+        if not definition.get('AttributeName') or \
+                definition.get('AttributeType') not in ('S', 'N', 'B'):
+            raise exceptions.ValidationException(
+                'One or more parameter values were invalid: Invalid '
+                'AttributeDefinition: {}'.format(json.dumps(definition)))
+        attributes[definition['AttributeName']] = definition['AttributeType']
+    return attributes
+
+
+def _key_schema(key_schema, attributes):
+    key_types = [k.get('KeyType') for k in key_schema or []]
+    if key_types not in (['HASH'], ['HASH', 'RANGE']):
+        raise exceptions.ValidationException(
+            '1 validation error detected: Value null at \'keySchema\' failed '
+            'to satisfy constraint: Member must have a HASH key and an '
+            'optional RANGE key')
+    for key in key_schema:
+        if key.get('AttributeName') not in attributes:
+            raise exceptions.ValidationException(
+                'One or more parameter values were invalid: Some index key '
+                'attributes are not defined in AttributeDefinitions. Keys: '
+                '[{}]'.format(key.get('AttributeName')))
+    return [{'AttributeName': k['AttributeName'], 'KeyType': k['KeyType']}
+            for k in key_schema]
+
+
+def _throughput(value):
+    value = value or {}
+    return {'ReadCapacityUnits': value.get('ReadCapacityUnits', 1),
+            'WriteCapacityUnits': value.get('WriteCapacityUnits', 1)}
+
+
+def _describe_throughput(throughput):
+    description = {'NumberOfDecreasesToday': 0}
+    description.update(throughput)
+    return description
+
+
+def _update_throughput(current, value):
+    """Return the new throughput of a table or index, tracking the time of
+    the last increase and decrease and the number of decreases made today.
+
+    """
+    throughput = dict(current)
+    throughput.update(_throughput(value))
+    now = time.time()
+    decreases = current.get('NumberOfDecreasesToday', 0)
+    if current.get('LastDecreaseDateTime', 0) // 86400 != now // 86400:
+        decreases = 0
+    units = ('ReadCapacityUnits', 'WriteCapacityUnits')
+    if any(throughput[key] < current[key] for key in units):
+        if decreases >= _DECREASES_PER_DAY:
+            raise exceptions.LimitExceeded(
+                'Subscriber limit exceeded: Provisioned throughput decreases '
+                'are limited within a given UTC day')
+        decreases += 1
+        throughput['LastDecreaseDateTime'] = now
+    if any(throughput[key] > current[key] for key in units):
+        throughput['LastIncreaseDateTime'] = now
+    throughput['NumberOfDecreasesToday'] = decreases
+    return throughput
+
+
+def _check_condition(payload, existing):
+    if payload.get('ConditionExpression') and not expressions.evaluate(
+            payload['ConditionExpression'], existing,
+            payload.get('ExpressionAttributeNames'),
+            payload.get('ExpressionAttributeValues')):
+        raise exceptions.ConditionalCheckFailedException(
+            'The conditional request failed')
+
+
+def _updated_item(table, payload, existing):
+    """Return the item that results from applying the update expression in
+    an *UpdateItem* request and the top-level attribute names it updated.
+
+    """
+    item = copy.deepcopy(existing or payload['Key'])
+    updated = set()
+    if payload.get('UpdateExpression'):
+        item, updated = expressions.update(
+            payload['UpdateExpression'], item,
+            payload.get('ExpressionAttributeNames'),
+            payload.get('ExpressionAttributeValues'))
+    if updated & set(table.key_names):
+        raise exceptions.ValidationException(
+            'One or more parameter values were invalid: Cannot update '
+            'attribute {}. This attribute is part of the key'.format(
+                sorted(updated & set(table.key_names))[0]))
+    table.validate_item(item)
+    return item, updated
+
+
+def _project(item, payload):
+    if payload.get('ProjectionExpression'):
+        return expressions.project(payload['ProjectionExpression'], item,
+                                   payload.get('ExpressionAttributeNames'))
+    return item
+
+
+def _capacity(result, payload, table, units):
+    if payload.get('ReturnConsumedCapacity') in ('INDEXES', 'TOTAL'):
+        result['ConsumedCapacity'] = {'TableName': table.name,
+                                      'CapacityUnits': float(units)}
+        if payload['ReturnConsumedCapacity'] == 'INDEXES':
+            result['ConsumedCapacity']['Table'] = {
+                'CapacityUnits': float(units)}
+    return result
+
+
+def _collection_metrics(result, payload, table, item):
+    has_lsi = any(not index.is_global for index in table.indexes.values())
+    if has_lsi and payload.get('ReturnItemCollectionMetrics') == 'SIZE':
+        hash_key = table.key_names[0]
+        result['ItemCollectionMetrics'] = {
+            'ItemCollectionKey': {hash_key: item[hash_key]},
+            'SizeEstimateRangeGB': [0.0, 1.0]}
+    return result
+
+
+def _segment(hash_key, total_segments):
+    """Assign a partition key to a parallel scan segment."""
+    value = repr(hash_key).encode('utf-8')
+    return (zlib.crc32(value) & 0xffffffff) % total_segments
+
+
+def _item_size(item):
+    return utils.item_size(item, marshalled=True)
+
+
+class _RequestHandler(web.RequestHandler):
+    """Dispatches DynamoDB JSON protocol requests to the emulator."""
+
+    def initialize(self, emulator):
+        self.emulator = emulator
+
+    @gen.coroutine
+    def post(self):
+        target = self.request.headers.get('x-amz-target', '')
+        operation = target[len(_TARGET_PREFIX):] \
+            if target.startswith(_TARGET_PREFIX) else target
+        delay = self.emulator.delay()
+        if delay:
+            yield gen.sleep(delay)
+        try:
+            try:
+                payload = json.loads(self.request.body.decode('utf-8'))
+            except ValueError:
+                raise exceptions.ValidationException(
+                    'Unable to parse the request body')
+            status, body = 200, self.emulator.execute(operation, payload)
+        except exceptions.DynamoDBException as error:
+            status, body = self.emulator.error_response(error)
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/x-amz-json-1.0')
+        self.finish(json.dumps(body))
+
+
+def main(args=None):
+    """Run the emulator as a standalone server.
+
+    :param list args: Command line arguments, defaults to ``sys.argv``
+
+    """
+    parser = argparse.ArgumentParser(
+        description='Run an in-process DynamoDB emulator')
+    parser.add_argument('--address', default='127.0.0.1',
+                        help='The address to listen on')
+    parser.add_argument('--port', type=int, default=7777,
+                        help='The port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to delay each response by')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Maximum additional random delay in seconds')
+    parser.add_argument('--seed', type=int, help='Random number seed')
+    parser.add_argument('--enforce-throughput', action='store_true',
+                        help='Throttle requests over provisioned throughput')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    emulator = Emulator(args.latency, args.jitter, args.seed,
+                        args.enforce_throughput)
+    LOGGER.info('Listening on %s', emulator.start(args.port, args.address))
+    try:
+        ioloop.IOLoop.current().start()
+    except KeyboardInterrupt:
+        emulator.stop()
+
+
+if __name__ == '__main__':  # pragma: no cover
+    main()
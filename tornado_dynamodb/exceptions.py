@@ -3,6 +3,7 @@ DynamoDB Exceptions
 ===================
 
 """
+import re
 
 
 class DynamoDBException(Exception):
@@ -34,6 +35,24 @@ class ConfigParserError(DynamoDBException):
     pass
 
 
+class ExpiredIteratorException(DynamoDBException):
+    """The shard iterator has expired and can no longer be used to retrieve
+    stream records. A shard iterator expires 15 minutes after it is retrieved
+    using the *GetShardIterator* action.
+
+    """
+    pass
+
+
+class IdempotentParameterMismatch(DynamoDBException):
+    """A transaction was submitted with a client request token that was
+    already used in the last 10 minutes for a request with different
+    parameters.
+
+    """
+    pass
+
+
 class InternalFailure(DynamoDBException):
     """The request processing has failed because of an unknown error, exception
     or failure.
@@ -166,6 +185,14 @@ class ServiceUnavailable(DynamoDBException):
     pass
 
 
+class StaleReplica(DynamoDBException):
+    """A :py:class:`~tornado_dynamodb.replica.TableReplica` has not been
+    loaded, or was last synchronized longer ago than its staleness bound.
+
+    """
+    pass
+
+
 class ThrottlingException(DynamoDBException):
     """The request was denied due to request throttling."""
     pass
@@ -176,6 +203,48 @@ class TimeoutException(DynamoDBException):
     pass
 
 
+class TransactionCanceled(DynamoDBException):
+    """The transaction was canceled and none of its actions were applied. The
+    reason each action caused the cancellation is decoded from the error
+    message returned by DynamoDB.
+
+    :ivar list reasons: One entry per action in the transaction, in request
+        order. Each entry is an instance of the exception that the action
+        would have raised on its own, for example
+        :py:exc:`~tornado_dynamodb.exceptions.ConditionalCheckFailedException`,
+        or :data:`None` if the action did not cause the cancellation.
+
+    """
+    def __init__(self, *args, **kwargs):
+        super(TransactionCanceled, self).__init__(*args, **kwargs)
+        self.reasons = _cancellation_reasons(args[0] if args else '')
+
+
+class TransactionConflict(DynamoDBException):
+    """Another transaction or request is modifying an item in the
+    transaction.
+
+    """
+    pass
+
+
+class TransactionInProgress(DynamoDBException):
+    """A transaction with the same client request token is still being
+    processed.
+
+    """
+    pass
+
+
+class TrimmedDataAccessException(DynamoDBException):
+    """The operation attempted to read past the oldest stream record in a
+    shard. Stream records older than 24 hours are trimmed and are no longer
+    accessible.
+
+    """
+    pass
+
+
 class ValidationException(DynamoDBException):
     """The input fails to satisfy the constraints specified by an AWS service.
 
@@ -184,9 +253,63 @@ class ValidationException(DynamoDBException):
 
 
 MAP = {
+    'com.amazon.coral.availability#ThrottlingException': ThrottlingException,
+    'com.amazon.coral.service#UnknownOperationException': InvalidAction,
+    'com.amazonaws.dynamodb.v20120810#ConditionalCheckFailedException':
+        ConditionalCheckFailedException,
+    'com.amazonaws.dynamodb.v20120810#ExpiredIteratorException':
+        ExpiredIteratorException,
+    'com.amazonaws.dynamodb.v20120810#IdempotentParameterMismatchException':
+        IdempotentParameterMismatch,
     'com.amazonaws.dynamodb.v20120810#InternalFailure': InternalFailure,
+    'com.amazonaws.dynamodb.v20120810#ItemCollectionSizeLimitExceededException':
+        ItemCollectionSizeLimitExceeded,
+    'com.amazonaws.dynamodb.v20120810#LimitExceededException': LimitExceeded,
+    'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException':
+        ProvisionedThroughputExceeded,
     'com.amazonaws.dynamodb.v20120810#ResourceNotFoundException':
         ResourceNotFound,
     'com.amazonaws.dynamodb.v20120810#ResourceInUseException': ResourceInUse,
+    'com.amazonaws.dynamodb.v20120810#TransactionCanceledException':
+        TransactionCanceled,
+    'com.amazonaws.dynamodb.v20120810#TransactionConflictException':
+        TransactionConflict,
+    'com.amazonaws.dynamodb.v20120810#TransactionInProgressException':
+        TransactionInProgress,
+    'com.amazonaws.dynamodb.v20120810#TrimmedDataAccessException':
+        TrimmedDataAccessException,
     'com.amazon.coral.validate#ValidationException': ValidationException
 }
+
+CANCELLATION_REASONS = {
+    'ConditionalCheckFailed': ConditionalCheckFailedException,
+    'ItemCollectionSizeLimitExceeded': ItemCollectionSizeLimitExceeded,
+    'ProvisionedThroughputExceeded': ProvisionedThroughputExceeded,
+    'ThrottlingError': ThrottlingException,
+    'TransactionConflict': TransactionConflict,
+    'ValidationError': ValidationException
+}
+
+_CANCELLATION_CODES = re.compile(r'\[([A-Za-z]+(?:,\s*[A-Za-z]+)*)\]\s*$')
+
+
+def _cancellation_reasons(message):
+    """Decode the per-action cancellation reason codes from the message of a
+    *TransactionCanceledException*, which ends with a bracketed list such as
+    ``[None, ConditionalCheckFailed]``.
+
+    :param str message: The error message
+    :rtype: list
+
+    """
+    match = _CANCELLATION_CODES.search(message or '')
+    if not match:
+        return []
+    reasons = []
+    for code in re.split(r',\s*', match.group(1)):
+        if code == 'None':
+            reasons.append(None)
+        else:
+            reasons.append(CANCELLATION_REASONS.get(
+                code, DynamoDBException)(code))
+    return reasons
@@ -0,0 +1,701 @@
+"""
+Expressions
+===========
+Evaluation of DynamoDB condition, filter, key condition, projection and update
+expressions against items in the DynamoDB wire format, where each attribute
+value is a single item dict such as ``{'S': 'value'}``. This is used by
+:py:mod:`tornado_dynamodb.emulator` and is useful anywhere that the result of
+an expression needs to be known without making a request.
+
+.. code:: python
+
+    item = {'id': {'S': 'foo'}, 'count': {'N': '1'}}
+    expressions.evaluate('#c > :v', item, {'#c': 'count'}, {':v': {'N': '0'}})
+    item, updated = expressions.update('SET #c = #c + :v', item,
+                                       {'#c': 'count'}, {':v': {'N': '1'}})
+
+Errors in the expression, and invalid operations such as adding a number to
+a string, raise :py:exc:`~tornado_dynamodb.exceptions.ValidationException`.
+
+"""
+import base64
+import copy
+import decimal
+import re
+
+from tornado_dynamodb import exceptions
+
+_TOKENS = re.compile(r"""\s*(?:
+    (?P<value>:[A-Za-z0-9_]+)|
+    (?P<name>\#[A-Za-z0-9_]+)|
+    (?P<number>\d+)|
+    (?P<ident>[A-Za-z_][A-Za-z0-9_]*)|
+    (?P<op><>|<=|>=|[=<>(),.\[\]+-])
+    )""", re.VERBOSE)
+
+_COMPARATORS = {'=', '<>', '<', '<=', '>', '>='}
+_CONDITION_FUNCTIONS = {'attribute_exists', 'attribute_not_exists',
+                        'attribute_type', 'begins_with', 'contains'}
+_UPDATE_ACTIONS = ('SET', 'REMOVE', 'ADD', 'DELETE')
+_SET_TYPES = {'SS', 'NS', 'BS'}
+
+
+def evaluate(expression, item, names=None, values=None):
+    """Evaluate a condition or filter expression against an item.
+
+    :param str expression: The condition expression
+    :param dict item: The item to evaluate, in the wire format. ``None`` is
+        treated as an item without any attributes.
+    :param dict names: Expression attribute name substitutions
+    :param dict values: Expression attribute values, in the wire format
+    :rtype: bool
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+    """
+    parser = _Parser(expression, names, values)
+    node = parser.condition()
+    parser.finish()
+    return _evaluate(node, item or {})
+
+
+def key_conditions(expression, names=None, values=None):
+    """Decompose a *Query* key condition expression into the conditions for
+    each key attribute. The result is a dict of attribute name to a tuple of
+    the operator and operand values, where the operator is one of ``=``,
+    ``<``, ``<=``, ``>``, ``>=``, ``BETWEEN`` or ``begins_with``.
+
+    :param str expression: The key condition expression
+    :param dict names: Expression attribute name substitutions
+    :param dict values: Expression attribute values, in the wire format
+    :rtype: dict
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+    """
+    parser = _Parser(expression, names, values)
+    node = parser.condition()
+    parser.finish()
+    conditions = {}
+    for condition in _conjuncts(node):
+        if condition[0] == 'cmp' and condition[1] != '<>':
+            path, operands = condition[2], (condition[3],)
+            operator = condition[1]
+        elif condition[0] == 'between':
+            path, operands = condition[1], condition[2:]
+            operator = 'BETWEEN'
+        elif condition[0] == 'func' and condition[1] == 'begins_with':
+            path, operands = condition[2][0], condition[2][1:]
+            operator = 'begins_with'
+        else:
+            raise exceptions.ValidationException(
+                'Invalid operator used in KeyConditionExpression')
+        if path[0] != 'path' or len(path[1]) != 1 or \
+                any(operand[0] != 'value' for operand in operands):
+            raise exceptions.ValidationException(
+                'KeyConditionExpression conditions must compare a key '
+                'attribute to a value')
+        if path[1][0] in conditions:
+            raise exceptions.ValidationException(
+                'KeyConditionExpressions must only contain one condition per '
+                'key')
+        conditions[path[1][0]] = (operator,) + tuple(o[1] for o in operands)
+    return conditions
+
+
+def matches(value, condition):
+    """Return ``True`` if the attribute value satisfies a key condition as
+    returned by :py:func:`key_conditions`.
+
+    :param dict value: The attribute value, in the wire format
+    :param tuple condition: The key condition
+    :rtype: bool
+
+    """
+    operator, operands = condition[0], condition[1:]
+    if operator == 'BETWEEN':
+        return _compare('>=', value, operands[0]) and \
+            _compare('<=', value, operands[1])
+    elif operator == 'begins_with':
+        return _begins_with(value, operands[0])
+    return _compare(operator, value, operands[0])
+
+
+def project(expression, item, names=None):
+    """Return a copy of the item that only contains the attributes in the
+    projection expression.
+
+    :param str expression: The projection expression
+    :param dict item: The item to project, in the wire format
+    :param dict names: Expression attribute name substitutions
+    :rtype: dict
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+    """
+    parser = _Parser(expression, names, None)
+    paths = [parser.path()]
+    while parser.accept(','):
+        paths.append(parser.path())
+    parser.finish()
+    result = {}
+    for path in paths:
+        value = _resolve(path, item)
+        if value is not None:
+            _merge(result, path[1], value)
+    return result
+
+
+def update(expression, item, names=None, values=None):
+    """Apply an update expression to an item, returning the updated copy of
+    the item and the set of top level attribute names that were changed. All
+    of the operands in the expression are evaluated against the original
+    item.
+
+    :param str expression: The update expression
+    :param dict item: The item to update, in the wire format
+    :param dict names: Expression attribute name substitutions
+    :param dict values: Expression attribute values, in the wire format
+    :rtype: (dict, set)
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+    """
+    parser = _Parser(expression, names, values)
+    actions = parser.update()
+    parser.finish()
+    original, result, updated = item or {}, copy.deepcopy(item or {}), set()
+    removals = []
+    for action, path, operand in actions:
+        updated.add(path[1][0])
+        if action == 'SET':
+            _assign(result, path[1], _operand(operand, original))
+        elif action == 'REMOVE':
+            removals.append(path[1])
+        elif action == 'ADD':
+            _add(result, path, _operand(operand, original))
+        else:
+            _delete(result, path, _operand(operand, original))
+    for elements in sorted(removals, key=_removal_order):
+        _remove(result, elements)
+    return result, updated
+
+
+def _removal_order(elements):
+    """Remove list elements from the highest index down so that removing one
+    element does not shift the others.
+
+    """
+    return [(0, -e) if isinstance(e, int) else (1, e) for e in elements]
+
+
+class _Parser(object):
+    """Recursive descent parser that produces a tuple based syntax tree for
+    condition and update expressions.
+
+    """
+    def __init__(self, expression, names, values):
+        if not expression or not expression.strip():
+            raise exceptions.ValidationException(
+                'Invalid expression: The expression can not be empty')
+        self.expression = expression
+        self.names = names or {}
+        self.values = values or {}
+        self.tokens = self._tokenize(expression)
+        self.position = 0
+
+    def _tokenize(self, expression):
+        tokens, offset = [], 0
+        expression = expression.rstrip()
+        while offset < len(expression):
+            match = _TOKENS.match(expression, offset)
+            if not match or match.end() == offset:
+                self.error('Syntax error; token: "{}"'.format(
+                    expression[offset:].strip()[:10]))
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            offset = match.end()
+        return tokens
+
+    def error(self, message):
+        raise exceptions.ValidationException(
+            'Invalid expression: {}; expression: "{}"'.format(
+                message, self.expression))
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        if index < len(self.tokens):
+            return self.tokens[index]
+        return None, None
+
+    def accept(self, text):
+        kind, value = self.peek()
+        if value is not None and kind in ('op', 'ident') and \
+                value.upper() == text.upper():
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, text):
+        if not self.accept(text):
+            self.error('Expected "{}"'.format(text))
+
+    def finish(self):
+        if self.position < len(self.tokens):
+            self.error('Syntax error; token: "{}"'.format(
+                self.tokens[self.position][1]))
+
+    def condition(self):
+        node = self._and()
+        while self.accept('OR'):
+            node = ('or', node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self.accept('AND'):
+            node = ('and', node, self._not())
+        return node
+
+    def _not(self):
+        if self.accept('NOT'):
+            return 'not', self._not()
+        return self._primary()
+
+    def _primary(self):
+        if self.accept('('):
+            node = self.condition()
+            self.expect(')')
+            return node
+        kind, value = self.peek()
+        if kind == 'ident' and value in _CONDITION_FUNCTIONS and \
+                self.peek(1)[1] == '(':
+            self.position += 2
+            args = self._arguments()
+            return 'func', value, args
+        left = self.operand()
+        if self.accept('BETWEEN'):
+            low = self.operand()
+            self.expect('AND')
+            return 'between', left, low, self.operand()
+        if self.accept('IN'):
+            self.expect('(')
+            options = self._arguments()
+            return 'in', left, options
+        kind, value = self.peek()
+        if value not in _COMPARATORS:
+            self.error('Expected a comparator')
+        self.position += 1
+        return 'cmp', value, left, self.operand()
+
+    def _arguments(self):
+        args = [self.operand()]
+        while self.accept(','):
+            args.append(self.operand())
+        self.expect(')')
+        return args
+
+    def operand(self):
+        kind, value = self.peek()
+        if kind == 'value':
+            self.position += 1
+            if value not in self.values:
+                self.error('An expression attribute value used in '
+                           'expression is not defined; attribute value: '
+                           '{}'.format(value))
+            return 'value', self.values[value]
+        if kind == 'ident' and value == 'size' and self.peek(1)[1] == '(':
+            self.position += 2
+            path = self.path()
+            self.expect(')')
+            return 'size', path
+        return self.path()
+
+    def path(self):
+        elements = [self._name()]
+        while True:
+            if self.accept('.'):
+                elements.append(self._name())
+            elif self.accept('['):
+                kind, value = self.peek()
+                if kind != 'number':
+                    self.error('Expected a list index')
+                self.position += 1
+                self.expect(']')
+                elements.append(int(value))
+            else:
+                return 'path', elements
+
+    def _name(self):
+        kind, value = self.peek()
+        if kind == 'name':
+            self.position += 1
+            if value not in self.names:
+                self.error('An expression attribute name used in the '
+                           'document path is not defined; attribute name: '
+                           '{}'.format(value))
+            return self.names[value]
+        elif kind == 'ident':
+            self.position += 1
+            return value
+        self.error('Expected an attribute name')
+
+    def update(self):
+        actions, seen = [], set()
+        while self.position < len(self.tokens):
+            kind, value = self.peek()
+            action = value.upper() if kind == 'ident' else None
+            if action not in _UPDATE_ACTIONS:
+                self.error('Expected one of {}'.format(
+                    ', '.join(_UPDATE_ACTIONS)))
+            if action in seen:
+                self.error('The "{}" section can only be used once in an '
+                           'update expression'.format(action))
+            seen.add(action)
+            self.position += 1
+            while True:
+                actions.append(self._update_action(action))
+                if not self.accept(','):
+                    break
+        return actions
+
+    def _update_action(self, action):
+        path = self.path()
+        if action == 'SET':
+            self.expect('=')
+            return action, path, self._set_value()
+        elif action == 'REMOVE':
+            return action, path, None
+        operand = self.operand()
+        if operand[0] != 'value':
+            self.error('{} requires a value operand'.format(action))
+        return action, path, operand
+
+    def _set_value(self):
+        left = self._set_operand()
+        for operator in ('+', '-'):
+            if self.accept(operator):
+                return operator, left, self._set_operand()
+        return left
+
+    def _set_operand(self):
+        kind, value = self.peek()
+        if kind == 'ident' and value in ('if_not_exists', 'list_append') \
+                and self.peek(1)[1] == '(':
+            self.position += 2
+            first = self.path() if value == 'if_not_exists' \
+                else self._set_operand()
+            self.expect(',')
+            second = self._set_operand()
+            self.expect(')')
+            return value, first, second
+        operand = self.operand()
+        if operand[0] == 'size':
+            self.error('The function size is not allowed in an update '
+                       'expression')
+        return operand
+
+
+def _conjuncts(node):
+    if node[0] == 'and':
+        return _conjuncts(node[1]) + _conjuncts(node[2])
+    return [node]
+
+
+def _evaluate(node, item):
+    kind = node[0]
+    if kind == 'or':
+        return _evaluate(node[1], item) or _evaluate(node[2], item)
+    elif kind == 'and':
+        return _evaluate(node[1], item) and _evaluate(node[2], item)
+    elif kind == 'not':
+        return not _evaluate(node[1], item)
+    elif kind == 'cmp':
+        return _compare(node[1], _operand(node[2], item),
+                        _operand(node[3], item))
+    elif kind == 'between':
+        value = _operand(node[1], item)
+        return _compare('>=', value, _operand(node[2], item)) and \
+            _compare('<=', value, _operand(node[3], item))
+    elif kind == 'in':
+        value = _operand(node[1], item)
+        return any(_compare('=', value, _operand(option, item))
+                   for option in node[2])
+    return _function(node[1], node[2], item)
+
+
+def _function(name, args, item):
+    if name in ('attribute_exists', 'attribute_not_exists'):
+        if len(args) != 1 or args[0][0] != 'path':
+            raise exceptions.ValidationException(
+                'Invalid arguments for function {}'.format(name))
+        exists = _resolve(args[0], item) is not None
+        return exists if name == 'attribute_exists' else not exists
+    if len(args) != 2:
+        raise exceptions.ValidationException(
+            'Invalid number of arguments for function {}'.format(name))
+    value, operand = _operand(args[0], item), _operand(args[1], item)
+    if value is None or operand is None:
+        return False
+    if name == 'attribute_type':
+        return _type(value) == operand.get('S')
+    elif name == 'begins_with':
+        return _begins_with(value, operand)
+    data_type = _type(value)
+    if data_type == 'S' and _type(operand) == 'S':
+        return operand['S'] in value['S']
+    elif data_type in _SET_TYPES and _type(operand) == data_type[0]:
+        return _normalize(operand) in _normalize(value)
+    elif data_type == 'L':
+        return any(_compare('=', v, operand) for v in value['L'])
+    return False
+
+
+def _begins_with(value, operand):
+    if value is None or _type(value) not in ('S', 'B') or \
+            _type(value) != _type(operand):
+        return False
+    return _normalize(value).startswith(_normalize(operand))
+
+
+def _operand(node, item):
+    """Return the attribute value for an operand or ``None`` if it refers to
+    an attribute that does not exist.
+
+    """
+    kind = node[0]
+    if kind == 'value':
+        return node[1]
+    elif kind == 'path':
+        return _resolve(node, item)
+    elif kind == 'size':
+        value = _resolve(node[1], item)
+        if value is None:
+            return None
+        return {'N': str(_size(value))}
+    elif kind == 'if_not_exists':
+        value = _resolve(node[1], item)
+        return value if value is not None else _operand(node[2], item)
+    elif kind == 'list_append':
+        first, second = _operand(node[1], item), _operand(node[2], item)
+        if _type(first) != 'L' or _type(second) != 'L':
+            raise exceptions.ValidationException(
+                'An operand in the update expression has an incorrect data '
+                'type')
+        return {'L': first['L'] + second['L']}
+    left, right = _operand(node[1], item), _operand(node[2], item)
+    if left is None or right is None:
+        raise exceptions.ValidationException(
+            'The provided expression refers to an attribute that does not '
+            'exist in the item')
+    if _type(left) != 'N' or _type(right) != 'N':
+        raise exceptions.ValidationException(
+            'An operand in the update expression has an incorrect data type')
+    a, b = decimal.Decimal(left['N']), decimal.Decimal(right['N'])
+    return {'N': format_number(a + b if kind == '+' else a - b)}
+
+
+def _resolve(path, item):
+    value = item.get(path[1][0])
+    for element in path[1][1:]:
+        if value is None:
+            return None
+        if isinstance(element, int):
+            values = value.get('L')
+            if values is None or element >= len(values):
+                return None
+            value = values[element]
+        else:
+            value = value.get('M', {}).get(element)
+    return value
+
+
+def _size(value):
+    data_type = _type(value)
+    if data_type in ('S', 'B'):
+        return len(_normalize(value))
+    elif data_type in _SET_TYPES or data_type in ('L', 'M'):
+        return len(value[data_type])
+    raise exceptions.ValidationException(
+        'Invalid operand type for function size: {}'.format(data_type))
+
+
+def _compare(operator, left, right):
+    if left is None or right is None:
+        return operator == '<>'
+    if operator in ('=', '<>'):
+        equal = _type(left) == _type(right) and \
+            _normalize(left) == _normalize(right)
+        return equal if operator == '=' else not equal
+    if _type(left) != _type(right) or _type(left) not in ('S', 'N', 'B'):
+        return False
+    a, b = _normalize(left), _normalize(right)
+    if operator == '<':
+        return a < b
+    elif operator == '<=':
+        return a <= b
+    elif operator == '>':
+        return a > b
+    return a >= b
+
+
+def _type(value):
+    return next(iter(value)) if value else None
+
+
+def _normalize(value):
+    """Return a comparable native representation of an attribute value.
+
+    :param dict value: The attribute value, in the wire format
+    :rtype: mixed
+
+    """
+    data_type = _type(value)
+    data = value[data_type]
+    if data_type == 'N':
+        return decimal.Decimal(data)
+    elif data_type == 'B':
+        return _binary(data)
+    elif data_type == 'NS':
+        return frozenset(decimal.Decimal(v) for v in data)
+    elif data_type == 'BS':
+        return frozenset(_binary(v) for v in data)
+    elif data_type == 'SS':
+        return frozenset(data)
+    elif data_type == 'L':
+        return [(_type(v), _normalize(v)) for v in data]
+    elif data_type == 'M':
+        return dict((k, (_type(v), _normalize(v))) for k, v in data.items())
+    return data
+
+
+def normalize_key(value):
+    """Return a hashable and sortable representation of a key attribute value
+    (``S``, ``N`` or ``B``).
+
+    :param dict value: The attribute value, in the wire format
+    :rtype: mixed
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+    """
+    if _type(value) not in ('S', 'N', 'B'):
+        raise exceptions.ValidationException(
+            'Invalid key attribute type: {}'.format(_type(value)))
+    return _normalize(value)
+
+
+def _binary(value):
+    if isinstance(value, bytes):
+        return value
+    try:
+        return base64.b64decode(value)
+    except (TypeError, ValueError):
+        return value.encode('utf-8')
+
+
+def format_number(value):
+    """Format a :py:class:`~decimal.Decimal` as a DynamoDB number string.
+
+    :param decimal.Decimal value: The value to format
+    :rtype: str
+
+    """
+    text = '{:f}'.format(value)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return text if text not in ('-0', '') else '0'
+
+
+def _container(item, elements):
+    """Return the container that holds the last element of a document path
+    along with the key or index to use for the last element.
+
+    """
+    container = item
+    for element in elements[:-1]:
+        if isinstance(container, list):
+            value = container[element] if isinstance(element, int) and \
+                element < len(container) else None
+        else:
+            value = container.get(element)
+        data_type = _type(value) if value is not None else None
+        if data_type not in ('M', 'L'):
+            raise exceptions.ValidationException(
+                'The document path provided in the update expression is '
+                'invalid for update')
+        container = value[data_type]
+    last = elements[-1]
+    if isinstance(last, int) != isinstance(container, list):
+        raise exceptions.ValidationException(
+            'The document path provided in the update expression is invalid '
+            'for update')
+    return container, last
+
+
+def _assign(item, elements, value):
+    container, last = _container(item, elements)
+    if isinstance(container, list) and last >= len(container):
+        container.append(value)
+    else:
+        container[last] = value
+
+
+def _remove(item, elements):
+    container, last = _container(item, elements)
+    if isinstance(container, list):
+        if last < len(container):
+            del container[last]
+    else:
+        container.pop(last, None)
+
+
+def _add(item, path, value):
+    current = _resolve(path, item)
+    if current is None:
+        return _assign(item, path[1], value)
+    data_type = _type(current)
+    if data_type != _type(value):
+        raise exceptions.ValidationException(
+            'An operand in the update expression has an incorrect data type')
+    if data_type == 'N':
+        result = decimal.Decimal(current['N']) + decimal.Decimal(value['N'])
+        return _assign(item, path[1], {'N': format_number(result)})
+    elif data_type in _SET_TYPES:
+        merged = list(current[data_type])
+        existing = _normalize(current)
+        for entry in value[data_type]:
+            if _normalize({data_type: [entry]}) - existing:
+                merged.append(entry)
+        return _assign(item, path[1], {data_type: merged})
+    raise exceptions.ValidationException(
+        'ADD can only be used with numbers and sets')
+
+
+def _delete(item, path, value):
+    current = _resolve(path, item)
+    if current is None:
+        return
+    data_type = _type(current)
+    if data_type not in _SET_TYPES or data_type != _type(value):
+        raise exceptions.ValidationException(
+            'An operand in the update expression has an incorrect data type')
+    remove = _normalize(value)
+    remaining = [entry for entry in current[data_type]
+                 if not _normalize({data_type: [entry]}) <= remove]
+    if remaining:
+        _assign(item, path[1], {data_type: remaining})
+    else:
+        _remove(item, path[1])
+
+
+def _merge(result, elements, value):
+    """Merge a projected value into the result at the document path."""
+    container = result
+    for index, element in enumerate(elements[:-1]):
+        next_type = 'L' if isinstance(elements[index + 1], int) else 'M'
+        if isinstance(container, list):
+            container.append({next_type: [] if next_type == 'L' else {}})
+            container = container[-1][next_type]
+        else:
+            container = container.setdefault(
+                element, {next_type: [] if next_type == 'L' else {}})[
+                    next_type]
+    if isinstance(container, list):
+        container.append(value)
+    else:
+        container[elements[-1]] = value
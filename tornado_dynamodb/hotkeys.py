@@ -0,0 +1,433 @@
+"""
+Hot Partition Keys
+==================
+:py:class:`~tornado_dynamodb.hotkeys.HotKeyTracker` samples the partition
+keys of the requests a :py:class:`~tornado_dynamodb.DynamoDB` client makes
+and keeps a per-table heavy hitters sketch of them, so the keys that are
+likely to be throttled can be reported:
+
+.. code:: python
+
+    tracker = hotkeys.HotKeyTracker(sample_rate=0.1, window=60)
+    client = tornado_dynamodb.DynamoDB(hot_key_tracker=tracker)
+    ...
+    for key, count, error in tracker.top('orders', 5):
+        LOGGER.info('%s: ~%i requests/minute', key, count)
+
+:py:class:`~tornado_dynamodb.hotkeys.ShardedTable` spreads the items of
+designated hot partition keys over several partitions by appending a shard
+suffix to the partition key value on writes, stripping it on reads and
+fanning queries out across the shards:
+
+.. code:: python
+
+    table = hotkeys.ShardedTable(client, 'events', 'user_id', 'created_at',
+                                 {'busy-user': 8})
+    yield table.put_item({'user_id': 'busy-user', 'created_at': now})
+    result = yield table.query('busy-user', scan_index_forward=False,
+                               limit=20)
+
+"""
+import decimal
+import logging
+import random
+import time
+import zlib
+
+from tornado import gen
+
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import expressions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 64
+DEFAULT_SEPARATOR = '#'
+DEFAULT_WINDOW = 60.0
+
+
+class HotKeyTracker(object):
+    """Track the most frequently requested partition keys of each table with
+    a space-saving heavy hitters sketch of ``capacity`` counters per table.
+
+    Counts are kept for tumbling windows of ``window`` seconds, and are
+    reported over the current and the previous window so that a report made
+    just after a window ends is not empty. When ``sample_rate`` is less than
+    ``1``, only that fraction of requests is inspected and the counts are
+    scaled up to estimate the total.
+
+    The partition key of a table is learned from the *CreateTable* requests
+    and :py:meth:`~tornado_dynamodb.DynamoDB.describe_table` responses that
+    pass through the client, or can be configured with ``partition_keys``.
+    Keys of tables with an unknown schema are tracked when the request key
+    only has one attribute. Queries of a secondary index are tracked under
+    ``table/index``.
+
+    :param int capacity: The number of counters per table
+    :param float sample_rate: The fraction of requests to inspect
+    :param float window: The window length in seconds
+    :param dict partition_keys: A mapping of table names to their partition
+        key attribute names
+    :param int seed: Seed for the sampling random number generator
+
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, sample_rate=1.0,
+                 window=DEFAULT_WINDOW, partition_keys=None, seed=None):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.window = window
+        self.partition_keys = dict(partition_keys or {})
+        self._current = {}
+        self._previous = {}
+        self._random = random.Random(seed)
+        self._window_start = time.time()
+
+    def learn(self, table):
+        """Learn the partition keys of a table and its secondary indexes from
+        a table description or *CreateTable* request.
+
+        :param dict table: The table description
+
+        """
+        name = table.get('TableName')
+        self.partition_keys[name] = _hash_key(table.get('KeySchema', []))
+        for index in (table.get('GlobalSecondaryIndexes', []) +
+                      table.get('LocalSecondaryIndexes', [])):
+            self.partition_keys['{}/{}'.format(
+                name, index['IndexName'])] = _hash_key(index['KeySchema'])
+
+    def observe(self, command, body):
+        """Record the partition keys used by a request. This is called by
+        the client for each request it makes.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+
+        """
+        if command == 'CreateTable':
+            return self.learn(body)
+        if self.sample_rate < 1 and self._random.random() >= self.sample_rate:
+            return
+        try:
+            for table, value in self._partition_values(command, body):
+                self.record(table, value, 1.0 / self.sample_rate)
+        except (exceptions.ValidationException, KeyError, TypeError,
+                ValueError) as error:
+            LOGGER.debug('Could not track the keys of a %s request: %s',
+                         command, error)
+
+    def record(self, table, value, weight=1):
+        """Count a request for a partition key value.
+
+        :param str table: The table name
+        :param value: The partition key value, in the wire format
+        :type value: dict
+        :param float weight: The number of requests to count
+
+        """
+        self._rotate()
+        sketch = self._current.setdefault(table, _SpaceSaving(self.capacity))
+        sketch.add(_hashable(value), weight)
+
+    def top(self, table, count=10):
+        """Return the ``count`` most requested partition keys of the table in
+        the current and previous window as a list of
+        ``(value, estimated count, maximum overestimate)`` tuples, with the
+        partition key value unmarshalled.
+
+        :param str table: The table name
+        :param int count: The number of keys to return
+        :rtype: list
+
+        """
+        self._rotate()
+        counts, errors = {}, {}
+        for sketches in (self._previous, self._current):
+            if table in sketches:
+                for key, (value, error) in sketches[table].counters.items():
+                    counts[key] = counts.get(key, 0) + value
+                    errors[key] = errors.get(key, 0) + error
+        ranked = sorted(counts, key=lambda key: (-counts[key], key))[:count]
+        return [(_native(key), int(round(counts[key])),
+                 int(round(errors[key]))) for key in ranked]
+
+    def report(self, count=10):
+        """Return the top partition keys for every tracked table.
+
+        :param int count: The number of keys to return per table
+        :rtype: dict
+
+        """
+        self._rotate()
+        tables = set(self._current) | set(self._previous)
+        return dict((table, self.top(table, count)) for table in tables)
+
+    def reset(self):
+        """Discard all of the counts."""
+        self._current, self._previous = {}, {}
+        self._window_start = time.time()
+
+    def _partition_values(self, command, body):
+        """Return the ``(table, partition key value)`` pairs of a request."""
+        if command in ('GetItem', 'DeleteItem', 'UpdateItem'):
+            yield self._from_item(body['TableName'], body['Key'])
+        elif command == 'PutItem':
+            yield self._from_item(body['TableName'], body['Item'])
+        elif command == 'BatchGetItem':
+            for table, request in body['RequestItems'].items():
+                for key in request['Keys']:
+                    yield self._from_item(table, key)
+        elif command == 'BatchWriteItem':
+            for table, requests in body['RequestItems'].items():
+                for request in requests:
+                    if 'PutRequest' in request:
+                        yield self._from_item(
+                            table, request['PutRequest']['Item'])
+                    else:
+                        yield self._from_item(
+                            table, request['DeleteRequest']['Key'])
+        elif command == 'Query':
+            table = body['TableName']
+            if body.get('IndexName'):
+                table = '{}/{}'.format(table, body['IndexName'])
+            conditions = expressions.key_conditions(
+                body['KeyConditionExpression'],
+                body.get('ExpressionAttributeNames'),
+                body.get('ExpressionAttributeValues'))
+            name = self.partition_keys.get(table)
+            if name is None:
+                equal = [attr for attr, value in conditions.items()
+                         if value[0] == '=']
+                if len(equal) != 1:
+                    return
+                name = equal[0]
+            yield table, conditions[name][1]
+        elif command in ('TransactGetItems', 'TransactWriteItems'):
+            for action in body['TransactItems']:
+                request = next(iter(action.values()))
+                yield self._from_item(request['TableName'],
+                                      request.get('Key') or request['Item'])
+
+    def _from_item(self, table, item):
+        name = self.partition_keys.get(table)
+        if name is None:
+            if len(item) != 1:
+                raise ValueError('the partition key of {} is not '
+                                 'known'.format(table))
+            name = next(iter(item))
+        return table, item[name]
+
+    def _rotate(self):
+        now = time.time()
+        if now - self._window_start < self.window:
+            return
+        if now - self._window_start < self.window * 2:
+            self._previous = self._current
+        else:
+            self._previous = {}
+        self._current = {}
+        self._window_start = now
+
+
+class ShardedTable(object):
+    """Write-shard designated hot partition keys of a table with a sort key.
+
+    Items for a hot partition key value are written to the partition
+    ``<value><separator><shard>``, where the shard is derived from the sort
+    key value so that an item is always written to and read from the same
+    shard. Partition key values that are not designated as hot are used
+    unchanged. Only string partition keys can be sharded.
+
+    .. warning:: The number of shards for a key must not change once items
+       have been written for it, or existing items will be read from the
+       wrong shard.
+
+    :param client: The client to make requests with
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table name
+    :param str partition_key: The partition key attribute name
+    :param str sort_key: The sort key attribute name
+    :param dict hot_keys: A mapping of hot partition key values to the
+        number of shards to spread them over
+    :param str separator: The separator between the value and the shard
+
+    """
+    def __init__(self, client, table_name, partition_key, sort_key,
+                 hot_keys=None, separator=DEFAULT_SEPARATOR):
+        self.client = client
+        self.table_name = table_name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self.separator = separator
+        self.hot_keys = {}
+        for value, shards in (hot_keys or {}).items():
+            self.add_hot_key(value, shards)
+
+    def add_hot_key(self, value, shards):
+        """Designate a partition key value as hot, spreading its items over
+        ``shards`` partitions.
+
+        :param str value: The partition key value
+        :param int shards: The number of shards
+        :raises: :py:exc:`ValueError`
+
+        """
+        if not isinstance(value, (str, type(u''))):
+            raise ValueError('Only string partition keys can be sharded')
+        if shards < 1:
+            raise ValueError('shards must be at least 1')
+        self.hot_keys[value] = shards
+
+    def shard_values(self, value):
+        """Return the partition key values that the items for ``value`` are
+        stored under.
+
+        :param value: The partition key value
+        :rtype: list
+
+        """
+        if value not in self.hot_keys:
+            return [value]
+        return ['{}{}{}'.format(value, self.separator, shard)
+                for shard in range(self.hot_keys[value])]
+
+    def shard_key(self, key):
+        """Return a copy of the key or item with the partition key value
+        replaced by the shard it is stored in.
+
+        :param dict key: The key or item
+        :rtype: dict
+
+        """
+        value = key[self.partition_key]
+        if value not in self.hot_keys:
+            return key
+        data_type, data = _hashable(utils.marshall(
+            {self.sort_key: key[self.sort_key]})[self.sort_key])
+        if data_type == 'N':
+            data = expressions.format_number(decimal.Decimal(data))
+        digest = zlib.crc32(u'{}:{}'.format(data_type, data).encode(
+            'utf-8')) & 0xffffffff
+        result = dict(key)
+        result[self.partition_key] = '{}{}{}'.format(
+            value, self.separator, digest % self.hot_keys[value])
+        return result
+
+    def strip(self, item):
+        """Remove the shard suffix from the partition key value of an item,
+        in place.
+
+        :param dict item: The item
+        :rtype: dict
+
+        """
+        value = item.get(self.partition_key)
+        if isinstance(value, (str, type(u''))) and self.separator in value:
+            base = value.rsplit(self.separator, 1)[0]
+            if base in self.hot_keys:
+                item[self.partition_key] = base
+        return item
+
+    @gen.coroutine
+    def put_item(self, item, **kwargs):
+        """Put an item, writing it to its shard if its partition key value is
+        hot. Accepts the keyword arguments of
+        :py:meth:`~tornado_dynamodb.DynamoDB.put_item`.
+
+        :param dict item: The item
+        :rtype: dict
+
+        """
+        result = yield self.client.put_item(self.table_name,
+                                            self.shard_key(item), **kwargs)
+        raise gen.Return(self._strip_attributes(result))
+
+    @gen.coroutine
+    def get_item(self, key, **kwargs):
+        """Get an item from its shard. Accepts the keyword arguments of
+        :py:meth:`~tornado_dynamodb.DynamoDB.get_item`.
+
+        :param dict key: The primary key of the item
+        :rtype: dict
+
+        """
+        result = yield self.client.get_item(self.table_name,
+                                            self.shard_key(key), **kwargs)
+        if result.get('Item'):
+            self.strip(result['Item'])
+        raise gen.Return(result)
+
+    @gen.coroutine
+    def delete_item(self, key, **kwargs):
+        """Delete an item from its shard. Accepts the keyword arguments of
+        :py:meth:`~tornado_dynamodb.DynamoDB.delete_item`.
+
+        :param dict key: The primary key of the item
+        :rtype: dict
+
+        """
+        result = yield self.client.delete_item(self.table_name,
+                                               self.shard_key(key), **kwargs)
+        raise gen.Return(self._strip_attributes(result))
+
+    @gen.coroutine
+    def query(self, value, **kwargs):
+        """Query the items for a partition key value, fanning the query out
+        across its shards and merging the results by sort key. Accepts the
+        keyword arguments of
+        :py:meth:`~tornado_dynamodb.DynamoDB.multi_query`.
+
+        :param value: The partition key value
+        :rtype: dict
+
+        """
+        result = yield self.client.multi_query(
+            self.table_name, self.partition_key, self.shard_values(value),
+            self.sort_key, **kwargs)
+        for item in result['Items']:
+            self.strip(item)
+        raise gen.Return(result)
+
+    def _strip_attributes(self, result):
+        if result and result.get('Attributes'):
+            self.strip(result['Attributes'])
+        return result
+
+
+class _SpaceSaving(object):
+    """The space-saving heavy hitters algorithm: ``capacity`` counters are
+    kept, and a key without a counter replaces the key with the smallest
+    count, inheriting its count as the maximum overestimate of its own.
+
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+
+    def add(self, key, weight=1):
+        if key in self.counters:
+            count, error = self.counters[key]
+            self.counters[key] = count + weight, error
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = weight, 0
+        else:
+            smallest = min(self.counters,
+                           key=lambda value: self.counters[value][0])
+            count = self.counters.pop(smallest)[0]
+            self.counters[key] = count + weight, count
+
+
+def _hash_key(key_schema):
+    for key in key_schema:
+        if key['KeyType'] == 'HASH':
+            return key['AttributeName']
+
+
+def _hashable(value):
+    data_type = next(iter(value))
+    return data_type, value[data_type]
+
+
+def _native(key):
+    return utils.unmarshall({'value': {key[0]: key[1]}})['value']
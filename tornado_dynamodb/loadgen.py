@@ -0,0 +1,575 @@
+"""
+Load Generator
+==============
+Drive a configurable mix of operations against a table to measure how many
+operations per second a single process can push through
+:py:class:`~tornado_dynamodb.DynamoDB` and what the latency distribution
+looks like.
+
+The load generator runs either closed-loop, where ``concurrency`` workers
+each issue their next request as soon as the previous one completes, or
+open-loop, where requests are started at a fixed ``rate`` regardless of how
+long earlier requests take. In open-loop mode, latency is measured from the
+time the request was scheduled to start, so queueing delay caused by a slow
+server is included in the results instead of being hidden by it.
+
+Items are generated by :py:class:`~tornado_dynamodb.loadgen.ItemGenerator`
+with a string partition key, a numeric sort key and a configurable number of
+fixed size string attributes. Read operations pick keys from the same key
+space, so the table should be populated first with
+:py:meth:`~tornado_dynamodb.loadgen.ItemGenerator.items`, or with the
+``--preload`` option of the ``tornado-dynamodb-loadgen`` console script.
+
+.. code:: python
+
+    generator = loadgen.LoadGenerator(
+        client, 'my-table', {'get_item': 80, 'put_item': 20},
+        concurrency=32, generator=loadgen.ItemGenerator(key_space=10000))
+    report = yield generator.run(duration=30)
+    print(report['throughput'], report['latency']['p99'])
+
+"""
+import argparse
+import bisect
+import collections
+import json
+import logging
+import math
+import random
+import string
+import sys
+
+from tornado import gen
+from tornado import ioloop
+from tornado import locks
+
+import tornado_dynamodb
+from tornado_dynamodb import bulk
+from tornado_dynamodb import emulator
+from tornado_dynamodb import exceptions
+
+LOGGER = logging.getLogger(__name__)
+
+OPERATIONS = ('get_item', 'put_item', 'query', 'scan', 'batch_get_item',
+              'batch_write_item')
+DEFAULT_MIX = {'get_item': 60, 'put_item': 30, 'query': 5, 'scan': 1,
+               'batch_get_item': 2, 'batch_write_item': 2}
+PERCENTILES = (50, 90, 99, 99.9)
+
+_THROTTLE_EXCEPTIONS = (exceptions.ProvisionedThroughputExceeded,
+                        exceptions.ThrottlingException)
+
+
+class Histogram(object):
+    """A latency histogram with logarithmic buckets, so that memory use is
+    bounded regardless of the number of values recorded. Percentiles are
+    accurate to within ``precision`` of the recorded values.
+
+    :param float precision: The relative precision of the buckets
+
+    """
+    def __init__(self, precision=0.01):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self._base = math.log(1 + precision)
+        self._buckets = collections.Counter()
+
+    def record(self, value):
+        """Record a value in seconds.
+
+        :param float value: The value to record
+
+        """
+        micros = max(value * 1000000, 1.0)
+        self._buckets[int(math.log(micros) / self._base)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add the values recorded by another histogram to this one.
+
+        :param other: The histogram to merge
+        :type other: :py:class:`~tornado_dynamodb.loadgen.Histogram`
+
+        """
+        self._buckets.update(other._buckets)
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None \
+                else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Return the value in seconds at the percentile.
+
+        :param float percent: The percentile, for example ``99.9``
+        :rtype: float
+
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= target:
+                value = math.exp((bucket + 0.5) * self._base) / 1000000
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self):
+        """Return the mean, max and standard percentiles in seconds.
+
+        :rtype: dict
+
+        """
+        result = dict(('p{:g}'.format(percent), self.percentile(percent))
+                      for percent in PERCENTILES)
+        result['mean'] = self.total / self.count if self.count else 0.0
+        result['max'] = self.max
+        return result
+
+
+class ItemGenerator(object):
+    """Generates keys and items for the load generator. Items have a string
+    ``id`` partition key, a numeric ``seq`` sort key and ``attributes``
+    string attributes of ``value_size`` characters.
+
+    :param int key_space: The number of partition keys
+    :param int range_keys: The number of sort keys per partition key
+    :param int attributes: The number of non-key attributes per item
+    :param int value_size: The size of each non-key attribute
+    :param int seed: Random number generator seed
+
+    """
+    ATTRIBUTES = [{'AttributeName': 'id', 'AttributeType': 'S'},
+                  {'AttributeName': 'seq', 'AttributeType': 'N'}]
+    KEY_SCHEMA = [{'AttributeName': 'id', 'KeyType': 'HASH'},
+                  {'AttributeName': 'seq', 'KeyType': 'RANGE'}]
+
+    def __init__(self, key_space=1000, range_keys=1, attributes=4,
+                 value_size=64, seed=None):
+        self.key_space = key_space
+        self.range_keys = range_keys
+        self.attributes = attributes
+        self.value_size = value_size
+        self._random = random.Random(seed)
+
+    def partition(self):
+        """Return a random partition key value.
+
+        :rtype: str
+
+        """
+        return 'key-{:08d}'.format(self._random.randrange(self.key_space))
+
+    def key(self):
+        """Return a random primary key from the key space.
+
+        :rtype: dict
+
+        """
+        return {'id': self.partition(),
+                'seq': self._random.randrange(self.range_keys)}
+
+    def item(self, key=None):
+        """Return an item for the key, or for a random key if not specified.
+
+        :param dict key: The primary key of the item
+        :rtype: dict
+
+        """
+        item = dict(key or self.key())
+        for offset in range(self.attributes):
+            item['attr{}'.format(offset)] = ''.join(
+                self._random.choice(string.ascii_letters)
+                for _ in range(self.value_size))
+        return item
+
+    def items(self):
+        """Iterate over an item for every key in the key space.
+
+        :rtype: iterator
+
+        """
+        for partition in range(self.key_space):
+            for seq in range(self.range_keys):
+                yield self.item({'id': 'key-{:08d}'.format(partition),
+                                 'seq': seq})
+
+
+class LoadGenerator(object):
+    """Issues a weighted mix of operations against a table and records the
+    outcome and latency of each request.
+
+    :param client: The client to use
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table to run against
+    :param dict mix: Relative weights by operation name. Valid operations are
+        ``get_item``, ``put_item``, ``query``, ``scan``, ``batch_get_item``
+        and ``batch_write_item``.
+    :param int concurrency: The number of concurrent requests. In open-loop
+        mode this is the maximum number of requests in flight.
+    :param float rate: Run open-loop at this many requests per second
+    :param generator: The item generator
+    :type generator: :py:class:`~tornado_dynamodb.loadgen.ItemGenerator`
+    :param int batch_size: The number of items per batch operation
+    :param int page_size: The ``limit`` used for query and scan operations
+    :param int seed: Random number generator seed for choosing operations
+    :param float timeout: Seconds to wait for a request before counting it
+        as an error
+    :raises: ValueError
+
+    """
+    def __init__(self, client, table_name, mix=None, concurrency=16,
+                 rate=None, generator=None, batch_size=10, page_size=25,
+                 seed=None, timeout=30.0):
+        mix = mix or DEFAULT_MIX
+        for operation, weight in mix.items():
+            if operation not in OPERATIONS:
+                raise ValueError('Unsupported operation: {}'.format(operation))
+            if weight < 0:
+                raise ValueError('Invalid weight for {}'.format(operation))
+        self._operations = [op for op in OPERATIONS if mix.get(op)]
+        if not self._operations:
+            raise ValueError('The operation mix is empty')
+        self._weights = []
+        for operation in self._operations:
+            total = self._weights[-1] if self._weights else 0
+            self._weights.append(total + mix[operation])
+        self.client = client
+        self.table_name = table_name
+        self.concurrency = concurrency
+        self.rate = rate
+        self.generator = generator or ItemGenerator(seed=seed)
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._ioloop = ioloop.IOLoop.current()
+        self._stats = dict((op, _OperationStats()) for op in self._operations)
+        self._started = None
+        self._finished = None
+        self._deadline = None
+        self._remaining = None
+
+    @gen.coroutine
+    def run(self, duration=None, requests=None):
+        """Run the workload for ``duration`` seconds or until ``requests``
+        requests have been issued, returning the report. If neither is
+        specified, the workload runs for ten seconds.
+
+        :param float duration: The number of seconds to run for
+        :param int requests: The number of requests to issue
+        :rtype: dict
+
+        """
+        if duration is None and requests is None:
+            duration = 10.0
+        self._started = self._ioloop.time()
+        self._deadline = self._started + duration if duration else None
+        self._remaining = requests
+        if self.rate:
+            yield self._open_loop()
+        else:
+            yield [self._worker() for _ in range(self.concurrency)]
+        self._finished = self._ioloop.time()
+        raise gen.Return(self.report())
+
+    def report(self):
+        """Return the throughput, error and throttle rates and latency
+        percentiles for the run, overall and for each operation. Latencies
+        are in seconds.
+
+        :rtype: dict
+
+        """
+        elapsed = (self._finished or self._ioloop.time()) - \
+            (self._started or self._ioloop.time())
+        total = _OperationStats()
+        operations = {}
+        for operation, stats in self._stats.items():
+            total.merge(stats)
+            operations[operation] = stats.as_dict(elapsed)
+        result = total.as_dict(elapsed)
+        result['elapsed'] = elapsed
+        result['operations'] = operations
+        return result
+
+    def _issue(self):
+        """Return ``True`` if another request should be issued."""
+        if self._deadline is not None and \
+                self._ioloop.time() >= self._deadline:
+            return False
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+        return True
+
+    @gen.coroutine
+    def _worker(self):
+        while self._issue():
+            yield self._execute(self._choose(), self._ioloop.time())
+
+    @gen.coroutine
+    def _open_loop(self):
+        semaphore = locks.Semaphore(self.concurrency)
+        interval, scheduled = 1.0 / self.rate, self._ioloop.time()
+        pending = set()
+
+        @gen.coroutine
+        def execute(operation, start):
+            try:
+                yield self._execute(operation, start)
+            finally:
+                semaphore.release()
+
+        while self._issue():
+            delay = scheduled - self._ioloop.time()
+            if delay > 0:
+                yield gen.sleep(delay)
+            yield semaphore.acquire()
+            future = execute(self._choose(), scheduled)
+            pending.add(future)
+            future.add_done_callback(pending.discard)
+            scheduled += interval
+        yield list(pending)
+
+    def _choose(self):
+        value = self._random.uniform(0, self._weights[-1])
+        index = bisect.bisect_left(self._weights, value)
+        return self._operations[min(index, len(self._operations) - 1)]
+
+    @gen.coroutine
+    def _execute(self, operation, start):
+        stats = self._stats[operation]
+        try:
+            result = yield gen.with_timeout(
+                self._ioloop.time() + self.timeout,
+                getattr(self, '_' + operation)(),
+                quiet_exceptions=exceptions.DynamoDBException)
+        except _THROTTLE_EXCEPTIONS:
+            stats.throttles += 1
+        except (exceptions.DynamoDBException, gen.TimeoutError) as error:
+            LOGGER.debug('Error executing %s: %s', operation, error)
+            stats.errors += 1
+        else:
+            stats.unprocessed += sum(
+                len(value.get('Keys', value)) for value in
+                (result.get('UnprocessedItems') or
+                 result.get('UnprocessedKeys') or {}).values())
+        stats.latency.record(self._ioloop.time() - start)
+
+    def _get_item(self):
+        return self.client.get_item(self.table_name, self.generator.key())
+
+    def _put_item(self):
+        return self.client.put_item(self.table_name, self.generator.item())
+
+    def _query(self):
+        return self.client.query(
+            self.table_name, key_condition_expression='#id = :id',
+            expression_attribute_names={'#id': 'id'},
+            expression_attribute_values={':id': self.generator.partition()},
+            limit=self.page_size)
+
+    def _scan(self):
+        return self.client.scan(self.table_name, limit=self.page_size)
+
+    def _batch_get_item(self):
+        keys = dict((tuple(sorted(key.items())), key)
+                    for key in (self.generator.key()
+                                for _ in range(self.batch_size)))
+        return self.client.batch_get_item(
+            {self.table_name: {'Keys': list(keys.values())}})
+
+    def _batch_write_item(self):
+        items = dict(((item['id'], item['seq']), item)
+                     for item in (self.generator.item()
+                                  for _ in range(self.batch_size)))
+        return self.client.batch_write_item(
+            {self.table_name: [{'PutRequest': {'Item': item}}
+                               for item in items.values()]})
+
+
+class _OperationStats(object):
+    """Counters and latency histogram for one operation."""
+
+    def __init__(self):
+        self.errors = 0
+        self.throttles = 0
+        self.unprocessed = 0
+        self.latency = Histogram()
+
+    def merge(self, other):
+        self.errors += other.errors
+        self.throttles += other.throttles
+        self.unprocessed += other.unprocessed
+        self.latency.merge(other.latency)
+
+    def as_dict(self, elapsed):
+        requests = self.latency.count
+        return {'requests': requests,
+                'throughput': requests / elapsed if elapsed else 0.0,
+                'errors': self.errors,
+                'throttles': self.throttles,
+                'unprocessed': self.unprocessed,
+                'error_rate': self.errors / float(requests or 1),
+                'throttle_rate': self.throttles / float(requests or 1),
+                'latency': self.latency.summary()}
+
+
+def parse_mix(value):
+    """Parse an operation mix in the form ``get_item=80,put_item=20``.
+
+    :param str value: The operation mix
+    :rtype: dict
+    :raises: ValueError
+
+    """
+    mix = {}
+    for part in value.split(','):
+        operation, _, weight = part.strip().partition('=')
+        if operation not in OPERATIONS:
+            raise ValueError('Unsupported operation: {}'.format(operation))
+        mix[operation] = float(weight or 1)
+    return mix
+
+
+def format_report(report):
+    """Format a report as a text table with latencies in milliseconds.
+
+    :param dict report: The report returned by
+        :py:meth:`~tornado_dynamodb.loadgen.LoadGenerator.run`
+    :rtype: str
+
+    """
+    columns = ['{:<18}', '{:>9}', '{:>10}'] + ['{:>9}'] * len(PERCENTILES) + \
+        ['{:>8}', '{:>10}']
+    row = ' '.join(columns)
+    lines = [row.format('operation', 'requests', 'ops/sec',
+                        *(['p{:g}'.format(p) for p in PERCENTILES] +
+                          ['errors', 'throttles']))]
+    rows = sorted(report['operations'].items()) + [('total', report)]
+    for name, values in rows:
+        latency = values['latency']
+        lines.append(row.format(
+            name, values['requests'], '{:.1f}'.format(values['throughput']),
+            *(['{:.2f}'.format(latency['p{:g}'.format(p)] * 1000)
+               for p in PERCENTILES] +
+              ['{:.2%}'.format(values['error_rate']),
+               '{:.2%}'.format(values['throttle_rate'])])))
+    lines.append('{} requests in {:.2f} seconds'.format(report['requests'],
+                                                        report['elapsed']))
+    return '\n'.join(lines)
+
+
+@gen.coroutine
+def create_table(client, table_name, generator, read_capacity_units=100,
+                 write_capacity_units=100):
+    """Create a table for the load generator's items and wait for it to
+    become active.
+
+    :param client: The client to use
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table name
+    :param generator: The item generator
+    :type generator: :py:class:`~tornado_dynamodb.loadgen.ItemGenerator`
+    :param int read_capacity_units: The provisioned read capacity
+    :param int write_capacity_units: The provisioned write capacity
+
+    """
+    yield client.create_table(table_name, generator.ATTRIBUTES,
+                              generator.KEY_SCHEMA, read_capacity_units,
+                              write_capacity_units)
+    while True:
+        table = yield client.describe_table(table_name)
+        if table['TableStatus'] == tornado_dynamodb.TABLE_ACTIVE:
+            break
+        yield gen.sleep(1)
+
+
+def main(args=None):
+    """Entry point for the ``tornado-dynamodb-loadgen`` console script."""
+    parser = argparse.ArgumentParser(
+        description='Generate load against a DynamoDB table')
+    parser.add_argument('table', nargs='?', default='loadgen',
+                        help='The table to run against')
+    parser.add_argument('--endpoint', help='Override the endpoint URL')
+    parser.add_argument('--profile', help='The AWS configuration profile')
+    parser.add_argument('--region', help='The AWS region')
+    parser.add_argument('--emulator', action='store_true',
+                        help='Run against an in-process emulator, implies '
+                             '--create-table and --preload')
+    parser.add_argument('--emulator-latency', type=float, default=0.0,
+                        help='Seconds of latency to add to emulator responses')
+    parser.add_argument('--create-table', action='store_true',
+                        help='Create the table before running')
+    parser.add_argument('--preload', action='store_true',
+                        help='Write an item for every key in the key space '
+                             'before running')
+    parser.add_argument('--mix', type=parse_mix,
+                        help='Operation weights, for example '
+                             'get_item=80,put_item=20')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float,
+                        help='Run open-loop at this many requests per second')
+    parser.add_argument('--duration', type=float,
+                        help='Seconds to run for (Default: 10)')
+    parser.add_argument('--requests', type=int,
+                        help='The number of requests to issue')
+    parser.add_argument('--key-space', type=int, default=1000)
+    parser.add_argument('--range-keys', type=int, default=1)
+    parser.add_argument('--attributes', type=int, default=4)
+    parser.add_argument('--value-size', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=25)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true',
+                        help='Write the report as JSON')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+
+    @gen.coroutine
+    def run():
+        endpoint = args.endpoint
+        if args.emulator:
+            endpoint = emulator.Emulator(args.emulator_latency,
+                                         seed=args.seed).start()
+        client = tornado_dynamodb.DynamoDB(args.profile, args.region,
+                                           endpoint=endpoint,
+                                           max_clients=args.concurrency)
+        generator = ItemGenerator(args.key_space, args.range_keys,
+                                  args.attributes, args.value_size, args.seed)
+        if args.create_table or args.emulator:
+            yield create_table(client, args.table, generator)
+        if args.preload or args.emulator:
+            yield bulk.import_items(client, args.table, generator.items(),
+                                    args.concurrency)
+        load = LoadGenerator(client, args.table, args.mix, args.concurrency,
+                             args.rate, generator, args.batch_size,
+                             args.page_size, args.seed)
+        report = yield load.run(args.duration, args.requests)
+        raise gen.Return(report)
+
+    try:
+        report = ioloop.IOLoop.current().run_sync(run)
+    except (exceptions.DynamoDBException, ValueError) as error:
+        sys.stderr.write('Error: {}\n'.format(error))
+        return 1
+    if args.json:
+        sys.stdout.write(json.dumps(report, indent=2, sort_keys=True) + '\n')
+    else:
+        sys.stdout.write(format_report(report) + '\n')
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
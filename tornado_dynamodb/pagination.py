@@ -0,0 +1,212 @@
+"""
+Adaptive Pagination
+===================
+:py:class:`~tornado_dynamodb.pagination.Paginator` pages through the results
+of :py:meth:`~tornado_dynamodb.DynamoDB.query` or
+:py:meth:`~tornado_dynamodb.DynamoDB.scan`, choosing the ``limit`` for each
+request with a :py:class:`~tornado_dynamodb.pagination.PageSizer` instead of
+using a fixed page size. Pages grow while requests are fast and the consumer
+keeps up, and shrink when requests approach the target page latency, when a
+page would exceed the memory budget, or when the consumer is slower than the
+pages arrive.
+
+.. code:: python
+
+    paginator = pagination.Paginator(
+        client.query, table_name='events',
+        key_condition_expression='id = :id',
+        expression_attribute_values={':id': 'foo'},
+        page_sizer=pagination.PageSizer(target_latency=0.05,
+                                        memory_budget=1048576))
+    while not paginator.exhausted:
+        items = yield paginator.next()
+        yield process(items)
+
+The next page is requested as soon as the current page is returned, so
+fetching overlaps with processing and at most one page is buffered. The size
+of the items read is measured from the consumed capacity of each request.
+
+"""
+import logging
+
+from tornado import gen
+from tornado import ioloop
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_INITIAL = 100
+DEFAULT_MAXIMUM = 1000
+DEFAULT_MINIMUM = 10
+DEFAULT_TARGET_LATENCY = 0.1
+
+_SMOOTHING = 0.5
+
+
+class PageSizer(object):
+    """Choose the ``limit`` for the next page of a *Query* or *Scan* from
+    the observed cost of the previous pages.
+
+    The limit is the smallest of the number of items that can be read within
+    ``target_latency``, the number of items that fit in ``memory_budget``
+    and, when the consumer is processing items more slowly than they are
+    read, the number of items the consumer processes in ``target_latency``.
+    It changes by at most a factor of ``growth`` per page and is kept
+    between ``minimum`` and ``maximum``.
+
+    :param int initial: The limit for the first page
+    :param int minimum: The smallest limit to use
+    :param int maximum: The largest limit to use
+    :param float target_latency: The target response time for a page in
+        seconds, or :data:`None` to not size pages by latency
+    :param int memory_budget: The target size of a page in bytes, or
+        :data:`None` to not size pages by item size
+    :param float growth: The maximum factor to change the limit by per page
+
+    """
+    def __init__(self, initial=DEFAULT_INITIAL, minimum=DEFAULT_MINIMUM,
+                 maximum=DEFAULT_MAXIMUM,
+                 target_latency=DEFAULT_TARGET_LATENCY, memory_budget=None,
+                 growth=2.0):
+        if not 0 < minimum <= maximum:
+            raise ValueError('minimum must be positive and <= maximum')
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.memory_budget = memory_budget
+        self.growth = growth
+        self.limit = max(minimum, min(maximum, initial))
+        self.item_latency = None
+        self.item_size = None
+        self.consume_rate = None
+
+    def observe(self, scanned, size, latency):
+        """Record the result of a request and adjust the limit.
+
+        :param int scanned: The number of items evaluated by the request
+        :param int size: The number of bytes read by the request
+        :param float latency: The response time of the request in seconds
+
+        """
+        if scanned <= 0:
+            return
+        self.item_latency = _average(self.item_latency, latency / scanned)
+        if size:
+            self.item_size = _average(self.item_size, size / float(scanned))
+        self._adjust()
+
+    def consumed(self, count, elapsed):
+        """Record the time the consumer took to process a page and adjust
+        the limit.
+
+        :param int count: The number of items in the page
+        :param float elapsed: The time taken to process the page in seconds
+
+        """
+        if count <= 0 or elapsed <= 0:
+            return
+        self.consume_rate = _average(self.consume_rate, count / elapsed)
+        self._adjust()
+
+    def _adjust(self):
+        candidates = [self.maximum]
+        if self.target_latency and self.item_latency:
+            candidates.append(self.target_latency / self.item_latency)
+            if self.consume_rate and \
+                    self.consume_rate * self.item_latency < 1:
+                candidates.append(self.consume_rate * self.target_latency)
+        if self.memory_budget and self.item_size:
+            candidates.append(self.memory_budget / self.item_size)
+        limit = min(candidates)
+        limit = min(limit, self.limit * self.growth)
+        limit = max(limit, self.limit / self.growth)
+        limit = int(max(self.minimum, min(self.maximum, limit)))
+        if limit != self.limit:
+            LOGGER.debug('Adjusting page size from %i to %i',
+                         self.limit, limit)
+        self.limit = limit
+
+
+class Paginator(object):
+    """Page through the results of a *Query* or *Scan*, sizing each page
+    with a :py:class:`~tornado_dynamodb.pagination.PageSizer`.
+
+    The ``limit``, ``exclusive_start_key`` and ``return_consumed_capacity``
+    arguments are managed by the paginator and should not be passed.
+
+    :param method: The client method to page with,
+        :py:meth:`~tornado_dynamodb.DynamoDB.query` or
+        :py:meth:`~tornado_dynamodb.DynamoDB.scan`
+    :param page_sizer: The page sizer to use
+    :type page_sizer: :py:class:`~tornado_dynamodb.pagination.PageSizer`
+    :param bool prefetch: Request the next page as soon as a page is
+        returned
+    :param kwargs: Keyword arguments for ``method``
+
+    """
+    def __init__(self, method, page_sizer=None, prefetch=True, **kwargs):
+        for name in ('limit', 'exclusive_start_key',
+                     'return_consumed_capacity'):
+            if name in kwargs:
+                raise ValueError('{} is managed by the paginator'.format(name))
+        self.page_sizer = page_sizer or PageSizer()
+        self.prefetch = prefetch
+        self.exhausted = False
+        self.pages = 0
+        self.items = 0
+        self._kwargs = kwargs
+        self._method = method
+        self._pending = None
+        self._returned = None
+        self._start_key = None
+        self._unit_size = 4096 if kwargs.get('consistent_read') else 8192
+
+    @gen.coroutine
+    def next(self):
+        """Return the next page of items. Once the last page has been
+        returned, :py:attr:`exhausted` is set.
+
+        :rtype: list
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        if self.exhausted:
+            raise gen.Return([])
+        if self._returned is not None:
+            count, returned = self._returned
+            self.page_sizer.consumed(count, ioloop.IOLoop.current().time() -
+                                     returned)
+        if self._pending is None:
+            self._pending = self._fetch()
+        try:
+            items = yield self._pending
+        finally:
+            self._pending = None
+        if self._start_key is None:
+            self.exhausted = True
+        elif self.prefetch:
+            self._pending = self._fetch()
+        self._returned = len(items), ioloop.IOLoop.current().time()
+        raise gen.Return(items)
+
+    @gen.coroutine
+    def _fetch(self):
+        start = ioloop.IOLoop.current().time()
+        result = yield self._method(
+            exclusive_start_key=self._start_key,
+            limit=self.page_sizer.limit, return_consumed_capacity='TOTAL',
+            **self._kwargs)
+        units = result.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+        self.page_sizer.observe(result.get('ScannedCount', 0),
+                                units * self._unit_size,
+                                ioloop.IOLoop.current().time() - start)
+        self._start_key = result.get('LastEvaluatedKey')
+        self.pages += 1
+        self.items += len(result.get('Items', []))
+        raise gen.Return(result.get('Items', []))
+
+
+def _average(current, value):
+    """Return the exponentially weighted moving average of ``value``."""
+    if current is None:
+        return value
+    return current + _SMOOTHING * (value - current)
@@ -0,0 +1,317 @@
+"""
+Multi-process Parallel Scan
+===========================
+:py:class:`~tornado_dynamodb.parallel.ParallelScan` distributes the segments
+of a parallel *Scan* over a pool of worker processes, each running its own
+IOLoop and :py:class:`~tornado_dynamodb.DynamoDB` client, so that decoding
+and processing the items of a table-wide job is not bound to one core.
+
+Items can be processed in the worker processes by passing a ``callback``,
+which is invoked with each page of items and may be a coroutine:
+
+.. code:: python
+
+    def reprocess(items):
+        for item in items:
+            ...
+
+    scan = parallel.ParallelScan('events', callback=reprocess,
+                                 processes=32, checkpoint_path='events.json')
+    stats = scan.run()
+
+Without a callback, pages are streamed back to the calling process through a
+bounded queue:
+
+.. code:: python
+
+    for segment, items in parallel.ParallelScan('events').pages():
+        ...
+
+When ``checkpoint_path`` is set, the ``LastEvaluatedKey`` of each segment is
+saved to it once a page has been processed, and a restarted scan resumes
+each segment from its checkpoint and skips the segments that completed.
+Workers are started with :py:mod:`multiprocessing`, so the callback must be
+picklable on platforms that do not fork.
+
+"""
+import json
+import logging
+import multiprocessing
+import os
+
+from tornado import gen
+from tornado import ioloop
+
+import tornado_dynamodb
+from tornado_dynamodb import bulk
+from tornado_dynamodb import utils
+
+try:
+    from queue import Empty, Full
+except ImportError:  # pragma: no cover
+    from Queue import Empty, Full
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_SEGMENTS_PER_PROCESS = 4
+
+_MAX_SEND_DELAY = 0.1
+
+_DONE = 'done'
+_ERROR = 'error'
+_ITEMS = 'items'
+_PAGE = 'page'
+
+
+class ParallelScan(object):
+    """Scan a table with ``segments`` parallel scan segments distributed
+    over ``processes`` worker processes. Each worker scans its segments
+    concurrently on its own IOLoop.
+
+    :param str table_name: The table to scan
+    :param int processes: The number of worker processes, defaults to the
+        number of CPUs
+    :param int segments: The number of scan segments, defaults to
+        ``4`` per process
+    :param callable callback: Invoked in the worker processes with each page
+        of items. If not specified, the pages are returned by
+        :py:meth:`pages`.
+    :param str checkpoint_path: Save the progress of each segment to this
+        file and resume from it
+    :param int queue_size: The maximum number of messages waiting to be
+        read from the workers
+    :param dict client_kwargs: Keyword arguments for the
+        :py:class:`~tornado_dynamodb.DynamoDB` client of each worker
+    :param scan_kwargs: Additional keyword arguments for
+        :py:meth:`~tornado_dynamodb.DynamoDB.scan`
+    :raises: ValueError
+
+    """
+    def __init__(self, table_name, processes=None, segments=None,
+                 callback=None, checkpoint_path=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, client_kwargs=None,
+                 **scan_kwargs):
+        for name in ('exclusive_start_key', 'segment', 'total_segments'):
+            if name in scan_kwargs:
+                raise ValueError('{} is managed by the scan'.format(name))
+        self.table_name = table_name
+        self.processes = processes or multiprocessing.cpu_count()
+        self.segments = segments or \
+            self.processes * DEFAULT_SEGMENTS_PER_PROCESS
+        self.callback = callback
+        self.client_kwargs = client_kwargs or {}
+        self.queue_size = queue_size
+        self.scan_kwargs = scan_kwargs
+        self.stats = bulk.Stats()
+        self._checkpoints = _Checkpoints(checkpoint_path, table_name,
+                                         self.segments)
+
+    def run(self):
+        """Scan the table, blocking until every segment has been scanned,
+        and return the statistics of the scan. Pages that are not processed
+        by a ``callback`` are discarded.
+
+        :returns: The :py:meth:`~tornado_dynamodb.bulk.Stats.as_dict` values
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+        :raises: RuntimeError
+
+        """
+        for _segment, _items in self.pages():
+            pass
+        return self.stats.as_dict()
+
+    def pages(self):
+        """Scan the table, yielding ``(segment, items)`` for each page that
+        is not processed by a ``callback``. The checkpoint for a page is
+        saved when the next page is requested.
+
+        :rtype: generator
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+        :raises: RuntimeError
+
+        """
+        self.stats = bulk.Stats()
+        queue = multiprocessing.Queue(self.queue_size)
+        workers = self._start(queue)
+        remaining = len(self._checkpoints.pending())
+        try:
+            while remaining:
+                kind, segment, payload, start_key = self._get(queue, workers)
+                if kind == _ERROR:
+                    raise payload
+                elif kind == _DONE:
+                    self._checkpoints.complete(segment)
+                    remaining -= 1
+                    continue
+                self.stats.requests += 1
+                if kind == _ITEMS:
+                    self.stats.items += len(payload)
+                    yield segment, payload
+                else:
+                    self.stats.items += payload
+                self._checkpoints.save(segment, start_key)
+            self.stats.finish = ioloop.IOLoop.current().time()
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            queue.close()
+
+    def _get(self, queue, workers):
+        """Return the next message from the workers, raising if a worker
+        exits without reporting that its segments are done.
+
+        """
+        while True:
+            try:
+                return queue.get(timeout=1.0)
+            except Empty:
+                for worker in workers:
+                    if worker.exitcode:
+                        raise RuntimeError('Scan worker {} exited with '
+                                           '{}'.format(worker.pid,
+                                                       worker.exitcode))
+
+    def _start(self, queue):
+        """Start the worker processes with their share of the pending
+        segments.
+
+        """
+        pending = self._checkpoints.pending()
+        workers = []
+        for offset in range(min(self.processes, len(pending))):
+            segments = dict((segment, pending[segment])
+                            for segment in sorted(pending)[
+                                offset::self.processes])
+            worker = multiprocessing.Process(
+                target=_worker,
+                args=(queue, self.table_name, self.segments, segments,
+                      self.callback, self.client_kwargs, self.scan_kwargs))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        LOGGER.debug('Started %i workers for %i segments of %s',
+                     len(workers), len(pending), self.table_name)
+        return workers
+
+
+class _Checkpoints(object):
+    """The ``LastEvaluatedKey`` of each segment of a scan, saved to a JSON
+    file with the keys in the wire format when ``path`` is set.
+
+    """
+    def __init__(self, path, table_name, segments):
+        self._path = path
+        self._state = {'table': table_name, 'total_segments': segments,
+                       'segments': {}}
+        if path and os.path.exists(path):
+            with open(path, 'r') as handle:
+                state = json.load(handle)
+            if state['table'] != table_name or \
+                    state['total_segments'] != segments:
+                raise ValueError('{} is a checkpoint for a different '
+                                 'scan'.format(path))
+            self._state = state
+
+    def complete(self, segment):
+        self._state['segments'][str(segment)] = {'done': True}
+        self._write()
+
+    def pending(self):
+        """Return the start key of each segment that is not done."""
+        pending = {}
+        for segment in range(self._state['total_segments']):
+            value = self._state['segments'].get(str(segment), {})
+            if not value.get('done'):
+                key = value.get('key')
+                pending[segment] = utils.unmarshall(key) if key else None
+        return pending
+
+    def save(self, segment, start_key):
+        if not self._path or not start_key:
+            return
+        self._state['segments'][str(segment)] = {
+            'key': utils.marshall(start_key)}
+        self._write()
+
+    def _write(self):
+        if not self._path:
+            return
+        temp_path = '{}.tmp'.format(self._path)
+        with open(temp_path, 'w') as handle:
+            json.dump(self._state, handle, default=utils.json_default,
+                      sort_keys=True)
+        os.rename(temp_path, self._path)
+
+
+@gen.coroutine
+def _send(queue, message):
+    """Put the message on the queue without blocking the IOLoop, so the
+    other segments of the worker keep running while the queue is full.
+    Waiting for space slows the worker down to the rate the pages are read.
+
+    :param multiprocessing.Queue queue: The queue to put the message on
+    :param tuple message: The message
+
+    """
+    delay = 0.001
+    while True:
+        try:
+            queue.put_nowait(message)
+            return
+        except Full:
+            yield gen.sleep(delay)
+            delay = min(delay * 2, _MAX_SEND_DELAY)
+
+
+def _worker(queue, table_name, total_segments, segments, callback,
+            client_kwargs, scan_kwargs):
+    """Scan the segments on a new IOLoop, sending the pages or the number of
+    items processed by the callback to the queue.
+
+    """
+    loop = ioloop.IOLoop()
+    loop.make_current()
+    client = tornado_dynamodb.DynamoDB(**client_kwargs)
+
+    @gen.coroutine
+    def scan_segment(segment, start_key):
+        attempt = 0
+        while True:
+            try:
+                result = yield client.scan(
+                    table_name, exclusive_start_key=start_key,
+                    segment=segment, total_segments=total_segments,
+                    **scan_kwargs)
+            except bulk._RETRY_EXCEPTIONS as error:
+                attempt += 1
+                LOGGER.debug('Retrying segment %i scan: %s', segment, error)
+                yield gen.sleep(min(bulk.MAX_BACKOFF, 0.05 * (2 ** attempt)))
+                continue
+            attempt = 0
+            items = result.get('Items', [])
+            start_key = result.get('LastEvaluatedKey')
+            if callback:
+                yield gen.maybe_future(callback(items))
+                yield _send(queue, (_PAGE, segment, len(items), start_key))
+            else:
+                yield _send(queue, (_ITEMS, segment, items, start_key))
+            if not start_key:
+                yield _send(queue, (_DONE, segment, None, None))
+                return
+
+    @gen.coroutine
+    def run():
+        yield [scan_segment(segment, start_key)
+               for segment, start_key in segments.items()]
+
+    try:
+        loop.run_sync(run)
+    except Exception as error:
+        queue.put((_ERROR, None, error, None))
+    finally:
+        client.close()
+        loop.close()
@@ -0,0 +1,368 @@
+"""
+Query Planning
+==============
+:py:class:`~tornado_dynamodb.planner.QueryPlanner` chooses the table or
+secondary index that can serve a set of attribute conditions with a *Query*,
+so callers do not have to know which index to name, and do not fall back to
+a filtered *Scan* when an index would have served the request:
+
+.. code:: python
+
+    planner = planner.QueryPlanner()
+    client = tornado_dynamodb.DynamoDB(query_planner=planner)
+    yield planner.load(client, 'orders')
+    ...
+    plan = planner.plan('orders', {'customer': customer_id,
+                                   'created': ('>=', since),
+                                   'status': 'open'},
+                        attributes=['id', 'total'])
+    if plan.scan:
+        LOGGER.warning('Scanning orders: %s', plan.reason)
+    result = yield plan.execute(client, limit=100)
+
+Conditions map attribute names to a value, for an equality condition, or to
+a tuple of an operator and its values, where the operator is one of ``=``,
+``<``, ``<=``, ``>``, ``>=``, ``BETWEEN`` or ``begins_with``. A table or
+index can serve the conditions when its partition key has an equality
+condition and it projects every attribute that is requested or has a
+condition. A secondary index only has the items that have its key
+attributes, so one with a sort key is only used when its sort key has a
+condition, unless ``allow_sparse`` is passed to
+:py:meth:`~tornado_dynamodb.planner.QueryPlanner.plan` by a caller that
+knows every matching item has the attribute. Of those, the one with a
+condition on its sort key is preferred, an equality condition over a range,
+the table over its indexes, and local over global secondary indexes. The
+conditions that are not on the key are applied as a filter expression. When
+no table or index can serve the conditions, the plan is a *Scan* of the
+table with every condition as a filter, and
+:py:attr:`~tornado_dynamodb.planner.QueryPlan.reason` says why.
+
+The key schemas and projections are learned from the
+:py:meth:`~tornado_dynamodb.DynamoDB.describe_table` responses that pass
+through the client the planner is passed to, and from its *CreateTable*
+requests. Tables that are deleted, or that have their global secondary
+indexes updated, are forgotten and described again by
+:py:meth:`~tornado_dynamodb.planner.QueryPlanner.load`. Secondary indexes
+that are not ``ACTIVE``, and global secondary indexes for strongly
+consistent reads, are not used.
+
+"""
+import logging
+
+from tornado import gen
+
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+OPERATORS = {'=', '<', '<=', '>', '>=', 'BETWEEN', 'begins_with'}
+
+
+class QueryPlan(object):
+    """The table or index, key conditions and filter conditions chosen to
+    read the items that match a set of conditions.
+
+    :param str table_name: The table to read
+    :param str index_name: The secondary index to query, or :data:`None`
+        for the table
+    :param dict key_conditions: The conditions on the partition key and
+        sort key, as tuples of the operator and values
+    :param dict filter_conditions: The conditions to filter the items by
+    :param list attributes: The attributes to return, or :data:`None` for
+        all of them
+    :param bool consistent_read: Read with strong consistency
+    :param str reason: Why the plan is a *Scan*
+
+    """
+    def __init__(self, table_name, index_name=None, key_conditions=None,
+                 filter_conditions=None, attributes=None,
+                 consistent_read=False, reason=None):
+        self.table_name = table_name
+        self.index_name = index_name
+        self.key_conditions = key_conditions or {}
+        self.filter_conditions = filter_conditions or {}
+        self.attributes = attributes
+        self.consistent_read = consistent_read
+        self.reason = reason
+
+    def __repr__(self):
+        if self.scan:
+            return '<QueryPlan scan {}: {}>'.format(self.table_name,
+                                                    self.reason)
+        return '<QueryPlan query {}{} on {}>'.format(
+            self.table_name,
+            '/{}'.format(self.index_name) if self.index_name else '',
+            ', '.join(sorted(self.key_conditions)))
+
+    @property
+    def scan(self):
+        """``True`` if the conditions can only be served with a *Scan*.
+
+        :rtype: bool
+
+        """
+        return not self.key_conditions
+
+    def execute(self, client, **kwargs):
+        """Make the *Query* or *Scan* request of the plan, returning the
+        future of :py:meth:`~tornado_dynamodb.DynamoDB.query` or
+        :py:meth:`~tornado_dynamodb.DynamoDB.scan`.
+
+        :param client: The client to make the request with
+        :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+        :param dict kwargs: Other request parameters, such as ``limit`` or
+            ``exclusive_start_key``
+        :rtype: :class:`tornado.concurrent.Future`
+
+        """
+        kwargs.update(self.parameters())
+        if self.scan:
+            return client.scan(**kwargs)
+        return client.query(**kwargs)
+
+    def parameters(self):
+        """Return the keyword arguments of the *Query* or *Scan* request of
+        the plan.
+
+        :rtype: dict
+
+        """
+        names, values = {}, {}
+        parameters = {'table_name': self.table_name,
+                      'consistent_read': self.consistent_read}
+        if self.index_name:
+            parameters['index_name'] = self.index_name
+        if self.key_conditions:
+            parameters['key_condition_expression'] = _expression(
+                self.key_conditions, names, values)
+        if self.filter_conditions:
+            parameters['filter_expression'] = _expression(
+                self.filter_conditions, names, values)
+        if self.attributes is not None:
+            projection = []
+            for offset, name in enumerate(self.attributes):
+                names['#a{}'.format(offset)] = name
+                projection.append('#a{}'.format(offset))
+            parameters['projection_expression'] = ', '.join(projection)
+        if names:
+            parameters['expression_attribute_names'] = names
+        if values:
+            parameters['expression_attribute_values'] = values
+        return parameters
+
+
+class QueryPlanner(object):
+    """Choose the table or secondary index to query for a set of attribute
+    conditions, using the key schemas and projections of the tables it has
+    learned.
+
+    :param list tables: Table descriptions to learn, as returned by
+        :py:meth:`~tornado_dynamodb.DynamoDB.describe_table`
+
+    """
+    def __init__(self, tables=None):
+        self.tables = {}
+        for table in tables or []:
+            self.learn(table)
+
+    def forget(self, table_name):
+        """Discard the schema of a table.
+
+        :param str table_name: The table name
+
+        """
+        self.tables.pop(table_name, None)
+
+    def learn(self, table):
+        """Learn the key schemas and projections of a table and its
+        secondary indexes from a table description or *CreateTable* request.
+
+        :param dict table: The table description
+
+        """
+        key = utils.key_names(table.get('KeySchema', []))
+        candidates = [(None, key, None, 0)]
+        for index in table.get('LocalSecondaryIndexes', []):
+            candidates.append(
+                (index['IndexName'], utils.key_names(index['KeySchema']),
+                 _projected(key, index), 1))
+        for index in table.get('GlobalSecondaryIndexes', []):
+            if index.get('IndexStatus', 'ACTIVE') == 'ACTIVE':
+                candidates.append(
+                    (index['IndexName'], utils.key_names(index['KeySchema']),
+                     _projected(key, index), 2))
+        self.tables[table['TableName']] = candidates
+
+    @gen.coroutine
+    def load(self, client, table_name):
+        """Describe a table with the client and learn its schema, unless it
+        is already known.
+
+        :param client: The client to describe the table with
+        :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+        :param str table_name: The table name
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        if table_name not in self.tables:
+            self.learn((yield client.describe_table(table_name)))
+
+    def observe(self, command, body):
+        """Learn the schema of created tables and forget the schema of
+        deleted and updated tables. This is called by the client for each
+        request it makes.
+
+        :param str command: The DynamoDB API operation
+        :param dict body: The request payload, in the wire format
+
+        """
+        if command == 'CreateTable':
+            self.learn(body)
+        elif command == 'DeleteTable' or (
+                command == 'UpdateTable' and
+                'GlobalSecondaryIndexUpdates' in body):
+            self.forget(body.get('TableName'))
+
+    def plan(self, table_name, conditions, attributes=None,
+             consistent_read=False, allow_sparse=False):
+        """Return the plan to read the items of a table that match the
+        conditions.
+
+        :param str table_name: The table name
+        :param dict conditions: A mapping of attribute names to a value, or
+            to a tuple of an operator and its values
+        :param list attributes: The attributes to return, or :data:`None`
+            for all of them
+        :param bool consistent_read: Read with strong consistency
+        :param bool allow_sparse: Use secondary indexes that have no
+            condition on their sort key, which miss the items that do not
+            have the sort key attribute
+        :rtype: :py:class:`~tornado_dynamodb.planner.QueryPlan`
+        :raises: ValueError
+
+        """
+        if table_name not in self.tables:
+            raise ValueError('The schema of {} is not known, load the table '
+                             'first'.format(table_name))
+        conditions = dict((name, _condition(value))
+                          for name, value in conditions.items())
+        needed = None
+        if attributes is not None:
+            needed = set(attributes) | set(conditions)
+        best, rank = None, None
+        for name, key, projected, kind in self.tables[table_name]:
+            if (kind == 2 and consistent_read) or \
+                    conditions.get(key[0], ('',))[0] != '=' or \
+                    (_sparse(kind, key, conditions) and not allow_sparse) or \
+                    not _covers(projected, needed):
+                continue
+            sort_condition = conditions.get(key[1]) if len(key) > 1 else None
+            candidate_rank = (sort_condition is not None,
+                              sort_condition is not None and
+                              sort_condition[0] == '=', -kind)
+            if rank is None or candidate_rank > rank:
+                best, rank = (name, key), candidate_rank
+        if best is None:
+            reason = _reason(self.tables[table_name], conditions, needed,
+                             consistent_read, allow_sparse)
+            LOGGER.info('Conditions on %s can only be served with a scan: %s',
+                        table_name, reason)
+            return QueryPlan(table_name, None, None, conditions, attributes,
+                             consistent_read, reason)
+        name, key = best
+        filters = dict(conditions)
+        key_conditions = dict((attribute, filters.pop(attribute))
+                              for attribute in key if attribute in filters)
+        return QueryPlan(table_name, name, key_conditions, filters,
+                         attributes, consistent_read)
+
+
+def _condition(value):
+    """Return the ``(operator, values...)`` tuple of a condition."""
+    if not isinstance(value, tuple):
+        return '=', value
+    if not value or value[0] not in OPERATORS:
+        raise ValueError('Invalid condition: {!r}'.format(value))
+    if len(value) != (3 if value[0] == 'BETWEEN' else 2):
+        raise ValueError('Invalid number of values for {}: {!r}'.format(
+            value[0], value))
+    return value
+
+
+def _covers(projected, needed):
+    """Return ``True`` if a projection includes the needed attributes, where
+    :data:`None` is every attribute.
+
+    """
+    if projected is None:
+        return True
+    return needed is not None and needed <= projected
+
+
+def _expression(conditions, names, values):
+    """Return the expression for the conditions, adding its attribute names
+    and values.
+
+    """
+    parts = []
+    for name, condition in sorted(conditions.items()):
+        offset = len(names)
+        placeholder = '#c{}'.format(offset)
+        names[placeholder] = name
+        operands = []
+        for value_offset, value in enumerate(condition[1:]):
+            operand = ':c{}_{}'.format(offset, value_offset)
+            values[operand] = value
+            operands.append(operand)
+        if condition[0] == 'BETWEEN':
+            parts.append('{} BETWEEN {} AND {}'.format(placeholder,
+                                                       *operands))
+        elif condition[0] == 'begins_with':
+            parts.append('begins_with({}, {})'.format(placeholder,
+                                                      operands[0]))
+        else:
+            parts.append('{} {} {}'.format(placeholder, condition[0],
+                                           operands[0]))
+    return ' AND '.join(parts)
+
+
+def _projected(table_key, index):
+    """Return the set of attributes an index projects, or :data:`None` if it
+    projects all of them.
+
+    """
+    projection = index.get('Projection', {})
+    if projection.get('ProjectionType', 'ALL') == 'ALL':
+        return None
+    return (set(table_key) | set(utils.key_names(index['KeySchema'])) |
+            set(projection.get('NonKeyAttributes', [])))
+
+
+def _sparse(kind, key, conditions):
+    """Return ``True`` if a secondary index may not have every item that
+    matches the conditions, because its sort key has no condition.
+
+    """
+    return kind > 0 and len(key) > 1 and key[1] not in conditions
+
+
+def _reason(candidates, conditions, needed, consistent_read, allow_sparse):
+    """Explain why none of the candidates can serve the conditions."""
+    reasons = []
+    for name, key, projected, kind in candidates:
+        label = name or 'table'
+        if kind == 2 and consistent_read:
+            reasons.append('{} does not support consistent reads'.format(
+                label))
+        elif conditions.get(key[0], ('',))[0] != '=':
+            reasons.append('{} needs an equality condition on {}'.format(
+                label, key[0]))
+        elif _sparse(kind, key, conditions) and not allow_sparse:
+            reasons.append('{} only has the items with {}, add a condition '
+                           'on it or pass allow_sparse'.format(label, key[1]))
+        else:
+            reasons.append('{} does not project {}'.format(
+                label, ', '.join(sorted((needed or set()) -
+                                        (projected or set())) or
+                                 ['every attribute'])))
+    return '; '.join(reasons)
@@ -0,0 +1,462 @@
+"""
+Table Replica
+=============
+:py:class:`~tornado_dynamodb.replica.TableReplica` keeps a complete copy of a
+small table, such as a configuration or feature flag table, in memory and
+answers :py:meth:`~tornado_dynamodb.replica.TableReplica.get_item` and
+:py:meth:`~tornado_dynamodb.replica.TableReplica.query` lookups from it
+synchronously, without making requests:
+
+.. code:: python
+
+    flags = replica.TableReplica(client, 'feature-flags',
+                                 refresh_interval=60, max_staleness=300)
+    yield flags.start()
+    ...
+    flag = flags.get_item({'name': 'new-checkout'})
+    rules = flags.query('#g = :g', {'#g': 'group'}, {':g': 'beta'},
+                        index_name='by-group')
+
+The table is loaded with a parallel scan and indexed by the key schema from
+:py:meth:`~tornado_dynamodb.DynamoDB.describe_table`, with the table's
+secondary indexes indexed as well. Every ``refresh_interval`` seconds the
+table is loaded again in the background and swapped in once the scan is
+complete. Changes can also be applied as they happen from the table's
+stream, by passing
+:py:meth:`~tornado_dynamodb.replica.TableReplica.on_records` as the callback
+of a :py:class:`~tornado_dynamodb.streams.StreamConsumer` created with
+``raw=True``, with a stream view type that includes new images. Items are
+indexed by the key values they are stored with, and only the keys passed to
+lookups are converted from native values.
+
+When ``max_staleness`` is set, lookups raise
+:py:exc:`~tornado_dynamodb.exceptions.StaleReplica` once the replica was last
+loaded or changed from the stream longer ago than that. Items are returned
+in full regardless of the projection of the index they are queried from, and
+are shared with the replica, so they must not be modified.
+
+"""
+import bisect
+import logging
+import time
+
+from tornado import gen
+from tornado import ioloop
+
+from tornado_dynamodb import bulk
+from tornado_dynamodb import compression
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import expressions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 300.0
+DEFAULT_SEGMENTS = 4
+
+_NO_RANGE = 0
+
+
+class TableReplica(object):
+    """An in-memory copy of a table, indexed by its primary key and
+    secondary indexes.
+
+    :param client: The client to load the table with
+    :type client: :py:class:`~tornado_dynamodb.DynamoDB`
+    :param str table_name: The table to replicate
+    :param list indexes: The names of the secondary indexes to index,
+        defaults to all of them
+    :param int segments: The number of parallel scan segments to load the
+        table with
+    :param float refresh_interval: The number of seconds between reloads
+        once :py:meth:`start` is called, or :data:`None` to only load the
+        table once
+    :param float max_staleness: The most seconds since the replica was
+        last synchronized before lookups raise
+        :py:exc:`~tornado_dynamodb.exceptions.StaleReplica`
+    :param bool consistent_read: Load the table with strongly consistent
+        reads
+
+    """
+    def __init__(self, client, table_name, indexes=None,
+                 segments=DEFAULT_SEGMENTS,
+                 refresh_interval=DEFAULT_REFRESH_INTERVAL,
+                 max_staleness=None, consistent_read=False):
+        self.client = client
+        self.table_name = table_name
+        self.indexes = indexes
+        self.segments = segments
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self.consistent_read = consistent_read
+        self.synchronized = None
+        self._loading = None
+        self._periodic = None
+        self._store = None
+
+    def __len__(self):
+        return len(self._store.items) if self._store else 0
+
+    @property
+    def age(self):
+        """The number of seconds since the replica was last loaded or
+        changed from the stream, or :data:`None` if it has not been loaded.
+
+        :rtype: float
+
+        """
+        if self.synchronized is None:
+            return None
+        return time.time() - self.synchronized
+
+    def apply(self, records):
+        """Apply stream records to the replica. ``INSERT`` and ``MODIFY``
+        records replace the item with their ``NewImage`` and ``REMOVE``
+        records delete it. Records received while the table is being loaded
+        are applied again once the load is complete.
+
+        :param list records: Stream records in the wire format, as passed
+            to the callback of a
+            :py:class:`~tornado_dynamodb.streams.StreamConsumer` created with
+            ``raw=True``
+
+        """
+        if self._loading is not None:
+            self._loading.extend(records)
+        if self._store is None:
+            return
+        self._apply(self._store, records)
+        self.synchronized = time.time()
+
+    def get_item(self, key):
+        """Return the item with the primary key, or :data:`None` if it does
+        not exist.
+
+        :param dict key: The primary key of the item
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.StaleReplica`
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        return self._current().get(key)
+
+    @gen.coroutine
+    def load(self):
+        """Load the table with a parallel scan and replace the contents of
+        the replica with it, returning the number of items loaded.
+
+        :rtype: int
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        started = time.time()
+        description = yield self.client.describe_table(self.table_name)
+        store = _Store(description, self.indexes)
+        self._loading = []
+        try:
+            yield [self._scan_segment(store, segment)
+                   for segment in range(self.segments)]
+        except Exception:
+            self._loading = None
+            raise
+        store.sort()
+        records, self._loading = self._loading, None
+        self._apply(store, records)
+        self._store = store
+        self.synchronized = started
+        LOGGER.debug('Loaded %i items of %s in %.2f seconds',
+                     len(store.items), self.table_name,
+                     time.time() - started)
+        raise gen.Return(len(store.items))
+
+    def on_records(self, shard_id, records):
+        """Apply stream records to the replica, with the signature of a
+        :py:class:`~tornado_dynamodb.streams.StreamConsumer` callback.
+
+        :param str shard_id: The shard the records were read from
+        :param list records: The stream records
+
+        """
+        self.apply(records)
+
+    def query(self, key_condition_expression, expression_attribute_names=None,
+              expression_attribute_values=None, index_name=None,
+              scan_index_forward=True, limit=None):
+        """Return the items that match a key condition expression, in the
+        order of the sort key, in the same format as
+        :py:meth:`~tornado_dynamodb.DynamoDB.query`.
+
+        :param str key_condition_expression: The condition on the partition
+            key, and optionally the sort key
+        :param dict expression_attribute_names: Expression attribute name
+            substitutions
+        :param dict expression_attribute_values: Expression attribute
+            values
+        :param str index_name: The secondary index to query
+        :param bool scan_index_forward: Return the items in ascending order
+            of the sort key
+        :param int limit: The most items to return
+        :rtype: dict
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.StaleReplica`
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.ValidationException`
+
+        """
+        conditions = expressions.key_conditions(
+            key_condition_expression, expression_attribute_names,
+            utils.marshall(expression_attribute_values or {}))
+        items = self._current().query(index_name, conditions)
+        if not scan_index_forward:
+            items.reverse()
+        if limit:
+            items = items[:limit]
+        return {'Count': len(items), 'Items': items,
+                'ScannedCount': len(items)}
+
+    @gen.coroutine
+    def start(self):
+        """Load the table and reload it every ``refresh_interval`` seconds
+        on the current :py:class:`~tornado.ioloop.IOLoop`.
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        self.stop()
+        yield self.load()
+        if self.refresh_interval:
+            self._periodic = ioloop.PeriodicCallback(
+                self._refresh, self.refresh_interval * 1000)
+            self._periodic.start()
+
+    def stop(self):
+        """Stop reloading the table."""
+        if self._periodic:
+            self._periodic.stop()
+            self._periodic = None
+
+    def _apply(self, store, records):
+        for record in records:
+            change = record.get('dynamodb', {})
+            if record.get('eventName') == 'REMOVE':
+                store.delete(change['Keys'])
+            elif 'NewImage' in change:
+                store.put(change['NewImage'], self._native(change['NewImage']))
+            else:
+                LOGGER.warning('Stream record for %s does not have a new '
+                               'image: %r', self.table_name,
+                               change.get('Keys'))
+
+    def _current(self):
+        """Return the store, raising if it is missing or stale."""
+        if self._store is None:
+            raise exceptions.StaleReplica(
+                'The replica of {} has not been loaded'.format(
+                    self.table_name))
+        elif self.max_staleness is not None and \
+                self.age > self.max_staleness:
+            raise exceptions.StaleReplica(
+                'The replica of {} was synchronized {:.1f} seconds '
+                'ago'.format(self.table_name, self.age))
+        return self._store
+
+    def _native(self, item):
+        """Return the native values of an item in the wire format,
+        decompressed if the client has a compressor.
+
+        """
+        item = utils.unmarshall(item)
+        if self.client.compressor:
+            return compression.decompress_item(item)
+        return item
+
+    @gen.coroutine
+    def _refresh(self):
+        if self._loading is not None:
+            return
+        try:
+            yield self.load()
+        except exceptions.DynamoDBException as error:
+            LOGGER.warning('Could not reload the replica of %s: %s',
+                           self.table_name, error)
+
+    @gen.coroutine
+    def _scan_segment(self, store, segment):
+        """Scan a segment of the table into the store, retrying throttling
+        and transient errors with an exponential backoff.
+
+        """
+        start_key, attempt = None, 0
+        while True:
+            try:
+                result = yield self.client.scan(
+                    self.table_name, consistent_read=self.consistent_read,
+                    exclusive_start_key=start_key, segment=segment,
+                    total_segments=self.segments, raw=True)
+            except bulk._RETRY_EXCEPTIONS as error:
+                attempt += 1
+                LOGGER.debug('Retrying segment %i scan: %s', segment, error)
+                yield gen.sleep(min(bulk.MAX_BACKOFF, 0.05 * (2 ** attempt)))
+                continue
+            attempt = 0
+            for item in result.get('Items', []):
+                store.put(item, self._native(item), False)
+            start_key = result.get('LastEvaluatedKey')
+            if not start_key:
+                break
+
+
+class _Store(object):
+    """The items of a table, indexed by primary key, and the partitions of
+    the table and each secondary index, with the entries of each partition
+    kept in sort key order. Items are added and removed with their keys in
+    the wire format, and looked up with native keys.
+
+    """
+    def __init__(self, description, index_names=None):
+        self.items = {}
+        self._entries = {}
+        self.key = utils.key_names(description['KeySchema'])
+        self.indexes = {None: (self.key, {})}
+        for index in (description.get('GlobalSecondaryIndexes', []) +
+                      description.get('LocalSecondaryIndexes', [])):
+            if index_names is None or index['IndexName'] in index_names:
+                self.indexes[index['IndexName']] = (
+                    utils.key_names(index['KeySchema']), {})
+
+    def delete(self, key):
+        """Remove the item with the primary key, in the wire format."""
+        self._remove(_primary_key(self.key, key))
+
+    def get(self, key):
+        """Return the item with the native primary key."""
+        try:
+            return self.items.get(tuple(_normalize(key[name])
+                                        for name in self.key))
+        except KeyError as error:
+            raise _missing_key(error)
+
+    def put(self, item, native, ordered=True):
+        """Add or replace an item, in the wire format, storing its native
+        form. When ``ordered`` is :data:`False` the partitions are not kept
+        in order until :py:meth:`sort` is called.
+
+        """
+        primary_key = _primary_key(self.key, item)
+        self._remove(primary_key)
+        self.items[primary_key] = native
+        entries = self._entries[primary_key] = []
+        for names, partitions in self.indexes.values():
+            entry = _entry(names, item)
+            entries.append(entry)
+            if entry is None:
+                continue
+            ranges, keys = partitions.setdefault(entry[0], ([], []))
+            offset = bisect.bisect_right(ranges, entry[1]) \
+                if ordered else len(ranges)
+            ranges.insert(offset, entry[1])
+            keys.insert(offset, primary_key)
+
+    def _remove(self, primary_key):
+        if self.items.pop(primary_key, None) is None:
+            return
+        for (_names, partitions), entry in zip(
+                self.indexes.values(), self._entries.pop(primary_key)):
+            if entry is None:
+                continue
+            ranges, keys = partitions[entry[0]]
+            offset = bisect.bisect_left(ranges, entry[1])
+            while keys[offset] != primary_key:
+                offset += 1
+            del ranges[offset], keys[offset]
+            if not ranges:
+                del partitions[entry[0]]
+
+    def query(self, index_name, conditions):
+        if index_name not in self.indexes:
+            raise exceptions.ValidationException(
+                'The table does not have the specified index: {}'.format(
+                    index_name))
+        names, partitions = self.indexes[index_name]
+        hash_condition = conditions.pop(names[0], None)
+        if not hash_condition or hash_condition[0] != '=':
+            raise exceptions.ValidationException(
+                'Query condition missed key schema element: {}'.format(
+                    names[0]))
+        range_condition = conditions.pop(names[1], None) \
+            if len(names) > 1 else None
+        if conditions:
+            raise exceptions.ValidationException(
+                'Query key condition not supported')
+        ranges, keys = partitions.get(
+            expressions.normalize_key(hash_condition[1]), ([], []))
+        start, end = 0, len(ranges)
+        if range_condition:
+            start, end = _bounds(ranges, range_condition)
+        return [self.items[key] for key in keys[start:end]]
+
+    def sort(self):
+        """Sort the entries of every partition by sort key."""
+        for _names, partitions in self.indexes.values():
+            for hash_value, (ranges, keys) in partitions.items():
+                entries = sorted(zip(ranges, keys))
+                partitions[hash_value] = ([entry[0] for entry in entries],
+                                          [entry[1] for entry in entries])
+
+
+def _bounds(ranges, condition):
+    """Return the slice of a partition's sort keys that match a condition."""
+    operator = condition[0]
+    values = [expressions.normalize_key(value) for value in condition[1:]]
+    if operator == '=':
+        return (bisect.bisect_left(ranges, values[0]),
+                bisect.bisect_right(ranges, values[0]))
+    elif operator == '<':
+        return 0, bisect.bisect_left(ranges, values[0])
+    elif operator == '<=':
+        return 0, bisect.bisect_right(ranges, values[0])
+    elif operator == '>':
+        return bisect.bisect_right(ranges, values[0]), len(ranges)
+    elif operator == '>=':
+        return bisect.bisect_left(ranges, values[0]), len(ranges)
+    elif operator == 'BETWEEN':
+        return (bisect.bisect_left(ranges, values[0]),
+                bisect.bisect_right(ranges, values[1]))
+    start = end = bisect.bisect_left(ranges, values[0])
+    while end < len(ranges) and ranges[end][:len(values[0])] == values[0]:
+        end += 1
+    return start, end
+
+
+def _entry(names, item):
+    """Return the normalized ``(partition key, sort key)`` of an item in the
+    wire format in an index, or :data:`None` if the item does not have the
+    index keys.
+
+    """
+    if any(name not in item for name in names):
+        return None
+    return (expressions.normalize_key(item[names[0]]),
+            expressions.normalize_key(item[names[1]])
+            if len(names) > 1 else _NO_RANGE)
+
+
+def _missing_key(error):
+    """Return the error for a key that is missing the attribute of the
+    :py:exc:`KeyError`.
+
+    """
+    return exceptions.ValidationException(
+        'The provided key element does not match the schema: '
+        'missing {}'.format(error))
+
+
+def _normalize(value):
+    """Return the hashable and sortable form of a native key value."""
+    return expressions.normalize_key(utils.marshall({'v': value})['v'])
+
+
+def _primary_key(names, item):
+    """Return the normalized primary key of an item in the wire format."""
+    try:
+        return tuple(expressions.normalize_key(item[name]) for name in names)
+    except KeyError as error:
+        raise _missing_key(error)
@@ -0,0 +1,414 @@
+"""
+Routing Client
+==============
+:py:class:`~tornado_dynamodb.routing.RoutingClient` wraps multiple
+:py:class:`~tornado_dynamodb.DynamoDB` clients, one per region or endpoint of
+a global table, and routes each request to the endpoint that is currently the
+fastest and healthiest.
+
+Latency and error rates are tracked per endpoint as exponentially weighted
+moving averages (EWMA). Reads are sent to the endpoint with the best score,
+writes can be pinned to a single endpoint, and reads that fail with a
+transient error are automatically retried against the next best endpoint.
+Writes are only failed over when enabled, and only for errors that show the
+write was not applied.
+
+"""
+import errno
+import logging
+import socket
+
+from tornado import gen
+from tornado import httpclient
+from tornado import ioloop
+
+from tornado_dynamodb import exceptions
+
+LOGGER = logging.getLogger(__name__)
+
+FAILOVER_EXCEPTIONS = (exceptions.InternalFailure,
+                       exceptions.ProvisionedThroughputExceeded,
+                       exceptions.RequestException,
+                       exceptions.ServiceUnavailable,
+                       exceptions.ThrottlingException,
+                       exceptions.TimeoutException,
+                       httpclient.HTTPError,
+                       socket.error)
+
+#: Errors that show a write was rejected before it was applied, so it can be
+#: safely sent to another endpoint
+WRITE_FAILOVER_EXCEPTIONS = (exceptions.ProvisionedThroughputExceeded,
+                             exceptions.ServiceUnavailable,
+                             exceptions.ThrottlingException)
+
+
+class Endpoint(object):
+    """Tracks the health of a single :py:class:`~tornado_dynamodb.DynamoDB`
+    client using an EWMA of the request latency and error rate.
+
+    :param str name: The name used to identify the endpoint
+    :param tornado_dynamodb.DynamoDB client: The client for the endpoint
+    :param float alpha: The EWMA smoothing factor, between ``0`` and ``1``
+    :param int failure_threshold: The number of consecutive failures before
+        the endpoint is considered down
+    :param float cooldown: The number of seconds an endpoint is considered
+        down for before it is tried again
+
+    """
+    def __init__(self, name, client, alpha=0.3, failure_threshold=3,
+                 cooldown=30.0):
+        self.name = name
+        self.client = client
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.down_until = 0
+
+    def healthy(self, now):
+        """Returns ``True`` if the endpoint is not currently marked as down.
+
+        :param float now: The current time
+        :rtype: bool
+
+        """
+        return now >= self.down_until
+
+    def record_success(self, duration):
+        """Update the EWMA values for a successful request.
+
+        :param float duration: The request duration in seconds
+
+        """
+        self.requests += 1
+        self.consecutive_failures = 0
+        self.down_until = 0
+        self._update_latency(duration)
+        self.error_rate = (1 - self.alpha) * self.error_rate
+
+    def record_failure(self, duration, now):
+        """Update the EWMA values for a failed request, marking the endpoint
+        as down if the consecutive failure threshold has been reached.
+
+        :param float duration: The request duration in seconds
+        :param float now: The current time
+
+        """
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        self._update_latency(duration)
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        if self.consecutive_failures >= self.failure_threshold:
+            LOGGER.warning('Marking endpoint %s down for %.2f seconds after '
+                           '%i consecutive failures', self.name, self.cooldown,
+                           self.consecutive_failures)
+            self.down_until = now + self.cooldown
+
+    def score(self, error_penalty):
+        """Return the routing score for the endpoint, lower is better.
+        Endpoints without any latency measurements score ``0`` so that they
+        are probed.
+
+        :param float error_penalty: The multiplier applied to the error rate
+        :rtype: float
+
+        """
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + error_penalty * self.error_rate)
+
+    def stats(self):
+        """Return the current statistics for the endpoint.
+
+        :rtype: dict
+
+        """
+        return {'latency': self.latency,
+                'error_rate': self.error_rate,
+                'requests': self.requests,
+                'failures': self.failures,
+                'consecutive_failures': self.consecutive_failures,
+                'down_until': self.down_until}
+
+    def _update_latency(self, duration):
+        if self.latency is None:
+            self.latency = duration
+        else:
+            self.latency = (self.alpha * duration +
+                            (1 - self.alpha) * self.latency)
+
+
+class RoutingClient(object):
+    """Route DynamoDB requests across multiple
+    :py:class:`~tornado_dynamodb.DynamoDB` clients, such as the replicas of a
+    global table.
+
+    Reads go to the healthy endpoint with the lowest EWMA latency, weighted by
+    its EWMA error rate. Writes go to ``write_endpoint`` when it is set,
+    otherwise to the best endpoint. When a read fails with one of the
+    :py:data:`~tornado_dynamodb.routing.FAILOVER_EXCEPTIONS`, it is retried on
+    the next best endpoint until all endpoints have been tried. Other errors,
+    such as a :py:exc:`~tornado_dynamodb.exceptions.ValidationException`, are
+    raised immediately.
+
+    Writes are not failed over by default. A write that timed out or lost its
+    connection may already have been applied, and replaying it on another
+    endpoint would apply an ``ADD`` update or a conditional put twice. With
+    ``write_failover`` enabled, writes are only retried on the next endpoint
+    after one of the
+    :py:data:`~tornado_dynamodb.routing.WRITE_FAILOVER_EXCEPTIONS`, or when
+    the connection was refused before the request was sent.
+
+    .. code:: python
+
+        client = routing.RoutingClient([
+            ('us-east-1', tornado_dynamodb.DynamoDB(region='us-east-1')),
+            ('us-west-2', tornado_dynamodb.DynamoDB(region='us-west-2'))],
+            write_endpoint='us-east-1')
+        result = yield client.get_item('my-table', {'id': 'abc'})
+
+    :param list endpoints: A list of ``(name, client)`` tuples in order of
+        preference
+    :param str write_endpoint: Pin writes to the named endpoint
+    :param bool write_failover: Fail writes over to other endpoints when
+        they are rejected without being applied (Default: ``False``)
+    :param float alpha: The EWMA smoothing factor (Default: ``0.3``)
+    :param float error_penalty: The multiplier applied to the EWMA error rate
+        when scoring endpoints (Default: ``10``)
+    :param int failure_threshold: The number of consecutive failures before an
+        endpoint is considered down (Default: ``3``)
+    :param float cooldown: The number of seconds a down endpoint is only used
+        as a last resort (Default: ``30``)
+    :raises: ValueError
+
+    """
+    def __init__(self, endpoints, write_endpoint=None, write_failover=False,
+                 alpha=0.3, error_penalty=10.0, failure_threshold=3,
+                 cooldown=30.0):
+        if not endpoints:
+            raise ValueError('At least one endpoint must be specified')
+        self._endpoints = [Endpoint(name, client, alpha, failure_threshold,
+                                    cooldown) for name, client in endpoints]
+        names = [endpoint.name for endpoint in self._endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError('Endpoint names must be unique')
+        if write_endpoint is not None and write_endpoint not in names:
+            raise ValueError('Unknown write_endpoint: {}'.format(
+                write_endpoint))
+        self._write_endpoint = write_endpoint
+        self._write_failover = write_failover
+        self._error_penalty = error_penalty
+
+    @property
+    def endpoints(self):
+        """Return the tracked endpoints in configured order.
+
+        :rtype: list(tornado_dynamodb.routing.Endpoint)
+
+        """
+        return list(self._endpoints)
+
+    def stats(self):
+        """Return the statistics for each endpoint, keyed by endpoint name.
+
+        :rtype: dict
+
+        """
+        return dict([(endpoint.name, endpoint.stats())
+                     for endpoint in self._endpoints])
+
+    def batch_get_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.batch_get_item` request
+        to the best endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('batch_get_item', *args, **kwargs)
+
+    def batch_write_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.batch_write_item` request
+        to the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('batch_write_item', *args, **kwargs)
+
+    def create_table(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.create_table` request to
+        the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('create_table', *args, **kwargs)
+
+    def delete_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.delete_item` request to
+        the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('delete_item', *args, **kwargs)
+
+    def delete_table(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.delete_table` request to
+        the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('delete_table', *args, **kwargs)
+
+    def describe_table(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.describe_table` request
+        to the best endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('describe_table', *args, **kwargs)
+
+    def get_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.get_item` request to the
+        best endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('get_item', *args, **kwargs)
+
+    def list_tables(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.list_tables` request to
+        the best endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('list_tables', *args, **kwargs)
+
+    def put_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.put_item` request to the
+        write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('put_item', *args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.query` request to the
+        best endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('query', *args, **kwargs)
+
+    def scan(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.scan` request to the best
+        endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._read('scan', *args, **kwargs)
+
+    def update_item(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.update_item` request to
+        the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('update_item', *args, **kwargs)
+
+    def update_table(self, *args, **kwargs):
+        """Route a :meth:`~tornado_dynamodb.DynamoDB.update_table` request to
+        the write endpoint.
+
+        :rtype: tornado.concurrent.Future
+
+        """
+        return self._write('update_table', *args, **kwargs)
+
+    def _ranked(self):
+        """Return the endpoints ordered by score, with endpoints that are
+        down moved to the end of the list.
+
+        :rtype: list(tornado_dynamodb.routing.Endpoint)
+
+        """
+        now = ioloop.IOLoop.current().time()
+        return sorted(self._endpoints,
+                      key=lambda e: (not e.healthy(now),
+                                     e.score(self._error_penalty)))
+
+    def _read(self, method, *args, **kwargs):
+        return self._execute(self._ranked(), method, args, kwargs)
+
+    def _write(self, method, *args, **kwargs):
+        ranked = self._ranked()
+        if self._write_endpoint is not None:
+            ranked = sorted(ranked,
+                            key=lambda e: e.name != self._write_endpoint)
+        if not self._write_failover:
+            ranked = ranked[:1]
+        return self._execute(ranked, method, args, kwargs, _not_applied)
+
+    @gen.coroutine
+    def _execute(self, endpoints, method, args, kwargs, can_failover=None):
+        """Invoke the method on each endpoint in order until one succeeds or
+        raises an error that should not be failed over.
+
+        :param list endpoints: The endpoints to try, in order
+        :param str method: The client method name to invoke
+        :param tuple args: Positional arguments for the method
+        :param dict kwargs: Keyword arguments for the method
+        :param callable can_failover: Return ``True`` if the request can be
+            sent to the next endpoint after an error, defaults to every error
+            in :py:data:`~tornado_dynamodb.routing.FAILOVER_EXCEPTIONS`
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        _ioloop = ioloop.IOLoop.current()
+        last_error = None
+        for endpoint in endpoints:
+            start = _ioloop.time()
+            try:
+                result = yield getattr(endpoint.client, method)(*args,
+                                                                **kwargs)
+            except FAILOVER_EXCEPTIONS as error:
+                now = _ioloop.time()
+                endpoint.record_failure(now - start, now)
+                if can_failover is not None and not can_failover(error):
+                    raise
+                LOGGER.debug('%s failed on %s (%s), failing over', method,
+                             endpoint.name, error)
+                last_error = error
+                continue
+            endpoint.record_success(_ioloop.time() - start)
+            raise gen.Return(result)
+        raise last_error
+
+
+def _not_applied(error):
+    """Return ``True`` if a write failed without being applied: it was
+    throttled or rejected as unavailable, or the connection was refused
+    before the request was sent.
+
+    :param Exception error: The error the write failed with
+    :rtype: bool
+
+    """
+    if isinstance(error, WRITE_FAILOVER_EXCEPTIONS):
+        return True
+    return isinstance(error, socket.error) and \
+        error.errno == errno.ECONNREFUSED
@@ -0,0 +1,588 @@
+"""
+DynamoDB Streams
+================
+:py:class:`~tornado_dynamodb.streams.DynamoDBStreams` is an asynchronous
+client for the `DynamoDB Streams API <http://docs.aws.amazon.com/
+dynamodbstreams/latest/APIReference/Welcome.html>`_ and
+:py:class:`~tornado_dynamodb.streams.StreamConsumer` reads all of the shards
+in a stream in parallel, passing batches of unmarshalled records to a
+callback and checkpointing its progress in a
+:py:class:`~tornado_dynamodb.streams.CheckpointStore`.
+
+.. code:: python
+
+    @gen.coroutine
+    def on_records(shard_id, records):
+        for record in records:
+            LOGGER.info('%s: %r', record['eventName'],
+                        record['dynamodb'].get('NewImage'))
+
+    client = streams.DynamoDBStreams()
+    consumer = streams.StreamConsumer(
+        client, stream_arn, on_records,
+        streams.FileCheckpointStore('/var/lib/app/checkpoints.json'))
+    yield consumer.run()
+
+"""
+import json
+import logging
+import os
+
+from tornado import gen
+from tornado import ioloop
+
+import tornado_dynamodb
+from tornado_dynamodb import exceptions
+from tornado_dynamodb import utils
+
+LOGGER = logging.getLogger(__name__)
+
+# Shard iterator type constants
+ITERATOR_AFTER_SEQUENCE_NUMBER = 'AFTER_SEQUENCE_NUMBER'
+ITERATOR_AT_SEQUENCE_NUMBER = 'AT_SEQUENCE_NUMBER'
+ITERATOR_LATEST = 'LATEST'
+ITERATOR_TRIM_HORIZON = 'TRIM_HORIZON'
+_ITERATOR_TYPES = (ITERATOR_AFTER_SEQUENCE_NUMBER, ITERATOR_AT_SEQUENCE_NUMBER,
+                   ITERATOR_LATEST, ITERATOR_TRIM_HORIZON)
+
+# Checkpoint value stored for shards that have been read to the end
+SHARD_END = 'SHARD_END'
+
+_RECORD_IMAGES = ('Keys', 'NewImage', 'OldImage')
+
+
+class DynamoDBStreams(tornado_dynamodb._AsyncClient):
+    """An asynchronous DynamoDB Streams client for Tornado
+
+    :param str profile: Specify the configuration profile name
+    :param str region: The AWS region to make requests to
+    :param str access_key: The access key
+    :param str secret_key: The secret access key
+    :param str endpoint: Override the base endpoint URL
+    :param int max_clients: Max simultaneous requests (Default: ``100``)
+
+    :raises: :py:exc:`~tornado_dynamodb.exceptions.ConfigNotFound`
+             :py:exc:`~tornado_dynamodb.exceptions.ConfigParserError`
+             :py:exc:`~tornado_dynamodb.exceptions.NoCredentialsError`
+             :py:exc:`~tornado_dynamodb.exceptions.NoProfileError`
+
+    Like :py:class:`~tornado_dynamodb.DynamoDB`, the client resolves the
+    IOLoop for each call, so it can be shared by code running on different
+    IOLoops.
+
+    """
+    def __init__(self, profile=None, region=None, access_key=None,
+                 secret_key=None, endpoint=None, max_clients=100):
+        """Create a new DynamoDBStreams instance"""
+        super(DynamoDBStreams, self).__init__(profile, region, access_key,
+                                              secret_key, endpoint,
+                                              max_clients)
+
+    def describe_stream(self, stream_arn, exclusive_start_shard_id=None,
+                        limit=None):
+        """Returns information about a stream, including the current status
+        of the stream, its Amazon Resource Name (ARN), the composition of its
+        shards, and its corresponding DynamoDB table.
+
+        :param str stream_arn: The Amazon Resource Name (ARN) for the stream
+        :param str exclusive_start_shard_id: The shard ID of the first item
+            that this operation will evaluate. Use the value that was returned
+            for ``LastEvaluatedShardId`` in the previous operation.
+        :param int limit: The maximum number of shard objects to return. The
+            upper limit is ``100``.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "CreationRequestDateTime": number,
+                  "KeySchema": [{
+                    "AttributeName": "string",
+                    "KeyType": "string"
+                  }],
+                  "LastEvaluatedShardId": "string",
+                  "Shards": [{
+                    "ParentShardId": "string",
+                    "SequenceNumberRange": {
+                      "EndingSequenceNumber": "string",
+                      "StartingSequenceNumber": "string"
+                    },
+                    "ShardId": "string"
+                  }],
+                  "StreamArn": "string",
+                  "StreamLabel": "string",
+                  "StreamStatus": "string",
+                  "StreamViewType": "string",
+                  "TableName": "string"
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+
+        """
+        payload = {'StreamArn': stream_arn}
+        if exclusive_start_shard_id:
+            payload['ExclusiveStartShardId'] = exclusive_start_shard_id
+        if limit:
+            payload['Limit'] = limit
+        return self._execute('DescribeStream', payload,
+                             self._stream_description)
+
+    def get_records(self, shard_iterator, limit=None):
+        """Retrieves the stream records from a given shard. The records are
+        returned as they are sent by DynamoDB Streams; use
+        :py:func:`~tornado_dynamodb.streams.unmarshall_record` to convert
+        their images to native values.
+
+        If ``NextShardIterator`` is not included in the response, the shard
+        has been closed and all of its records have been read.
+
+        :param str shard_iterator: A shard iterator that was retrieved from a
+            previous :py:meth:`get_shard_iterator` or :py:meth:`get_records`
+            call
+        :param int limit: The maximum number of records to return from the
+            shard. The upper limit is ``1000``.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "NextShardIterator": "string",
+                  "Records": [{
+                    "awsRegion": "string",
+                    "dynamodb": {
+                      "ApproximateCreationDateTime": number,
+                      "Keys": {"string": AttributeValue},
+                      "NewImage": {"string": AttributeValue},
+                      "OldImage": {"string": AttributeValue},
+                      "SequenceNumber": "string",
+                      "SizeBytes": number,
+                      "StreamViewType": "string"
+                    },
+                    "eventID": "string",
+                    "eventName": "string",
+                    "eventSource": "string",
+                    "eventVersion": "string"
+                  }]
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.ExpiredIteratorException`
+                 :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.LimitExceeded`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.TrimmedDataAccessException`
+
+        """
+        payload = {'ShardIterator': shard_iterator}
+        if limit:
+            payload['Limit'] = limit
+        return self._execute('GetRecords', payload)
+
+    def get_shard_iterator(self, stream_arn, shard_id, shard_iterator_type,
+                           sequence_number=None):
+        """Returns a shard iterator, which is used to read the records of a
+        shard with :py:meth:`get_records`. A shard iterator expires 15
+        minutes after it is returned to the requester.
+
+        :param str stream_arn: The Amazon Resource Name (ARN) for the stream
+        :param str shard_id: The identifier of the shard
+        :param str shard_iterator_type: Determines how the shard iterator is
+            used to start reading stream records from the shard. One of
+            ``TRIM_HORIZON``, ``LATEST``, ``AT_SEQUENCE_NUMBER`` or
+            ``AFTER_SEQUENCE_NUMBER``.
+        :param str sequence_number: The sequence number of a stream record in
+            the shard from which to start reading, required for the
+            ``AT_SEQUENCE_NUMBER`` and ``AFTER_SEQUENCE_NUMBER`` iterator
+            types.
+        :returns: The shard iterator
+        :rtype: str
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+                 :py:exc:`~tornado_dynamodb.exceptions.TrimmedDataAccessException`
+                 :py:exc:`ValueError`
+
+        """
+        if shard_iterator_type not in _ITERATOR_TYPES:
+            raise ValueError('Invalid shard_iterator_type value: {}'.format(
+                shard_iterator_type))
+        payload = {'StreamArn': stream_arn,
+                   'ShardId': shard_id,
+                   'ShardIteratorType': shard_iterator_type}
+        if sequence_number:
+            payload['SequenceNumber'] = sequence_number
+        return self._execute('GetShardIterator', payload, self._shard_iterator)
+
+    def list_streams(self, table_name=None, exclusive_start_stream_arn=None,
+                     limit=None):
+        """Returns an array of stream ARNs associated with the current account
+        and endpoint. If the ``table_name`` parameter is present, only the
+        streams associated with that table will be returned.
+
+        :param str table_name: Only return the streams for this table
+        :param str exclusive_start_stream_arn: The ARN of the first item that
+            this operation will evaluate. Use the value that was returned for
+            ``LastEvaluatedStreamArn`` in the previous operation.
+        :param int limit: The maximum number of streams to return. The upper
+            limit is ``100``.
+        :returns: Response format:
+
+            .. code:: json
+
+                {
+                  "LastEvaluatedStreamArn": "string",
+                  "Streams": [{
+                    "StreamArn": "string",
+                    "StreamLabel": "string",
+                    "TableName": "string"
+                  }]
+                }
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.InternalFailure`
+                 :py:exc:`~tornado_dynamodb.exceptions.ResourceNotFound`
+
+        """
+        payload = {}
+        if table_name:
+            payload['TableName'] = table_name
+        if exclusive_start_stream_arn:
+            payload['ExclusiveStartStreamArn'] = exclusive_start_stream_arn
+        if limit:
+            payload['Limit'] = limit
+        return self._execute('ListStreams', payload)
+
+    def _endpoint(self, endpoint):
+        """Return the user specified endpoint or the DynamoDB Streams
+        endpoint for the region.
+
+        :rtype: str
+
+        """
+        if endpoint:
+            return endpoint
+        return '{}://streams.dynamodb.{}.amazonaws.com'.format(self.SCHEME,
+                                                               self._region)
+
+    @staticmethod
+    def _headers(method):
+        """Return request headers for the specified API method
+
+        :param api method: The API method
+        :type: dict
+
+        """
+        return {'Content-Type': 'application/x-amz-json-1.0',
+                'x-amz-target': 'DynamoDBStreams_20120810.{}'.format(method)}
+
+    @staticmethod
+    def _shard_iterator(body):
+        """Return the shard iterator from a *GetShardIterator* response.
+
+        :param dict body: The response body
+        :rtype: str
+
+        """
+        return body['ShardIterator']
+
+    @staticmethod
+    def _stream_description(body):
+        """Return the stream description from a *DescribeStream* response.
+
+        :param dict body: The response body
+        :rtype: dict
+
+        """
+        return body['StreamDescription']
+
+
+def unmarshall_record(record):
+    """Return the stream record with the ``Keys``, ``NewImage`` and
+    ``OldImage`` values unmarshalled to native values with
+    :py:func:`~tornado_dynamodb.utils.unmarshall`.
+
+    :param dict record: The stream record
+    :rtype: dict
+
+    """
+    for key in _RECORD_IMAGES:
+        if key in record.get('dynamodb', {}):
+            record['dynamodb'][key] = utils.unmarshall(record['dynamodb'][key])
+    return record
+
+
+class CheckpointStore(object):
+    """Stores the sequence number of the last record processed for each
+    shard in memory. Extend this class and implement :py:meth:`get` and
+    :py:meth:`set` to store checkpoints elsewhere. Both methods may return
+    a :py:class:`~tornado.concurrent.Future`.
+
+    """
+    def __init__(self):
+        self._checkpoints = {}
+
+    def get(self, stream_arn, shard_id):
+        """Return the checkpoint for the shard or ``None`` if the shard has
+        not been processed before.
+
+        :param str stream_arn: The stream ARN
+        :param str shard_id: The shard ID
+        :rtype: str or None
+
+        """
+        return self._checkpoints.get(stream_arn, {}).get(shard_id)
+
+    def set(self, stream_arn, shard_id, sequence_number):
+        """Store the checkpoint for the shard.
+
+        :param str stream_arn: The stream ARN
+        :param str shard_id: The shard ID
+        :param str sequence_number: The sequence number of the last record
+            that was processed, or
+            :py:data:`~tornado_dynamodb.streams.SHARD_END`
+
+        """
+        self._checkpoints.setdefault(stream_arn, {})[shard_id] = \
+            sequence_number
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Stores the checkpoints in a local JSON file, rewriting the file
+    each time a checkpoint is set.
+
+    :param str path: The path to the checkpoint file
+
+    """
+    def __init__(self, path):
+        super(FileCheckpointStore, self).__init__()
+        self._path = path
+        if os.path.exists(path):
+            with open(path, 'r') as handle:
+                self._checkpoints = json.load(handle)
+
+    def set(self, stream_arn, shard_id, sequence_number):
+        super(FileCheckpointStore, self).set(stream_arn, shard_id,
+                                             sequence_number)
+        temp_path = '{}.tmp'.format(self._path)
+        with open(temp_path, 'w') as handle:
+            json.dump(self._checkpoints, handle, sort_keys=True)
+        os.rename(temp_path, self._path)
+
+
+class StreamConsumer(object):
+    """Consume all of the shards of a DynamoDB stream in parallel.
+
+    Shards are processed concurrently, up to ``max_shards`` at a time. A
+    child shard is only processed once its parent shard has been read to the
+    end, so that the records for an item are always delivered in order.
+    Records are passed to ``callback`` in batches of up to ``batch_size``,
+    with ``Keys``, ``NewImage``, and ``OldImage`` unmarshalled, unless
+    ``raw`` is set. The callback is invoked as
+    ``callback(shard_id, records)`` and may be a coroutine. Once the
+    callback has completed, the sequence number of the last record in the
+    batch is saved to the checkpoint store, and processing resumes from
+    there when the consumer is restarted.
+
+    :param streams_client: The DynamoDB Streams client
+    :type streams_client: :py:class:`~tornado_dynamodb.streams.DynamoDBStreams`
+    :param str stream_arn: The ARN of the stream to consume
+    :param callable callback: The method to invoke with each batch of records
+    :param checkpoint_store: Where to store the shard checkpoints. If not
+        specified, checkpoints are kept in memory.
+    :type checkpoint_store: :py:class:`~tornado_dynamodb.streams.CheckpointStore`
+    :param int batch_size: The maximum number of records per batch
+        (Default: ``100``)
+    :param int max_shards: The maximum number of shards to process at the
+        same time (Default: ``10``)
+    :param float poll_interval: How long to wait in seconds before polling
+        an open shard that returned no records (Default: ``1.0``)
+    :param float describe_interval: How often in seconds to describe the
+        stream to discover new shards (Default: ``10.0``)
+    :param str iterator_type: Where to start reading shards that do not have
+        a checkpoint, ``TRIM_HORIZON`` (Default) or ``LATEST``
+    :param bool raw: Pass the records to ``callback`` in the wire format,
+        without unmarshalling them
+
+    """
+    def __init__(self, streams_client, stream_arn, callback,
+                 checkpoint_store=None, batch_size=100, max_shards=10,
+                 poll_interval=1.0, describe_interval=10.0,
+                 iterator_type=ITERATOR_TRIM_HORIZON, raw=False):
+        if iterator_type not in (ITERATOR_LATEST, ITERATOR_TRIM_HORIZON):
+            raise ValueError('Invalid iterator_type value: {}'.format(
+                iterator_type))
+        self._client = streams_client
+        self._stream_arn = stream_arn
+        self._callback = callback
+        self._store = checkpoint_store or CheckpointStore()
+        self._batch_size = batch_size
+        self._max_shards = max_shards
+        self._poll_interval = poll_interval
+        self._describe_interval = describe_interval
+        self._iterator_type = iterator_type
+        self._raw = raw
+        self._finished = set()
+        self._running = {}
+        self._stopping = False
+
+    @property
+    def finished_shards(self):
+        """Return the IDs of the shards that have been read to the end.
+
+        :rtype: set
+
+        """
+        return set(self._finished)
+
+    def stop(self):
+        """Stop consuming the stream. Shards finish processing the batch they
+        are working on before :py:meth:`run` returns.
+
+        """
+        self._stopping = True
+
+    @gen.coroutine
+    def run(self):
+        """Consume the stream until :py:meth:`stop` is called or all of the
+        shards in the stream have been closed and read to the end.
+
+        :raises: :py:exc:`~tornado_dynamodb.exceptions.DynamoDBException`
+
+        """
+        _ioloop = ioloop.IOLoop.current()
+        self._stopping = False
+        try:
+            while not self._stopping:
+                shards = yield self._describe_shards()
+                for shard in self._ready_shards(shards):
+                    LOGGER.debug('Starting shard %s', shard['ShardId'])
+                    self._running[shard['ShardId']] = \
+                        self._process_shard(shard['ShardId'])
+                if not self._running:
+                    break
+                deadline = _ioloop.time() + self._describe_interval
+                while (self._running and not self._stopping and
+                       _ioloop.time() < deadline):
+                    yield self._wait_for_shard(deadline - _ioloop.time())
+        except Exception:
+            self._stopping = True
+            raise
+        if self._running:
+            yield list(self._running.values())
+
+    @gen.coroutine
+    def _describe_shards(self):
+        """Return all of the shards in the stream, paginating through the
+        *DescribeStream* results.
+
+        :rtype: list
+
+        """
+        shards, start_shard_id = [], None
+        while True:
+            result = yield self._client.describe_stream(
+                self._stream_arn, exclusive_start_shard_id=start_shard_id)
+            shards += result.get('Shards', [])
+            start_shard_id = result.get('LastEvaluatedShardId')
+            if not start_shard_id:
+                raise gen.Return(shards)
+
+    def _ready_shards(self, shards):
+        """Return the shards that can be started, ensuring that parent shards
+        are read to the end before their children are started.
+
+        :param list shards: The shards returned by *DescribeStream*
+        :rtype: list
+
+        """
+        shard_ids = set([shard['ShardId'] for shard in shards])
+        ready = []
+        for shard in shards:
+            if (shard['ShardId'] in self._finished or
+                    shard['ShardId'] in self._running):
+                continue
+            parent = shard.get('ParentShardId')
+            if parent and parent in shard_ids and \
+                    parent not in self._finished:
+                continue
+            ready.append(shard)
+        available = self._max_shards - len(self._running)
+        return ready[:max(0, available)]
+
+    @gen.coroutine
+    def _wait_for_shard(self, timeout):
+        """Wait until a shard completes or the timeout expires, raising any
+        exception raised while processing the shard.
+
+        :param float timeout: The maximum time to wait in seconds
+
+        """
+        waiter = gen.WaitIterator(*self._running.values())
+        try:
+            yield gen.with_timeout(ioloop.IOLoop.current().time() +
+                                   max(timeout, 0), waiter.next())
+        except gen.TimeoutError:
+            return
+        for shard_id, future in list(self._running.items()):
+            if future.done():
+                del self._running[shard_id]
+                future.result()
+
+    @gen.coroutine
+    def _process_shard(self, shard_id):
+        """Read records from the shard, starting after the last checkpoint,
+        until the shard is closed or the consumer is stopped.
+
+        :param str shard_id: The shard ID
+
+        """
+        checkpoint = yield gen.maybe_future(
+            self._store.get(self._stream_arn, shard_id))
+        if checkpoint == SHARD_END:
+            self._finished.add(shard_id)
+            return
+        iterator = yield self._shard_iterator(shard_id, checkpoint)
+        while iterator and not self._stopping:
+            try:
+                result = yield self._client.get_records(iterator,
+                                                        self._batch_size)
+            except (exceptions.ExpiredIteratorException,
+                    exceptions.InternalFailure,
+                    exceptions.LimitExceeded,
+                    exceptions.RequestException,
+                    exceptions.TimeoutException) as error:
+                LOGGER.warning('Error reading shard %s, reacquiring the '
+                               'shard iterator: %s', shard_id, error)
+                yield gen.sleep(self._poll_interval)
+                iterator = yield self._shard_iterator(shard_id, checkpoint)
+                continue
+            records = result.get('Records', [])
+            if not self._raw:
+                records = [unmarshall_record(record) for record in records]
+            if records:
+                yield gen.maybe_future(self._callback(shard_id, records))
+                checkpoint = records[-1]['dynamodb']['SequenceNumber']
+                yield gen.maybe_future(
+                    self._store.set(self._stream_arn, shard_id, checkpoint))
+            iterator = result.get('NextShardIterator')
+            if iterator and not records:
+                yield gen.sleep(self._poll_interval)
+        if not iterator:
+            LOGGER.debug('Shard %s has been read to the end', shard_id)
+            yield gen.maybe_future(
+                self._store.set(self._stream_arn, shard_id, SHARD_END))
+            self._finished.add(shard_id)
+
+    def _shard_iterator(self, shard_id, checkpoint):
+        """Return a shard iterator that starts after the checkpoint, or at
+        the configured position if there is no checkpoint.
+
+        :param str shard_id: The shard ID
+        :param str checkpoint: The last processed sequence number
+        :rtype: tornado.concurrent.Future
+
+        """
+        if checkpoint:
+            return self._client.get_shard_iterator(
+                self._stream_arn, shard_id, ITERATOR_AFTER_SEQUENCE_NUMBER,
+                checkpoint)
+        return self._client.get_shard_iterator(self._stream_arn, shard_id,
+                                               self._iterator_type)
@@ -0,0 +1,321 @@
+"""
+Tracing
+=======
+A :py:class:`~tornado_dynamodb.tracing.Tracer` passed to
+:py:class:`~tornado_dynamodb.DynamoDB` records a span for each operation the
+client performs, with a child span for each HTTP request made for it, so the
+time spent in DynamoDB calls shows up in traces:
+
+.. code:: python
+
+    tracer = tracing.ZipkinTracer(service_name='orders-api')
+    client = tornado_dynamodb.DynamoDB(tracer=tracer)
+
+Operation spans are named after the API operation, such as
+``DynamoDB.Query``, and have these attributes:
+
+- ``aws.dynamodb.table_name``: the table, or comma separated tables of a
+  batch or transaction
+- ``aws.dynamodb.index_name``: the secondary index queried or scanned
+- ``aws.dynamodb.consumed_capacity``: the capacity units consumed, when
+  ``return_consumed_capacity`` is requested
+- ``aws.dynamodb.item_count``: the number of items returned or counted
+- ``http.response_bytes``: the total size of the response bodies
+- ``error.type``: the exception class name of a failed operation
+
+Their child spans are named ``attempt`` for the first request, ``retry``
+for the requests that retry it, such as the retries of
+:py:meth:`~tornado_dynamodb.DynamoDB.transact_write_items`, and ``page`` for
+the following pages of :py:meth:`~tornado_dynamodb.DynamoDB.count_query` and
+:py:meth:`~tornado_dynamodb.DynamoDB.count_scan`. They have the
+``http.status_code``, ``http.response_bytes`` and ``error.type`` of the
+request.
+
+Without a tracer no spans are created. :py:class:`Tracer` itself discards
+the spans it creates, and is the base class of
+:py:class:`~tornado_dynamodb.tracing.FileTracer`, which appends them to a
+JSON lines file, and :py:class:`~tornado_dynamodb.tracing.ZipkinTracer`,
+which sends them to a local collector that accepts the Zipkin v2 JSON
+format, such as Zipkin, Jaeger or the OpenTelemetry collector. Subclasses
+can override :py:meth:`~tornado_dynamodb.tracing.Tracer.current_span` to
+parent operation spans to the span of the code making the request.
+
+"""
+import binascii
+import json
+import logging
+import os
+import threading
+import time
+
+from tornado import gen
+from tornado import httpclient
+from tornado import ioloop
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_ZIPKIN_ENDPOINT = 'http://localhost:9411/api/v2/spans'
+
+
+class Span(object):
+    """A timed operation within a trace.
+
+    :param tracer: The tracer that exports the span when it is finished
+    :type tracer: :py:class:`~tornado_dynamodb.tracing.Tracer`
+    :param str name: The span name
+    :param parent: The parent span, or :data:`None` to start a trace
+    :type parent: :py:class:`~tornado_dynamodb.tracing.Span`
+    :param dict attributes: The initial span attributes
+
+    """
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else _identifier(16)
+        self.span_id = _identifier(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.children = 0
+        self.start = time.time()
+        self.end = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish(exc_value)
+
+    @property
+    def duration(self):
+        """The span duration in seconds, or :data:`None` if it has not
+        finished.
+
+        :rtype: float
+
+        """
+        if self.end is None:
+            return None
+        return self.end - self.start
+
+    def add(self, key, value):
+        """Add ``value`` to a numeric attribute, starting from ``0``.
+
+        :param str key: The attribute name
+        :param int|float value: The amount to add
+
+        """
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def as_dict(self):
+        """Return the span as a JSON serializable dict.
+
+        :rtype: dict
+
+        """
+        return {'name': self.name,
+                'trace_id': self.trace_id,
+                'span_id': self.span_id,
+                'parent_id': self.parent_id,
+                'start': self.start,
+                'duration': self.duration,
+                'attributes': self.attributes}
+
+    def child(self, name, attributes=None):
+        """Start a child span.
+
+        :param str name: The span name
+        :param dict attributes: The initial span attributes
+        :rtype: :py:class:`~tornado_dynamodb.tracing.Span`
+
+        """
+        self.children += 1
+        return self.tracer.start_span(name, self, attributes)
+
+    def finish(self, error=None):
+        """End the span and export it, recording the exception it failed
+        with.
+
+        :param Exception error: The exception the operation failed with
+
+        """
+        if self.end is not None:
+            return
+        self.end = time.time()
+        if error is not None:
+            self.attributes.setdefault('error.type', type(error).__name__)
+        self.tracer.export(self)
+
+    def set_attribute(self, key, value):
+        """Set an attribute of the span.
+
+        :param str key: The attribute name
+        :param value: The attribute value
+
+        """
+        self.attributes[key] = value
+
+
+class Tracer(object):
+    """Create spans and discard them when they are finished. Subclasses
+    export the finished spans by overriding :py:meth:`export`.
+
+    """
+    def close(self):
+        """Export the spans that have not been exported yet and release
+        the resources of the tracer.
+
+        """
+        pass
+
+    def current_span(self):
+        """Return the span of the code that is running, which operation
+        spans are parented to, or :data:`None` to start a new trace.
+
+        :rtype: :py:class:`~tornado_dynamodb.tracing.Span`
+
+        """
+        return None
+
+    def export(self, span):
+        """Export a finished span.
+
+        :param span: The finished span
+        :type span: :py:class:`~tornado_dynamodb.tracing.Span`
+
+        """
+        pass
+
+    def start_span(self, name, parent=None, attributes=None):
+        """Start a span, parented to :py:meth:`current_span` if no parent is
+        specified.
+
+        :param str name: The span name
+        :param parent: The parent span
+        :type parent: :py:class:`~tornado_dynamodb.tracing.Span`
+        :param dict attributes: The initial span attributes
+        :rtype: :py:class:`~tornado_dynamodb.tracing.Span`
+
+        """
+        return Span(self, name, parent or self.current_span(), attributes)
+
+
+class FileTracer(Tracer):
+    """Append each finished span to a file as a line of JSON, in the format
+    of :py:meth:`Span.as_dict`.
+
+    :param str path: The file to append the spans to
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def export(self, span):
+        line = json.dumps(span.as_dict(), sort_keys=True, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + '\n')
+                self._file.flush()
+
+
+class ZipkinTracer(Tracer):
+    """Send the finished spans to a collector that accepts the Zipkin v2
+    JSON format, in batches of up to ``batch_size`` spans at most
+    ``interval`` seconds after they finish. Spans that cannot be sent are
+    logged and dropped, and so are the oldest spans once ``max_pending``
+    spans are waiting to be sent.
+
+    :param str endpoint: The URL of the collector's span endpoint
+    :param str service_name: The service name to report the spans under
+    :param int batch_size: The most spans to send in a request
+    :param float interval: The most seconds a span waits to be sent
+    :param int max_pending: The most spans to keep waiting to be sent
+
+    """
+    def __init__(self, endpoint=DEFAULT_ZIPKIN_ENDPOINT,
+                 service_name='dynamodb', batch_size=DEFAULT_BATCH_SIZE,
+                 interval=DEFAULT_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.sent = 0
+        self._pending = []
+        self._timeout = None
+
+    def close(self):
+        """Send the spans that are waiting to be sent.
+
+        :rtype: :class:`tornado.concurrent.Future`
+
+        """
+        return self.flush()
+
+    def export(self, span):
+        self._pending.append(self._format(span))
+        if len(self._pending) > self.max_pending:
+            self.dropped += len(self._pending) - self.max_pending
+            del self._pending[:len(self._pending) - self.max_pending]
+        if len(self._pending) >= self.batch_size:
+            ioloop.IOLoop.current().add_callback(self.flush)
+        elif self._timeout is None:
+            self._timeout = ioloop.IOLoop.current().call_later(
+                self.interval, self.flush)
+
+    @gen.coroutine
+    def flush(self):
+        """Send the spans that are waiting to be sent, returning the number
+        of spans sent.
+
+        :rtype: int
+
+        """
+        if self._timeout is not None:
+            ioloop.IOLoop.current().remove_timeout(self._timeout)
+            self._timeout = None
+        sent = 0
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            try:
+                yield httpclient.AsyncHTTPClient().fetch(
+                    self.endpoint, method='POST', body=json.dumps(batch),
+                    headers={'Content-Type': 'application/json'})
+            except (httpclient.HTTPError, IOError) as error:
+                LOGGER.warning('Dropping %i spans that could not be sent to '
+                               '%s: %s', len(batch), self.endpoint, error)
+                self.dropped += len(batch)
+                continue
+            sent += len(batch)
+        self.sent += sent
+        raise gen.Return(sent)
+
+    def _format(self, span):
+        """Return a span in the Zipkin v2 JSON format."""
+        value = {'traceId': span.trace_id,
+                 'id': span.span_id,
+                 'name': span.name,
+                 'kind': 'CLIENT',
+                 'timestamp': int(span.start * 1000000),
+                 'duration': max(1, int(span.duration * 1000000)),
+                 'localEndpoint': {'serviceName': self.service_name},
+                 'tags': dict((key, str(value)) for key, value
+                              in span.attributes.items())}
+        if span.parent_id:
+            value['parentId'] = span.parent_id
+        return value
+
+
+def _identifier(size):
+    """Return a random hex identifier of ``size`` bytes."""
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
@@ -0,0 +1,259 @@
+"""
+HTTP Transports
+===============
+Transports are the HTTP clients that :py:class:`~tornado_dynamodb.DynamoDB`
+uses to submit signed requests. A transport exposes the same ``fetch`` method
+as :py:class:`tornado.httpclient.AsyncHTTPClient`, adds per-host connection
+limits, and keeps counters for connection usage that can be retrieved with
+:py:meth:`~tornado_dynamodb.transport.Transport.stats`.
+
+:py:class:`~tornado_dynamodb.transport.Transport` uses Tornado's default
+``simple_httpclient``, which opens a new connection for every request.
+:py:class:`~tornado_dynamodb.transport.CurlTransport` uses Tornado's
+``curl_httpclient`` and keeps connections alive between requests. It requires
+`pycurl <http://pycurl.io>`_.
+
+.. code:: python
+
+    client = tornado_dynamodb.DynamoDB(
+        transport=transport.CurlTransport(max_clients=50,
+                                          max_host_connections=25))
+    yield client.warm_up(10)
+
+"""
+import collections
+import logging
+
+from tornado import gen
+from tornado import httpclient
+
+try:
+    import pycurl
+    from tornado import curl_httpclient
+except ImportError:  # pragma: no cover
+    pycurl, curl_httpclient = None, None
+
+try:
+    from urllib import parse as _urlparse
+except ImportError:  # pragma: no cover
+    import urlparse as _urlparse
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Transport(object):
+    """HTTP transport using Tornado's default
+    :py:class:`~tornado.httpclient.AsyncHTTPClient` implementation. Every
+    request opens a new connection.
+
+    :param int max_clients: Max simultaneous requests (Default: ``100``)
+    :param int max_host_connections: Max simultaneous requests per host. If
+        not set, only ``max_clients`` is enforced.
+    :param dict defaults: Default :py:class:`~tornado.httpclient.HTTPRequest`
+        attribute values
+
+    """
+    KEEP_ALIVE = False
+
+    def __init__(self, max_clients=100, max_host_connections=None,
+                 defaults=None):
+        self.max_clients = max_clients
+        self.max_host_connections = max_host_connections
+        self._client = self._create_client(max_clients, defaults)
+        self._defaults = defaults
+        self._host_semaphores = {}
+        self._counters = collections.Counter()
+        self._in_flight = 0
+        self._pooled = 0
+
+    @property
+    def client(self):
+        """Return the underlying HTTP client.
+
+        :rtype: tornado.httpclient.AsyncHTTPClient
+
+        """
+        return self._client
+
+    @property
+    def io_loop(self):
+        """Return the IOLoop the underlying HTTP client runs on.
+
+        :rtype: tornado.ioloop.IOLoop
+
+        """
+        return self._client.io_loop
+
+    def close(self):
+        """Close the underlying HTTP client"""
+        self._client.close()
+
+    def copy(self):
+        """Return a new transport with the same configuration, with an HTTP
+        client for the current IOLoop.
+
+        :rtype: :py:class:`~tornado_dynamodb.transport.Transport`
+
+        """
+        return type(self)(self.max_clients, self.max_host_connections,
+                          self._defaults)
+
+    def fetch(self, request, **kwargs):
+        """Execute the request, returning a
+        :py:class:`~tornado.concurrent.Future` for the
+        :py:class:`~tornado.httpclient.HTTPResponse`. The arguments are the
+        same as :py:meth:`tornado.httpclient.AsyncHTTPClient.fetch`.
+
+        :param request: The request to perform
+        :type request: str or :py:class:`tornado.httpclient.HTTPRequest`
+        :rtype: tornado.concurrent.Future
+
+        """
+        if not self.max_host_connections:
+            return self._fetch(request, kwargs)
+        return self._limited_fetch(request, kwargs)
+
+    def stats(self):
+        """Return the connection counters for the transport:
+
+        - ``requests``: The number of completed requests
+        - ``opened``: The number of connections opened
+        - ``reused``: The number of requests that reused an open connection
+        - ``in_flight``: The number of requests currently in progress
+        - ``idle``: The estimated number of open connections that are not
+          currently in use
+
+        :rtype: dict
+
+        """
+        return {'requests': self._counters['requests'],
+                'opened': self._counters['opened'],
+                'reused': self._counters['reused'],
+                'in_flight': self._in_flight,
+                'idle': max(0, self._pooled - self._in_flight)}
+
+    @gen.coroutine
+    def warm_up(self, url, connections):
+        """Open ``connections`` concurrent connections to the URL so that they
+        are established before the first API request is made. Only transports
+        that keep connections alive benefit from warming up.
+
+        :param str url: The URL to request
+        :param int connections: The number of connections to open
+        :returns: The number of connections that were established
+        :rtype: int
+
+        """
+        responses = yield [self.fetch(url, raise_error=False)
+                           for _ in range(connections)]
+        raise gen.Return(len([r for r in responses if r.code != 599]))
+
+    @staticmethod
+    def _create_client(max_clients, defaults):
+        """Return the HTTP client used to perform requests.
+
+        :param int max_clients: Max simultaneous requests
+        :param dict defaults: Default request attribute values
+        :rtype: tornado.httpclient.AsyncHTTPClient
+
+        """
+        return httpclient.AsyncHTTPClient(max_clients=max_clients,
+                                          defaults=defaults,
+                                          force_instance=True)
+
+    def _fetch(self, request, kwargs):
+        self._in_flight += 1
+        if self.KEEP_ALIVE:
+            self._pooled = min(self.max_clients,
+                               max(self._pooled, self._in_flight))
+        future = self._client.fetch(request, **kwargs)
+        future.add_done_callback(self._on_complete)
+        return future
+
+    @staticmethod
+    def _host(request):
+        url = request.url if hasattr(request, 'url') else request
+        return _urlparse.urlparse(url).netloc
+
+    @gen.coroutine
+    def _limited_fetch(self, request, kwargs):
+        host = self._host(request)
+        if host not in self._host_semaphores:
+            from tornado import locks
+            self._host_semaphores[host] = locks.Semaphore(
+                self.max_host_connections)
+        with (yield self._host_semaphores[host].acquire()):
+            response = yield self._fetch(request, kwargs)
+        raise gen.Return(response)
+
+    def _on_complete(self, _future):
+        self._in_flight -= 1
+        self._counters['requests'] += 1
+        if not self.KEEP_ALIVE:
+            self._counters['opened'] += 1
+
+    def _on_connections(self, opened):
+        """Invoked by keep-alive clients with the number of new connections
+        that were opened to complete a request.
+
+        :param int opened: The number of connections opened
+
+        """
+        if opened:
+            self._counters['opened'] += opened
+        else:
+            self._counters['reused'] += 1
+
+
+class CurlTransport(Transport):
+    """HTTP transport using Tornado's ``curl_httpclient``. Connections are
+    kept alive and pooled by libcurl, and TCP keep-alive probes are enabled
+    on each connection.
+
+    :param int max_clients: Max simultaneous requests (Default: ``100``)
+    :param int max_host_connections: Max simultaneous requests per host. If
+        not set, only ``max_clients`` is enforced.
+    :param dict defaults: Default :py:class:`~tornado.httpclient.HTTPRequest`
+        attribute values
+    :raises: ImportError
+
+    """
+    KEEP_ALIVE = True
+
+    def __init__(self, max_clients=100, max_host_connections=None,
+                 defaults=None):
+        if pycurl is None:
+            raise ImportError('pycurl is required for CurlTransport')
+        super(CurlTransport, self).__init__(max_clients, max_host_connections,
+                                            defaults)
+        self._client.on_connections = self._on_connections
+
+    @staticmethod
+    def _create_client(max_clients, defaults):
+        return _CurlAsyncHTTPClient(max_clients=max_clients,
+                                    defaults=defaults, force_instance=True)
+
+
+if curl_httpclient is not None:
+
+    class _CurlAsyncHTTPClient(curl_httpclient.CurlAsyncHTTPClient):
+        """Extends the curl client to enable TCP keep-alive and to report
+        the number of connections opened for each request.
+
+        """
+        on_connections = None
+
+        def _curl_create(self):
+            curl = super(_CurlAsyncHTTPClient, self)._curl_create()
+            if hasattr(pycurl, 'TCP_KEEPALIVE'):
+                curl.setopt(pycurl.TCP_KEEPALIVE, 1)
+            return curl
+
+        def _finish(self, curl, curl_error=None, curl_message=None):
+            if self.on_connections is not None:
+                try:
+                    self.on_connections(curl.getinfo(pycurl.NUM_CONNECTS))
+                except pycurl.error as error:  # pragma: no cover
+                    LOGGER.debug('Error getting NUM_CONNECTS: %s', error)
+            return super(_CurlAsyncHTTPClient, self)._finish(
+                curl, curl_error, curl_message)
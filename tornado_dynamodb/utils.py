@@ -3,33 +3,213 @@ DynamoDB Utilities
 ==================
 
 """
-import arrow
+import base64
+import binascii
 import datetime
-import uuid
+import decimal
+import math
 import sys
 
 PYTHON3 = True if sys.version_info > (3, 0, 0) else False
 TEXTCHARS = bytearray({7,8,9,10,12,13,27} | set(range(0x20, 0x100)) - {0x7f})
 
+# DynamoDB request limits
+MAX_ITEM_SIZE = 409600
+MAX_BATCH_GET_ITEMS = 100
+MAX_BATCH_WRITE_ITEMS = 25
+MAX_BATCH_WRITE_SIZE = 16777216
 
-def marshall(values):
+_SCALAR_SIZE = 1
+_CONTAINER_OVERHEAD = 3
+
+
+def marshall(values, size=None):
     """Return the values in a nested dict structure that is required for
     writing the values to DynamoDB.
 
     :param dict values: The values to marshall
+    :param list size: A single element list that the size of the marshalled
+        values is added to, see
+        :py:func:`~tornado_dynamodb.utils.marshall_with_size`
     :rtype: dict
 
     """
     serialized = {}
     for key in values:
-        serialized[key] = _marshall_value(values[key])
+        if size is not None:
+            size[0] += _string_size(key)
+        serialized[key] = _marshall_value(values[key], size)
     return serialized
 
 
-def _marshall_value(value):
+def marshall_with_size(values):
+    """Marshall the values as :py:func:`~tornado_dynamodb.utils.marshall`
+    does, calculating the item size as defined by DynamoDB in the same pass.
+
+    :param dict values: The values to marshall
+    :rtype: (dict, int)
+
+    """
+    size = [0]
+    return marshall(values, size), size[0]
+
+
+def item_size(item, marshalled=False):
+    """Return the size of an item in bytes, following the rules that
+    DynamoDB uses for the item size limit and capacity unit calculations:
+    the UTF-8 length of attribute names and strings, the length of binary
+    values, roughly one byte per two significant digits of numbers, one byte
+    for booleans and nulls and three bytes plus one per element for lists
+    and maps.
+
+    :param dict item: The item
+    :param bool marshalled: ``True`` if the item is in the DynamoDB wire
+        format instead of native values
+    :rtype: int
+
+    """
+    if not marshalled:
+        return marshall_with_size(item)[1]
+    return sum(_string_size(name) + _value_size(value)
+               for name, value in item.items())
+
+
+def key_names(key_schema):
+    """Return the attribute names of a key schema, the partition key first
+    and then the sort key, if there is one.
+
+    :param list key_schema: The ``KeySchema`` of a table or index
+    :rtype: list
+
+    """
+    return [key['AttributeName'] for key in
+            sorted(key_schema, key=lambda key: key['KeyType'] != 'HASH')]
+
+
+def read_capacity_units(size, consistent=False, transactional=False):
+    """Return the read capacity units consumed by reading ``size`` bytes in
+    a single item read, or the items of a *Query* or *Scan* page.
+
+    :param int size: The number of bytes read
+    :param bool consistent: ``True`` for a strongly consistent read
+    :param bool transactional: ``True`` for a *TransactGetItems* read
+    :rtype: float
+
+    """
+    units = max(1, int(math.ceil(size / 4096.0)))
+    if transactional:
+        return units * 2.0
+    return float(units) if consistent else units / 2.0
+
+
+def write_capacity_units(size, transactional=False):
+    """Return the write capacity units consumed by writing an item of
+    ``size`` bytes. For updates and deletes, the size is the larger of the
+    item before and after the write.
+
+    :param int size: The item size in bytes
+    :param bool transactional: ``True`` for a *TransactWriteItems* write
+    :rtype: float
+
+    """
+    units = float(max(1, int(math.ceil(size / 1024.0))))
+    return units * 2 if transactional else units
+
+
+def estimate_capacity(operation, items, consistent=False):
+    """Estimate the capacity units an operation consumes for the native
+    items it reads or writes. Reads by *Query* and *Scan* are rounded up for
+    the total size of the items, other reads and writes per item. For
+    writes that replace an existing item, pass the larger of the two.
+
+    :param str operation: The DynamoDB API operation, for example
+        ``PutItem``
+    :param list items: The items read or written
+    :param bool consistent: ``True`` for strongly consistent reads
+    :rtype: float
+    :raises: ValueError
+
+    """
+    sizes = [item_size(item) for item in items]
+    if operation in ('Query', 'Scan'):
+        return read_capacity_units(sum(sizes), consistent)
+    elif operation in ('BatchGetItem', 'GetItem', 'TransactGetItems'):
+        return sum(read_capacity_units(
+            size, consistent, operation == 'TransactGetItems')
+            for size in sizes)
+    elif operation in ('BatchWriteItem', 'DeleteItem', 'PutItem',
+                       'TransactWriteItems', 'UpdateItem'):
+        return sum(write_capacity_units(
+            size, operation == 'TransactWriteItems') for size in sizes)
+    raise ValueError('Unsupported operation: %s' % operation)
+
+
+def batches(items, max_items=MAX_BATCH_WRITE_ITEMS,
+            max_size=MAX_BATCH_WRITE_SIZE):
+    """Split the native items into lists that have at most ``max_items``
+    items and a total size of at most ``max_size`` bytes, for batch
+    requests.
+
+    :param iterable items: The items to split
+    :param int max_items: The maximum number of items per batch
+    :param int max_size: The maximum total item size per batch
+    :rtype: generator
+
+    """
+    batch, batch_size = [], 0
+    for item in items:
+        size = item_size(item)
+        if batch and (len(batch) == max_items or
+                      batch_size + size > max_size):
+            yield batch
+            batch, batch_size = [], 0
+        batch.append(item)
+        batch_size += size
+    if batch:
+        yield batch
+
+
+def json_default(value):
+    """Return binary values base64 encoded for the JSON request body, for
+    use as the ``default`` argument of :py:func:`json.dumps`.
+
+    :param mixed value: The value that could not be serialized
+    :rtype: str
+    :raises: TypeError
+
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode('ascii')
+    raise TypeError('%r is not JSON serializable' % value)
+
+
+def _marshall_value(value, size=None):
     """Return the value as dict indicating the data type and transform or
     recursively process the value if required.
 
+    :param mixed value: The value to encode
+    :param list size: A single element list to add the value size to
+    :rtype: dict
+    :raises: ValueError
+
+    """
+    if isinstance(value, dict):
+        if size is not None:
+            size[0] += _CONTAINER_OVERHEAD + len(value)
+        return {'M': marshall(value, size)}
+    elif isinstance(value, list):
+        if size is not None:
+            size[0] += _CONTAINER_OVERHEAD + len(value)
+        return {'L': [_marshall_value(v, size) for v in value]}
+    marshalled = _marshall_scalar(value)
+    if size is not None:
+        size[0] += _value_size(marshalled)
+    return marshalled
+
+
+def _marshall_scalar(value):
+    """Return the marshalled form of a value that is not a map or list.
+
     :param mixed value: The value to encode
     :rtype: dict
     :raises: ValueError
@@ -43,28 +223,25 @@ def _marshall_value(value):
         if _is_binary(value):
             return {'B': value}
         return {'S': value}
-    elif isinstance(value, dict):
-        return {'M': marshall(value)}
     elif isinstance(value, bool):
         return {'BOOL': value}
     elif isinstance(value, int):
         return {'N': str(value)}
+    elif isinstance(value, (decimal.Decimal, float)):
+        return {'N': _number_string(value)}
     elif isinstance(value, datetime.datetime):
         return {'S': value.isoformat()}
-    elif isinstance(value, arrow.Arrow):
+    elif _is_arrow(value):
         return {'S': value.isoformat()}
-    elif isinstance(value, uuid.UUID):
+    elif _is_uuid(value):
         return {'S': str(value)}
-    elif isinstance(value, list):
-        return {'L': [_marshall_value(v) for v in value]}
     elif isinstance(value, set):
         if PYTHON3 and all([isinstance(v, bytes) for v in value]):
             return {'BS': sorted(list(value))}
         elif PYTHON3 and all([isinstance(v, str) for v in value]):
             return {'SS': sorted(list(value))}
-        elif all([isinstance(v, float) for v in value]) or \
-                all([isinstance(v, int) for v in value]):
-            return {'NS': sorted([str(v) for v in value])}
+        elif all([_is_number(v) for v in value]):
+            return {'NS': sorted([_number_string(v) for v in value])}
         elif not PYTHON3 and all([isinstance(v, str) for v in value]) and \
                 all([_is_binary(v) for v in value]):
             return {'BS': sorted(list(value))}
@@ -78,6 +255,112 @@ def _marshall_value(value):
     raise ValueError('Unsupported type: %s' % type(value))
 
 
+def _is_number(value):
+    """Check to see if the value is marshalled as a number.
+
+    :param mixed value: The value to check
+    :rtype: bool
+
+    """
+    return isinstance(value, (decimal.Decimal, float, int)) and \
+        not isinstance(value, bool)
+
+
+def _number_string(value):
+    """Return the string form of a number that is sent to DynamoDB. Floats
+    use their shortest round-tripping representation, and floats and
+    decimals are written without an exponent.
+
+    :param int|float|decimal.Decimal value: The number
+    :rtype: str
+    :raises: ValueError
+
+    """
+    if isinstance(value, float):
+        if math.isinf(value) or math.isnan(value):
+            raise ValueError('Unsupported number: %r' % value)
+        value = decimal.Decimal(repr(value))
+    elif not isinstance(value, decimal.Decimal):
+        return str(value)
+    elif not value.is_finite():
+        raise ValueError('Unsupported number: %r' % value)
+    text = '{:f}'.format(value)
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return text if text not in ('-0', '') else '0'
+
+
+def _value_size(value):
+    """Return the size of a marshalled value in bytes.
+
+    :param dict value: The marshalled value
+    :rtype: int
+
+    """
+    data_type = next(iter(value))
+    data = value[data_type]
+    if data_type == 'S':
+        return _string_size(data)
+    elif data_type == 'N':
+        return _number_size(data)
+    elif data_type == 'B':
+        return _binary_size(data)
+    elif data_type in ('BOOL', 'NULL'):
+        return _SCALAR_SIZE
+    elif data_type == 'SS':
+        return sum(_string_size(v) for v in data)
+    elif data_type == 'NS':
+        return sum(_number_size(v) for v in data)
+    elif data_type == 'BS':
+        return sum(_binary_size(v) for v in data)
+    elif data_type == 'L':
+        return _CONTAINER_OVERHEAD + sum(1 + _value_size(v) for v in data)
+    elif data_type == 'M':
+        return _CONTAINER_OVERHEAD + sum(
+            1 + _string_size(k) + _value_size(v) for k, v in data.items())
+    raise ValueError('Unsupported value type: %s' % data_type)
+
+
+def _string_size(value):
+    """Return the UTF-8 encoded length of a string.
+
+    :param str value: The string
+    :rtype: int
+
+    """
+    if isinstance(value, bytes):
+        return len(value)
+    return len(value.encode('utf-8'))
+
+
+def _number_size(value):
+    """Return the size of a number in its string form: one byte per two
+    significant digits, plus one.
+
+    :param str value: The number
+    :rtype: int
+
+    """
+    digits = decimal.Decimal(value).normalize().as_tuple().digits
+    return int(math.ceil(len(digits) / 2.0)) + 1
+
+
+def _binary_size(value):
+    """Return the size of a binary value, which is base64 encoded when it
+    has been received over the wire.
+
+    :param bytes|str value: The value
+    :rtype: int
+
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    try:
+        return len(base64.b64decode(value))
+    except (TypeError, ValueError, binascii.Error):
+        return len(value)
+
+
 def unmarshall(values):
     """Transform a response payload from DynamoDB to a native dict
 
@@ -102,9 +385,9 @@ def _unmarshall_dict(value):
     """
     key = list(value.keys()).pop()
     if key == 'B':
-        return bytes(value[key])
+        return _to_bytes(value[key])
     elif key == 'BS':
-        return set([bytes(v) for v in value[key]])
+        return set([_to_bytes(v) for v in value[key]])
     elif key == 'BOOL':
         return value[key]
     elif key == 'L':
@@ -124,13 +407,29 @@ def _unmarshall_dict(value):
     raise ValueError('Unsupported value type: %s' % key)
 
 
+def _to_bytes(value):
+    """Return a binary value, decoding it if it is the base64 encoded
+    string received over the wire.
+
+    :param bytes|str value: The value to convert
+    :rtype: bytes
+
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return base64.b64decode(value)
+
+
 def _to_number(value):
-    """Convert the string containing a number to a number
+    """Convert the string containing a number to a number, a
+    :py:class:`~decimal.Decimal` if it has an exponent.
 
     :param str value: The value to convert
-    :rtype: float|int
+    :rtype: float|int|decimal.Decimal
 
     """
+    if 'e' in value or 'E' in value:
+        return decimal.Decimal(value)
     return float(value) if '.' in value else int(value)
 
 
@@ -142,12 +441,42 @@ def _maybe_convert(value):
     :rtype: uuid.UUID|datetime.datetime|str
 
     """
+    digits = value.replace('urn:', '').replace('uuid:', '')
+    if len(digits.strip('{}').replace('-', '')) != 32:
+        return value
+    import uuid
     try:
         return uuid.UUID(value)
     except ValueError:
         return value
 
 
+def _is_arrow(value):
+    """Check to see if the value is an :py:class:`arrow.Arrow` instance.
+    ``arrow`` is an optional dependency and is never imported here, if it has
+    not been imported by the application there can not be an ``Arrow`` value.
+
+    :param mixed value: The value to check
+    :rtype: bool
+
+    """
+    arrow = sys.modules.get('arrow')
+    return arrow is not None and isinstance(value, arrow.Arrow)
+
+
+def _is_uuid(value):
+    """Check to see if the value is a :py:class:`uuid.UUID` instance. Like
+    ``arrow``, ``uuid`` is only imported when a UUID string is unmarshalled,
+    so there can not be a ``UUID`` value if it has not been imported yet.
+
+    :param mixed value: The value to check
+    :rtype: bool
+
+    """
+    uuid = sys.modules.get('uuid')
+    return uuid is not None and isinstance(value, uuid.UUID)
+
+
 def _is_binary(value):
     """Check to see if a string contains binary data in Python2
 